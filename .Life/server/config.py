@@ -25,6 +25,8 @@ LLM_CONFIG = {
     "temperature": float(os.getenv("LLM_TEMPERATURE", 0.7)),
     "max_tokens": int(os.getenv("LLM_MAX_TOKENS", 512)),
     "use_local": os.getenv("USE_LOCAL_LLM", "False").lower() == "true",
+    # Локальный LLM сервер (.Life/src/llm): ответы потоком через /generate/stream
+    "local_server_url": os.getenv("LIFE_LLM_URL", ""),
     "fallback_to_openai": os.getenv("FALLBACK_TO_OPENAI", "True").lower() == "true"
 }
 
@@ -7,14 +7,15 @@ FastAPI сервер для Quick Voice Assistant
 import asyncio
 import json
 import logging
+import sys
 import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
@@ -23,6 +24,16 @@ from config import (
     VOICE_COMMANDS, DEFAULT_RESPONSES, validate_config
 )
 
+# Клиент локального LLM сервера из .Life/src/llm
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+try:
+    import aiohttp
+    from llm.client import LocalLLMClient
+    from llm.local_server import ContextType
+    LOCAL_LLM_CLIENT_AVAILABLE = True
+except ImportError:
+    LOCAL_LLM_CLIENT_AVAILABLE = False
+
 # Настройка логирования
 logging.basicConfig(
     level=getattr(logging, SERVER_CONFIG.get("log_level", "INFO")),
@@ -75,6 +86,8 @@ class LLMProcessor:
         self.model = None
         self.use_local = LLM_CONFIG["use_local"]
         self.fallback_to_openai = LLM_CONFIG["fallback_to_openai"]
+        self.local_server_url = LLM_CONFIG["local_server_url"]
+        self._session = None
         
     async def initialize(self):
         """Инициализация LLM модели"""
@@ -105,6 +118,36 @@ class LLMProcessor:
             logger.error(f"Ошибка обработки LLM запроса: {e}")
             return "Извините, произошла ошибка при обработке запроса."
     
+    async def stream_query(self, query: str, context: str = "watch_voice") -> AsyncIterator[str]:
+        """
+        Ответ по частям по мере генерации.
+        
+        С локальным LLM сервером токены идут из /generate/stream, и часы
+        получают первый токен, не дожидаясь всего ответа. Без сервера или
+        при ошибке до первого токена - ответ process_query целиком.
+        """
+        if self.local_server_url and LOCAL_LLM_CLIENT_AVAILABLE:
+            streamed = False
+            try:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession()
+                client = LocalLLMClient(self.local_server_url, session=self._session)
+                async for token in client.generate_stream(query, context=ContextType.HOME,
+                                                          max_tokens=LLM_CONFIG["max_tokens"]):
+                    streamed = True
+                    yield token
+                return
+            except Exception as e:
+                logger.error(f"Ошибка потокового ответа локального LLM сервера: {e}")
+                if streamed:
+                    return
+        yield await self.process_query(query, context)
+    
+    async def close(self):
+        """Закрывает HTTP-сессию к локальному LLM серверу"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+    
     async def _process_local(self, query: str, context: str) -> str:
         """Обработка через локальную модель"""
         # Здесь будет код для локальной Llama 70B
@@ -276,6 +319,7 @@ async def startup_event():
 async def shutdown_event():
     """Событие остановки приложения"""
     logger.info("🛑 Остановка Quick Voice Assistant API...")
+    await llm_processor.close()
 
 # Эндпоинты API
 
@@ -310,45 +354,70 @@ async def health():
         }
     }
 
+def _schedule_voice_action(query: str, background_tasks: BackgroundTasks) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Определяет действие голосовой команды и ставит его выполнение в фон"""
+    query_lower = query.lower()
+    for command_type, command_info in VOICE_COMMANDS.items():
+        for pattern in command_info["patterns"]:
+            if pattern in query_lower:
+                action = command_info["action"]
+                data = {}
+                
+                # Выполнение действия в фоне
+                if action == "create_task":
+                    task_text = query.replace(pattern, "").strip()
+                    background_tasks.add_task(notion_integration.create_task, task_text)
+                    data["task"] = task_text
+                elif action == "save_reflection":
+                    reflection_text = query.replace(pattern, "").strip()
+                    background_tasks.add_task(notion_integration.save_reflection, reflection_text)
+                    data["reflection"] = reflection_text
+                elif action == "create_habit":
+                    habit_text = query.replace(pattern, "").strip()
+                    background_tasks.add_task(notion_integration.create_habit, habit_text)
+                    data["habit"] = habit_text
+                
+                return action, data
+    return None, {}
+
 @app.post("/watch/voice", response_model=VoiceResponse)
-async def process_voice_command(request: VoiceRequest, background_tasks: BackgroundTasks):
-    """Обработка голосовой команды от часов"""
-    try:
-        logger.info(f"🎤 Получена голосовая команда: {request.query}")
+async def process_voice_command(request: VoiceRequest, background_tasks: BackgroundTasks, stream: bool = False):
+    """
+    Обработка голосовой команды от часов.
+    
+    С stream=true ответ отдается потоком SSE (события token и done)
+    по мере генерации; done содержит полный ответ, действие и данные.
+    """
+    logger.info(f"🎤 Получена голосовая команда: {request.query}")
+    
+    if stream:
+        async def events():
+            tokens = []
+            async for token in llm_processor.stream_query(request.query, request.context):
+                tokens.append(token)
+                yield f"event: token\ndata: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+            response_text = "".join(tokens).strip()
+            action, data = _schedule_voice_action(request.query, background_tasks)
+            # Фоновые задачи запускаются после завершения потока, поэтому
+            # отправку в Telegram можно добавить, когда ответ уже известен
+            background_tasks.add_task(
+                telegram_integration.send_message,
+                f"Запрос: {request.query}\nОтвет: {response_text}",
+                "watch_voice"
+            )
+            done = {"response": response_text, "action": action, "data": data, "timestamp": int(time.time())}
+            yield f"event: done\ndata: {json.dumps(done, ensure_ascii=False)}\n\n"
         
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    try:
         # Обработка через LLM
-        response_text = await llm_processor.process_query(
-            request.query, 
-            request.context
-        )
+        response_text = "".join([
+            token async for token in llm_processor.stream_query(request.query, request.context)
+        ]).strip()
         
         # Определение действия
-        action = None
-        data = {}
-        
-        query_lower = request.query.lower()
-        for command_type, command_info in VOICE_COMMANDS.items():
-            for pattern in command_info["patterns"]:
-                if pattern in query_lower:
-                    action = command_info["action"]
-                    
-                    # Выполнение действия в фоне
-                    if action == "create_task":
-                        task_text = request.query.replace(pattern, "").strip()
-                        background_tasks.add_task(notion_integration.create_task, task_text)
-                        data["task"] = task_text
-                    elif action == "save_reflection":
-                        reflection_text = request.query.replace(pattern, "").strip()
-                        background_tasks.add_task(notion_integration.save_reflection, reflection_text)
-                        data["reflection"] = reflection_text
-                    elif action == "create_habit":
-                        habit_text = request.query.replace(pattern, "").strip()
-                        background_tasks.add_task(notion_integration.create_habit, habit_text)
-                        data["habit"] = habit_text
-                    
-                    break
-            if action:
-                break
+        action, data = _schedule_voice_action(request.query, background_tasks)
         
         # Отправка в Telegram
         background_tasks.add_task(
@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 from notion_client import AsyncClient
 import httpx
 
+from .prompt_registry import prompt_registry
+
 # Импортируем мониторинг
 try:
     from src.utils.performance_monitor import performance_monitor, cache_manager
@@ -69,48 +71,27 @@ class AgentCore:
         return hashlib.md5(content.encode()).hexdigest()
 
     async def load_prompts_from_notion(self, force_refresh: bool = False) -> Dict[str, str]:
-        """Загружает промпты агентов из Notion базы с кэшированием"""
-        cache_key = "notion_prompts"
-        
-        # Проверяем кэш
-        if cache_manager and not force_refresh:
-            cached_prompts = cache_manager.get(cache_key)
-            if cached_prompts:
-                if performance_monitor:
-                    performance_monitor.cache_hits += 1
-                return cached_prompts
-        
-        if performance_monitor:
-            performance_monitor.cache_misses += 1
+        """
+        Возвращает промпты агентов по ролям из реестра.
         
+        База загружается из Notion один раз (с пагинацией), дальше ответ
+        отдается из памяти, а изменения подтягиваются в фоне по last_edited_time.
+        """
         try:
-            response = await self.notion_client.databases.query(
-                database_id=self.dbs["agent_prompts"]
+            prompts = await prompt_registry.get_role_prompts(
+                self.notion_client,
+                self.dbs["agent_prompts"],
+                force_refresh=force_refresh
             )
-            
-            prompts = {}
-            for page in response["results"]:
-                props = page["properties"]
-                role = props.get("Роль", {}).get("select", {}).get("name", "unknown")
-                name = props.get("Name", {}).get("title", [{}])[0].get("plain_text", "")
-                prompt_text = props.get("Промпт", {}).get("rich_text", [{}])[0].get("plain_text", "")
-                
-                if role and prompt_text:
-                    prompts[role] = prompt_text
-            
             self.prompts_cache = prompts
-            self.last_prompts_update = datetime.now()
-            
-            # Сохраняем в кэш
-            if cache_manager:
-                cache_manager.set(cache_key, prompts)
-            
-            print(f"Загружено {len(prompts)} промптов агентов")
+            if force_refresh or self.last_prompts_update is None:
+                self.last_prompts_update = datetime.now()
+                print(f"Загружено {len(prompts)} промптов агентов")
             return prompts
             
         except Exception as e:
             print(f"Ошибка загрузки промптов: {e}")
-            return {}
+            return self.prompts_cache
 
     async def get_agent_response(self, role: str, context: str, user_input: str, model_type: str = "default") -> str:
         """Получает ответ от агента с мониторингом и кэшированием"""
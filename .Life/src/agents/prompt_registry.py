@@ -0,0 +1,194 @@
+import asyncio
+import copy
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROMPTS_PATH = Path(__file__).parent / "prompts.json"
+
+
+class AgentPromptRegistry:
+    """
+    Единый реестр промптов агентов.
+
+    Промпты из prompts.json (по agent_id) и из Notion базы agent_prompts
+    (по роли) загружаются один раз и отдаются из памяти. Notion
+    перепроверяется в фоне по last_edited_time, а раз в
+    full_reload_seconds загружается целиком: инкрементальный запрос не
+    возвращает удаленные страницы. Файл пишется атомарно из in-memory копии.
+    """
+
+    def __init__(self, prompts_path: Path = PROMPTS_PATH, revalidate_seconds: float = 300,
+                 full_reload_seconds: float = 3600):
+        self.prompts_path = Path(prompts_path)
+        self.revalidate_seconds = revalidate_seconds
+        self.full_reload_seconds = full_reload_seconds
+
+        # Локальные промпты
+        self._local: Optional[List[Dict[str, Any]]] = None
+        self._by_agent_id: Dict[str, Dict[str, Any]] = {}
+
+        # Промпты из Notion: page_id -> (роль, текст)
+        self._notion_pages: Dict[str, tuple] = {}
+        self._by_role: Dict[str, str] = {}
+        self._notion_loaded = False
+        self._last_edited_time: Optional[str] = None
+        self._last_check = 0.0
+        self._last_full_load = 0.0
+        self._revalidate_task: Optional[asyncio.Task] = None
+
+    # ---- prompts.json ----
+
+    def _ensure_local(self) -> List[Dict[str, Any]]:
+        if self._local is None:
+            with open(self.prompts_path, "r", encoding="utf-8") as f:
+                self._local = json.load(f)
+            self._reindex_local()
+        return self._local
+
+    def _reindex_local(self):
+        self._by_agent_id = {}
+        for prompt in self._local:
+            # При дубликатах agent_id побеждает первая запись, как при линейном поиске
+            self._by_agent_id.setdefault(prompt["agent_id"], prompt)
+
+    def _write_local(self):
+        tmp_path = self.prompts_path.with_name(self.prompts_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._local, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.prompts_path)
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        return copy.deepcopy(self._ensure_local())
+
+    def get_by_id(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        self._ensure_local()
+        prompt = self._by_agent_id.get(agent_id)
+        return copy.deepcopy(prompt) if prompt is not None else None
+
+    def add(self, prompt: Dict[str, Any]):
+        self._ensure_local().append(copy.deepcopy(prompt))
+        self._reindex_local()
+        self._write_local()
+
+    def replace(self, agent_id: str, new_prompt: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Заменяет промпт, возвращает предыдущую версию или None"""
+        prompts = self._ensure_local()
+        old_prompt = self._by_agent_id.get(agent_id)
+        if old_prompt is None:
+            return None
+        prompts[prompts.index(old_prompt)] = copy.deepcopy(new_prompt)
+        self._reindex_local()
+        self._write_local()
+        return copy.deepcopy(old_prompt)
+
+    def remove(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Удаляет все промпты агента, возвращает удаленный или None"""
+        prompts = self._ensure_local()
+        old_prompt = self._by_agent_id.get(agent_id)
+        if old_prompt is None:
+            return None
+        self._local = [p for p in prompts if p["agent_id"] != agent_id]
+        self._reindex_local()
+        self._write_local()
+        return copy.deepcopy(old_prompt)
+
+    # ---- Notion ----
+
+    @staticmethod
+    def _plain_text(prop: Dict[str, Any], key: str) -> str:
+        # Длинные промпты Notion режет на несколько фрагментов rich_text
+        return "".join(part.get("plain_text", "") for part in prop.get(key) or [])
+
+    def _apply_page(self, page: Dict[str, Any]):
+        props = page["properties"]
+        role = (props.get("Роль", {}).get("select") or {}).get("name", "unknown")
+        prompt_text = self._plain_text(props.get("Промпт", {}), "rich_text")
+
+        if page.get("archived") or page.get("in_trash") or not (role and prompt_text):
+            self._notion_pages.pop(page["id"], None)
+        else:
+            self._notion_pages[page["id"]] = (role, prompt_text)
+
+        edited = page.get("last_edited_time")
+        if edited and (self._last_edited_time is None or edited > self._last_edited_time):
+            self._last_edited_time = edited
+
+    def _reindex_roles(self):
+        self._by_role = {role: text for role, text in self._notion_pages.values()}
+
+    async def _query_all(self, notion_client, database_id: str, **params) -> List[Dict[str, Any]]:
+        pages = []
+        cursor = None
+        while True:
+            if cursor:
+                params["start_cursor"] = cursor
+            response = await notion_client.databases.query(database_id=database_id, page_size=100, **params)
+            pages.extend(response["results"])
+            if not response.get("has_more"):
+                return pages
+            cursor = response.get("next_cursor")
+
+    async def load_from_notion(self, notion_client, database_id: str):
+        """Полная загрузка базы промптов с пагинацией"""
+        pages = await self._query_all(notion_client, database_id)
+        self._notion_pages = {}
+        self._last_edited_time = None
+        for page in pages:
+            self._apply_page(page)
+        self._reindex_roles()
+        self._notion_loaded = True
+        self._last_check = self._last_full_load = time.monotonic()
+
+    async def revalidate(self, notion_client, database_id: str):
+        """Догружает только страницы, измененные с последней проверки"""
+        self._last_check = time.monotonic()
+        if self._last_edited_time is None or self._last_check - self._last_full_load >= self.full_reload_seconds:
+            await self.load_from_notion(notion_client, database_id)
+            return
+        # last_edited_time в Notion округляется до минуты, поэтому on_or_after
+        pages = await self._query_all(
+            notion_client,
+            database_id,
+            filter={"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": self._last_edited_time}}
+        )
+        for page in pages:
+            self._apply_page(page)
+        self._reindex_roles()
+
+    def _schedule_revalidation(self, notion_client, database_id: str):
+        if time.monotonic() - self._last_check < self.revalidate_seconds:
+            return
+        if self._revalidate_task and not self._revalidate_task.done():
+            return
+
+        async def run():
+            try:
+                await self.revalidate(notion_client, database_id)
+            except Exception as e:
+                print(f"Ошибка обновления промптов: {e}")
+
+        self._last_check = time.monotonic()
+        self._revalidate_task = asyncio.create_task(run())
+
+    async def get_role_prompts(self, notion_client, database_id: str, force_refresh: bool = False) -> Dict[str, str]:
+        """
+        Возвращает промпты по ролям.
+
+        После первой загрузки ответ берется из памяти, а устаревшие данные
+        обновляются в фоне.
+        """
+        if force_refresh or not self._notion_loaded:
+            await self.load_from_notion(notion_client, database_id)
+        else:
+            self._schedule_revalidation(notion_client, database_id)
+        return self._by_role
+
+    def get_role_prompt(self, role: str) -> Optional[str]:
+        return self._by_role.get(role)
+
+
+# Глобальный реестр
+prompt_registry = AgentPromptRegistry()
@@ -1,33 +1,22 @@
-import json
 from typing import List, Optional, Dict, Any
-from pathlib import Path
 from datetime import datetime
 from .prompts_history_repository import AgentPromptHistoryRepository
-
-PROMPTS_PATH = Path(__file__).parent / "prompts.json"
+from .prompt_registry import prompt_registry
 
 class AgentPromptRepository:
     @staticmethod
     def get_all() -> List[Dict[str, Any]]:
-        with open(PROMPTS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return prompt_registry.get_all()
 
     @staticmethod
     def get_by_id(agent_id: str) -> Optional[Dict[str, Any]]:
-        prompts = AgentPromptRepository.get_all()
-        for prompt in prompts:
-            if prompt["agent_id"] == agent_id:
-                return prompt
-        return None
+        return prompt_registry.get_by_id(agent_id)
 
     @staticmethod
     def add(prompt: Dict[str, Any], author: str = "system") -> None:
-        prompts = AgentPromptRepository.get_all()
         prompt["meta"]["version"] = 1
         prompt["meta"]["updated"] = datetime.utcnow().isoformat() + "Z"
-        prompts.append(prompt)
-        with open(PROMPTS_PATH, "w", encoding="utf-8") as f:
-            json.dump(prompts, f, ensure_ascii=False, indent=2)
+        prompt_registry.add(prompt)
         AgentPromptHistoryRepository.add_history({
             "agent_id": prompt["agent_id"],
             "timestamp": prompt["meta"]["updated"],
@@ -39,40 +28,32 @@ class AgentPromptRepository:
 
     @staticmethod
     def update(agent_id: str, new_prompt: Dict[str, Any], author: str = "system") -> bool:
-        prompts = AgentPromptRepository.get_all()
-        for i, prompt in enumerate(prompts):
-            if prompt["agent_id"] == agent_id:
-                old_prompt = prompt["prompt"]
-                new_version = prompt["meta"].get("version", 1) + 1
-                new_prompt["meta"]["version"] = new_version
-                new_prompt["meta"]["updated"] = datetime.utcnow().isoformat() + "Z"
-                prompts[i] = new_prompt
-                with open(PROMPTS_PATH, "w", encoding="utf-8") as f:
-                    json.dump(prompts, f, ensure_ascii=False, indent=2)
-                AgentPromptHistoryRepository.add_history({
-                    "agent_id": agent_id,
-                    "timestamp": new_prompt["meta"]["updated"],
-                    "action": "update",
-                    "old_prompt": old_prompt,
-                    "new_prompt": new_prompt["prompt"],
-                    "meta": {"author": author}
-                })
-                return True
-        return False
+        prompt = prompt_registry.get_by_id(agent_id)
+        if prompt is None:
+            return False
+        new_prompt["meta"]["version"] = prompt["meta"].get("version", 1) + 1
+        new_prompt["meta"]["updated"] = datetime.utcnow().isoformat() + "Z"
+        prompt_registry.replace(agent_id, new_prompt)
+        AgentPromptHistoryRepository.add_history({
+            "agent_id": agent_id,
+            "timestamp": new_prompt["meta"]["updated"],
+            "action": "update",
+            "old_prompt": prompt["prompt"],
+            "new_prompt": new_prompt["prompt"],
+            "meta": {"author": author}
+        })
+        return True
 
     @staticmethod
     def delete(agent_id: str, author: str = "system") -> bool:
-        prompts = AgentPromptRepository.get_all()
-        new_prompts = [p for p in prompts if p["agent_id"] != agent_id]
-        if len(new_prompts) == len(prompts):
+        old_prompt = prompt_registry.remove(agent_id)
+        if old_prompt is None:
             return False
-        with open(PROMPTS_PATH, "w", encoding="utf-8") as f:
-            json.dump(new_prompts, f, ensure_ascii=False, indent=2)
         AgentPromptHistoryRepository.add_history({
             "agent_id": agent_id,
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "action": "delete",
-            "old_prompt": AgentPromptRepository.get_by_id(agent_id),
+            "old_prompt": old_prompt["prompt"],
             "new_prompt": None,
             "meta": {"author": author}
         })
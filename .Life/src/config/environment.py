@@ -45,6 +45,11 @@ class EnvironmentConfig:
         # Настройки системы
         self.DEBUG = os.getenv("DEBUG", "False").lower() == "true"
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+        # Каталог данных (хранилища на диске); по умолчанию .Life/data
+        self.DATA_DIR = os.getenv(
+            "LIFE_DATA_DIR",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+        )
         
     def validate(self) -> Dict[str, bool]:
         """Проверка конфигурации"""
@@ -7,7 +7,8 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Any, Optional, List
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, Optional, List
 from datetime import datetime, UTC
 from dataclasses import dataclass
 import httpx
@@ -24,9 +25,14 @@ except ImportError:
 from ..agents.agent_core import agent_core
 from ..notion.universal_repository import UniversalNotionRepository
 from ..core.config import Settings
+from ..llm.client import LocalLLMClient
+from ..llm.local_server import ContextType
 
 logger = logging.getLogger(__name__)
 
+# Локальный LLM сервер для чата с часов (пусто - ответ через agent_core)
+LLM_SERVER_URL = os.getenv("LIFE_LLM_URL")
+
 @dataclass
 class BiometricData:
     """Структура биометрических данных"""
@@ -253,9 +259,16 @@ class XiaomiWatchIntegration:
         
         # История команд для контекста
         self.command_history = []
+        self.llm_url = LLM_SERVER_URL
+        
+    async def handle_voice_command(self, audio_data: bytes,
+                                   on_token: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Обработка голосовой команды с часов.
         
-    async def handle_voice_command(self, audio_data: bytes) -> str:
-        """Обработка голосовой команды с часов"""
+        on_token получает части ответа ИИ по мере генерации, чтобы часы
+        показывали начало ответа, не дожидаясь его целиком.
+        """
         try:
             # 1. Преобразование речи в текст
             text = await self.voice_processor.speech_to_text(audio_data)
@@ -278,7 +291,7 @@ class XiaomiWatchIntegration:
             )
             
             # 5. Выполнение команды
-            response = await self._execute_command(command)
+            response = await self._execute_command(command, on_token)
             
             # 6. Сохранение в историю
             self.command_history.append(command)
@@ -289,7 +302,8 @@ class XiaomiWatchIntegration:
             logger.error(f"Error handling voice command: {e}")
             return f"Произошла ошибка: {str(e)}"
     
-    async def _execute_command(self, command: VoiceCommand) -> str:
+    async def _execute_command(self, command: VoiceCommand,
+                               on_token: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """Выполнение голосовой команды"""
         try:
             if command.intent == "add_task":
@@ -301,7 +315,7 @@ class XiaomiWatchIntegration:
             elif command.intent == "check_progress":
                 return await self._check_progress(command)
             elif command.intent == "chat":
-                return await self._chat_with_ai(command)
+                return await self._chat_with_ai(command, on_token)
             else:
                 return "Неизвестная команда"
                 
@@ -395,11 +409,9 @@ class XiaomiWatchIntegration:
             logger.error(f"Error checking progress: {e}")
             return "Не удалось получить данные о прогрессе"
     
-    async def _chat_with_ai(self, command: VoiceCommand) -> str:
-        """Чат с ИИ на основе контекста"""
-        try:
-            # Формируем контекст для ИИ
-            context = f"""
+    def _build_ai_context(self, command: VoiceCommand) -> str:
+        """Контекст для ИИ: команда, биометрия и история"""
+        return f"""
 Пользователь: {command.text}
 
 Биометрические данные:
@@ -409,17 +421,41 @@ class XiaomiWatchIntegration:
 - Активность: {command.biometrics.steps} шагов
 
 История команд: {[cmd.text for cmd in self.command_history[-3:]]}
-            """.strip()
-            
-            # Получаем ответ от ИИ
-            response = await agent_core.get_agent_response(
-                role="Personal Assistant",
-                context=context,
-                user_input=command.text,
-                model_type="default"
-            )
-            
-            return response
+        """.strip()
+    
+    async def stream_chat_with_ai(self, command: VoiceCommand) -> AsyncIterator[str]:
+        """Ответ ИИ по частям: токены локальной LLM или ответ agent_core целиком"""
+        context = self._build_ai_context(command)
+        if self.llm_url:
+            streamed = False
+            try:
+                async with LocalLLMClient(self.llm_url) as client:
+                    async for token in client.generate_stream(context, context=ContextType.HOME):
+                        streamed = True
+                        yield token
+                return
+            except Exception as e:
+                logger.error(f"Error streaming from local LLM: {e}")
+                if streamed:
+                    return
+        
+        yield await agent_core.get_agent_response(
+            role="Personal Assistant",
+            context=context,
+            user_input=command.text,
+            model_type="default"
+        )
+    
+    async def _chat_with_ai(self, command: VoiceCommand,
+                            on_token: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """Чат с ИИ на основе контекста"""
+        try:
+            tokens = []
+            async for token in self.stream_chat_with_ai(command):
+                tokens.append(token)
+                if on_token:
+                    await on_token(token)
+            return "".join(tokens).strip()
             
         except Exception as e:
             logger.error(f"Error chatting with AI: {e}")
@@ -2,7 +2,14 @@
 Модуль локальной LLM интеграции для персональной AI-экосистемы
 """
 
-from .local_server import LocalLLMServer, llm_server
+from .local_server import LocalLLMServer, get_llm_server
 from .client import LocalLLMClient
 
-__all__ = ["LocalLLMServer", "llm_server", "LocalLLMClient"] 
\ No newline at end of file
+__all__ = ["LocalLLMServer", "get_llm_server", "llm_server", "LocalLLMClient"]
+
+
+def __getattr__(name):
+    # llm_server создается при первом обращении, а не при импорте пакета
+    if name == "llm_server":
+        return get_llm_server()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
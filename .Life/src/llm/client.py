@@ -5,8 +5,9 @@
 
 import asyncio
 import aiohttp
+import json
 import logging
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime, UTC
 from dataclasses import dataclass
 
@@ -29,9 +30,12 @@ class LocalLLMClient:
     Клиент для взаимодействия с локальным LLM сервером
     """
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000",
+                 session: Optional[aiohttp.ClientSession] = None):
         self.base_url = base_url
-        self.session: Optional[aiohttp.ClientSession] = None
+        # Внешняя сессия (общая для долгоживущего сервиса) не закрывается клиентом
+        self.session: Optional[aiohttp.ClientSession] = session
+        self._owns_session = session is None
         self.default_context = ContextType.HOME
         self.default_model = ModelType.DEFAULT
         
@@ -39,13 +43,16 @@ class LocalLLMClient:
 
     async def __aenter__(self):
         """Асинхронный контекстный менеджер - вход"""
-        self.session = aiohttp.ClientSession()
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+            self._owns_session = True
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Асинхронный контекстный менеджер - выход"""
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
 
     async def generate(self, prompt: str, context: ContextType = None, 
                       model_type: ModelType = None, session_id: str = None,
@@ -71,7 +78,7 @@ class LocalLLMClient:
         try:
             async with self.session.post(
                 f"{self.base_url}/generate",
-                json=request_data.dict()
+                json=self._payload(request_data)
             ) as response:
                 if response.status != 200:
                     error_text = await response.text()
@@ -96,6 +103,56 @@ class LocalLLMClient:
             logger.error(f"Ошибка запроса к LLM серверу: {e}")
             raise
 
+    async def generate_stream(self, prompt: str, context: ContextType = None,
+                              model_type: ModelType = None, session_id: str = None,
+                              user_id: str = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Генерирует ответ потоком через /generate/stream и отдает токены по мере генерации.
+        
+        Если перестать итерировать (break или отмена задачи), соединение
+        закрывается и сервер прекращает генерацию.
+        """
+        if not self.session:
+            raise RuntimeError("Клиент не инициализирован. Используйте async with LocalLLMClient()")
+        
+        request_data = GenerateRequest(
+            prompt=prompt,
+            context=context or self.default_context,
+            model_type=model_type or self.default_model,
+            session_id=session_id,
+            user_id=user_id,
+            **kwargs
+        )
+        
+        async with self.session.post(
+            f"{self.base_url}/generate/stream",
+            json=self._payload(request_data),
+            headers={"Accept": "text/event-stream"}
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"LLM сервер вернул ошибку {response.status}: {error_text}")
+            
+            event = None
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):].strip())
+                    if event == "token":
+                        yield data["token"]
+                    elif event == "error":
+                        raise Exception(f"Ошибка потоковой генерации: {data.get('detail')}")
+                    elif event == "done":
+                        logger.debug(f"Потоковая генерация завершена: {data}")
+                        return
+
+    @staticmethod
+    def _payload(request_data: GenerateRequest) -> Dict[str, Any]:
+        """Тело запроса: .dict() оставляет Enum, которые aiohttp не сериализует в JSON"""
+        return json.loads(request_data.json())
+
     async def generate_work_context(self, prompt: str, **kwargs) -> LLMResponse:
         """Генерирует ответ в рабочем контексте"""
         return await self.generate(prompt, context=ContextType.WORK, **kwargs)
@@ -7,13 +7,16 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 from datetime import datetime, UTC
 from dataclasses import dataclass
 from enum import Enum
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
@@ -28,6 +31,16 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Маркер завершения потока токенов
+_STREAM_END = object()
+
+# История сессии в промпте только дописывается, поэтому промпт следующего
+# хода начинается с промпта и ответа предыдущего (сохраненного KV-кэша).
+# Когда ходов больше PROMPT_HISTORY_MAX_TURNS, окно обрезается одним блоком
+# до последних PROMPT_HISTORY_KEEP_TURNS и префикс прогревается заново.
+PROMPT_HISTORY_MAX_TURNS = 8
+PROMPT_HISTORY_KEEP_TURNS = 3
+
 class ContextType(Enum):
     WORK = "work"
     HOME = "home"
@@ -63,22 +76,91 @@ class GenerateResponse(BaseModel):
     processing_time: float
     confidence_score: float
 
+class PrefixStateCache:
+    """
+    LRU-кэш состояний модели (KV-кэша) для стабильных префиксов промптов.
+    
+    Ключ - (модель, сессия или контекст). Размер ограничен бюджетом памяти
+    в байтах, при превышении вытесняются давно неиспользуемые записи.
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[ModelType, str], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _state_size(state: Any) -> int:
+        return getattr(state, "llama_state_size", 0)
+
+    def get(self, key: Tuple[ModelType, str]) -> Optional[Any]:
+        with self._lock:
+            state = self._entries.get(key)
+            if state is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return state
+
+    def put(self, key: Tuple[ModelType, str], state: Any):
+        size = self._state_size(state)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old_state = self._entries.pop(key, None)
+            if old_state is not None:
+                self.current_bytes -= self._state_size(old_state)
+            self._entries[key] = state
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= self._state_size(evicted)
+                self.evictions += 1
+
+    def discard(self, key: Tuple[ModelType, str]):
+        with self._lock:
+            state = self._entries.pop(key, None)
+            if state is not None:
+                self.current_bytes -= self._state_size(state)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
 class LocalLLMServer:
     """
     Локальный LLM сервер с контекстным переключением
     """
     
-    def __init__(self):
+    def __init__(self, prefix_cache_bytes: int = 4 * 1024 ** 3):
         self.app = FastAPI(title="Personal AI Ecosystem LLM Server", version="1.0.0")
         self.models: Dict[ModelType, Any] = {}
         self.context_configs: Dict[ContextType, ContextConfig] = {}
+        self.system_prefixes: Dict[ContextType, str] = {}
         self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.prefix_cache = PrefixStateCache(prefix_cache_bytes)
+        # Модель хранит один KV-кэш, поэтому вызовы одной модели сериализуются
+        self._model_locks: Dict[ModelType, threading.Lock] = {model_type: threading.Lock() for model_type in ModelType}
+        # Ключ префикса, состояние которого сейчас загружено в модель
+        self._loaded_prefix: Dict[ModelType, Tuple[ModelType, str]] = {}
         
         # Инициализация
         self._setup_cors()
         self._setup_routes()
         self._init_context_configs()
         self._init_models()
+        self._warm_prefix_cache()
         
         logger.info("Локальный LLM сервер инициализирован")
 
@@ -99,9 +181,21 @@ class LocalLLMServer:
         async def generate_text(request: GenerateRequest):
             return await self.generate_response(request)
         
+        @self.app.post("/generate/stream")
+        async def generate_text_stream(request: GenerateRequest, http_request: Request):
+            return StreamingResponse(
+                self.stream_response(request, http_request),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
         @self.app.get("/health")
         async def health_check():
-            return {"status": "healthy", "models_loaded": len(self.models)}
+            return {
+                "status": "healthy",
+                "models_loaded": len(self.models),
+                "prefix_cache": self.prefix_cache.stats()
+            }
         
         @self.app.get("/contexts")
         async def get_contexts():
@@ -176,6 +270,12 @@ class LocalLLMServer:
                 specializations=["general_knowledge", "learning", "creative_writing", "analysis", "decision_making"]
             )
         }
+        
+        # Системные префиксы не меняются, собираем их один раз
+        self.system_prefixes = {
+            context: f"<s>[INST] {config.system_prompt} [/INST]"
+            for context, config in self.context_configs.items()
+        }
 
     def _init_models(self):
         """Инициализация моделей"""
@@ -221,7 +321,7 @@ class LocalLLMServer:
             def __init__(self, model_type):
                 self.model_type = model_type
             
-            def __call__(self, prompt, **kwargs):
+            def __call__(self, prompt, stream=False, **kwargs):
                 # Генерируем реалистичный ответ в зависимости от контекста
                 if "рабочий" in prompt.lower() or "проект" in prompt.lower():
                     response = f"[MOCK {self.model_type.value}] Рабочий ответ: {prompt[:100]}..."
@@ -230,10 +330,73 @@ class LocalLLMServer:
                 else:
                     response = f"[MOCK {self.model_type.value}] Общий ответ: {prompt[:100]}..."
                 
+                if stream:
+                    # Отдаем ответ по словам, как llama_cpp при stream=True
+                    return ({"choices": [{"text": f"{word} "}]} for word in response.split())
                 return {"choices": [{"text": response}]}
         
         return MockModel(model_type)
 
+    def _warm_prefix_cache(self):
+        """Предвычисляет состояния модели для системных промптов всех контекстов"""
+        for model_type, model in self.models.items():
+            if not hasattr(model, "save_state"):
+                continue
+            for context, prefix in self.system_prefixes.items():
+                try:
+                    with self._model_locks[model_type]:
+                        model.reset()
+                        model.eval(model.tokenize(prefix.encode("utf-8")))
+                        self.prefix_cache.put((model_type, context.value), model.save_state())
+                        self._loaded_prefix[model_type] = (model_type, context.value)
+                except Exception as e:
+                    logger.error(f"Ошибка прогрева префикса {model_type.value}/{context.value}: {e}")
+
+    @staticmethod
+    def _prefix_key(request: GenerateRequest) -> Tuple[ModelType, str]:
+        """Ключ кэша префикса: сессия, если есть, иначе контекст"""
+        if request.session_id:
+            return (request.model_type, f"session:{request.session_id}")
+        return (request.model_type, request.context.value)
+
+    def _restore_prefix_state(self, model: Any, request: GenerateRequest) -> Tuple[ModelType, str]:
+        """
+        Загружает в модель сохраненное состояние префикса.
+        
+        llama_cpp сравнивает новый промпт с токенами в KV-кэше и
+        вычисляет только несовпадающий хвост.
+        """
+        key = self._prefix_key(request)
+        if not hasattr(model, "load_state") or self._loaded_prefix.get(request.model_type) == key:
+            return key
+        
+        state = self.prefix_cache.get(key)
+        if state is None and request.session_id:
+            # Новая сессия начинается с системного промпта своего контекста
+            state = self.prefix_cache.get((request.model_type, request.context.value))
+        if state is not None:
+            model.load_state(state)
+            self._loaded_prefix[request.model_type] = key
+        return key
+
+    def _save_prefix_state(self, model: Any, request: GenerateRequest, key: Tuple[ModelType, str]):
+        """Сохраняет состояние модели после ответа для следующего хода сессии"""
+        if not request.session_id or not hasattr(model, "save_state"):
+            return
+        try:
+            self.prefix_cache.put(key, model.save_state())
+            self._loaded_prefix[request.model_type] = key
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния префикса: {e}")
+
+    def _run_model(self, model: Any, request: GenerateRequest, full_prompt: str, **params) -> Any:
+        """Вызывает модель с переиспользованием KV-кэша префикса"""
+        with self._model_locks[request.model_type]:
+            key = self._restore_prefix_state(model, request)
+            response_data = model(full_prompt, **params)
+            self._save_prefix_state(model, request, key)
+            return response_data
+
     async def generate_response(self, request: GenerateRequest) -> GenerateResponse:
         """Генерирует ответ с учетом контекста"""
         start_time = datetime.now(UTC)
@@ -250,20 +413,28 @@ class LocalLLMServer:
             # Формируем полный промпт
             full_prompt = self._build_prompt(request.prompt, context_config, request)
             
-            # Генерируем ответ
-            response_data = model(
-                full_prompt,
-                max_tokens=request.max_tokens or context_config.max_tokens,
-                temperature=request.temperature or context_config.temperature,
-                top_p=context_config.top_p,
-                stop=["</s>", "Human:", "Assistant:"]
+            # Генерируем ответ в отдельном потоке, чтобы не блокировать event loop
+            response_data = await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: self._run_model(
+                    model,
+                    request,
+                    full_prompt,
+                    max_tokens=request.max_tokens or context_config.max_tokens,
+                    temperature=request.temperature or context_config.temperature,
+                    top_p=context_config.top_p,
+                    stop=["</s>", "Human:", "Assistant:"]
+                )
             )
             
-            # Извлекаем ответ
-            if hasattr(response_data, 'choices') and response_data.choices:
-                response_text = response_data.choices[0].text.strip()
+            # Извлекаем ответ (llama_cpp возвращает dict)
+            if isinstance(response_data, dict) and response_data.get("choices"):
+                raw_response = response_data["choices"][0]["text"]
+            elif hasattr(response_data, 'choices') and response_data.choices:
+                raw_response = response_data.choices[0].text
             else:
-                response_text = str(response_data)
+                raw_response = str(response_data)
+            response_text = raw_response.strip()
             
             # Вычисляем время обработки
             processing_time = (datetime.now(UTC) - start_time).total_seconds()
@@ -273,7 +444,7 @@ class LocalLLMServer:
             
             # Обновляем сессию
             if request.session_id:
-                self._update_session(request.session_id, request.context, request.prompt, response_text)
+                self._update_session(request.session_id, request.context, request.prompt, response_text, raw_response)
             
             return GenerateResponse(
                 response=response_text,
@@ -288,21 +459,111 @@ class LocalLLMServer:
             logger.error(f"Ошибка генерации ответа: {e}")
             raise HTTPException(status_code=500, detail=f"Ошибка генерации: {str(e)}")
 
+    async def stream_response(self, request: GenerateRequest,
+                              http_request: Optional[Request] = None) -> AsyncIterator[str]:
+        """
+        Генерирует ответ потоком токенов в формате SSE.
+        
+        Модель работает в отдельном потоке и передает токены через очередь,
+        поэтому первый токен уходит клиенту сразу после его генерации.
+        При отключении клиента генерация останавливается.
+        """
+        start_time = datetime.now(UTC)
+        context_config = self.context_configs[request.context]
+        model = self.models.get(request.model_type)
+        if not model:
+            yield self._sse_event("error", {"detail": f"Модель {request.model_type.value} не найдена"})
+            return
+        
+        full_prompt = self._build_prompt(request.prompt, context_config, request)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancel_event = threading.Event()
+        
+        def produce_tokens():
+            try:
+                with self._model_locks[request.model_type]:
+                    key = self._restore_prefix_state(model, request)
+                    for chunk in model(
+                        full_prompt,
+                        max_tokens=request.max_tokens or context_config.max_tokens,
+                        temperature=request.temperature or context_config.temperature,
+                        top_p=context_config.top_p,
+                        stop=["</s>", "Human:", "Assistant:"],
+                        stream=True
+                    ):
+                        if cancel_event.is_set():
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk["choices"][0]["text"])
+                    if not cancel_event.is_set():
+                        self._save_prefix_state(model, request, key)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+        
+        producer = loop.run_in_executor(None, produce_tokens)
+        tokens: List[str] = []
+        first_token_time = None
+        completed = False
+        
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    completed = True
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Ошибка потоковой генерации: {item}")
+                    yield self._sse_event("error", {"detail": f"Ошибка генерации: {str(item)}"})
+                    return
+                if http_request is not None and await http_request.is_disconnected():
+                    logger.info("Клиент отключился, генерация остановлена")
+                    return
+                
+                if first_token_time is None:
+                    first_token_time = (datetime.now(UTC) - start_time).total_seconds()
+                tokens.append(item)
+                yield self._sse_event("token", {"token": item})
+            
+            raw_response = "".join(tokens)
+            response_text = raw_response.strip()
+            if request.session_id:
+                self._update_session(request.session_id, request.context, request.prompt, response_text, raw_response)
+            
+            yield self._sse_event("done", {
+                "context_used": request.context.value,
+                "model_used": request.model_type.value,
+                "tokens_used": len(tokens),
+                "time_to_first_token": first_token_time,
+                "processing_time": (datetime.now(UTC) - start_time).total_seconds(),
+                "confidence_score": self._calculate_confidence(response_text, request.context)
+            })
+        finally:
+            # Останавливаем модель, если поток прерван до завершения
+            if not completed:
+                cancel_event.set()
+            await asyncio.shield(producer)
+
+    @staticmethod
+    def _sse_event(event: str, data: Dict[str, Any]) -> str:
+        """Форматирует событие Server-Sent Events"""
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
     def _build_prompt(self, user_prompt: str, context_config: ContextConfig, request: GenerateRequest) -> str:
         """Строит полный промпт с учетом контекста и истории"""
         
-        # Базовый промпт
+        # Базовый промпт (предвычислен в _init_context_configs)
         prompt_parts = [
-            f"<s>[INST] {context_config.system_prompt} [/INST]",
+            self.system_prefixes.get(request.context) or f"<s>[INST] {context_config.system_prompt} [/INST]",
         ]
         
-        # Добавляем историю сессии
+        # Добавляем окно истории сессии: ответ модели дословно, без strip,
+        # чтобы промпт продолжал токены сохраненного состояния
         if request.session_id and request.session_id in self.sessions:
-            session = self.sessions[request.session_id]
-            if "history" in session:
-                for entry in session["history"][-3:]:  # Последние 3 сообщения
-                    prompt_parts.append(f"Human: {entry['user']}")
-                    prompt_parts.append(f"Assistant: {entry['assistant']}")
+            for turn in self.sessions[request.session_id].get("prompt_turns", []):
+                prompt_parts.append(f"Human: {turn['user']}")
+                prompt_parts.append(f"Assistant:{turn['assistant']}")
         
         # Добавляем текущий запрос
         prompt_parts.append(f"Human: {user_prompt}")
@@ -333,12 +594,25 @@ class LocalLLMServer:
         
         return min(confidence, 1.0)
 
-    def _update_session(self, session_id: str, context: ContextType, user_prompt: str, assistant_response: str):
-        """Обновляет историю сессии"""
+    def _update_session(self, session_id: str, context: ContextType, user_prompt: str, assistant_response: str,
+                        raw_response: Optional[str] = None):
+        """Обновляет историю сессии и окно истории в промпте"""
         if session_id not in self.sessions:
-            self.sessions[session_id] = {"history": [], "context": context}
+            self.sessions[session_id] = {"history": [], "prompt_turns": [], "context": context}
+        
+        prompt_turns = self.sessions[session_id].setdefault("prompt_turns", [])
+        prompt_turns.append({
+            "user": user_prompt,
+            "assistant": raw_response if raw_response is not None else f" {assistant_response}"
+        })
+        if len(prompt_turns) > PROMPT_HISTORY_MAX_TURNS:
+            # Префикс сменился: сохраненное состояние сессии больше не подойдет,
+            # следующий ход начнет с префикса контекста и сохранит новое
+            del prompt_turns[:-PROMPT_HISTORY_KEEP_TURNS]
+            for model_type in ModelType:
+                self.prefix_cache.discard((model_type, f"session:{session_id}"))
         
-        self.sessions[session_id]["history"].append({
+        self.sessions[session_id].setdefault("history", []).append({
             "user": user_prompt,
             "assistant": assistant_response,
             "timestamp": datetime.now(UTC).isoformat(),
@@ -354,8 +628,16 @@ class LocalLLMServer:
         logger.info(f"Запуск локального LLM сервера на {host}:{port}")
         uvicorn.run(self.app, host=host, port=port)
 
-# Глобальный экземпляр сервера
-llm_server = LocalLLMServer()
+# Глобальный экземпляр сервера создается при первом обращении:
+# импорт пакета llm (например, ради LocalLLMClient) не загружает модели
+_llm_server: Optional[LocalLLMServer] = None
+
+def get_llm_server() -> LocalLLMServer:
+    """Возвращает глобальный экземпляр сервера, создавая его при первом вызове"""
+    global _llm_server
+    if _llm_server is None:
+        _llm_server = LocalLLMServer()
+    return _llm_server
 
 if __name__ == "__main__":
-    llm_server.run() 
\ No newline at end of file
+    get_llm_server().run()
@@ -8,10 +8,13 @@ from .core import TelegramAnalytics
 from .scraper import TelegramWorkingScraper
 from .enhanced_scraper import TelegramEnhancedScraper
 from .analytics import TelegramAnalyticsFramework
+from .channel_crawler import TelegramChannelCrawler, TelegramPostStore
 
 __all__ = [
     'TelegramAnalytics',
     'TelegramWorkingScraper', 
     'TelegramEnhancedScraper',
-    'TelegramAnalyticsFramework'
+    'TelegramAnalyticsFramework',
+    'TelegramChannelCrawler',
+    'TelegramPostStore'
 ] 
\ No newline at end of file
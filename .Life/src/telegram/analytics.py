@@ -11,14 +11,21 @@
 ✅ Конкурентный анализ
 """
 
+import asyncio
 import requests
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
 from typing import Dict, List, Optional
 import statistics
 
+try:
+    from .channel_crawler import BS4_PARSER, TelegramChannelCrawler, TelegramPostStore
+except ImportError:
+    # Запуск файла напрямую (python analytics.py)
+    from channel_crawler import BS4_PARSER, TelegramChannelCrawler, TelegramPostStore
+
 @dataclass
 class TelegramMetrics:
     """Структура метрик Telegram канала"""
@@ -39,6 +46,11 @@ class TelegramMetrics:
     subscriber_growth: int = 0
     subscriber_growth_rate: float = 0  # % рост за период
     posts_frequency: float = 0  # постов в день
+    daily_views_gained: float = 0  # новых просмотров в день по снимкам
+    daily_view_rate: float = 0  # новые просмотры в день / подписчики * 100
+    views_velocity: float = 0  # просмотров в час за последний интервал снимков
+    history_posts: int = 0  # постов во всей локальной истории
+    history_avg_views: float = 0  # средние просмотры по всей истории
     
     # Качество контента
     top_post_views: int = 0
@@ -53,10 +65,15 @@ class TelegramMetrics:
     peak_activity_hour: str = ""
     best_posting_day: str = ""
 
+# Посты для avg_views/view_rate: последние, как на одной странице t.me/s
+RECENT_POSTS_WINDOW = 20
+
 class TelegramAnalyticsFramework:
     """Фреймворк аналитики на основе лучших практик"""
     
-    def __init__(self):
+    def __init__(self, post_store=None):
+        # Локальная история постов (TelegramPostStore), заполняется TelegramChannelCrawler
+        self.post_store = post_store
         self.notion_token = os.getenv('NOTION_TOKEN')
         self.platforms_db_id = os.getenv('NOTION_PLATFORMS_DB_ID')
         self.content_db_id = os.getenv('NOTION_CONTENT_PLAN_DB_ID')
@@ -108,7 +125,7 @@ class TelegramAnalyticsFramework:
             print(f"   📊 Средние просмотры: {metrics.avg_views:,.0f}")
         
         # 3. Расчет ключевых KPI
-        metrics = self.calculate_key_kpis(metrics)
+        metrics = self.calculate_key_kpis(metrics, channel)
         
         # 4. Анализ роста
         metrics = self.analyze_growth_metrics(metrics, channel)
@@ -118,7 +135,7 @@ class TelegramAnalyticsFramework:
         
         return metrics
     
-    def calculate_key_kpis(self, metrics: TelegramMetrics) -> TelegramMetrics:
+    def calculate_key_kpis(self, metrics: TelegramMetrics, channel: Optional[str] = None) -> TelegramMetrics:
         """Рассчитывает ключевые KPI"""
         
         print(f"\n🎯 РАСЧЕТ КЛЮЧЕВЫХ KPI")
@@ -139,6 +156,19 @@ class TelegramAnalyticsFramework:
             consistency_score = 100 - (metrics.content_consistency / metrics.avg_views * 100)
             print(f"   🎯 Консистентность: {consistency_score:.1f}%")
         
+        # Дневные KPI по накопленным снимкам просмотров
+        history = self.get_stored_history(channel) if channel else None
+        if history and history['daily_views']:
+            gained = [day['views_gained'] for day in history['daily_views']]
+            metrics.daily_views_gained = sum(gained) / len(gained)
+            metrics.views_velocity = history['views_velocity']
+            print(f"   📅 Новых просмотров в день: {metrics.daily_views_gained:,.0f} (дней: {len(gained)})")
+            print(f"   ⚡ Скорость: {metrics.views_velocity:,.1f} просмотров/час")
+            
+            if metrics.subscribers > 0:
+                metrics.daily_view_rate = metrics.daily_views_gained / metrics.subscribers * 100
+                print(f"   📈 Дневной View Rate: {metrics.daily_view_rate:.1f}%")
+        
         return metrics
     
     def analyze_growth_metrics(self, metrics: TelegramMetrics, channel: str) -> TelegramMetrics:
@@ -147,13 +177,25 @@ class TelegramAnalyticsFramework:
         print(f"\n📈 АНАЛИЗ РОСТА")
         print("=" * 40)
         
-        # Здесь можно добавить логику сравнения с историческими данными
-        # Пока используем примерные расчеты
-        
-        # Частота постинга (за последние 30 дней)
-        # Предполагаем, что имеем 15 постов за ~10 дней
-        estimated_days = 10  # Примерная оценка
-        metrics.posts_frequency = metrics.posts_count / estimated_days if estimated_days > 0 else 0
+        history = self.get_stored_history(channel)
+        if history:
+            # Частота постинга по реальным датам постов за последние 30 дней
+            cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+            recent_dates = [d for d in history['dates'] if d >= cutoff]
+            if recent_dates:
+                days = max((datetime.now(timezone.utc) - min(recent_dates)).total_seconds() / 86400, 1)
+                metrics.posts_frequency = len(recent_dates) / days
+            
+            metrics.history_posts = history['posts_count']
+            metrics.history_avg_views = history['avg_views']
+            print(f"   🗂 В истории: {metrics.history_posts} постов, в среднем {metrics.history_avg_views:,.0f} просмотров")
+            
+            if history['views_growth'] is not None:
+                print(f"   👀 Прирост просмотров с {history['previous_snapshot'][:10]}: {history['views_growth']:+,}")
+        else:
+            # Истории нет - грубая оценка по одной странице
+            estimated_days = 10
+            metrics.posts_frequency = metrics.posts_count / estimated_days if estimated_days > 0 else 0
         
         print(f"   📝 Частота: {metrics.posts_frequency:.1f} постов/день")
         
@@ -219,8 +261,56 @@ class TelegramAnalyticsFramework:
             print(f"   ❌ Ошибка получения базовых данных: {e}")
             return {}
     
+    def get_stored_history(self, channel: str) -> Optional[Dict]:
+        """Даты постов и прирост просмотров из локального хранилища"""
+        
+        if not self.post_store:
+            return None
+        
+        posts = self.post_store.get_posts(channel)
+        if not posts:
+            return None
+        
+        dates = []
+        for post in posts:
+            try:
+                dates.append(datetime.fromisoformat(post['date']))
+            except (TypeError, ValueError):
+                pass
+        
+        # Прирост за последний интервал между снимками по всем постам
+        deltas = self.post_store.view_deltas(channel)
+        views_growth = None
+        views_velocity = 0.0
+        previous_snapshot = None
+        if deltas:
+            latest_snapshot = max(d['captured_at'] for d in deltas)
+            latest = [d for d in deltas if d['captured_at'] == latest_snapshot]
+            views_growth = sum(d['delta'] for d in latest)
+            views_velocity = sum(d['velocity'] for d in latest)
+            previous_snapshot = (datetime.fromisoformat(latest_snapshot) - timedelta(hours=latest[0]['hours'])).isoformat()
+        
+        return {
+            'dates': dates,
+            'posts_count': len(posts),
+            'avg_views': sum(post['views'] or 0 for post in posts) / len(posts),
+            'views_growth': views_growth,
+            'views_velocity': views_velocity,
+            'previous_snapshot': previous_snapshot,
+            'daily_views': self.post_store.daily_views(channel)
+        }
+    
     def get_posts_analytics(self, channel: str) -> List[Dict]:
-        """Получает аналитику постов"""
+        """Получает аналитику последних постов (вся история - в get_stored_history)"""
+        
+        if self.post_store:
+            stored_posts = self.post_store.get_posts(channel, limit=RECENT_POSTS_WINDOW)
+            if stored_posts:
+                return [{
+                    'views': post['views'] or 0,
+                    'date': datetime.fromisoformat(post['date']) if post['date'] else None,
+                    'url': post['url']
+                } for post in stored_posts]
         
         try:
             url = f"https://t.me/s/{channel}"
@@ -232,7 +322,7 @@ class TelegramAnalyticsFramework:
             
             if response.status_code == 200:
                 from bs4 import BeautifulSoup
-                soup = BeautifulSoup(response.content, 'html.parser')
+                soup = BeautifulSoup(response.content, BS4_PARSER)
                 posts_elements = soup.find_all('div', class_='tgme_widget_message')
                 
                 posts_data = []
@@ -347,6 +437,8 @@ class TelegramAnalyticsFramework:
 📈 PERFORMANCE МЕТРИКИ:
    🎯 View Rate: {metrics.view_rate:.1f}% (охват подписчиков)
    📝 Частота постинга: {metrics.posts_frequency:.1f} постов/день
+   📅 Новых просмотров в день: {metrics.daily_views_gained:,.0f}
+   ⚡ Скорость просмотров: {metrics.views_velocity:,.1f}/час
    🏆 Лучший пост: {metrics.top_post_views:,} просмотров
    📉 Худший пост: {metrics.worst_post_views:,} просмотров
 
@@ -369,7 +461,11 @@ def main():
     print("🚀 ЗАПУСК КОМПЛЕКСНОЙ АНАЛИТИКИ TELEGRAM")
     print("=" * 80)
     
-    analyzer = TelegramAnalyticsFramework()
+    # Догружаем новые посты и снимок просмотров в локальную историю
+    store = TelegramPostStore()
+    asyncio.run(TelegramChannelCrawler("rawmid", store).crawl())
+    
+    analyzer = TelegramAnalyticsFramework(post_store=store)
     
     # Получаем метрики
     metrics = analyzer.get_comprehensive_metrics("rawmid")
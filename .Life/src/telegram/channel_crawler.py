@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📚 ИНКРЕМЕНТАЛЬНЫЙ КРАУЛЕР ПУБЛИЧНОГО TELEGRAM КАНАЛА
+
+Проходит всю историю t.me/s/<channel> по курсору ?before=,
+останавливается на последнем уже сохраненном посте и пишет
+посты и снимки просмотров в локальную SQLite базу.
+"""
+
+import asyncio
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Парсер для BeautifulSoup в скраперах: lxml заметно быстрее html.parser
+BS4_PARSER = "lxml" if LXML_AVAILABLE else "html.parser"
+
+# Каталог данных .Life (как Config.DATA_DIR), не зависит от текущего каталога
+DATA_DIR = Path(os.getenv("LIFE_DATA_DIR", Path(__file__).resolve().parents[2] / "data"))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+}
+
+
+def convert_count_to_number(count_str: str) -> int:
+    """Конвертирует строку счетчика (1.2K, 3M) в число"""
+    if not count_str:
+        return 0
+    count_str = str(count_str).replace(' ', '').replace(',', '').lower()
+    try:
+        if count_str.endswith('k'):
+            return int(float(count_str[:-1]) * 1000)
+        if count_str.endswith('m'):
+            return int(float(count_str[:-1]) * 1000000)
+        return int(float(count_str))
+    except ValueError:
+        return 0
+
+
+def _media_type(has_photo: bool, has_video: bool) -> str:
+    if has_photo and has_video:
+        return "photo_video"
+    if has_photo:
+        return "photo"
+    if has_video:
+        return "video"
+    return "text"
+
+
+def _parse_with_lxml(html: str) -> List[Dict]:
+    tree = lxml.html.fromstring(html)
+    posts = []
+    for elem in tree.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " tgme_widget_message ")][@data-post]'):
+        date = elem.xpath('.//time[contains(@class, "datetime")]/@datetime')
+        text = elem.xpath('.//div[contains(@class, "tgme_widget_message_text")]')
+        views = elem.xpath('.//span[contains(@class, "tgme_widget_message_views")]/text()')
+        posts.append({
+            'data_post': elem.get('data-post'),
+            'date': date[0] if date else '',
+            'text': text[0].text_content().strip() if text else '',
+            'views': views[0].strip() if views else '',
+            'has_photo': bool(elem.xpath('.//a[contains(@class, "tgme_widget_message_photo_wrap")]')),
+            'has_video': bool(elem.xpath('.//a[contains(@class, "tgme_widget_message_video_wrap")]')),
+        })
+    return posts
+
+
+def _parse_with_bs4(html: str) -> List[Dict]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, BS4_PARSER)
+    posts = []
+    for elem in soup.find_all('div', class_='tgme_widget_message'):
+        if not elem.get('data-post'):
+            continue
+        date_elem = elem.find('time', class_='datetime')
+        text_elem = elem.find('div', class_='tgme_widget_message_text')
+        views_elem = elem.find('span', class_='tgme_widget_message_views')
+        posts.append({
+            'data_post': elem.get('data-post'),
+            'date': date_elem.get('datetime', '') if date_elem else '',
+            'text': text_elem.get_text(strip=True) if text_elem else '',
+            'views': views_elem.text.strip() if views_elem else '',
+            'has_photo': bool(elem.find('a', class_='tgme_widget_message_photo_wrap')),
+            'has_video': bool(elem.find('a', class_='tgme_widget_message_video_wrap')),
+        })
+    return posts
+
+
+def parse_channel_page(html: str, channel: str) -> List[Dict]:
+    """Извлекает посты со страницы t.me/s/<channel>, по возрастанию id"""
+    raw_posts = _parse_with_lxml(html) if LXML_AVAILABLE else _parse_with_bs4(html)
+    posts = []
+    for raw in raw_posts:
+        post_id = raw['data_post'].split('/')[-1]
+        if not post_id.isdigit():
+            continue
+        date = ''
+        if raw['date']:
+            try:
+                date = datetime.fromisoformat(raw['date'].replace('Z', '+00:00')).astimezone(timezone.utc).isoformat()
+            except ValueError:
+                date = raw['date']
+        posts.append({
+            'id': int(post_id),
+            'date': date,
+            'text': raw['text'],
+            'views': convert_count_to_number(raw['views']),
+            'media_type': _media_type(raw['has_photo'], raw['has_video']),
+            'url': f"https://t.me/{channel}/{post_id}",
+        })
+    posts.sort(key=lambda p: p['id'])
+    return posts
+
+
+class TelegramPostStore:
+    """Локальное хранилище постов канала и снимков их просмотров (SQLite)"""
+
+    def __init__(self, db_path: str = str(DATA_DIR / "telegram_posts.db")):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS posts (
+                channel TEXT NOT NULL,
+                post_id INTEGER NOT NULL,
+                date TEXT,
+                text TEXT,
+                media_type TEXT,
+                url TEXT,
+                PRIMARY KEY (channel, post_id)
+            );
+            CREATE TABLE IF NOT EXISTS view_snapshots (
+                channel TEXT NOT NULL,
+                post_id INTEGER NOT NULL,
+                captured_at TEXT NOT NULL,
+                views INTEGER NOT NULL,
+                PRIMARY KEY (channel, post_id, captured_at)
+            );
+            CREATE TABLE IF NOT EXISTS crawl_state (
+                channel TEXT PRIMARY KEY,
+                backfill_done INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_posts_date ON posts (channel, date);
+            CREATE INDEX IF NOT EXISTS idx_snapshots_time ON view_snapshots (channel, captured_at);
+        """)
+
+    def last_post_id(self, channel: str) -> Optional[int]:
+        row = self.conn.execute("SELECT MAX(post_id) FROM posts WHERE channel = ?", (channel,)).fetchone()
+        return row[0]
+
+    def first_post_id(self, channel: str) -> Optional[int]:
+        row = self.conn.execute("SELECT MIN(post_id) FROM posts WHERE channel = ?", (channel,)).fetchone()
+        return row[0]
+
+    def backfill_done(self, channel: str) -> bool:
+        """История канала уже пройдена до самого старого поста"""
+        row = self.conn.execute("SELECT backfill_done FROM crawl_state WHERE channel = ?", (channel,)).fetchone()
+        return bool(row and row[0])
+
+    def mark_backfill_done(self, channel: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO crawl_state (channel, backfill_done) VALUES (?, 1) "
+                "ON CONFLICT(channel) DO UPDATE SET backfill_done = 1",
+                (channel,)
+            )
+
+    def save_posts(self, channel: str, posts: List[Dict], captured_at: str) -> int:
+        """Сохраняет посты и снимок просмотров, возвращает число новых постов"""
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO posts (channel, post_id, date, text, media_type, url) VALUES (?, ?, ?, ?, ?, ?)",
+                [(channel, p['id'], p['date'], p['text'], p['media_type'], p['url']) for p in posts]
+            )
+            new_posts = self.conn.total_changes - before
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO view_snapshots (channel, post_id, captured_at, views) VALUES (?, ?, ?, ?)",
+                [(channel, p['id'], captured_at, p['views']) for p in posts]
+            )
+        return new_posts
+
+    def get_posts(self, channel: str, since: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Посты канала с последним известным количеством просмотров (limit - только самые новые)"""
+        query = """
+            SELECT p.post_id AS id, p.date, p.text, p.media_type, p.url,
+                   (SELECT s.views FROM view_snapshots s
+                    WHERE s.channel = p.channel AND s.post_id = p.post_id
+                    ORDER BY s.captured_at DESC LIMIT 1) AS views
+            FROM posts p WHERE p.channel = ?
+        """
+        params: Tuple = (channel,)
+        if since:
+            query += " AND p.date >= ?"
+            params += (since,)
+        if limit:
+            query = f"SELECT * FROM ({query} ORDER BY p.post_id DESC LIMIT ?)"
+            params += (limit,)
+        query += " ORDER BY id"
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def get_snapshots(self, channel: str, since: Optional[str] = None) -> List[Dict]:
+        query = "SELECT post_id, captured_at, views FROM view_snapshots WHERE channel = ?"
+        params: Tuple = (channel,)
+        if since:
+            query += " AND captured_at >= ?"
+            params += (since,)
+        query += " ORDER BY post_id, captured_at"
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def view_deltas(self, channel: str, since: Optional[str] = None) -> List[Dict]:
+        """
+        Прирост просмотров между соседними снимками каждого поста.
+
+        delta - новые просмотры с предыдущего снимка, velocity - просмотров
+        в час. Считается оконной функцией SQLite за один проход.
+        """
+        query = """
+            SELECT post_id, captured_at, views, delta,
+                   (julianday(captured_at) - julianday(prev_at)) * 24 AS hours
+            FROM (
+                SELECT post_id, captured_at, views,
+                       views - LAG(views) OVER w AS delta,
+                       LAG(captured_at) OVER w AS prev_at
+                FROM view_snapshots WHERE channel = ?
+                WINDOW w AS (PARTITION BY post_id ORDER BY captured_at)
+            )
+            WHERE delta IS NOT NULL
+        """
+        params: Tuple = (channel,)
+        if since:
+            query += " AND captured_at >= ?"
+            params += (since,)
+        query += " ORDER BY post_id, captured_at"
+        rows = []
+        for row in self.conn.execute(query, params):
+            row = dict(row)
+            row['velocity'] = row['delta'] / row['hours'] if row['hours'] else 0.0
+            rows.append(row)
+        return rows
+
+    def daily_views(self, channel: str, days: int = 30) -> List[Dict]:
+        """Прирост просмотров по дням (UTC) из снимков, без повторного скрапинга"""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        query = """
+            SELECT substr(captured_at, 1, 10) AS day,
+                   SUM(delta) AS views_gained,
+                   COUNT(DISTINCT post_id) AS posts_growing
+            FROM (
+                SELECT post_id, captured_at,
+                       views - LAG(views) OVER (PARTITION BY post_id ORDER BY captured_at) AS delta
+                FROM view_snapshots WHERE channel = ?
+            )
+            WHERE delta IS NOT NULL AND captured_at >= ?
+            GROUP BY day ORDER BY day
+        """
+        return [dict(row) for row in self.conn.execute(query, (channel, since))]
+
+    def close(self):
+        self.conn.close()
+
+
+@dataclass
+class CrawlResult:
+    pages: int = 0
+    posts_seen: int = 0
+    new_posts: int = 0
+    oldest_post_id: Optional[int] = None
+    backfill_done: bool = False
+    errors: List[str] = field(default_factory=list)
+
+
+class TelegramChannelCrawler:
+    """Асинхронный постраничный краулер t.me/s/<channel>"""
+
+    def __init__(self, channel: str = "rawmid", store: Optional[TelegramPostStore] = None,
+                 page_delay: float = 1.0, timeout: float = 15):
+        self.channel = channel.replace("@", "")
+        self.store = store or TelegramPostStore()
+        self.page_delay = page_delay
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def fetch_page(self, session: aiohttp.ClientSession, before: Optional[int] = None) -> List[Dict]:
+        params = {'before': str(before)} if before else None
+        async with session.get(f"https://t.me/s/{self.channel}", params=params) as response:
+            response.raise_for_status()
+            return parse_channel_page(await response.text(), self.channel)
+
+    async def crawl(self, full_history: bool = False, max_pages: Optional[int] = None) -> CrawlResult:
+        """
+        Проходит страницы от новых постов к старым.
+
+        По умолчанию останавливается, когда дошел до последнего сохраненного
+        поста; с full_history=True проходит всю историю канала. Если первый
+        обход истории прервался (ошибка, max_pages), следующие запуски
+        догружают ее от самого старого сохраненного поста, пока не дойдут
+        до начала канала. Для всех встреченных постов записывается снимок
+        просмотров.
+        """
+        result = CrawlResult()
+        known_last_id = None if full_history else self.store.last_post_id(self.channel)
+        captured_at = datetime.now(timezone.utc).isoformat()
+
+        async with aiohttp.ClientSession(headers=HEADERS, timeout=self.timeout) as session:
+            # Новые посты: от свежих до последнего сохраненного
+            reached_start = await self._walk(session, result, None, known_last_id, captured_at, max_pages)
+
+            # Догрузка истории после прерванного первого обхода
+            if not reached_start and not result.errors and not self.store.backfill_done(self.channel):
+                oldest_id = self.store.first_post_id(self.channel)
+                if oldest_id is not None and oldest_id <= 1:
+                    reached_start = True
+                elif oldest_id is not None and (max_pages is None or result.pages < max_pages):
+                    await asyncio.sleep(self.page_delay)
+                    reached_start = await self._walk(session, result, oldest_id, None, captured_at, max_pages)
+
+        if reached_start:
+            self.store.mark_backfill_done(self.channel)
+        result.backfill_done = self.store.backfill_done(self.channel)
+
+        print(f"📚 @{self.channel}: страниц {result.pages}, постов {result.posts_seen}, новых {result.new_posts}"
+              f"{'' if result.backfill_done else ', история догружается'}")
+        return result
+
+    async def _walk(self, session: aiohttp.ClientSession, result: CrawlResult, before: Optional[int],
+                    stop_at: Optional[int], captured_at: str, max_pages: Optional[int]) -> bool:
+        """Страницы от before к старым постам до stop_at; True - дошли до начала канала"""
+        while max_pages is None or result.pages < max_pages:
+            try:
+                posts = await self.fetch_page(session, before)
+            except Exception as e:
+                result.errors.append(f"before={before}: {e}")
+                return False
+
+            result.pages += 1
+            if not posts:
+                # Пустая страница перед известным постом - старше постов нет
+                return before is not None
+
+            result.posts_seen += len(posts)
+            result.new_posts += self.store.save_posts(self.channel, posts, captured_at)
+            oldest_id = posts[0]['id']
+            result.oldest_post_id = oldest_id
+
+            if oldest_id <= 1:
+                return True
+            if stop_at is not None and oldest_id <= stop_at:
+                return False
+            before = oldest_id
+            await asyncio.sleep(self.page_delay)
+        return False
+
+async def main():
+    crawler = TelegramChannelCrawler("rawmid")
+    await crawler.crawl()
+    crawler.store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -18,6 +18,12 @@ import json
 from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    from .channel_crawler import BS4_PARSER
+except ImportError:
+    # Запуск файла напрямую (python enhanced_scraper.py)
+    from channel_crawler import BS4_PARSER
+
 load_dotenv()
 
 class TelegramEnhancedScraper:
@@ -85,7 +91,7 @@ class TelegramEnhancedScraper:
             response = requests.get(url, headers=self.headers, timeout=15)
             
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                soup = BeautifulSoup(response.content, BS4_PARSER)
                 posts_elements = soup.find_all('div', class_='tgme_widget_message')
                 
                 print(f"📝 Найдено постов: {len(posts_elements)}")
@@ -18,6 +18,12 @@ from datetime import datetime
 import re
 from dotenv import load_dotenv
 
+try:
+    from .channel_crawler import BS4_PARSER
+except ImportError:
+    # Запуск файла напрямую (python scraper.py)
+    from channel_crawler import BS4_PARSER
+
 load_dotenv()
 
 class TelegramWorkingScraper:
@@ -172,7 +178,7 @@ class TelegramWorkingScraper:
             if response.status_code == 200:
                 print(f"✅ HTML загружен: {len(response.content)} байт")
                 
-                soup = BeautifulSoup(response.content, 'html.parser')
+                soup = BeautifulSoup(response.content, BS4_PARSER)
                 posts_elements = soup.find_all('div', class_='tgme_widget_message')
                 
                 print(f"📝 Найдено постов в HTML: {len(posts_elements)}")
@@ -0,0 +1,193 @@
+"""
+Хранилище метрик производительности в виде дневных JSONL-сегментов.
+
+Каждая метрика дописывается одной строкой в файл своего дня, агрегаты
+(количество, суммы, гистограмма длительностей) обновляются потоково и
+не требуют хранения самих метрик в памяти.
+"""
+
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+SEGMENT_PREFIX = "metrics-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class LatencyHistogram:
+    """
+    Гистограмма с логарифмическими корзинами (в духе HDR Histogram).
+
+    Относительная ошибка квантилей не превышает `precision`, память
+    зависит только от диапазона значений, а не от их количества.
+    """
+
+    def __init__(self, precision: float = 0.01, min_value: float = 1e-4):
+        self.precision = precision
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_base) + 1
+
+    def _bucket_value(self, index: int) -> float:
+        if index == 0:
+            return self.min_value
+        return self.min_value * math.exp((index - 0.5) * self._log_base)
+
+    def add(self, value: float):
+        index = self._bucket(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return self._bucket_value(index)
+        return self._bucket_value(max(self.buckets))
+
+
+@dataclass
+class MetricAggregate:
+    """Потоковый агрегат метрик (за день, по модели и т.п.)"""
+    operations: int = 0
+    successful: int = 0
+    total_duration: float = 0.0
+    total_tokens: int = 0
+    total_cost: float = 0.0
+    durations: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def add(self, record: Dict[str, Any]):
+        self.operations += 1
+        self.successful += 1 if record.get("success") else 0
+        self.total_duration += record.get("duration", 0.0)
+        self.total_tokens += record.get("tokens_used", 0)
+        self.total_cost += record.get("cost", 0.0)
+        self.durations.add(record.get("duration", 0.0))
+
+    def merge(self, other: "MetricAggregate"):
+        self.operations += other.operations
+        self.successful += other.successful
+        self.total_duration += other.total_duration
+        self.total_tokens += other.total_tokens
+        self.total_cost += other.total_cost
+        self.durations.merge(other.durations)
+
+
+class MetricsSegmentStore:
+    """
+    Append-only хранилище метрик с разбиением по дням.
+
+    Сегменты старше `retention_days` удаляются целиком при открытии
+    хранилища и при переходе на новый день.
+    """
+
+    def __init__(self, directory: Path, retention_days: int = 30):
+        self.directory = Path(directory)
+        self.retention_days = retention_days
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.daily: Dict[date, MetricAggregate] = {}
+        self.daily_by_model: Dict[date, Dict[str, MetricAggregate]] = {}
+        self._current_day: Optional[date] = None
+        self._handle = None
+
+    def _segment_path(self, day: date) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{day.isoformat()}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> Iterator[tuple]:
+        for path in sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")):
+            try:
+                day = date.fromisoformat(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue
+            yield day, path
+
+    def _aggregate(self, day: date, record: Dict[str, Any]):
+        self.daily.setdefault(day, MetricAggregate()).add(record)
+        model = record.get("model_used", "unknown")
+        self.daily_by_model.setdefault(day, {}).setdefault(model, MetricAggregate()).add(record)
+
+    def load(self):
+        """Восстанавливает агрегаты, потоково читая сегменты в пределах хранения"""
+        self.apply_retention()
+        self.daily.clear()
+        self.daily_by_model.clear()
+        for day, path in self._segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._aggregate(day, json.loads(line))
+                    except json.JSONDecodeError:
+                        # Оборванная последняя строка после сбоя
+                        continue
+
+    def apply_retention(self, today: Optional[date] = None):
+        """Удаляет сегменты и агрегаты старше срока хранения"""
+        cutoff = (today or date.today()) - timedelta(days=self.retention_days)
+        for day, path in self._segments():
+            if day < cutoff:
+                path.unlink(missing_ok=True)
+        for day in [d for d in self.daily if d < cutoff]:
+            del self.daily[day]
+            self.daily_by_model.pop(day, None)
+
+    def append(self, record: Dict[str, Any], day: Optional[date] = None):
+        """Дописывает метрику в сегмент дня и обновляет агрегаты"""
+        day = day or datetime.fromisoformat(record["timestamp"]).date()
+        if day != self._current_day:
+            self.close()
+            self.apply_retention(day)
+            self._handle = open(self._segment_path(day), "a", encoding="utf-8")
+            self._current_day = day
+        self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._aggregate(day, record)
+
+    def append_many(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.append(record)
+        self.flush()
+
+    def flush(self):
+        if self._handle:
+            self._handle.flush()
+
+    def close(self):
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+            self._current_day = None
+
+    def summarize(self, since: date) -> tuple:
+        """Сливает дневные агрегаты начиная с `since`: (общий, по моделям)"""
+        total = MetricAggregate()
+        by_model: Dict[str, MetricAggregate] = {}
+        for day, aggregate in self.daily.items():
+            if day < since:
+                continue
+            total.merge(aggregate)
+            for model, model_aggregate in self.daily_by_model.get(day, {}).items():
+                by_model.setdefault(model, MetricAggregate()).merge(model_aggregate)
+        return total, by_model
+
+    def days(self) -> List[date]:
+        return sorted(self.daily)
@@ -1,12 +1,17 @@
 import asyncio
 import time
 import json
+import pickle
+import sys
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Awaitable, Callable, Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 import os
 from pathlib import Path
 
+from .metrics_store import MetricsSegmentStore
+
 @dataclass
 class PerformanceMetric:
     """Метрика производительности"""
@@ -22,9 +27,10 @@ class PerformanceMetric:
 class PerformanceMonitor:
     """Мониторинг производительности системы"""
     
-    def __init__(self, log_file: str = "performance_log.json"):
+    def __init__(self, log_file: str = "performance_log.json", retention_days: int = 30):
+        # Старый JSON-файл нужен только для однократной миграции
         self.log_file = Path(log_file)
-        self.metrics: List[PerformanceMetric] = []
+        self.store = MetricsSegmentStore(self.log_file.with_suffix(""), retention_days=retention_days)
         self.cache_hits = 0
         self.cache_misses = 0
         
@@ -32,28 +38,32 @@ class PerformanceMonitor:
         self.load_metrics()
     
     def load_metrics(self):
-        """Загружает метрики из файла"""
-        if self.log_file.exists():
-            try:
+        """Восстанавливает агрегаты из сегментов и переносит старый JSON-лог"""
+        try:
+            self.store.load()
+            if self.log_file.exists():
                 with open(self.log_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.metrics = [PerformanceMetric(**metric) for metric in data]
-            except Exception as e:
-                print(f"Ошибка загрузки метрик: {e}")
+                self.store.append_many(data)
+                self.store.close()
+                self.log_file.rename(self.log_file.with_name(self.log_file.name + ".migrated"))
+                self.store.load()
+        except Exception as e:
+            print(f"Ошибка загрузки метрик: {e}")
     
     def save_metrics(self):
-        """Сохраняет метрики в файл"""
+        """Сбрасывает буфер текущего сегмента на диск"""
         try:
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                json.dump([asdict(metric) for metric in self.metrics], f, indent=2, ensure_ascii=False)
+            self.store.flush()
         except Exception as e:
             print(f"Ошибка сохранения метрик: {e}")
     
     def add_metric(self, operation: str, duration: float, model_used: str, 
                   tokens_used: int, cost: float, success: bool, error: str = None):
         """Добавляет новую метрику"""
+        now = datetime.now()
         metric = PerformanceMetric(
-            timestamp=datetime.now().isoformat(),
+            timestamp=now.isoformat(),
             operation=operation,
             duration=duration,
             model_used=model_used,
@@ -63,62 +73,45 @@ class PerformanceMonitor:
             error=error
         )
         
-        self.metrics.append(metric)
-        
-        # Сохраняем каждые 10 метрик
-        if len(self.metrics) % 10 == 0:
-            self.save_metrics()
+        try:
+            self.store.append(asdict(metric), day=now.date())
+            self.store.flush()
+        except Exception as e:
+            print(f"Ошибка сохранения метрики: {e}")
     
     def get_performance_stats(self, days: int = 7) -> Dict[str, Any]:
         """Получает статистику производительности"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        recent_metrics = [
-            m for m in self.metrics 
-            if datetime.fromisoformat(m.timestamp) > cutoff_date
-        ]
+        # Агрегаты хранятся по дням, период округляется до целых суток
+        since = (datetime.now() - timedelta(days=days)).date()
+        total, by_model = self.store.summarize(since)
         
-        if not recent_metrics:
+        if total.operations == 0:
             return {"error": "Нет данных за указанный период"}
         
-        # Общая статистика
-        total_operations = len(recent_metrics)
-        successful_operations = len([m for m in recent_metrics if m.success])
-        total_duration = sum(m.duration for m in recent_metrics)
-        total_tokens = sum(m.tokens_used for m in recent_metrics)
-        total_cost = sum(m.cost for m in recent_metrics)
-        
         # Статистика по моделям
-        model_stats = {}
-        for metric in recent_metrics:
-            model = metric.model_used
-            if model not in model_stats:
-                model_stats[model] = {
-                    "operations": 0,
-                    "total_tokens": 0,
-                    "total_cost": 0,
-                    "avg_duration": 0,
-                    "success_rate": 0
-                }
-            
-            model_stats[model]["operations"] += 1
-            model_stats[model]["total_tokens"] += metric.tokens_used
-            model_stats[model]["total_cost"] += metric.cost
-        
-        # Вычисляем средние значения
-        for model in model_stats:
-            model_metrics = [m for m in recent_metrics if m.model_used == model]
-            model_stats[model]["avg_duration"] = sum(m.duration for m in model_metrics) / len(model_metrics)
-            model_stats[model]["success_rate"] = len([m for m in model_metrics if m.success]) / len(model_metrics)
+        model_stats = {
+            model: {
+                "operations": aggregate.operations,
+                "total_tokens": aggregate.total_tokens,
+                "total_cost": aggregate.total_cost,
+                "avg_duration": aggregate.total_duration / aggregate.operations,
+                "p95_duration": aggregate.durations.quantile(0.95),
+                "success_rate": aggregate.successful / aggregate.operations
+            }
+            for model, aggregate in by_model.items()
+        }
         
         return {
             "period_days": days,
-            "total_operations": total_operations,
-            "successful_operations": successful_operations,
-            "success_rate": successful_operations / total_operations if total_operations > 0 else 0,
-            "avg_duration": total_duration / total_operations if total_operations > 0 else 0,
-            "total_tokens": total_tokens,
-            "total_cost": total_cost,
+            "total_operations": total.operations,
+            "successful_operations": total.successful,
+            "success_rate": total.successful / total.operations,
+            "avg_duration": total.total_duration / total.operations,
+            "p50_duration": total.durations.quantile(0.50),
+            "p95_duration": total.durations.quantile(0.95),
+            "p99_duration": total.durations.quantile(0.99),
+            "total_tokens": total.total_tokens,
+            "total_cost": total.total_cost,
             "model_stats": model_stats,
             "cache_hits": self.cache_hits,
             "cache_misses": self.cache_misses,
@@ -140,6 +133,7 @@ class PerformanceMonitor:
         print(f"✅ Успешные операции: {stats['successful_operations']}")
         print(f"📈 Успешность: {stats['success_rate']:.1%}")
         print(f"⏱️  Среднее время: {stats['avg_duration']:.2f}с")
+        print(f"📐 p50 / p95 / p99: {stats['p50_duration']:.2f}с / {stats['p95_duration']:.2f}с / {stats['p99_duration']:.2f}с")
         print(f"📝 Общее токенов: {stats['total_tokens']:,}")
         print(f"💰 Общая стоимость: ${stats['total_cost']:.6f}")
         print(f"🎯 Кэш-хиты: {stats['cache_hits']}")
@@ -192,65 +186,194 @@ class PerformanceMonitor:
         
         return recommendations
 
+class PickleCachePersistence:
+    """Сохранение кэша на диск через pickle с атомарной заменой файла"""
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+    
+    def load(self) -> List[tuple]:
+        """Возвращает записи (ключ, значение, время последнего доступа)"""
+        if not self.path.exists():
+            return []
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+    
+    def save(self, entries: List[tuple]):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
 class CacheManager:
-    """Управление кэшем для оптимизации"""
+    """
+    LRU-кэш со скользящим TTL для оптимизации.
     
-    def __init__(self, max_size: int = 1000, ttl_hours: int = 24):
+    Записи хранятся в OrderedDict в порядке последнего доступа, поэтому
+    вытеснение и удаление просроченных записей идут с головы за O(1).
+    """
+    
+    def __init__(self, max_size: int = 1000, ttl_hours: int = 24,
+                 max_bytes: Optional[int] = None, persistence: Optional[PickleCachePersistence] = None):
         self.max_size = max_size
         self.ttl_hours = ttl_hours
-        self.cache: Dict[str, Dict] = {}
-        self.access_times: Dict[str, float] = {}
-    
-    def _cleanup_expired(self):
-        """Удаляет просроченные записи"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, access_time in self.access_times.items()
-            if current_time - access_time > self.ttl_hours * 3600
-        ]
+        self.max_bytes = max_bytes
+        self.persistence = persistence
+        # key -> (value, last_access, size_bytes)
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
         
-        for key in expired_keys:
-            del self.cache[key]
-            del self.access_times[key]
+        if self.persistence:
+            self.load()
+    
+    @property
+    def _ttl_seconds(self) -> float:
+        return self.ttl_hours * 3600
+    
+    def _estimate_size(self, value: Any) -> int:
+        if self.max_bytes is None:
+            return 0
+        try:
+            return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return sys.getsizeof(value)
+    
+    def _remove(self, key: str):
+        _, _, size = self.cache.pop(key)
+        self.current_bytes -= size
+    
+    def _cleanup_expired(self, now: Optional[float] = None):
+        """Удаляет просроченные записи с головы очереди"""
+        now = now or time.time()
+        while self.cache:
+            key, (_, last_access, _) = next(iter(self.cache.items()))
+            if now - last_access <= self._ttl_seconds:
+                break
+            self._remove(key)
+            self.expirations += 1
     
     def _evict_lru(self):
-        """Удаляет наименее используемые записи"""
-        if len(self.cache) >= self.max_size:
-            # Находим самую старую запись
-            oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
-            del self.cache[oldest_key]
-            del self.access_times[oldest_key]
+        """Удаляет наименее используемые записи при превышении лимитов"""
+        while self.cache and (
+            len(self.cache) > self.max_size
+            or (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            _, (_, _, size) = self.cache.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
     
     def get(self, key: str) -> Optional[Any]:
         """Получает значение из кэша"""
-        self._cleanup_expired()
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
         
-        if key in self.cache:
-            self.access_times[key] = time.time()
-            return self.cache[key]['value']
+        value, last_access, size = entry
+        now = time.time()
+        if now - last_access > self._ttl_seconds:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
         
-        return None
+        self.cache[key] = (value, now, size)
+        self.cache.move_to_end(key)
+        self.hits += 1
+        return value
     
     def set(self, key: str, value: Any):
         """Сохраняет значение в кэш"""
-        self._cleanup_expired()
+        now = time.time()
+        if key in self.cache:
+            self._remove(key)
+        size = self._estimate_size(value)
+        self.cache[key] = (value, now, size)
+        self.current_bytes += size
+        self._cleanup_expired(now)
         self._evict_lru()
+    
+    def delete(self, key: str):
+        """Удаляет значение из кэша"""
+        if key in self.cache:
+            self._remove(key)
+    
+    async def get_or_set(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает значение из кэша или вычисляет его через factory.
         
-        self.cache[key] = {
-            'value': value,
-            'created_at': time.time()
-        }
-        self.access_times[key] = time.time()
+        Одновременные промахи по одному ключу ждут один и тот же вызов factory.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+            if value is not None:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже получил вызывающий, ожидающие получат его из future
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+    
+    def load(self):
+        """Загружает записи из persistence, пропуская просроченные"""
+        try:
+            now = time.time()
+            for key, value, last_access in self.persistence.load():
+                if now - last_access > self._ttl_seconds:
+                    continue
+                size = self._estimate_size(value)
+                self.cache[key] = (value, last_access, size)
+                self.current_bytes += size
+            self._evict_lru()
+        except Exception as e:
+            print(f"Ошибка загрузки кэша: {e}")
+    
+    def save(self):
+        """Сохраняет записи через persistence"""
+        if not self.persistence:
+            return
+        try:
+            self._cleanup_expired()
+            self.persistence.save([(key, value, last_access) for key, (value, last_access, _) in self.cache.items()])
+        except Exception as e:
+            print(f"Ошибка сохранения кэша: {e}")
     
     def get_stats(self) -> Dict[str, Any]:
         """Получает статистику кэша"""
         self._cleanup_expired()
+        lookups = self.hits + self.misses
         
         return {
             "size": len(self.cache),
             "max_size": self.max_size,
             "utilization": len(self.cache) / self.max_size if self.max_size > 0 else 0,
-            "ttl_hours": self.ttl_hours
+            "ttl_hours": self.ttl_hours,
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
         }
 
 # Глобальные экземпляры
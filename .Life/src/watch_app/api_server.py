@@ -7,17 +7,55 @@ API сервер для Life Watch App
 import asyncio
 import json
 import logging
+import os
+import sys
+import uuid
+import zlib
+from collections import deque
+from itertools import islice
 from datetime import datetime, UTC
-from typing import Dict, Any, Optional, List
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from typing import AsyncIterator, Dict, Any, Optional, List, Set
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+if AIOHTTP_AVAILABLE:
+    try:
+        from ..llm.client import LocalLLMClient
+        from ..llm.local_server import ContextType
+    except ImportError:
+        # Запуск файла напрямую
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from llm.client import LocalLLMClient
+        from llm.local_server import ContextType
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ограничения пакетной синхронизации
+MAX_BATCH_EVENTS = 5000
+MAX_BATCH_BYTES = 10 * 1024 * 1024
+
+# Локальный LLM сервер для ответов ИИ; без него используются шаблонные ответы
+LLM_SERVER_URL = os.getenv("LIFE_LLM_URL")
+# Как часто публиковать накопленные токены ответа в канал ai_responses
+AI_CHUNK_INTERVAL_SECONDS = 0.3
+
 # Модели данных
 class WatchData(BaseModel):
     type: str = Field(..., description="Тип данных (heart_rate, activity, task, voice_command, etc.)")
@@ -42,6 +80,18 @@ class SyncResponse(BaseModel):
     message: str = Field(..., description="Сообщение")
     processed_count: int = Field(0, description="Количество обработанных записей")
 
+class BatchSyncResponse(BaseModel):
+    status: str = Field(..., description="Статус синхронизации")
+    accepted: int = Field(0, description="Количество принятых событий")
+    failed: int = Field(0, description="Количество событий с ошибкой")
+    errors: List[Dict[str, Any]] = Field(default_factory=list, description="Ошибки по индексам событий")
+    processed_count: int = Field(0, description="Всего обработано записей")
+
+class AckRequest(BaseModel):
+    device_id: str = Field(..., description="Идентификатор устройства")
+    channel: str = Field(..., description="Канал: notifications или ai_responses")
+    seq: int = Field(..., description="Последний обработанный номер сообщения")
+
 # Создание FastAPI приложения
 app = FastAPI(
     title="Life Watch API",
@@ -58,15 +108,132 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Глобальные переменные для хранения данных
-watch_data_buffer: List[Dict[str, Any]] = []
-notifications_queue: List[Dict[str, Any]] = []
-ai_responses_queue: List[Dict[str, Any]] = []
+class RingBuffer:
+    """
+    Ограниченная очередь: при переполнении вытесняются самые старые записи.
+    
+    Количество вытесненных записей считается в `dropped`.
+    """
+    
+    def __init__(self, maxlen: int):
+        self._items: deque = deque(maxlen=maxlen)
+        self.dropped = 0
+    
+    @property
+    def maxlen(self) -> int:
+        return self._items.maxlen
+    
+    def append(self, item: Dict[str, Any]):
+        if len(self._items) == self._items.maxlen:
+            self.dropped += 1
+        self._items.append(item)
+    
+    def extend(self, items: List[Dict[str, Any]]):
+        for item in items:
+            self.append(item)
+    
+    def copy(self) -> List[Dict[str, Any]]:
+        return list(self._items)
+    
+    def clear(self):
+        self._items.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "maxlen": self._items.maxlen, "dropped": self.dropped}
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def __iter__(self):
+        return iter(self._items)
+
+class MessageChannel(RingBuffer):
+    """
+    Канал сообщений для устройств с номерами, подтверждениями и повтором.
+    
+    Сообщения не удаляются при чтении: каждое устройство хранит свой курсор
+    (последний подтвержденный номер), поэтому несколько потребителей не
+    отнимают сообщения друг у друга. Ожидающие читатели будятся через
+    asyncio.Event при публикации.
+    """
+    
+    def __init__(self, name: str, maxlen: int):
+        super().__init__(maxlen)
+        self.name = name
+        self.last_seq = 0
+        self._cursors: Dict[str, int] = {}
+        self._new_message = asyncio.Event()
+    
+    def append(self, item: Dict[str, Any]):
+        self.last_seq += 1
+        super().append(dict(item, seq=self.last_seq))
+        # Будим всех ожидающих и заводим новое событие для следующих
+        self._new_message.set()
+        self._new_message = asyncio.Event()
+    
+    @property
+    def first_seq(self) -> int:
+        """Номер самого старого сообщения, доступного для повтора"""
+        return self.last_seq - len(self._items) + 1
+    
+    def since(self, after_seq: int) -> List[Dict[str, Any]]:
+        """Сообщения с номером больше after_seq"""
+        start = max(after_seq - self.first_seq + 1, 0)
+        return list(islice(self._items, start, None))
+    
+    def cursor(self, device_id: str) -> int:
+        return self._cursors.get(device_id, 0)
+    
+    def ack(self, device_id: str, seq: int):
+        """Сдвигает курсор устройства на подтвержденный номер"""
+        self._cursors[device_id] = max(self.cursor(device_id), min(seq, self.last_seq))
+    
+    def changed(self) -> asyncio.Event:
+        """Событие, которое сработает при следующей публикации"""
+        return self._new_message
+    
+    async def wait_since(self, after_seq: int, timeout: float) -> List[Dict[str, Any]]:
+        """Long-poll: ждет новые сообщения не дольше timeout секунд"""
+        event = self.changed()
+        messages = self.since(after_seq)
+        if messages or timeout <= 0:
+            return messages
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return self.since(after_seq)
+    
+    def stats(self) -> Dict[str, int]:
+        return dict(super().stats(), last_seq=self.last_seq, devices=len(self._cursors))
+
+# Глобальные буферы для хранения данных
+watch_data_buffer = RingBuffer(maxlen=10000)
+notifications_queue = MessageChannel("notifications", maxlen=500)
+ai_responses_queue = MessageChannel("ai_responses", maxlen=500)
+channels: Dict[str, MessageChannel] = {
+    notifications_queue.name: notifications_queue,
+    ai_responses_queue.name: ai_responses_queue,
+}
+
+# Максимальное время ожидания long-poll запроса
+MAX_LONG_POLL_SECONDS = 60
+# Курсор клиентов, которые опрашивают каналы без device_id
+LEGACY_DEVICE_ID = "default"
 
 class WatchDataProcessor:
     """Обработчик данных с часов"""
     
-    def __init__(self):
+    # Тип события -> метод обработки
+    EVENT_HANDLERS = {
+        "heart_rate": "process_heart_rate",
+        "activity": "process_activity",
+        "task": "process_task",
+        "voice_command": "process_voice_command",
+        "sleep": "process_sleep",
+    }
+    
+    def __init__(self, llm_url: Optional[str] = LLM_SERVER_URL):
         self.stats = {
             "heart_rate_count": 0,
             "activity_count": 0,
@@ -74,6 +241,17 @@ class WatchDataProcessor:
             "voice_command_count": 0,
             "total_processed": 0
         }
+        self.llm_url = llm_url
+        self._session = None
+        # Ссылки на фоновые задачи ответов, чтобы их не собрал GC
+        self._response_tasks: Set[asyncio.Task] = set()
+    
+    async def process_event(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Передает событие обработчику его типа"""
+        handler_name = self.EVENT_HANDLERS.get(event_type)
+        if handler_name is None:
+            raise ValueError(f"Неизвестный тип данных: {event_type}")
+        return await getattr(self, handler_name)(data)
     
     async def process_heart_rate(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Обработка данных пульса"""
@@ -197,9 +375,10 @@ class WatchDataProcessor:
         self.stats["voice_command_count"] += 1
         self.stats["total_processed"] += 1
         
-        # Генерация ответа ИИ
-        ai_response = await self._generate_ai_response(command_text, intent)
-        ai_responses_queue.append(ai_response)
+        # Ответ ИИ публикуется по мере генерации, синхронизация его не ждет
+        task = asyncio.create_task(self._publish_ai_response(command_text, intent))
+        self._response_tasks.add(task)
+        task.add_done_callback(self._response_tasks.discard)
         
         return processed_data
     
@@ -287,9 +466,8 @@ class WatchDataProcessor:
         }
         notifications_queue.append(notification)
     
-    async def _generate_ai_response(self, command_text: str, intent: str) -> Dict[str, Any]:
-        """Генерация ответа ИИ"""
-        # Здесь будет интеграция с существующими агентами
+    def _template_response(self, command_text: str, intent: str) -> str:
+        """Шаблонный ответ, если LLM не настроена или недоступна"""
         responses = {
             "add_task": f"Задача '{command_text}' добавлена в ваш список дел.",
             "show_progress": "Показываю ваш прогресс за сегодня...",
@@ -297,20 +475,90 @@ class WatchDataProcessor:
             "help": "Я могу помочь добавить задачи, показать прогресс, записать рефлексию.",
             "unknown": "Не совсем понял команду. Попробуйте сказать 'добавь задачу' или 'покажи прогресс'."
         }
-        
-        response_text = responses.get(intent, responses["unknown"])
-        
+        return responses.get(intent, responses["unknown"])
+    
+    def _get_session(self):
+        """Общая HTTP-сессия к LLM серверу"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+    
+    async def stream_ai_response(self, command_text: str, intent: str) -> AsyncIterator[str]:
+        """Текст ответа ИИ по частям: токены локальной LLM или шаблонный ответ"""
+        if self.llm_url and AIOHTTP_AVAILABLE:
+            streamed = False
+            try:
+                client = LocalLLMClient(self.llm_url, session=self._get_session())
+                async for token in client.generate_stream(command_text, context=ContextType.HOME, max_tokens=300):
+                    streamed = True
+                    yield token
+                return
+            except Exception as e:
+                logger.error(f"Ошибка потокового ответа LLM: {e}")
+                if streamed:
+                    return
+        yield self._template_response(command_text, intent)
+    
+    def _ai_response(self, response_text: str, intent: str, command_text: str,
+                     response_id: Optional[str] = None) -> Dict[str, Any]:
         return {
             "type": "ai_response",
+            "response_id": response_id or uuid.uuid4().hex,
             "response": response_text,
             "intent": intent,
             "original_command": command_text,
             "timestamp": datetime.now(UTC).isoformat()
         }
+    
+    async def _generate_ai_response(self, command_text: str, intent: str) -> Dict[str, Any]:
+        """Генерация ответа ИИ целиком"""
+        tokens = [token async for token in self.stream_ai_response(command_text, intent)]
+        return self._ai_response("".join(tokens).strip(), intent, command_text)
+    
+    async def _publish_ai_response(self, command_text: str, intent: str):
+        """
+        Публикует ответ ИИ в канал ai_responses по мере генерации.
+        
+        Первый токен уходит сразу, дальше накопленные токены публикуются
+        сообщениями ai_response_chunk не чаще AI_CHUNK_INTERVAL_SECONDS.
+        В конце - ai_response с полным текстом и тем же response_id.
+        """
+        loop = asyncio.get_running_loop()
+        response_id = uuid.uuid4().hex
+        tokens: List[str] = []
+        pending: List[str] = []
+        last_flush = None
+        try:
+            async for token in self.stream_ai_response(command_text, intent):
+                tokens.append(token)
+                pending.append(token)
+                if last_flush is None or loop.time() - last_flush >= AI_CHUNK_INTERVAL_SECONDS:
+                    ai_responses_queue.append({
+                        "type": "ai_response_chunk",
+                        "response_id": response_id,
+                        "text": "".join(pending)
+                    })
+                    pending.clear()
+                    last_flush = loop.time()
+        except Exception as e:
+            logger.error(f"Ошибка генерации ответа ИИ: {e}")
+        
+        response_text = "".join(tokens).strip() or self._template_response(command_text, intent)
+        ai_responses_queue.append(self._ai_response(response_text, intent, command_text, response_id))
+    
+    async def close(self):
+        """Закрывает HTTP-сессию к LLM серверу"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
 # Создание обработчика
 processor = WatchDataProcessor()
 
+@app.on_event("shutdown")
+async def close_processor():
+    """Закрывает HTTP-сессию обработчика к LLM серверу"""
+    await processor.close()
+
 # API endpoints
 @app.post("/watch/sync", response_model=SyncResponse)
 async def sync_watch_data(watch_data: WatchData, background_tasks: BackgroundTasks):
@@ -319,18 +567,10 @@ async def sync_watch_data(watch_data: WatchData, background_tasks: BackgroundTas
         logger.info(f"Получены данные с часов: {watch_data.type}")
         
         # Обработка данных в зависимости от типа
-        if watch_data.type == "heart_rate":
-            processed_data = await processor.process_heart_rate(watch_data.data)
-        elif watch_data.type == "activity":
-            processed_data = await processor.process_activity(watch_data.data)
-        elif watch_data.type == "task":
-            processed_data = await processor.process_task(watch_data.data)
-        elif watch_data.type == "voice_command":
-            processed_data = await processor.process_voice_command(watch_data.data)
-        elif watch_data.type == "sleep":
-            processed_data = await processor.process_sleep(watch_data.data)
-        else:
-            raise HTTPException(status_code=400, detail=f"Неизвестный тип данных: {watch_data.type}")
+        try:
+            processed_data = await processor.process_event(watch_data.type, watch_data.data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Запуск фоновой задачи для интеграции с Notion
         background_tasks.add_task(integrate_with_notion, processed_data)
@@ -341,47 +581,221 @@ async def sync_watch_data(watch_data: WatchData, background_tasks: BackgroundTas
             processed_count=processor.stats["total_processed"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка обработки данных: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _decode_batch_body(body: bytes, content_type: str, content_encoding: str) -> List[Dict[str, Any]]:
+    """Распаковывает пакет событий: gzip/deflate + JSON или msgpack"""
+    if content_encoding in ("gzip", "deflate") or body[:2] == b"\x1f\x8b":
+        # wbits=47 автоматически распознает gzip и zlib заголовки
+        decompressor = zlib.decompressobj(47)
+        body = decompressor.decompress(body, MAX_BATCH_BYTES)
+        if decompressor.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="Пакет слишком большой после распаковки")
+    
+    if "msgpack" in content_type:
+        if not MSGPACK_AVAILABLE:
+            raise HTTPException(status_code=415, detail="msgpack не установлен на сервере")
+        payload = msgpack.unpackb(body, raw=False)
+    else:
+        payload = json.loads(body)
+    
+    events = payload.get("events", []) if isinstance(payload, dict) else payload
+    if not isinstance(events, list):
+        raise HTTPException(status_code=400, detail="Ожидается массив событий")
+    if len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"Не более {MAX_BATCH_EVENTS} событий в пакете")
+    return events
+
+@app.post("/watch/sync/batch", response_model=BatchSyncResponse)
+async def sync_watch_data_batch(request: Request, background_tasks: BackgroundTasks):
+    """
+    Пакетная синхронизация данных с часов.
+    
+    Тело - массив WatchData (или {"events": [...]}) в JSON или msgpack,
+    опционально сжатый gzip. Все события пакета уходят в Notion одной
+    фоновой задачей.
+    """
+    try:
+        body = await request.body()
+        events = _decode_batch_body(
+            body,
+            request.headers.get("content-type", ""),
+            request.headers.get("content-encoding", "")
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка распаковки пакета: {e}")
+        raise HTTPException(status_code=400, detail=f"Некорректный пакет: {e}")
+    
+    processed_batch: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for index, raw_event in enumerate(events):
+        try:
+            event = WatchData(**raw_event)
+            processed_batch.append(await processor.process_event(event.type, event.data))
+        except Exception as e:
+            errors.append({"index": index, "error": str(e)})
+    
+    if processed_batch:
+        background_tasks.add_task(integrate_batch_with_notion, processed_batch)
+    
+    logger.info(f"Пакет с часов: принято {len(processed_batch)}, ошибок {len(errors)}")
+    return BatchSyncResponse(
+        status="success" if not errors else "partial",
+        accepted=len(processed_batch),
+        failed=len(errors),
+        errors=errors,
+        processed_count=processor.stats["total_processed"]
+    )
+
+async def _poll_channel(channel: MessageChannel, device_id: Optional[str], after: Optional[int],
+                        wait: float, auto_ack: Optional[bool]) -> Dict[str, Any]:
+    """
+    Общая логика чтения канала.
+    
+    Без `after` отдаются сообщения после курсора устройства; с `after` -
+    повтор начиная с указанного номера. `wait` включает long-poll.
+    
+    Именованное устройство по умолчанию подтверждает чтение само
+    (/phone/ack или auto_ack=true), иначе несколько клиентов с одним
+    device_id теряли бы сообщения друг друга. Запрос без device_id -
+    старый клиент: общий курсор и подтверждение при чтении, как раньше.
+    """
+    if auto_ack is None:
+        auto_ack = device_id is None
+    device_id = device_id or LEGACY_DEVICE_ID
+    after_seq = channel.cursor(device_id) if after is None else after
+    messages = await channel.wait_since(after_seq, min(max(wait, 0), MAX_LONG_POLL_SECONDS))
+    if messages and auto_ack:
+        channel.ack(device_id, messages[-1]["seq"])
+    return {
+        "messages": messages,
+        "last_seq": channel.last_seq,
+        # Сообщения до first_seq уже вытеснены из буфера
+        "first_seq": channel.first_seq,
+    }
+
 @app.get("/phone/notifications")
-async def get_notifications():
-    """Получение уведомлений для часов"""
+async def get_notifications(device_id: Optional[str] = None, after: Optional[int] = None,
+                            wait: float = 0, auto_ack: Optional[bool] = None):
+    """Получение уведомлений для часов (с long-poll через wait)"""
     try:
-        # Возвращаем все уведомления из очереди
-        notifications = notifications_queue.copy()
-        notifications_queue.clear()
-        
-        return {"notifications": notifications}
+        result = await _poll_channel(notifications_queue, device_id, after, wait, auto_ack)
+        return {"notifications": result["messages"], "last_seq": result["last_seq"], "first_seq": result["first_seq"]}
         
     except Exception as e:
         logger.error(f"Ошибка получения уведомлений: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/phone/ai_responses")
-async def get_ai_responses():
-    """Получение ответов ИИ для часов"""
+async def get_ai_responses(device_id: Optional[str] = None, after: Optional[int] = None,
+                           wait: float = 0, auto_ack: Optional[bool] = None):
+    """Получение ответов ИИ для часов (с long-poll через wait)"""
     try:
-        # Возвращаем все ответы ИИ из очереди
-        responses = ai_responses_queue.copy()
-        ai_responses_queue.clear()
-        
-        return {"ai_responses": responses}
+        result = await _poll_channel(ai_responses_queue, device_id, after, wait, auto_ack)
+        return {"ai_responses": result["messages"], "last_seq": result["last_seq"], "first_seq": result["first_seq"]}
         
     except Exception as e:
         logger.error(f"Ошибка получения ответов ИИ: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/phone/ack")
+async def ack_messages(ack: AckRequest):
+    """Подтверждение получения сообщений устройством"""
+    channel = channels.get(ack.channel)
+    if channel is None:
+        raise HTTPException(status_code=404, detail=f"Неизвестный канал: {ack.channel}")
+    channel.ack(ack.device_id, ack.seq)
+    return {"channel": ack.channel, "device_id": ack.device_id, "cursor": channel.cursor(ack.device_id)}
+
+@app.websocket("/ws/{device_id}")
+async def push_channel(websocket: WebSocket, device_id: str):
+    """
+    Push-канал для часов и телефона.
+    
+    Сервер отправляет {"channel", "messages"} по мере публикации, клиент
+    подтверждает обработку сообщением {"ack": {"<channel>": seq}}. После
+    переподключения неподтвержденные сообщения отправляются повторно.
+    Первым сообщением клиент может прислать {"after": {"<channel>": seq}}
+    для повтора с конкретного номера.
+    """
+    await websocket.accept()
+    subscribed = [channels[name] for name in websocket.query_params.get("channels", "notifications,ai_responses").split(",") if name in channels]
+    sent = {channel.name: channel.cursor(device_id) for channel in subscribed}
+    # "after" от клиента копится здесь и применяется только в начале цикла
+    # отправки: иначе перемотка во время send_json затиралась бы номером
+    # только что отправленного сообщения
+    rewinds: Dict[str, int] = {}
+    rewind = asyncio.Event()  # клиент прислал "after": будим цикл отправки
+    
+    async def receive_acks():
+        async for message in websocket.iter_json():
+            for name, seq in message.get("after", {}).items():
+                if name in sent:
+                    rewinds[name] = int(seq)
+                    rewind.set()
+            for name, seq in message.get("ack", {}).items():
+                if name in channels:
+                    channels[name].ack(device_id, int(seq))
+    
+    receiver = asyncio.create_task(receive_acks())
+    try:
+        while not receiver.done():
+            # Событие берем до чтения, чтобы не пропустить публикацию между ними
+            events = [channel.changed() for channel in subscribed]
+            rewind.clear()
+            sent.update(rewinds)
+            rewinds.clear()
+            for channel in subscribed:
+                messages = channel.since(sent[channel.name])
+                if messages:
+                    await websocket.send_json({"channel": channel.name, "messages": messages})
+                    sent[channel.name] = messages[-1]["seq"]
+            
+            waiters = [asyncio.create_task(event.wait()) for event in events + [rewind]]
+            await asyncio.wait(waiters + [receiver], return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        # Забираем результат задачи, чтобы ее исключение не осталось неполученным
+        error = (await asyncio.gather(receiver, return_exceptions=True))[0]
+        if isinstance(error, Exception) and not isinstance(error, WebSocketDisconnect):
+            logger.warning(f"Ошибка приема сообщений от устройства {device_id}: {error!r}")
+        logger.info(f"Push-канал устройства {device_id} закрыт")
+
 @app.post("/phone/ai_chat")
-async def ai_chat(chat_data: WatchData):
-    """Обработка чата с ИИ"""
+async def ai_chat(chat_data: WatchData, stream: bool = False):
+    """
+    Обработка чата с ИИ.
+    
+    С stream=true ответ отдается потоком SSE (события token и done)
+    по мере генерации.
+    """
+    text = chat_data.data.get("text", "")
+    intent = processor._recognize_intent(text)
+    
+    if stream:
+        async def events():
+            tokens = []
+            async for token in processor.stream_ai_response(text, intent):
+                tokens.append(token)
+                yield f"event: token\ndata: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+            done = {"response": "".join(tokens).strip(), "intent": intent}
+            yield f"event: done\ndata: {json.dumps(done, ensure_ascii=False)}\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
     try:
         # Получение ответа от ИИ
-        response = await processor._generate_ai_response(
-            chat_data.data.get("text", ""),
-            processor._recognize_intent(chat_data.data.get("text", ""))
-        )
+        response = await processor._generate_ai_response(text, intent)
         
         return AIResponse(
             response=response["response"],
@@ -401,6 +815,11 @@ async def get_stats():
         "buffer_size": len(watch_data_buffer),
         "notifications_queue_size": len(notifications_queue),
         "ai_responses_queue_size": len(ai_responses_queue),
+        "buffers": {
+            "watch_data": watch_data_buffer.stats(),
+            "notifications": notifications_queue.stats(),
+            "ai_responses": ai_responses_queue.stats()
+        },
         "uptime": datetime.now(UTC).isoformat()
     }
 
@@ -426,6 +845,23 @@ async def integrate_with_notion(data: Dict[str, Any]):
     except Exception as e:
         logger.error(f"Ошибка интеграции с Notion: {e}")
 
+async def integrate_batch_with_notion(batch: List[Dict[str, Any]]):
+    """Интеграция пакета данных с Notion одной записью на тип данных"""
+    try:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for data in batch:
+            grouped.setdefault(data["type"], []).append(data)
+        
+        for data_type, items in grouped.items():
+            logger.info(f"Интеграция с Notion: {data_type} x{len(items)}")
+            
+            # Здесь будет код интеграции с существующей системой Notion
+            # Пока просто логируем
+            logger.info(f"Пакет готов для интеграции: {data_type}, {len(items)} записей")
+        
+    except Exception as e:
+        logger.error(f"Ошибка пакетной интеграции с Notion: {e}")
+
 # Дополнительные методы для процессора
 async def process_sleep(self, data: Dict[str, Any]) -> Dict[str, Any]:
     """Обработка данных сна"""
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Колоночное хранилище биометрических временных рядов для анализа данных часов
+
+Сырые отсчеты и агрегаты (1 мин, 1 ч) хранятся в memory-mapped файлах
+NumPy: отдельный файл на колонку и уровень детализации. Аналитика
+(скользящие средние, наклоны, оценки аномалий) считается векторно.
+"""
+
+import logging
+import math
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Колонки хранилища (совпадают с полями BiometricData)
+COLUMNS = ("heart_rate", "stress_level", "steps", "sleep_quality")
+
+# Уровни детализации: имя -> размер корзины в секундах
+TIERS = {"raw": 0, "1min": 60, "1h": 3600}
+
+
+class ColumnarSeries:
+    """
+    Append-only таблица (timestamp + float32-колонки) в memory-mapped файлах.
+
+    Файлы растут удвоением, длина восстанавливается при открытии по
+    ненулевым временным меткам, поэтому отдельные метаданные не нужны.
+    """
+
+    def __init__(self, directory: Path, name: str, columns: Tuple[str, ...] = COLUMNS,
+                 initial_capacity: int = 4096):
+        self.directory = Path(directory)
+        self.name = name
+        self.columns = columns
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        ts_path = self._path("ts")
+        capacity = max(initial_capacity, ts_path.stat().st_size // 4 if ts_path.exists() else 0)
+        self._open(capacity)
+        # Пустые слоты заполнены нулями, метки времени строго положительные
+        self.length = int(np.count_nonzero(self._ts))
+
+    def _path(self, column: str) -> Path:
+        return self.directory / f"{self.name}.{column}.bin"
+
+    def _map(self, column: str, dtype, capacity: int) -> np.memmap:
+        path = self._path(column)
+        size = capacity * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity,))
+
+    def _open(self, capacity: int):
+        self.capacity = capacity
+        self._ts = self._map("ts", np.uint32, capacity)
+        self._values = {column: self._map(column, np.float32, capacity) for column in self.columns}
+
+    def _grow(self):
+        self.flush()
+        self._open(self.capacity * 2)
+
+    def append(self, timestamp: int, values: np.ndarray):
+        if self.length == self.capacity:
+            self._grow()
+        self._ts[self.length] = timestamp
+        for index, column in enumerate(self.columns):
+            self._values[column][self.length] = values[index]
+        self.length += 1
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._ts[:self.length]
+
+    def column(self, column: str) -> np.ndarray:
+        return self._values[column][:self.length]
+
+    def last_timestamp(self) -> Optional[int]:
+        return int(self._ts[self.length - 1]) if self.length else None
+
+    def window(self, column: str, start_ts: int, end_ts: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Метки времени и значения колонки в интервале [start_ts, end_ts]"""
+        ts = self.timestamps
+        start = int(np.searchsorted(ts, start_ts, side="left"))
+        end = self.length if end_ts is None else int(np.searchsorted(ts, end_ts, side="right"))
+        return ts[start:end], self.column(column)[start:end]
+
+    def drop_before(self, timestamp: int):
+        """Удаляет строки старше timestamp, сдвигая оставшиеся в начало"""
+        start = int(np.searchsorted(self.timestamps, timestamp, side="left"))
+        if start == 0:
+            return
+        keep = self.length - start
+        self._ts[:keep] = self._ts[start:self.length]
+        self._ts[keep:self.length] = 0
+        for values in self._values.values():
+            values[:keep] = values[start:self.length]
+            values[keep:self.length] = 0
+        self.length = keep
+
+    def flush(self):
+        self._ts.flush()
+        for values in self._values.values():
+            values.flush()
+
+
+class BiometricSeriesStore:
+    """
+    Хранилище биометрии с уровнями детализации raw → 1 мин → 1 ч.
+
+    Сырые данные хранятся `raw_retention_seconds`, агрегаты - бессрочно.
+    Агрегаты дописываются, когда отсчет попадает в следующую корзину.
+    """
+
+    def __init__(self, directory: str = "data/biometrics", raw_retention_seconds: int = 24 * 3600):
+        self.directory = Path(directory)
+        self.raw_retention_seconds = raw_retention_seconds
+        self.tiers: Dict[str, ColumnarSeries] = {
+            tier: ColumnarSeries(self.directory, tier) for tier in TIERS
+        }
+        # Незакрытые корзины агрегатов: tier -> [начало, суммы, количества]
+        self._buckets: Dict[str, list] = {}
+        self._restore_buckets()
+
+    def _restore_buckets(self):
+        """Пересчитывает незакрытые корзины из хвоста сырых данных"""
+        raw = self.tiers["raw"]
+        for tier, resolution in TIERS.items():
+            if not resolution:
+                continue
+            last = self.tiers[tier].last_timestamp()
+            start_ts = last + resolution if last is not None else 0
+            ts = raw.timestamps[int(np.searchsorted(raw.timestamps, start_ts)):]
+            offset = raw.length - len(ts)
+            for i, timestamp in enumerate(ts):
+                row = np.array([raw.column(c)[offset + i] for c in COLUMNS], dtype=np.float32)
+                self._accumulate(tier, resolution, int(timestamp), row)
+
+    def _accumulate(self, tier: str, resolution: int, timestamp: int, row: np.ndarray):
+        bucket_start = timestamp - timestamp % resolution
+        bucket = self._buckets.get(tier)
+        if bucket is not None and bucket[0] != bucket_start:
+            self._close_bucket(tier)
+            bucket = None
+        if bucket is None:
+            bucket = [bucket_start, np.zeros(len(COLUMNS)), np.zeros(len(COLUMNS))]
+            self._buckets[tier] = bucket
+        present = ~np.isnan(row)
+        bucket[1][present] += row[present]
+        bucket[2][present] += 1
+
+    def _close_bucket(self, tier: str):
+        bucket_start, sums, counts = self._buckets.pop(tier)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        self.tiers[tier].append(bucket_start, means.astype(np.float32))
+
+    def append(self, biometrics) -> None:
+        """Добавляет отсчет BiometricData"""
+        timestamp = int((biometrics.timestamp or datetime.now(UTC)).timestamp())
+        row = np.array(
+            [np.nan if getattr(biometrics, column) is None else getattr(biometrics, column) for column in COLUMNS],
+            dtype=np.float32
+        )
+        raw = self.tiers["raw"]
+        last = raw.last_timestamp()
+        if last is not None and timestamp < last:
+            # Хранилище упорядочено по времени, запоздавшие отсчеты отбрасываем
+            logger.debug(f"Пропущен запоздавший отсчет биометрии: {timestamp} < {last}")
+            return
+        raw.append(timestamp, row)
+        for tier, resolution in TIERS.items():
+            if resolution:
+                self._accumulate(tier, resolution, timestamp, row)
+
+        # Компактируем сырые данные, когда они вдвое превышают срок хранения
+        oldest = int(raw.timestamps[0])
+        if timestamp - oldest > 2 * self.raw_retention_seconds:
+            raw.drop_before(timestamp - self.raw_retention_seconds)
+
+    def flush(self):
+        for series in self.tiers.values():
+            series.flush()
+
+    def __len__(self) -> int:
+        return self.tiers["raw"].length
+
+    def _tier_for(self, seconds: int) -> str:
+        if seconds <= min(2 * 3600, self.raw_retention_seconds):
+            return "raw"
+        if seconds <= 2 * 24 * 3600:
+            return "1min"
+        return "1h"
+
+    def window(self, column: str, seconds: int, now: Optional[int] = None,
+               tier: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Непустые значения колонки за последние `seconds` секунд.
+        
+        Без явного `tier` уровень выбирается по длине окна; если на нем еще
+        нет закрытых корзин, используется более детальный уровень.
+        """
+        candidates = [tier] if tier else list(TIERS)[:list(TIERS).index(self._tier_for(seconds)) + 1][::-1]
+        for candidate in candidates:
+            series = self.tiers[candidate]
+            end_ts = now if now is not None else series.last_timestamp()
+            if end_ts is None:
+                continue
+            ts, values = series.window(column, end_ts - seconds, end_ts)
+            present = ~np.isnan(values)
+            if present.any() or tier:
+                return ts[present], values[present]
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.float32)
+
+    def rolling_mean(self, column: str, seconds: int, points: int, tier: Optional[str] = None) -> np.ndarray:
+        """Скользящее среднее по `points` последним значениям окна"""
+        _, values = self.window(column, seconds, tier=tier)
+        if len(values) < points:
+            return np.empty(0, dtype=np.float64)
+        cumsum = np.cumsum(np.insert(values.astype(np.float64), 0, 0.0))
+        return (cumsum[points:] - cumsum[:-points]) / points
+
+    def slope(self, column: str, seconds: int, tier: Optional[str] = None) -> Optional[float]:
+        """Наклон линейного тренда за окно, в единицах в час"""
+        ts, values = self.window(column, seconds, tier=tier)
+        if len(values) < 2 or ts[-1] == ts[0]:
+            return None
+        hours = (ts.astype(np.float64) - float(ts[0])) / 3600.0
+        return float(np.polyfit(hours, values.astype(np.float64), 1)[0])
+
+    def anomaly_score(self, column: str, value: Optional[float], seconds: int = 24 * 3600,
+                      tier: Optional[str] = None) -> Optional[float]:
+        """Робастный z-score значения относительно окна (медиана и MAD)"""
+        if value is None:
+            return None
+        _, values = self.window(column, seconds, tier=tier)
+        if len(values) < 10:
+            return None
+        median = float(np.median(values))
+        mad = float(np.median(np.abs(values - median))) * 1.4826
+        if mad == 0 or math.isnan(mad):
+            return 0.0
+        return (float(value) - median) / mad
+
+    def trend(self, column: str, seconds: int, min_change: float,
+              rising: str = "increasing", falling: str = "decreasing") -> str:
+        """Классифицирует изменение за окно по наклону линейного тренда"""
+        slope = self.slope(column, seconds)
+        if slope is None:
+            return "insufficient_data"
+        change = slope * seconds / 3600.0
+        if change > min_change:
+            return rising
+        if change < -min_change:
+            return falling
+        return "stable"
+
+    def summary(self, seconds: int, tier: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """Среднее, минимум, максимум, последнее значение и количество по колонкам"""
+        result = {}
+        for column in COLUMNS:
+            _, values = self.window(column, seconds, tier=tier)
+            if len(values) == 0:
+                continue
+            result[column] = {
+                "mean": float(values.mean()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "last": float(values[-1]),
+                "count": int(len(values))
+            }
+        return result
@@ -7,13 +7,21 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Any, Optional, List
+import os
+import time
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Any, Optional, List, Tuple
 from datetime import datetime, UTC, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import aiohttp
 from enum import Enum
 
 from ..integrations.xiaomi_watch import XiaomiWatchAPI, BiometricData
+from ..config.environment import config
+from .biometric_store import BiometricSeriesStore
+from ..llm.client import LocalLLMClient
+from ..llm.local_server import ContextType as LLMContextType
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +45,7 @@ class BiometricContext:
     sleep_quality_trend: str
     activity_level_trend: str
     recommendations_needed: List[str]
+    anomaly_scores: Dict[str, float] = field(default_factory=dict)
 
 @dataclass
 class LLMInsight:
@@ -49,49 +58,163 @@ class LLMInsight:
     action_items: List[str]
     context: Dict[str, Any]
 
+class BiometricChangeDetector:
+    """
+    Предфильтр перед LLM: сводит контекст к дискретному состоянию.
+    
+    Показатели раскладываются по зонам с гистерезисом, чтобы колебания
+    около порога не считались сменой состояния. Для одинакового состояния
+    в пределах TTL повторно используется ранее полученный инсайт.
+    """
+    
+    def __init__(self, zone_rules: Dict[str, Tuple[List[float], float]],
+                 insight_ttl_seconds: float = 1800, max_cached: int = 32):
+        # Показатель -> (границы зон по возрастанию, ширина гистерезиса)
+        self.zone_rules = zone_rules
+        self.insight_ttl_seconds = insight_ttl_seconds
+        self.max_cached = max_cached
+        self._zones: Dict[str, Optional[int]] = {}
+        self._insights: "OrderedDict[tuple, Tuple[LLMInsight, float]]" = OrderedDict()
+    
+    def _zone(self, metric: str, value: Optional[float]) -> Optional[int]:
+        if value is None:
+            return self._zones.get(metric)
+        bounds, hysteresis = self.zone_rules[metric]
+        previous = self._zones.get(metric)
+        zone = bisect_right(bounds, value)
+        if previous is not None and zone > previous:
+            zone = max(previous, bisect_right(bounds, value - hysteresis))
+        elif previous is not None and zone < previous:
+            zone = min(previous, bisect_right(bounds, value + hysteresis))
+        self._zones[metric] = zone
+        return zone
+    
+    def signature(self, context: BiometricContext) -> tuple:
+        """Дискретное состояние контекста, значимое для LLM"""
+        zones = tuple(
+            self._zone(metric, getattr(context.biometrics, metric))
+            for metric in sorted(self.zone_rules)
+        )
+        return (
+            context.context_type.value,
+            zones,
+            context.stress_trend,
+            context.sleep_quality_trend,
+            context.activity_level_trend,
+            tuple(sorted(context.recommendations_needed)),
+        )
+    
+    def lookup(self, signature: tuple) -> Optional[LLMInsight]:
+        """Инсайт для такого же состояния, если он еще не устарел"""
+        cached = self._insights.get(signature)
+        if cached is None:
+            return None
+        insight, created_at = cached
+        if time.monotonic() - created_at > self.insight_ttl_seconds:
+            del self._insights[signature]
+            return None
+        self._insights.move_to_end(signature)
+        return insight
+    
+    def remember(self, signature: tuple, insight: LLMInsight):
+        self._insights[signature] = (insight, time.monotonic())
+        self._insights.move_to_end(signature)
+        while len(self._insights) > self.max_cached:
+            self._insights.popitem(last=False)
+
 class LLMWatchAnalyzer:
     """Анализатор данных часов через локальную LLM"""
     
-    def __init__(self, local_llm_url: str = "http://localhost:8000"):
+    def __init__(self, local_llm_url: str = "http://localhost:8000",
+                 biometric_store_dir: Optional[str] = None):
         self.watch_api = XiaomiWatchAPI()
         self.local_llm_url = local_llm_url
-        self.biometric_history: List[BiometricData] = []
-        self.insights_history: List[LLMInsight] = []
+        # Полная история хранится в biometric_store, в памяти - только последние записи
+        self.biometric_store_dir = biometric_store_dir or os.path.join(config.DATA_DIR, "biometrics")
+        self._biometric_store: Optional[BiometricSeriesStore] = None
+        self.biometric_history: Deque[BiometricData] = deque(maxlen=100)
+        self.insights_history: Deque[LLMInsight] = deque(maxlen=100)
         
         # Настройки для анализа
         self.stress_threshold = 70.0
         self.low_activity_threshold = 3000
         self.poor_sleep_threshold = 60.0
+        self.anomaly_threshold = 3.0
+        
+        # Окна трендов (секунды) и минимальные изменения за окно
+        self.stress_trend_window = 6 * 3600
+        self.sleep_trend_window = 7 * 24 * 3600
+        self.activity_trend_window = 24 * 3600
+        
+        # В LLM уходят только значимые смены состояния
+        self.change_detector = BiometricChangeDetector({
+            "heart_rate": ([60, 90, 110], 5),
+            "stress_level": ([40, self.stress_threshold], 5),
+            "steps": ([self.low_activity_threshold, 10000], 300),
+            "sleep_quality": ([self.poor_sleep_threshold, 80], 3),
+        })
+        self.llm_stats = {"llm_calls": 0, "llm_skipped": 0}
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    @property
+    def biometric_store(self) -> BiometricSeriesStore:
+        """Хранилище открывается при первом обращении, а не при импорте модуля"""
+        if self._biometric_store is None:
+            self._biometric_store = BiometricSeriesStore(self.biometric_store_dir)
+        return self._biometric_store
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия к локальной LLM"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+    
+    async def close(self):
+        """Закрывает HTTP-сессию и сбрасывает хранилище на диск"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        if self._biometric_store is not None:
+            self._biometric_store.flush()
         
     async def analyze_biometrics_with_llm(self, biometrics: BiometricData) -> LLMInsight:
         """Анализ биометрических данных через локальную LLM"""
         try:
+            self.record_biometrics(biometrics)
+            
             # Создаем контекст
             context = await self._create_biometric_context(biometrics)
             
+            # Без значимых изменений возвращаем действующий инсайт
+            signature = self.change_detector.signature(context)
+            cached_insight = self.change_detector.lookup(signature)
+            if cached_insight is not None:
+                self.llm_stats["llm_skipped"] += 1
+                return cached_insight
+            
             # Формируем промпт для LLM
             prompt = self._build_analysis_prompt(context)
             
             # Получаем анализ от локальной LLM
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.local_llm_url}/generate",
-                    json={
-                        "prompt": prompt,
-                        "context": context.context_type.value,
-                        "max_tokens": 800,
-                        "temperature": 0.7
-                    }
-                ) as response:
-                    result = await response.json()
-                    llm_response = result["response"]
+            self.llm_stats["llm_calls"] += 1
+            async with self._get_session().post(
+                f"{self.local_llm_url}/generate",
+                json={
+                    "prompt": prompt,
+                    "context": context.context_type.value,
+                    "max_tokens": 800,
+                    "temperature": 0.7
+                }
+            ) as response:
+                result = await response.json()
+                llm_response = result["response"]
             
             # Парсим ответ LLM
             insight = await self._parse_llm_response(llm_response, context)
+            if insight.insight_type != "fallback":
+                self.change_detector.remember(signature, insight)
             
             # Сохраняем в историю
             self.insights_history.append(insight)
-            self.biometric_history.append(biometrics)
             
             return insight
             
@@ -99,6 +222,14 @@ class LLMWatchAnalyzer:
             logger.error(f"Error analyzing biometrics with LLM: {e}")
             return self._create_fallback_insight(biometrics)
     
+    def record_biometrics(self, biometrics: BiometricData):
+        """Сохраняет отсчет биометрии в хранилище временных рядов"""
+        self.biometric_history.append(biometrics)
+        try:
+            self.biometric_store.append(biometrics)
+        except Exception as e:
+            logger.error(f"Error storing biometrics: {e}")
+    
     async def _create_biometric_context(self, biometrics: BiometricData) -> BiometricContext:
         """Создает контекст для анализа биометрических данных"""
         now = datetime.now()
@@ -128,6 +259,15 @@ class LLMWatchAnalyzer:
         if biometrics.sleep_quality and biometrics.sleep_quality < self.poor_sleep_threshold:
             recommendations_needed.append("sleep_improvement")
         
+        # Оцениваем отклонения от суточной нормы
+        anomaly_scores = {}
+        for column in ("heart_rate", "stress_level"):
+            score = self.biometric_store.anomaly_score(column, getattr(biometrics, column))
+            if score is not None:
+                anomaly_scores[column] = round(score, 2)
+        if any(abs(score) >= self.anomaly_threshold for score in anomaly_scores.values()):
+            recommendations_needed.append("anomaly_check")
+        
         return BiometricContext(
             context_type=context_type,
             biometrics=biometrics,
@@ -136,7 +276,8 @@ class LLMWatchAnalyzer:
             stress_trend=stress_trend,
             sleep_quality_trend=sleep_trend,
             activity_level_trend=activity_trend,
-            recommendations_needed=recommendations_needed
+            recommendations_needed=recommendations_needed,
+            anomaly_scores=anomaly_scores
         )
     
     def _build_analysis_prompt(self, context: BiometricContext) -> str:
@@ -161,6 +302,9 @@ class LLMWatchAnalyzer:
             f"- Сон: {context.sleep_quality_trend}",
             f"- Активность: {context.activity_level_trend}",
             "",
+            "ОТКЛОНЕНИЯ ОТ СУТОЧНОЙ НОРМЫ (z-score):",
+            ", ".join(f"{name}: {score}" for name, score in context.anomaly_scores.items()) or "нет данных",
+            "",
             "ПОТРЕБНОСТИ В РЕКОМЕНДАЦИЯХ:",
             ", ".join(context.recommendations_needed) if context.recommendations_needed else "общие рекомендации",
             "",
@@ -224,51 +368,17 @@ class LLMWatchAnalyzer:
     
     async def _analyze_stress_trend(self) -> str:
         """Анализирует тренд стресса"""
-        if len(self.biometric_history) < 3:
-            return "insufficient_data"
-        
-        recent_stress = [b.stress_level for b in self.biometric_history[-3:] if b.stress_level]
-        if len(recent_stress) < 2:
-            return "insufficient_data"
-        
-        if recent_stress[-1] > recent_stress[0] + 10:
-            return "increasing"
-        elif recent_stress[-1] < recent_stress[0] - 10:
-            return "decreasing"
-        else:
-            return "stable"
+        return self.biometric_store.trend("stress_level", self.stress_trend_window, 10)
     
     async def _analyze_sleep_trend(self) -> str:
         """Анализирует тренд качества сна"""
-        if len(self.biometric_history) < 3:
-            return "insufficient_data"
-        
-        recent_sleep = [b.sleep_quality for b in self.biometric_history[-3:] if b.sleep_quality]
-        if len(recent_sleep) < 2:
-            return "insufficient_data"
-        
-        if recent_sleep[-1] > recent_sleep[0] + 10:
-            return "improving"
-        elif recent_sleep[-1] < recent_sleep[0] - 10:
-            return "declining"
-        else:
-            return "stable"
+        return self.biometric_store.trend(
+            "sleep_quality", self.sleep_trend_window, 10, rising="improving", falling="declining"
+        )
     
     async def _analyze_activity_trend(self) -> str:
         """Анализирует тренд активности"""
-        if len(self.biometric_history) < 3:
-            return "insufficient_data"
-        
-        recent_steps = [b.steps for b in self.biometric_history[-3:] if b.steps]
-        if len(recent_steps) < 2:
-            return "insufficient_data"
-        
-        if recent_steps[-1] > recent_steps[0] + 1000:
-            return "increasing"
-        elif recent_steps[-1] < recent_steps[0] - 1000:
-            return "decreasing"
-        else:
-            return "stable"
+        return self.biometric_store.trend("steps", self.activity_trend_window, 1000)
     
     async def get_smart_notification_with_llm(self) -> str:
         """Генерирует умное уведомление с помощью локальной LLM"""
@@ -293,85 +403,87 @@ class LLMWatchAnalyzer:
             logger.error(f"Error generating smart notification: {e}")
             return "Добрый день! Как дела?"
     
+    async def stream_voice_command_with_context(self, voice_text: str) -> AsyncIterator[str]:
+        """Отдает ответ на голосовую команду по мере генерации"""
+        # Получаем биометрические данные
+        biometrics = await self.watch_api.get_current_biometrics()
+        
+        # Формируем промпт с контекстом
+        prompt = f"""
+        Ты персональный ассистент. Обработай голосовую команду с учетом биометрического контекста.
+        
+        КОМАНДА: {voice_text}
+        
+        БИОМЕТРИЧЕСКИЙ КОНТЕКСТ:
+        - Пульс: {biometrics.heart_rate} уд/мин
+        - Стресс: {biometrics.stress_level}%
+        - Активность: {biometrics.steps} шагов
+        - Время: {datetime.now().strftime('%H:%M')}
+        
+        Дай полезный и контекстный ответ на команду пользователя.
+        """
+        
+        # Токены локальной LLM уходят дальше сразу, без ожидания всего ответа
+        client = LocalLLMClient(self.local_llm_url, session=self._get_session())
+        async for token in client.generate_stream(prompt, context=LLMContextType.HOME,
+                                                  max_tokens=400, temperature=0.7):
+            yield token
+    
     async def handle_voice_command_with_context(self, voice_text: str) -> str:
         """Обрабатывает голосовую команду с контекстом биометрии"""
+        tokens: List[str] = []
         try:
-            # Получаем биометрические данные
-            biometrics = await self.watch_api.get_current_biometrics()
-            
-            # Формируем промпт с контекстом
-            prompt = f"""
-            Ты персональный ассистент. Обработай голосовую команду с учетом биометрического контекста.
-            
-            КОМАНДА: {voice_text}
-            
-            БИОМЕТРИЧЕСКИЙ КОНТЕКСТ:
-            - Пульс: {biometrics.heart_rate} уд/мин
-            - Стресс: {biometrics.stress_level}%
-            - Активность: {biometrics.steps} шагов
-            - Время: {datetime.now().strftime('%H:%M')}
-            
-            Дай полезный и контекстный ответ на команду пользователя.
-            """
-            
-            # Получаем ответ от локальной LLM
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.local_llm_url}/generate",
-                    json={
-                        "prompt": prompt,
-                        "context": "voice_command",
-                        "max_tokens": 400,
-                        "temperature": 0.7
-                    }
-                ) as response:
-                    result = await response.json()
-                    return result["response"]
+            async for token in self.stream_voice_command_with_context(voice_text):
+                tokens.append(token)
+            return "".join(tokens).strip()
                     
         except Exception as e:
             logger.error(f"Error handling voice command: {e}")
+            if tokens:
+                return "".join(tokens).strip()
             return f"Обработал команду: {voice_text}. Что-то пошло не так с анализом."
     
     async def get_weekly_insights(self) -> List[LLMInsight]:
         """Получает недельные инсайты на основе биометрических данных"""
         try:
-            # Собираем данные за неделю
-            weekly_data = self.biometric_history[-7:] if len(self.biometric_history) >= 7 else self.biometric_history
-            
-            if not weekly_data:
+            # Собираем сводку за неделю из хранилища временных рядов
+            week_seconds = 7 * 24 * 3600
+            summary = self.biometric_store.summary(week_seconds)
+            if not summary.get("heart_rate") or not summary.get("stress_level"):
                 return []
             
-            # Создаем сводку недели
-            avg_heart_rate = sum(b.heart_rate for b in weekly_data if b.heart_rate) / len([b for b in weekly_data if b.heart_rate])
-            avg_stress = sum(b.stress_level for b in weekly_data if b.stress_level) / len([b for b in weekly_data if b.stress_level])
-            total_steps = sum(b.steps for b in weekly_data if b.steps)
+            avg_heart_rate = summary["heart_rate"]["mean"]
+            avg_stress = summary["stress_level"]["mean"]
+            max_steps = summary.get("steps", {}).get("max", 0)
+            stress_slope = self.biometric_store.slope("stress_level", week_seconds) or 0.0
+            heart_rate_slope = self.biometric_store.slope("heart_rate", week_seconds) or 0.0
+            _, hourly_steps = self.biometric_store.window("steps", week_seconds, tier="1h")
             
             # Формируем промпт для недельного анализа
             prompt = f"""
             Проанализируй недельные биометрические данные и дай персональные инсайты.
             
             НЕДЕЛЬНЫЕ ДАННЫЕ:
-            - Средний пульс: {avg_heart_rate:.1f} уд/мин
-            - Средний стресс: {avg_stress:.1f}%
-            - Общие шаги: {total_steps}
-            - Количество дней с данными: {len(weekly_data)}
+            - Средний пульс: {avg_heart_rate:.1f} уд/мин (тренд {heart_rate_slope * 24:+.1f} в сутки)
+            - Средний стресс: {avg_stress:.1f}% (тренд {stress_slope * 24:+.1f} в сутки)
+            - Максимум шагов за день: {max_steps:.0f}
+            - Часов с данными: {len(hourly_steps)}
             
             Дай 3-5 ключевых инсайта для улучшения здоровья и продуктивности.
             """
             
             # Получаем анализ от LLM
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.local_llm_url}/generate",
-                    json={
-                        "prompt": prompt,
-                        "context": "weekly_analysis",
-                        "max_tokens": 1000,
-                        "temperature": 0.7
-                    }
-                ) as response:
-                    result = await response.json()
-                    llm_response = result["response"]
+            async with self._get_session().post(
+                f"{self.local_llm_url}/generate",
+                json={
+                    "prompt": prompt,
+                    "context": "weekly_analysis",
+                    "max_tokens": 1000,
+                    "temperature": 0.7
+                }
+            ) as response:
+                result = await response.json()
+                llm_response = result["response"]
             
             # Парсим недельные инсайты
             insights = await self._parse_weekly_insights(llm_response)
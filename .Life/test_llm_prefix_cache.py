@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Тест кэша префиксов LocalLLMServer: промпт следующего хода сессии
+продолжает токены состояния, сохраненного после предыдущего хода
+"""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.append(str(Path(__file__).parent))
+
+from src.llm import local_server
+from src.llm.local_server import GenerateRequest, LocalLLMServer, ModelType
+
+
+class FakeLlama:
+    """llama_cpp.Llama с побайтовой токенизацией и KV-кэшем в виде списка токенов"""
+
+    def __init__(self):
+        self.tokens = []
+        self.prompts = []
+        self.turn = 0
+
+    def tokenize(self, text: bytes):
+        return list(text)
+
+    def reset(self):
+        self.tokens = []
+
+    def eval(self, tokens):
+        self.tokens = self.tokens + list(tokens)
+
+    def save_state(self):
+        return SimpleNamespace(tokens=list(self.tokens), llama_state_size=len(self.tokens))
+
+    def load_state(self, state):
+        self.tokens = list(state.tokens)
+
+    def __call__(self, prompt, stream=False, **kwargs):
+        self.turn += 1
+        self.prompts.append(self.tokenize(prompt.encode("utf-8")))
+        text = f" ответ {self.turn}\n"
+        # После генерации в KV-кэше промпт и сгенерированные токены
+        self.tokens = self.prompts[-1] + self.tokenize(text.encode("utf-8"))
+        if stream:
+            return ({"choices": [{"text": word}]} for word in text.split(" ") if word)
+        return {"choices": [{"text": text}]}
+
+
+def make_server():
+    server = LocalLLMServer(prefix_cache_bytes=10 ** 9)
+    server.models = {ModelType.DEFAULT: FakeLlama()}
+    server._loaded_prefix = {}
+    server._warm_prefix_cache()
+    return server, server.models[ModelType.DEFAULT]
+
+
+def ask(server, text):
+    request = GenerateRequest(prompt=text, session_id="s1")
+    return asyncio.run(server.generate_response(request))
+
+
+def session_state(server):
+    return server.prefix_cache._entries.get((ModelType.DEFAULT, "session:s1"))
+
+
+def test_next_turn_prompt_starts_with_saved_state_tokens():
+    server, model = make_server()
+
+    ask(server, "вопрос 0")
+    for turn in range(1, local_server.PROMPT_HISTORY_MAX_TURNS):
+        saved = session_state(server).tokens
+        ask(server, f"вопрос {turn}")
+        assert model.prompts[-1][:len(saved)] == saved
+        assert len(model.prompts[-1]) > len(saved)
+
+
+def test_history_window_is_truncated_in_one_block_and_rewarmed():
+    server, model = make_server()
+
+    for turn in range(local_server.PROMPT_HISTORY_MAX_TURNS + 1):
+        ask(server, f"вопрос {turn}")
+
+    # Окно обрезано блоком, устаревшее состояние сессии выброшено из кэша
+    assert len(server.sessions["s1"]["prompt_turns"]) == local_server.PROMPT_HISTORY_KEEP_TURNS
+    assert session_state(server) is None
+
+    # Следующий ход начинается с системного префикса и снова сохраняет состояние
+    ask(server, "после обрезки")
+    system_prefix = server.prefix_cache._entries[(ModelType.DEFAULT, "home")].tokens
+    assert model.prompts[-1][:len(system_prefix)] == system_prefix
+    saved = session_state(server).tokens
+    ask(server, "еще вопрос")
+    assert model.prompts[-1][:len(saved)] == saved
@@ -183,7 +183,7 @@ class TestLLMWatchIntegration:
                     steps=8000 + i * 200,
                     calories=400 + i * 20
                 )
-                self.llm_analyzer.biometric_history.append(biometrics)
+                self.llm_analyzer.record_biometrics(biometrics)
             
             # Получаем недельные инсайты
             weekly_insights = await self.llm_analyzer.get_weekly_insights()
@@ -33,6 +33,7 @@ class ReportConfig:
     max_time_per_report: float = 24.0  # часов
     auto_save_interval: int = 300  # секунд
     backup_enabled: bool = True
+    directory_refresh_interval: int = 300  # секунд, кэш проектов и задач
 
 class DesignerBotConfig:
     """Основная конфигурация бота"""
@@ -9,12 +9,21 @@ import json
 import time
 import asyncio
 import aiohttp
+import threading
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, Optional, Any
 from dataclasses import dataclass, asdict
 import logging
 from pathlib import Path
 
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: блокировка только внутри процесса
+    FCNTL_AVAILABLE = False
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -39,6 +48,192 @@ class CostLimits:
     request_limit: float = 0.1  # $0.1 за запрос
     warning_threshold: float = 0.8  # 80% от лимита
 
+class CostLedger:
+    """
+    Журнал затрат: append-only JSONL + снимок агрегатов.
+    
+    Каждая запись обновляет итоги и почасовые/подневные корзины за O(1).
+    Запись идет под файловой блокировкой, перед ней дочитываются строки
+    других процессов, поэтому несколько ботов видят общие суммы.
+    Сжатие: агрегаты пишутся в снимок (атомарная замена), журнал
+    начинается заново в файле следующего поколения.
+    """
+    
+    def __init__(self, directory: Path = Path("."), name: str = "deepseek_costs",
+                 compact_every: int = 1000, hourly_keep: int = 48, daily_keep: int = 90):
+        self.directory = Path(directory)
+        self.name = name
+        self.compact_every = compact_every
+        self.hourly_keep = hourly_keep
+        self.daily_keep = daily_keep
+        self.snapshot_file = self.directory / f"{name}.snapshot.json"
+        self.lock_file = self.directory / f"{name}.lock"
+        self._thread_lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
+        self.totals = {"cost": 0.0, "requests": 0, "successful": 0, "failed": 0}
+        self.hourly: Dict[str, float] = {}  # "YYYY-MM-DDTHH" -> $
+        self.daily: Dict[str, float] = {}  # "YYYY-MM-DD" -> $
+        self.generation = 0
+        self.offset = 0
+        self.ledger_lines = 0
+        self._snapshot_mtime = None
+    
+    def ledger_path(self, generation: Optional[int] = None) -> Path:
+        return self.directory / f"{self.name}.{self.generation if generation is None else generation}.jsonl"
+    
+    @contextmanager
+    def _lock(self):
+        """Блокировка журнала: между потоками и (где есть fcntl) между процессами"""
+        with self._thread_lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_file, 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+    
+    def _apply(self, record: Dict):
+        """O(1): итоги и корзины часа/дня по префиксу timestamp"""
+        cost = record.get("cost", 0.0)
+        timestamp = record.get("timestamp", "")
+        self.totals["cost"] += cost
+        self.totals["requests"] += 1
+        self.totals["successful" if record.get("success") else "failed"] += 1
+        
+        hour_key, day_key = timestamp[:13], timestamp[:10]
+        if hour_key not in self.hourly:
+            self.hourly[hour_key] = 0.0
+            # Новая корзина - выбрасываем самые старые (амортизированно O(1))
+            while len(self.hourly) > self.hourly_keep:
+                del self.hourly[min(self.hourly)]
+        self.hourly[hour_key] += cost
+        if day_key not in self.daily:
+            self.daily[day_key] = 0.0
+            while len(self.daily) > self.daily_keep:
+                del self.daily[min(self.daily)]
+        self.daily[day_key] += cost
+    
+    def _load_snapshot(self):
+        self._reset()
+        try:
+            stat = self.snapshot_file.stat()
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        self.totals = snapshot["totals"]
+        self.hourly = snapshot["hourly"]
+        self.daily = snapshot["daily"]
+        self.generation = snapshot["generation"]
+        self._snapshot_mtime = stat.st_mtime_ns
+        
+        # Журнал прошлого поколения уже учтен в снимке (остался после сбоя)
+        stale = self.ledger_path(self.generation - 1)
+        if stale.exists():
+            stale.unlink()
+    
+    def _snapshot_changed(self) -> bool:
+        try:
+            return self.snapshot_file.stat().st_mtime_ns != self._snapshot_mtime
+        except FileNotFoundError:
+            return self._snapshot_mtime is not None
+    
+    def _catch_up(self, truncate_partial: bool = False):
+        """Дочитывает записи журнала после self.offset (в том числе чужие)"""
+        path = self.ledger_path()
+        try:
+            with open(path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+                self.ledger_lines += 1
+            except ValueError:
+                logger.error("Пропущена поврежденная строка журнала затрат")
+        self.offset += end
+        
+        if truncate_partial and end < len(data):
+            # Оборванная строка упавшего процесса: пишем поверх нее
+            os.truncate(path, self.offset)
+    
+    def sync(self):
+        """Подтянуть изменения других процессов"""
+        with self._lock():
+            self._sync_locked()
+    
+    def _sync_locked(self, truncate_partial: bool = False):
+        if self._snapshot_changed():
+            self._load_snapshot()
+        self._catch_up(truncate_partial)
+    
+    def append(self, record: Dict):
+        with self._lock():
+            self._sync_locked(truncate_partial=True)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+            fd = os.open(self.ledger_path(), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self.offset += len(line)
+            self.ledger_lines += 1
+            self._apply(record)
+            
+            if self.ledger_lines >= self.compact_every:
+                self._compact_locked()
+    
+    def compact(self):
+        with self._lock():
+            self._sync_locked()
+            self._compact_locked()
+    
+    def _compact_locked(self):
+        """Снимок агрегатов + новое поколение журнала (без двойного учета при сбое)"""
+        old_ledger = self.ledger_path()
+        new_generation = self.generation + 1
+        self.ledger_path(new_generation).touch()
+        
+        tmp_file = self.snapshot_file.with_name(self.snapshot_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "generation": new_generation,
+                "totals": self.totals,
+                "hourly": self.hourly,
+                "daily": self.daily,
+                "compacted_at": datetime.now().isoformat()
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        # Точка фиксации: до нее действует старый снимок и старый журнал
+        os.replace(tmp_file, self.snapshot_file)
+        
+        self.generation = new_generation
+        self.offset = 0
+        self.ledger_lines = 0
+        self._snapshot_mtime = self.snapshot_file.stat().st_mtime_ns
+        try:
+            old_ledger.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def hour_cost(self, moment: datetime) -> float:
+        return self.hourly.get(moment.strftime("%Y-%m-%dT%H"), 0.0)
+    
+    def day_cost(self, moment: datetime) -> float:
+        return self.daily.get(moment.strftime("%Y-%m-%d"), 0.0)
+
 class DeepSeekCostMonitor:
     """Монитор затрат для DeepSeek API"""
     
@@ -47,8 +242,13 @@ class DeepSeekCostMonitor:
         self.costs_file = Path("costs_history.json")
         self.limits = CostLimits()
         
-        # Загружаем историю затрат
-        self.cost_history: List[CostRecord] = self._load_cost_history()
+        # Журнал затрат с агрегатами
+        self.ledger = CostLedger(self.costs_file.parent)
+        self.ledger.sync()
+        self._import_legacy_history()
+        
+        # Последние записи этого процесса
+        self.cost_history: deque = deque(maxlen=100)
         
         # Статистика
         self.stats = {
@@ -65,48 +265,43 @@ class DeepSeekCostMonitor:
         
         logger.info(f"💰 Монитор затрат инициализирован. Лимит: ${self.limits.daily_limit}/день")
     
-    def _load_cost_history(self) -> List[CostRecord]:
-        """Загрузка истории затрат"""
-        if self.costs_file.exists():
-            try:
-                with open(self.costs_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return [CostRecord(**record) for record in data]
-            except Exception as e:
-                logger.error(f"Ошибка загрузки истории затрат: {e}")
-        return []
-    
-    def _save_cost_history(self):
-        """Сохранение истории затрат"""
+    def _import_legacy_history(self):
+        """Однократный перенос старого costs_history.json в журнал"""
+        if self.ledger.totals["requests"] or not self.costs_file.exists():
+            return
         try:
-            with open(self.costs_file, 'w', encoding='utf-8') as f:
-                json.dump([asdict(record) for record in self.cost_history], f, indent=2, ensure_ascii=False)
+            with open(self.costs_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self.ledger._lock():
+                self.ledger._sync_locked()
+                if self.ledger.totals["requests"]:
+                    return
+                for record in data:
+                    self.ledger._apply(record)
+                self.ledger._compact_locked()
+            self.costs_file.rename(self.costs_file.with_suffix(".json.imported"))
+            logger.info(f"📦 Перенесено записей затрат в журнал: {len(data)}")
         except Exception as e:
-            logger.error(f"Ошибка сохранения истории затрат: {e}")
+            logger.error(f"Ошибка загрузки истории затрат: {e}")
     
     def _update_stats(self):
-        """Обновление статистики"""
+        """Обновление статистики (O(1) по агрегатам журнала)"""
         now = datetime.now()
-        today = now.date()
-        current_hour = now.replace(minute=0, second=0, microsecond=0)
-        
-        # Фильтруем записи по времени
-        today_costs = [c for c in self.cost_history if datetime.fromisoformat(c.timestamp).date() == today]
-        hour_costs = [c for c in self.cost_history if datetime.fromisoformat(c.timestamp) >= current_hour]
+        totals = self.ledger.totals
         
-        # Обновляем статистику
-        self.stats["total_cost"] = sum(c.cost for c in self.cost_history)
-        self.stats["total_requests"] = len(self.cost_history)
-        self.stats["successful_requests"] = len([c for c in self.cost_history if c.success])
-        self.stats["failed_requests"] = len([c for c in self.cost_history if not c.success])
-        self.stats["daily_cost"] = sum(c.cost for c in today_costs)
-        self.stats["hourly_cost"] = sum(c.cost for c in hour_costs)
+        self.stats["total_cost"] = totals["cost"]
+        self.stats["total_requests"] = totals["requests"]
+        self.stats["successful_requests"] = totals["successful"]
+        self.stats["failed_requests"] = totals["failed"]
+        # Корзины текущего часа/дня: на границе автоматически начинаются с нуля
+        self.stats["daily_cost"] = self.ledger.day_cost(now)
+        self.stats["hourly_cost"] = self.ledger.hour_cost(now)
     
     def add_cost_record(self, record: CostRecord):
         """Добавление записи о затратах"""
         self.cost_history.append(record)
+        self.ledger.append(asdict(record))
         self._update_stats()
-        self._save_cost_history()
         
         # Проверяем лимиты
         self._check_limits()
@@ -134,6 +329,8 @@ class DeepSeekCostMonitor:
     
     def get_cost_summary(self) -> Dict[str, Any]:
         """Получение сводки затрат"""
+        self.ledger.sync()
+        self._update_stats()
         return {
             "total_cost": self.stats["total_cost"],
             "daily_cost": self.stats["daily_cost"],
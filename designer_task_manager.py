@@ -1,8 +1,12 @@
 import os
 import sys
+import time
 import requests
-from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
 from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,19 +18,178 @@ TEAMS_DB_ID = os.getenv("NOTION_TEAMS_DB_ID")
 if not NOTION_TOKEN or not TASKS_DB_ID:
     raise RuntimeError("NOTION_TOKEN и NOTION_TASKS_DB_ID должны быть заданы в переменных окружения")
 
+TODO_STATUSES = {"to do", "todo", "не начата"}
+IN_PROGRESS_STATUSES = {"in progress", "в работе"}
+DONE_STATUSES = {"done", "выполнена", "завершена"}
+
+def _status_group(status: str) -> str:
+    status = status.lower()
+    if status in TODO_STATUSES:
+        return "todo"
+    if status in IN_PROGRESS_STATUSES:
+        return "in_progress"
+    if status in DONE_STATUSES:
+        return "done"
+    return "other"
+
+def _parse_deadline(value: str) -> Optional[date]:
+    try:
+        return datetime.fromisoformat(value.split("T")[0]).date() if value else None
+    except ValueError:
+        return None
+
+@dataclass
+class Designer:
+    """Дизайнер из базы команды"""
+    id: str
+    name: str
+
+@dataclass
+class TaskInfo:
+    """Задача; поля разбираются один раз при загрузке"""
+    id: str
+    title: str
+    status: str
+    group: str  # todo, in_progress, done, other
+    assignees: List[str]
+    deadline: str
+    deadline_date: Optional[date]
+    priority: str
+    designer_ids: List[str] = field(default_factory=list)
+
+    @property
+    def is_open(self) -> bool:
+        return self.group != "done"
+
+class WorkloadModel:
+    """
+    Задачи и дизайнеры в памяти с агрегатами для всех экранов меню.
+
+    Агрегаты (ToDo по дизайнерам и исполнителям, счетчики статусов,
+    отсортированные дедлайны открытых задач) обновляются при каждом
+    upsert/remove задачи, поэтому экраны не перебирают все задачи.
+    """
+
+    def __init__(self):
+        self.designers: Dict[str, Designer] = {}
+        self.tasks: Dict[str, TaskInfo] = {}
+        self._designer_by_name: Dict[str, str] = {}
+        self._reset_aggregates()
+
+    def _reset_aggregates(self):
+        self.todo_by_designer: Dict[str, Dict[str, TaskInfo]] = defaultdict(dict)
+        self.todo_by_assignee: Dict[str, Dict[str, TaskInfo]] = defaultdict(dict)
+        self.todo_unassigned: Dict[str, TaskInfo] = {}
+        self.todo_total = 0
+        self.stats_by_designer: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"todo": 0, "in_progress": 0, "done": 0, "total": 0}
+        )
+        self.open_deadlines_by_designer: Dict[str, List[Tuple[date, str]]] = defaultdict(list)
+        self.open_deadlines: List[Tuple[date, str]] = []
+
+    def set_designers(self, designers: List[Designer]):
+        """Новый состав дизайнеров: привязки задач и агрегаты пересчитываются"""
+        self.designers = {designer.id: designer for designer in designers}
+        self._designer_by_name = {}
+        for designer in designers:
+            self._designer_by_name.setdefault(designer.name.lower(), designer.id)
+        tasks = list(self.tasks.values())
+        self.tasks = {}
+        self._reset_aggregates()
+        for task in tasks:
+            self.upsert(task)
+
+    def _apply(self, task: TaskInfo, sign: int):
+        if task.group == "todo":
+            self.todo_total += sign
+            if not task.assignees:
+                self._toggle(self.todo_unassigned, task, sign)
+            for name in task.assignees:
+                self._toggle(self.todo_by_assignee[name], task, sign)
+            for designer_id in task.designer_ids:
+                self._toggle(self.todo_by_designer[designer_id], task, sign)
+
+        for designer_id in task.designer_ids:
+            stats = self.stats_by_designer[designer_id]
+            stats["total"] += sign
+            if task.group in stats:
+                stats[task.group] += sign
+
+        if task.deadline_date and task.is_open:
+            key = (task.deadline_date, task.id)
+            lists = [self.open_deadlines] + [self.open_deadlines_by_designer[d] for d in task.designer_ids]
+            for deadlines in lists:
+                if sign > 0:
+                    insort(deadlines, key)
+                else:
+                    index = bisect_left(deadlines, key)
+                    if index < len(deadlines) and deadlines[index] == key:
+                        deadlines.pop(index)
+
+    @staticmethod
+    def _toggle(bucket: Dict[str, TaskInfo], task: TaskInfo, sign: int):
+        if sign > 0:
+            bucket[task.id] = task
+        else:
+            bucket.pop(task.id, None)
+
+    def upsert(self, task: TaskInfo):
+        old = self.tasks.get(task.id)
+        if old:
+            self._apply(old, -1)
+        ids = []
+        for name in task.assignees:
+            designer_id = self._designer_by_name.get(name.lower())
+            if designer_id and designer_id not in ids:
+                ids.append(designer_id)
+        task.designer_ids = ids
+        self.tasks[task.id] = task
+        self._apply(task, +1)
+
+    def remove(self, task_id: str):
+        old = self.tasks.pop(task_id, None)
+        if old:
+            self._apply(old, -1)
+
+    def todo_assigned(self) -> int:
+        return self.todo_total - len(self.todo_unassigned)
+
+    def workload(self) -> Dict[str, int]:
+        """Число задач ToDo по дизайнерам (id -> количество)"""
+        return {designer_id: len(self.todo_by_designer.get(designer_id, {})) for designer_id in self.designers}
+
+    def overdue_count(self, today: Optional[date] = None, designer_id: Optional[str] = None) -> int:
+        today = today or date.today()
+        deadlines = self.open_deadlines if designer_id is None else self.open_deadlines_by_designer.get(designer_id, [])
+        return bisect_left(deadlines, (today, ""))
+
 class DesignerTaskManager:
     """Главный менеджер задач дизайнеров"""
     
-    def __init__(self):
+    def __init__(self, refresh_interval: float = 60.0):
         self.headers = {
             "Authorization": f"Bearer {NOTION_TOKEN}",
             "Notion-Version": "2022-06-28",
             "Content-Type": "application/json"
         }
-        self.designers = {}
-        self.tasks = {}
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.model = WorkloadModel()
+        self.refresh_interval = refresh_interval  # не чаще - инкрементальное обновление
+        self.full_refresh_interval = timedelta(hours=1)  # полная загрузка (удаленные задачи)
+        self._last_edited_cursor: Optional[str] = None
+        self._last_refresh = 0.0
+        self._last_full_refresh: Optional[datetime] = None
         self.week_start = datetime.now().date() - timedelta(days=datetime.now().weekday())
         self.week_end = self.week_start + timedelta(days=6)
+    
+    @property
+    def designers(self) -> Dict[str, Designer]:
+        return self.model.designers
+    
+    @property
+    def tasks(self) -> Dict[str, TaskInfo]:
+        return self.model.tasks
         
     def show_menu(self):
         """Показываем главное меню"""
@@ -49,28 +212,19 @@ class DesignerTaskManager:
         print("\n⚡ БЫСТРЫЙ ОБЗОР")
         print("=" * 40)
         
-        # Загружаем данные
-        self.load_designers()
-        self.load_tasks()
-        
-        # Анализируем
-        todo_tasks = [t for t in self.tasks.values() if t["status"].lower() in ["to do", "todo", "не начата"]]
-        assigned_tasks = [t for t in todo_tasks if t["assignees"]]
+        self.load_data()
+        model = self.model
+        unassigned = len(model.todo_unassigned)
         
         print(f"📊 СТАТИСТИКА:")
         print(f"   • Дизайнеров: {len(self.designers)}")
-        print(f"   • Задач ToDo: {len(todo_tasks)}")
-        print(f"   • С исполнителями: {len(assigned_tasks)}")
-        print(f"   • Без исполнителей: {len(todo_tasks) - len(assigned_tasks)}")
+        print(f"   • Задач ToDo: {model.todo_total}")
+        print(f"   • С исполнителями: {model.todo_assigned()}")
+        print(f"   • Без исполнителей: {unassigned}")
+        print(f"   • Просрочено: {model.overdue_count()}")
         
         # Нагрузка по дизайнерам
-        workload = defaultdict(int)
-        for task in assigned_tasks:
-            for assignee in task["assignees"]:
-                for designer in self.designers.values():
-                    if designer["name"].lower() == assignee.lower():
-                        workload[designer["name"]] += 1
-                        break
+        workload = {self.designers[d].name: count for d, count in model.workload().items() if count}
         
         if workload:
             print(f"\n👥 НАГРУЗКА:")
@@ -79,8 +233,8 @@ class DesignerTaskManager:
         
         # Проблемы
         issues = []
-        if len(todo_tasks) - len(assigned_tasks) > 0:
-            issues.append(f"❌ {len(todo_tasks) - len(assigned_tasks)} задач без исполнителя")
+        if unassigned > 0:
+            issues.append(f"❌ {unassigned} задач без исполнителя")
         
         if workload:
             max_load = max(workload.values())
@@ -95,37 +249,61 @@ class DesignerTaskManager:
         else:
             print(f"\n✅ Все в порядке!")
     
-    def load_designers(self):
-        """Загружаем дизайнеров"""
-        if self.designers:  # Уже загружены
-            return
-            
-        print("👥 Загружаем дизайнеров...")
-        url = f"https://api.notion.com/v1/databases/{TEAMS_DB_ID}/query"
-        
+    def _query_all(self, database_id: str, payload: Optional[Dict] = None) -> List[Dict]:
+        """Постраничный запрос к базе"""
+        url = f"https://api.notion.com/v1/databases/{database_id}/query"
+        payload = dict(payload or {}, page_size=100)
         results = []
-        payload = {}
         while True:
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self.session.post(url, json=payload)
             data = response.json()
+            if response.status_code != 200:
+                raise Exception(f"API error: {response.status_code} - {data.get('message', '')}")
             results.extend(data.get('results', []))
             if not data.get('has_more'):
-                break
-            payload = {"start_cursor": data.get('next_cursor')}
+                return results
+            payload["start_cursor"] = data.get('next_cursor')
+    
+    def load_data(self, force_full: bool = False):
+        """
+        Загружаем дизайнеров и задачи в модель.
+        
+        Первая загрузка и раз в full_refresh_interval - полные, иначе
+        запрашиваются только задачи, измененные с прошлого раза.
+        """
+        if not force_full and self.model.tasks and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        
+        now = datetime.now()
+        full = force_full or self._last_edited_cursor is None or \
+            self._last_full_refresh is None or now - self._last_full_refresh >= self.full_refresh_interval
+        
+        if full:
+            self.load_designers()
+        self.load_tasks(full)
+        self._last_refresh = time.monotonic()
+        if full:
+            self._last_full_refresh = now
+    
+    def load_designers(self):
+        """Загружаем дизайнеров"""
+        print("👥 Загружаем дизайнеров...")
+        results = self._query_all(TEAMS_DB_ID) if TEAMS_DB_ID else []
         
+        designers = []
         for emp in results:
             props = emp.get("properties", {})
             name = None
-            for field in ["Name", "Имя", "ФИО", "Title"]:
-                if field in props and props[field].get("title"):
-                    name = props[field]["title"][0]["plain_text"]
+            for prop_name in ["Name", "Имя", "ФИО", "Title"]:
+                if prop_name in props and props[prop_name].get("title"):
+                    name = props[prop_name]["title"][0]["plain_text"]
                     break
             
             # Проверяем, является ли дизайнером
             is_designer = False
-            for field in ["Должность", "Position", "Роль"]:
-                if field in props:
-                    role_obj = props[field]
+            for prop_name in ["Должность", "Position", "Роль"]:
+                if prop_name in props:
+                    role_obj = props[prop_name]
                     if role_obj.get("select") and "дизайн" in role_obj["select"]["name"].lower():
                         is_designer = True
                         break
@@ -136,52 +314,54 @@ class DesignerTaskManager:
                             break
             
             if name and is_designer:
-                self.designers[emp["id"]] = {
-                    "name": name,
-                    "id": emp["id"],
-                    "tasks_count": 0,
-                    "tasks": []
-                }
+                designers.append(Designer(id=emp["id"], name=name))
         
+        self.model.set_designers(designers)
         print(f"✅ Загружено {len(self.designers)} дизайнеров")
     
-    def load_tasks(self):
-        """Загружаем задачи"""
-        if self.tasks:  # Уже загружены
-            return
-            
-        print("📋 Загружаем задачи...")
-        url = f"https://api.notion.com/v1/databases/{TASKS_DB_ID}/query"
-        
-        results = []
-        payload = {}
-        while True:
-            response = requests.post(url, headers=self.headers, json=payload)
-            data = response.json()
-            results.extend(data.get('results', []))
-            if not data.get('has_more'):
-                break
-            payload = {"start_cursor": data.get('next_cursor')}
+    def load_tasks(self, full: bool = True):
+        """Загружаем задачи: все или только измененные"""
+        payload = {"sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+        if not full:
+            payload["filter"] = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": self._last_edited_cursor}
+            }
+        
+        if full:
+            print("📋 Загружаем задачи...")
+        results = self._query_all(TASKS_DB_ID, payload)
+        
+        if full:
+            # Полная загрузка убирает задачи, удаленные из базы
+            seen = {task["id"] for task in results}
+            for task_id in [task_id for task_id in self.tasks if task_id not in seen]:
+                self.model.remove(task_id)
         
         for task in results:
-            props = task.get("properties", {})
-            task_info = self._extract_task_info(task, props)
-            self.tasks[task["id"]] = task_info
+            if task.get("archived") or task.get("in_trash"):
+                self.model.remove(task["id"])
+            else:
+                self.model.upsert(self._extract_task_info(task, task.get("properties", {})))
+            edited = task.get("last_edited_time")
+            if edited and (self._last_edited_cursor is None or edited > self._last_edited_cursor):
+                self._last_edited_cursor = edited
         
-        print(f"✅ Загружено {len(self.tasks)} задач")
+        if full:
+            print(f"✅ Загружено {len(self.tasks)} задач")
     
-    def _extract_task_info(self, task, props):
+    def _extract_task_info(self, task, props) -> TaskInfo:
         """Извлекаем информацию о задаче"""
         title = ""
-        for field in ["Задача", "Name", "Title", "Название"]:
-            if field in props and props[field].get("title"):
-                title = props[field]["title"][0]["plain_text"]
+        for prop_name in ["Задача", "Name", "Title", "Название"]:
+            if prop_name in props and props[prop_name].get("title"):
+                title = props[prop_name]["title"][0]["plain_text"]
                 break
         
         status = ""
-        for field in ["Статус", "Status"]:
-            if field in props:
-                s = props[field]
+        for prop_name in ["Статус", "Status"]:
+            if prop_name in props:
+                s = props[prop_name]
                 if s.get("status"):
                     status = s["status"]["name"]
                 elif s.get("select"):
@@ -189,75 +369,70 @@ class DesignerTaskManager:
                 break
         
         assignees = []
-        for field in ["Участники", "Assignee", "Исполнитель", "Responsible"]:
-            if field in props and props[field].get("people"):
-                assignees = [p.get("name", "Без имени") for p in props[field]["people"]]
+        for prop_name in ["Участники", "Assignee", "Исполнитель", "Responsible"]:
+            if prop_name in props and props[prop_name].get("people"):
+                assignees = [p.get("name", "Без имени") for p in props[prop_name]["people"]]
                 break
         
         deadline = ""
-        for field in ["Дедлайн", "Due Date", "Дата", "Deadline"]:
-            if field in props and props[field].get("date"):
-                deadline = props[field]["date"]["start"]
+        for prop_name in ["Дедлайн", "Due Date", "Дата", "Deadline"]:
+            if prop_name in props and props[prop_name].get("date"):
+                deadline = props[prop_name]["date"]["start"]
                 break
         
         priority = ""
-        for field in ["Приоритет", "Priority"]:
-            if field in props:
-                p = props[field]
+        for prop_name in ["Приоритет", "Priority"]:
+            if prop_name in props:
+                p = props[prop_name]
                 if p.get("select"):
                     priority = p["select"]["name"]
                 break
         
-        return {
-            "id": task["id"],
-            "title": title,
-            "status": status,
-            "assignees": assignees,
-            "deadline": deadline,
-            "priority": priority,
-            "properties": props
-        }
+        return TaskInfo(
+            id=task["id"],
+            title=title,
+            status=status,
+            group=_status_group(status),
+            assignees=assignees,
+            deadline=deadline,
+            deadline_date=_parse_deadline(deadline),
+            priority=priority
+        )
+    
+    @staticmethod
+    def _task_line(task: TaskInfo, width: int) -> str:
+        deadline_info = f" (до {task.deadline})" if task.deadline else ""
+        priority_info = f" [{task.priority}]" if task.priority else ""
+        return f"   • {task.title[:width]}{deadline_info}{priority_info}"
     
     def analyze_workload(self):
         """Анализ текущей нагрузки"""
         print("\n📊 АНАЛИЗ ТЕКУЩЕЙ НАГРУЗКИ")
         print("=" * 50)
         
-        self.load_designers()
-        self.load_tasks()
-        
-        # Фильтруем задачи ToDo
-        todo_tasks = [t for t in self.tasks.values() if t["status"].lower() in ["to do", "todo", "не начата"]]
-        
-        # Распределяем по дизайнерам
-        for task in todo_tasks:
-            for assignee in task["assignees"]:
-                for designer in self.designers.values():
-                    if designer["name"].lower() == assignee.lower():
-                        designer["tasks_count"] += 1
-                        designer["tasks"].append(task)
-                        break
+        self.load_data()
+        model = self.model
+        workload = model.workload()
         
         # Выводим статистику
         print(f"\n👥 НАГРУЗКА ПО ДИЗАЙНЕРАМ:")
         total_assigned = 0
-        for designer in self.designers.values():
-            print(f"\n🎨 {designer['name']}: {designer['tasks_count']} задач")
-            total_assigned += designer["tasks_count"]
+        for designer_id, count in workload.items():
+            print(f"\n🎨 {self.designers[designer_id].name}: {count} задач")
+            total_assigned += count
             
-            if designer["tasks"]:
+            if count:
+                tasks = list(model.todo_by_designer[designer_id].values())
                 print("   Задачи:")
-                for task in designer["tasks"][:3]:  # Показываем первые 3
-                    deadline_info = f" (до {task['deadline']})" if task['deadline'] else ""
-                    priority_info = f" [{task['priority']}]" if task['priority'] else ""
-                    print(f"   • {task['title'][:40]}{deadline_info}{priority_info}")
-                if len(designer["tasks"]) > 3:
-                    print(f"   ... и еще {len(designer['tasks']) - 3} задач")
+                for task in tasks[:3]:  # Показываем первые 3
+                    print(self._task_line(task, 40))
+                if count > 3:
+                    print(f"   ... и еще {count - 3} задач")
         
         # Общая статистика
-        unassigned = len([t for t in todo_tasks if not t["assignees"]])
+        unassigned = len(model.todo_unassigned)
         print(f"\n📈 ОБЩАЯ СТАТИСТИКА:")
-        print(f"   • Всего задач ToDo: {len(todo_tasks)}")
+        print(f"   • Всего задач ToDo: {model.todo_total}")
         print(f"   • Распределено дизайнерам: {total_assigned}")
         print(f"   • Без исполнителя: {unassigned}")
         
@@ -266,9 +441,9 @@ class DesignerTaskManager:
             print(f"\n💡 РЕКОМЕНДАЦИИ:")
             print(f"   • Назначить исполнителей для {unassigned} задач")
         
-        if self.designers:
-            avg_load = total_assigned / len(self.designers)
-            max_load = max(d["tasks_count"] for d in self.designers.values())
+        if workload:
+            avg_load = total_assigned / len(workload)
+            max_load = max(workload.values())
             if max_load > avg_load * 1.5:
                 print(f"   • Перераспределить нагрузку (максимум: {max_load}, среднее: {avg_load:.1f})")
     
@@ -277,108 +452,93 @@ class DesignerTaskManager:
         print(f"\n📋 ЗАДАЧИ TODO НА НЕДЕЛЮ {self.week_start} - {self.week_end}")
         print("=" * 70)
         
-        self.load_tasks()
-        
-        todo_tasks = [t for t in self.tasks.values() if t["status"].lower() in ["to do", "todo", "не начата"]]
+        self.load_data()
+        model = self.model
         
-        if not todo_tasks:
+        if not model.todo_total:
             print("✅ Нет задач в статусе ToDo")
             return
         
-        # Группируем по исполнителям
-        by_assignee = defaultdict(list)
-        for task in todo_tasks:
-            if task["assignees"]:
-                for assignee in task["assignees"]:
-                    by_assignee[assignee].append(task)
-            else:
-                by_assignee["Без исполнителя"].append(task)
+        # Группы по исполнителям уже собраны в модели
+        groups = [(name, tasks) for name, tasks in model.todo_by_assignee.items() if tasks]
+        if model.todo_unassigned:
+            groups.append(("Без исполнителя", model.todo_unassigned))
         
-        # Выводим по группам
-        for assignee, tasks in by_assignee.items():
+        for assignee, tasks in groups:
             print(f"\n👤 {assignee} ({len(tasks)} задач):")
-            for task in tasks:
-                deadline_info = f" (до {task['deadline']})" if task['deadline'] else ""
-                priority_info = f" [{task['priority']}]" if task['priority'] else ""
-                print(f"   • {task['title'][:50]}{deadline_info}{priority_info}")
+            for task in tasks.values():
+                print(self._task_line(task, 50))
+    
+    def plan_redistribution(self) -> List[Tuple[TaskInfo, str, str]]:
+        """
+        План выравнивания ToDo между дизайнерами: (задача, от кого, кому).
+        
+        Переносятся только задачи с одним исполнителем-дизайнером,
+        в первую очередь без дедлайна и с самым поздним дедлайном.
+        """
+        workload = self.model.workload()
+        if len(workload) < 2:
+            return []
+        
+        target = sum(workload.values()) / len(workload)
+        donors = sorted((d for d, count in workload.items() if count > target + 1), key=lambda d: -workload[d])
+        loads = dict(workload)
+        moves = []
+        
+        for donor in donors:
+            candidates = [t for t in self.model.todo_by_designer[donor].values() if t.designer_ids == [donor]]
+            candidates.sort(key=lambda t: (t.deadline_date is not None,
+                                           -t.deadline_date.toordinal() if t.deadline_date else 0))
+            for task in candidates:
+                receiver = min(loads, key=loads.get)
+                if loads[donor] - loads[receiver] <= 1 or loads[donor] <= target:
+                    break
+                moves.append((task, donor, receiver))
+                loads[donor] -= 1
+                loads[receiver] += 1
+        return moves
     
     def redistribute_tasks(self):
         """Перераспределение задач"""
         print("\n🔄 ПЕРЕРАСПРЕДЕЛЕНИЕ ЗАДАЧ")
         print("=" * 40)
         
-        # Запускаем скрипт перераспределения
-        try:
-            import redistribute_tasks
-            redistributor = redistribute_tasks.TaskRedistributor()
-            redistributor.fetch_designers()
-            redistributor.fetch_todo_tasks()
-            target_avg = redistributor.analyze_current_distribution()
-            redistributor.plan_redistribution(target_avg)
-            redistributor.execute_redistribution(dry_run=True)
-            
-            print(f"\n💡 Для выполнения изменений запустите:")
-            print(f"   python redistribute_tasks.py --execute")
-            
-        except ImportError:
-            print("❌ Модуль redistribute_tasks не найден")
-        except Exception as e:
-            print(f"❌ Ошибка: {e}")
+        self.load_data()
+        moves = self.plan_redistribution()
+        if not moves:
+            print("✅ Нагрузка распределена равномерно")
+            return
+        
+        print(f"📋 Предлагается перенести {len(moves)} задач:")
+        for task, donor, receiver in moves:
+            print(f"   • {task.title[:40]}: {self.designers[donor].name} → {self.designers[receiver].name}")
+        print(f"\n💡 Изменения не применяются автоматически - назначьте исполнителей в Notion")
     
     def generate_report(self):
         """Генерируем отчет по дизайнерам"""
         print(f"\n📈 ОТЧЕТ ПО ДИЗАЙНЕРАМ")
         print("=" * 40)
         
-        self.load_designers()
-        self.load_tasks()
-        
-        # Анализируем все задачи дизайнеров
-        designer_stats = defaultdict(lambda: {
-            "todo": 0, "in_progress": 0, "done": 0, "overdue": 0, "total": 0
-        })
-        
-        now = datetime.now().date()
-        
-        for task in self.tasks.values():
-            for assignee in task["assignees"]:
-                for designer in self.designers.values():
-                    if designer["name"].lower() == assignee.lower():
-                        stats = designer_stats[designer["name"]]
-                        stats["total"] += 1
-                        
-                        status = task["status"].lower()
-                        if status in ["to do", "todo", "не начата"]:
-                            stats["todo"] += 1
-                        elif status in ["in progress", "в работе"]:
-                            stats["in_progress"] += 1
-                        elif status in ["done", "выполнена", "завершена"]:
-                            stats["done"] += 1
-                        
-                        # Проверяем просрочку
-                        if task["deadline"]:
-                            try:
-                                deadline = datetime.fromisoformat(task["deadline"].split("T")[0]).date()
-                                if deadline < now and status not in ["done", "выполнена", "завершена"]:
-                                    stats["overdue"] += 1
-                            except:
-                                pass
-                        break
+        self.load_data()
+        model = self.model
+        today = date.today()
         
         # Выводим отчет
-        for designer_name, stats in designer_stats.items():
-            print(f"\n🎨 {designer_name}:")
+        for designer_id, stats in model.stats_by_designer.items():
+            if not stats["total"] or designer_id not in self.designers:
+                continue
+            overdue = model.overdue_count(today, designer_id)
+            print(f"\n🎨 {self.designers[designer_id].name}:")
             print(f"   • Всего задач: {stats['total']}")
             print(f"   • ToDo: {stats['todo']}")
             print(f"   • В работе: {stats['in_progress']}")
             print(f"   • Выполнено: {stats['done']}")
-            if stats['overdue'] > 0:
-                print(f"   • Просрочено: {stats['overdue']} ⚠️")
+            if overdue > 0:
+                print(f"   • Просрочено: {overdue} ⚠️")
             
             # Эффективность
-            if stats['total'] > 0:
-                efficiency = (stats['done'] / stats['total']) * 100
-                print(f"   • Эффективность: {efficiency:.1f}%")
+            efficiency = (stats['done'] / stats['total']) * 100
+            print(f"   • Эффективность: {efficiency:.1f}%")
     
     def settings(self):
         """Настройки"""
@@ -393,9 +553,8 @@ class DesignerTaskManager:
         if choice == "1":
             self.check_environment()
         elif choice == "2":
-            self.designers = {}  # Сброс кэша
-            self.tasks = {}
-            print("✅ Кэш очищен, данные будут загружены заново")
+            self.load_data(force_full=True)
+            print("✅ Данные загружены заново")
     
     def check_environment(self):
         """Проверка переменных окружения"""
@@ -6,19 +6,27 @@
 """
 
 import os
+import json
 import logging
+import sqlite3
 import aiohttp
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
+from utils.notion_rate_limiter import notion_rate_limiter
+
 load_dotenv()
 
 # Логирование
 logger = logging.getLogger(__name__)
 
+# Снимки метрик хранятся рядом со скриптом, а не в текущем каталоге
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
 @dataclass
 class InstagramPost:
     """Данные поста Instagram"""
@@ -185,10 +193,185 @@ class InstagramAPI:
             logger.debug(f"Ошибка получения метрик для {media_id}: {e}")
             return {}
 
+class InstagramSnapshotStore:
+    """
+    Снимки метрик постов Instagram в SQLite.
+    
+    Каждая синхронизация дописывает снимок, а приросты, скорость и
+    скользящий ER считаются оконными функциями SQLite по истории,
+    без повторных запросов к API.
+    """
+    
+    # Поле InstagramPost -> колонка снимка
+    METRICS = {
+        'impressions': 'impressions',
+        'reach': 'reach',
+        'likes_count': 'likes',
+        'comments_count': 'comments',
+        'saves_count': 'saves',
+        'shares_count': 'shares'
+    }
+    
+    _DELTAS_QUERY = """
+        SELECT post_id, captured_at, impressions, reach, likes, comments, saves, shares,
+               impressions - LAG(impressions) OVER w AS impressions_delta,
+               reach - LAG(reach) OVER w AS reach_delta,
+               (likes + comments + saves + shares) - LAG(likes + comments + saves + shares) OVER w AS engagement_delta,
+               (julianday(captured_at) - julianday(LAG(captured_at) OVER w)) * 24 AS hours,
+               AVG(CASE WHEN reach > 0 THEN (likes + comments + saves + shares) * 100.0 / reach END)
+                   OVER (w ROWS BETWEEN {window} PRECEDING AND CURRENT ROW) AS rolling_er,
+               ROW_NUMBER() OVER (PARTITION BY post_id ORDER BY captured_at DESC) AS recency
+        FROM snapshots
+        WINDOW w AS (PARTITION BY post_id ORDER BY captured_at)
+    """
+    
+    def __init__(self, db_path: str = str(DATA_DIR / "instagram_snapshots.db")):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                caption TEXT,
+                media_type TEXT,
+                media_url TEXT,
+                timestamp TEXT,
+                permalink TEXT
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (
+                post_id TEXT NOT NULL,
+                captured_at TEXT NOT NULL,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                reach INTEGER NOT NULL DEFAULT 0,
+                likes INTEGER NOT NULL DEFAULT 0,
+                comments INTEGER NOT NULL DEFAULT 0,
+                saves INTEGER NOT NULL DEFAULT 0,
+                shares INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (post_id, captured_at)
+            );
+            CREATE INDEX IF NOT EXISTS idx_snapshots_time ON snapshots (captured_at);
+            CREATE TABLE IF NOT EXISTS notion_pages (
+                post_id TEXT PRIMARY KEY,
+                page_id TEXT NOT NULL,
+                metrics TEXT
+            );
+        """)
+    
+    def record(self, posts: List[InstagramPost], captured_at: Optional[str] = None) -> str:
+        """Сохраняет снимок метрик постов, возвращает его время"""
+        captured_at = captured_at or datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?)",
+                [(p.id, p.caption, p.media_type, p.media_url, p.timestamp, p.permalink) for p in posts]
+            )
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO snapshots (post_id, captured_at, {', '.join(self.METRICS.values())}) "
+                f"VALUES (?, ?, {', '.join('?' * len(self.METRICS))})",
+                [(p.id, captured_at, *(getattr(p, field) or 0 for field in self.METRICS)) for p in posts]
+            )
+        return captured_at
+    
+    def latest_snapshot_time(self) -> Optional[str]:
+        return self.conn.execute("SELECT MAX(captured_at) FROM snapshots").fetchone()[0]
+    
+    def latest_posts(self, max_age_hours: float = 1) -> List[InstagramPost]:
+        """Посты с метриками последнего снимка, если он не старше max_age_hours"""
+        latest = self.latest_snapshot_time()
+        if not latest or datetime.now(timezone.utc) - datetime.fromisoformat(latest) > timedelta(hours=max_age_hours):
+            return []
+        
+        rows = self.conn.execute("""
+            SELECT p.*, s.impressions, s.reach, s.likes, s.comments, s.saves, s.shares
+            FROM snapshots s JOIN posts p USING (post_id)
+            WHERE s.captured_at = ?
+            ORDER BY p.timestamp DESC
+        """, (latest,))
+        
+        posts = []
+        for row in rows:
+            post = InstagramPost(
+                id=row['post_id'],
+                caption=row['caption'] or '',
+                media_type=row['media_type'],
+                media_url=row['media_url'] or '',
+                timestamp=row['timestamp'] or '',
+                permalink=row['permalink'] or '',
+                **{field: row[column] for field, column in self.METRICS.items()}
+            )
+            if post.reach > 0:
+                engagement = post.likes_count + post.comments_count + post.saves_count + post.shares_count
+                post.engagement_rate = (engagement / post.reach) * 100
+            posts.append(post)
+        return posts
+    
+    def post_deltas(self, rolling_window: int = 24) -> Dict[str, Dict]:
+        """
+        Последний прирост метрик по каждому посту.
+        
+        reach_velocity - охват в час за последний интервал, rolling_er -
+        средний ER по последним rolling_window снимкам.
+        """
+        query = f"SELECT * FROM ({self._DELTAS_QUERY.format(window=int(rolling_window) - 1)}) WHERE recency = 1"
+        
+        result = {}
+        for row in self.conn.execute(query):
+            row = dict(row)
+            hours = row['hours']
+            row['reach_velocity'] = row['reach_delta'] / hours if hours and row['reach_delta'] is not None else 0.0
+            result[row['post_id']] = row
+        return result
+    
+    def daily_kpis(self, days: int = 30) -> List[Dict]:
+        """Прирост охвата, показов и вовлечения по дням (UTC) из снимков"""
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec='seconds')
+        query = f"""
+            SELECT substr(captured_at, 1, 10) AS day,
+                   SUM(impressions_delta) AS impressions_gained,
+                   SUM(reach_delta) AS reach_gained,
+                   SUM(engagement_delta) AS engagement_gained
+            FROM ({self._DELTAS_QUERY.format(window=0)})
+            WHERE hours IS NOT NULL AND captured_at >= ?
+            GROUP BY day ORDER BY day
+        """
+        
+        result = []
+        for row in self.conn.execute(query, (since,)):
+            row = dict(row)
+            row['engagement_rate'] = row['engagement_gained'] / row['reach_gained'] * 100 if row['reach_gained'] else 0.0
+            result.append(row)
+        return result
+    
+    @classmethod
+    def metrics_of(cls, post: InstagramPost) -> List[int]:
+        return [getattr(post, field) or 0 for field in cls.METRICS]
+    
+    def notion_pages(self) -> Dict[str, tuple]:
+        """media_id -> (page_id Notion, метрики последней записи или None)"""
+        return {
+            row['post_id']: (row['page_id'], json.loads(row['metrics']) if row['metrics'] else None)
+            for row in self.conn.execute("SELECT * FROM notion_pages")
+        }
+    
+    def set_notion_page(self, post_id: str, page_id: str, metrics: Optional[List[int]] = None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO notion_pages VALUES (?, ?, ?)",
+                (post_id, page_id, json.dumps(metrics) if metrics is not None else None)
+            )
+    
+    def post_ids_by_permalink(self) -> Dict[str, str]:
+        return {row['permalink']: row['post_id'] for row in self.conn.execute("SELECT post_id, permalink FROM posts")}
+    
+    def close(self):
+        self.conn.close()
+
 class InstagramNotionSync:
     """Синхронизация Instagram аналитики с Notion"""
     
-    def __init__(self, notion_token: str, metrics_db_id: str):
+    def __init__(self, notion_token: str, metrics_db_id: str,
+                 snapshot_store: Optional[InstagramSnapshotStore] = None):
         self.notion_token = notion_token
         self.metrics_db_id = metrics_db_id
         self.notion_headers = {
@@ -197,9 +380,17 @@ class InstagramNotionSync:
             'Content-Type': 'application/json'
         }
         self.instagram = InstagramAPI()
+        self.snapshots = snapshot_store or InstagramSnapshotStore()
     
     async def sync_posts_to_notion(self, days_back: int = 7) -> int:
-        """Синхронизировать посты Instagram в Notion"""
+        """
+        Синхронизировать посты Instagram в Notion.
+        
+        Upsert по media_id: новые посты создаются, у известных обновляются
+        только метрики и только если они изменились с прошлой записи.
+        Запросы идут параллельно через общий ограничитель Notion API.
+        Возвращает число сохраненных постов (без пропущенных неизмененных).
+        """
         logger.info(f"Начинаю синхронизацию Instagram постов за {days_back} дней")
         
         # Получаем посты
@@ -209,6 +400,10 @@ class InstagramNotionSync:
             logger.warning("Посты Instagram не найдены")
             return 0
         
+        # Снимок метрик для расчета приростов
+        self.snapshots.record(posts)
+        deltas = self.snapshots.post_deltas()
+        
         # Фильтруем по дате
         cutoff_date = datetime.now() - timedelta(days=days_back)
         recent_posts = []
@@ -223,43 +418,108 @@ class InstagramNotionSync:
         
         logger.info(f"Найдено {len(recent_posts)} постов за {days_back} дней")
         
-        # Сохраняем в Notion
-        saved_count = 0
-        for post in recent_posts:
-            success = await self.save_post_to_notion(post)
-            if success:
-                saved_count += 1
+        async with aiohttp.ClientSession(headers=self.notion_headers) as session:
+            pages = self.snapshots.notion_pages()
+            if not pages and recent_posts:
+                # Первый запуск с этим хранилищем - подхватываем уже созданные страницы
+                pages = await self._load_existing_pages(session)
             
-            # Небольшая пауза между запросами
-            await asyncio.sleep(0.5)
+            changed_posts = [
+                post for post in recent_posts
+                if post.id not in pages or pages[post.id][1] != self.snapshots.metrics_of(post)
+            ]
+            results = await asyncio.gather(*(
+                self._upsert_post(session, post, pages.get(post.id, (None, None))[0], deltas.get(post.id))
+                for post in changed_posts
+            ))
         
-        logger.info(f"Сохранено {saved_count} постов в Notion")
+        saved_count = sum(results)
+        unchanged_count = len(recent_posts) - len(changed_posts)
+        logger.info(f"Сохранено {saved_count} постов в Notion, без изменений {unchanged_count}")
         return saved_count
     
-    async def save_post_to_notion(self, post: InstagramPost) -> bool:
-        """Сохранить пост в Notion"""
-        url = 'https://api.notion.com/v1/pages'
+    async def _notion_request(self, session: aiohttp.ClientSession, method: str, url: str,
+                              payload: Dict, retries: int = 3) -> tuple:
+        """Запрос к Notion через общий ограничитель, возвращает (status, json)"""
+        for _ in range(retries):
+            async with notion_rate_limiter:
+                async with session.request(method, url, json=payload) as response:
+                    if response.status == 429:
+                        notion_rate_limiter.backoff(float(response.headers.get('Retry-After', 1)))
+                        continue
+                    if response.status == 200:
+                        return response.status, await response.json()
+                    error = await response.text()
+                    logger.error(f"Notion API {method} {url}: {response.status} - {error}")
+                    return response.status, None
+        return 429, None
+    
+    async def _load_existing_pages(self, session: aiohttp.ClientSession) -> Dict[str, tuple]:
+        """Сопоставляет страницы базы метрик с media_id по ссылке на пост"""
+        post_ids = self.snapshots.post_ids_by_permalink()
+        url = f'https://api.notion.com/v1/databases/{self.metrics_db_id}/query'
+        payload = {'filter': {'property': 'Платформа', 'select': {'equals': 'Instagram'}}, 'page_size': 100}
         
-        # Формируем caption для поста
-        caption_text = post.caption[:100] + "..." if len(post.caption) > 100 else post.caption
+        while True:
+            status, data = await self._notion_request(session, 'POST', url, payload)
+            if not data:
+                break
+            for page in data.get('results', []):
+                comment = page['properties'].get('Комментарий', {}).get('rich_text') or []
+                text = ''.join(part.get('plain_text', '') for part in comment)
+                for line in text.splitlines():
+                    if line.startswith('🔗 ') and line[2:].strip() in post_ids:
+                        # Метрики неизвестны - страница обновится при первой синхронизации
+                        self.snapshots.set_notion_page(post_ids[line[2:].strip()], page['id'])
+            if not data.get('has_more'):
+                break
+            payload['start_cursor'] = data['next_cursor']
         
-        # Определяем категорию по типу медиа
-        category = {
-            'IMAGE': '📸 Instagram Photo',
-            'VIDEO': '🎥 Instagram Video', 
-            'CAROUSEL_ALBUM': '📚 Instagram Carousel'
-        }.get(post.media_type, '📱 Instagram Post')
+        return self.snapshots.notion_pages()
+    
+    async def _upsert_post(self, session: aiohttp.ClientSession, post: InstagramPost,
+                           page_id: Optional[str], deltas: Optional[Dict]) -> bool:
+        try:
+            if page_id:
+                status, result = await self._notion_request(
+                    session, 'PATCH', f'https://api.notion.com/v1/pages/{page_id}',
+                    {'properties': self._metric_properties(post, deltas)}
+                )
+                if status != 404:
+                    if result:
+                        self.snapshots.set_notion_page(post.id, page_id, self.snapshots.metrics_of(post))
+                    return result is not None
+                # Страницу удалили в Notion - создаем заново
+            
+            status, result = await self._notion_request(
+                session, 'POST', 'https://api.notion.com/v1/pages',
+                {'parent': {'database_id': self.metrics_db_id}, 'properties': self._build_properties(post, deltas)}
+            )
+            if result:
+                logger.debug(f"Пост сохранен: {result['id']}")
+                self.snapshots.set_notion_page(post.id, result['id'], self.snapshots.metrics_of(post))
+            return result is not None
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении поста: {e}")
+            return False
+    
+    def _metric_properties(self, post: InstagramPost, deltas: Optional[Dict] = None) -> Dict:
+        """Свойства страницы, зависящие от метрик поста"""
+        # Прирост с предыдущего снимка, если он есть
+        growth_text = ""
+        if deltas and deltas.get('hours'):
+            growth_text = (
+                f"\n📈 За {deltas['hours']:.1f} ч: "
+                f"reach {deltas['reach_delta']:+,}, impressions {deltas['impressions_delta']:+,}, "
+                f"engagement {deltas['engagement_delta']:+,}\n"
+                f"⚡ Reach/час: {deltas['reach_velocity']:,.1f}\n"
+                f"📊 ER (скользящий): {deltas['rolling_er'] or 0:.2f}%"
+            )
         
-        properties = {
-            "Метрика": {
-                "title": [{"text": {"content": f"Instagram: {caption_text}"}}]
-            },
+        return {
             "Значение": {
                 "rich_text": [{"text": {"content": f"ER: {post.engagement_rate:.2f}%"}}]
             },
-            "Категория": {
-                "select": {"name": "📈 Marketing"}
-            },
             "Комментарий": {
                 "rich_text": [{
                     "text": {
@@ -272,9 +532,32 @@ class InstagramNotionSync:
                             f"📤 Shares: {post.shares_count:,}\n"
                             f"📊 ER: {post.engagement_rate:.2f}%\n"
                             f"🔗 {post.permalink}"
+                            f"{growth_text}"
                         )
                     }
                 }]
+            }
+        }
+    
+    def _build_properties(self, post: InstagramPost, deltas: Optional[Dict] = None) -> Dict:
+        """Все свойства новой страницы поста"""
+        # Формируем caption для поста
+        caption_text = post.caption[:100] + "..." if len(post.caption) > 100 else post.caption
+        
+        # Определяем категорию по типу медиа
+        category = {
+            'IMAGE': '📸 Instagram Photo',
+            'VIDEO': '🎥 Instagram Video', 
+            'CAROUSEL_ALBUM': '📚 Instagram Carousel'
+        }.get(post.media_type, '📱 Instagram Post')
+        
+        return {
+            "Метрика": {
+                "title": [{"text": {"content": f"Instagram: {caption_text}"}}]
+            },
+            **self._metric_properties(post, deltas),
+            "Категория": {
+                "select": {"name": "📈 Marketing"}
             },
             "Дата": {
                 "date": {"start": post.timestamp[:10]}  # YYYY-MM-DD
@@ -286,26 +569,12 @@ class InstagramNotionSync:
                 "select": {"name": category}
             }
         }
-        
-        data = {
-            'parent': {'database_id': self.metrics_db_id},
-            'properties': properties
-        }
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=self.notion_headers, json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.debug(f"Пост сохранен: {result['id']}")
-                        return True
-                    else:
-                        error = await response.text()
-                        logger.error(f"Ошибка сохранения поста в Notion: {response.status} - {error}")
-                        return False
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении поста: {e}")
-            return False
+    
+    async def save_post_to_notion(self, post: InstagramPost, deltas: Optional[Dict] = None) -> bool:
+        """Сохранить пост в Notion (создать или обновить страницу по media_id)"""
+        page_id = self.snapshots.notion_pages().get(post.id, (None, None))[0]
+        async with aiohttp.ClientSession(headers=self.notion_headers) as session:
+            return await self._upsert_post(session, post, page_id, deltas)
     
     async def get_account_summary(self) -> Optional[Dict]:
         """Получить сводку по аккаунту"""
@@ -313,8 +582,14 @@ class InstagramNotionSync:
         if not account:
             return None
         
-        # Получаем посты за последние 30 дней
-        posts = await self.instagram.get_recent_posts(limit=100)
+        # Свежий снимок берем из хранилища, иначе запрашиваем API и сохраняем
+        posts = self.snapshots.latest_posts(max_age_hours=1)
+        if not posts:
+            posts = await self.instagram.get_recent_posts(limit=100)
+            if posts:
+                self.snapshots.record(posts)
+        
+        daily = self.snapshots.daily_kpis(days=30)
         
         # Анализируем метрики
         total_impressions = sum(p.impressions for p in posts)
@@ -330,7 +605,10 @@ class InstagramNotionSync:
                 'total_reach': total_reach,
                 'total_engagement': total_engagement,
                 'avg_engagement_rate': avg_engagement_rate,
-                'followers': account.followers_count
+                'followers': account.followers_count,
+                'daily_reach_gained': sum(d['reach_gained'] for d in daily) / len(daily) if daily else 0,
+                'daily_engagement_rate': sum(d['engagement_rate'] for d in daily) / len(daily) if daily else 0,
+                'tracked_days': len(daily)
             }
         }
 
@@ -350,7 +628,7 @@ class InstagramScheduler:
             try:
                 # Синхронизируем посты за последние 3 дня
                 count = await self.sync_manager.sync_posts_to_notion(days_back=3)
-                logger.info(f"✅ Автосинхронизация: обработано {count} постов")
+                logger.info(f"✅ Автосинхронизация: сохранено {count} постов")
                 
                 # Ждем час
                 await asyncio.sleep(3600)
@@ -371,7 +649,7 @@ async def quick_instagram_sync(notion_token: str, metrics_db_id: str) -> str:
     
     try:
         count = await sync_manager.sync_posts_to_notion(days_back=1)
-        return f"📱 Instagram: синхронизировано {count} постов за сутки"
+        return f"📱 Instagram: сохранено {count} постов за сутки"
     except Exception as e:
         return f"❌ Ошибка синхронизации Instagram: {e}"
 
@@ -398,6 +676,12 @@ async def get_instagram_summary(notion_token: str, metrics_db_id: str) -> str:
             f"🎯 Reach: {stats['total_reach']:,}\n"
             f"❤️ Engagement: {stats['total_engagement']:,}\n"
             f"📈 Средний ER: {stats['avg_engagement_rate']:.2f}%"
+            + (
+                f"\n\n**По дням ({stats['tracked_days']} дн.):**\n"
+                f"🎯 Прирост охвата: {stats['daily_reach_gained']:,.0f}/день\n"
+                f"📈 ER прироста: {stats['daily_engagement_rate']:.2f}%"
+                if stats['tracked_days'] else ""
+            )
         )
     except Exception as e:
         return f"❌ Ошибка получения аналитики: {e}"
@@ -9,7 +9,7 @@ import asyncio
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from dotenv import load_dotenv
+from utils.config_snapshot import load_env
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 
@@ -29,7 +29,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Загружаем переменные окружения
-load_dotenv()
+load_env()
 
 class MainProjectBot:
     """Главный бот для управления всем проектом"""
@@ -6,7 +6,8 @@
 import os
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
-from dotenv import load_dotenv
+
+from utils.config_snapshot import load_env
 
 @dataclass
 class DatabaseSchema:
@@ -20,8 +21,8 @@ class DatabaseSchema:
     multi_select_options: Dict[str, List[str]]
     relations: Dict[str, str]  # property_name -> target_database_id
 
-# Загружаем переменные окружения
-load_dotenv()
+# Загружаем переменные окружения (из снимка .env, если он актуален)
+load_env()
 
 # Схемы всех баз данных с реальными ID из .env
 DATABASE_SCHEMAS = {
@@ -8,16 +8,18 @@ Notion MCP Server для интеграции с проектом
 import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from datetime import datetime, UTC
 import os
 import time
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
 import sys
-import yaml
-import pytz
-from src.utils.date_utils import parse_notion_date
+
+from utils.config_snapshot import load_env
+
+# .env загружается до импорта схем: они читают ID баз из окружения
+env_path = load_env()
+print(f"[MCP] ENV файл загружен: {env_path}", file=sys.stderr)
 
 # Импорт централизованных схем
 from notion_database_schemas import (
@@ -32,31 +34,10 @@ from notion_database_schemas import (
     get_database_id
 )
 
-# Импорт безопасных операций
-from safe_database_operations import SafeDatabaseOperations
-
-from notion_client import AsyncClient
-
-# MCP imports
-from mcp.server import Server
-from mcp.server.models import InitializationOptions
-from mcp.server.stdio import stdio_server
-from mcp.types import (
-    CallToolRequest,
-    CallToolResult,
-    ListToolsRequest,
-    ListToolsResult,
-    Tool,
-    TextContent,
-    ImageContent,
-    EmbeddedResource,
-    LoggingLevel,
-)
-
-# первоначальный вызов без пути
-env_path = find_dotenv()
-load_dotenv(env_path, override=False)
-print(f"[MCP] ENV файл загружен: {env_path}")
+# notion_client и mcp тяжелые (httpx, pydantic, anyio): импортируются при
+# создании сервера и в режиме stdio, а не при импорте модуля
+if TYPE_CHECKING:
+    from mcp.types import CallToolRequest, CallToolResult, ListToolsRequest, ListToolsResult
 
 # Настройка логирования
 logging.basicConfig(
@@ -77,23 +58,6 @@ if not progress_logger.handlers:
     progress_logger.addHandler(sh)
     progress_logger.setLevel(logging.INFO)
 
-# ---------------------------------------------------------
-# Дополнительная попытка загрузить .env из корня проекта (если нужно)
-# ---------------------------------------------------------
-
-if not os.getenv("NOTION_TOKEN"):
-    possible_roots = [
-        Path(__file__).resolve().parent / ".env",
-        Path(__file__).resolve().parent.parent / ".env",
-        Path(__file__).resolve().parent.parent.parent / ".env",
-    ]
-    for env_path in possible_roots:
-        if env_path.exists():
-            loaded = load_dotenv(env_path, override=False)
-            logger.info(f"[MCP] dotenv extra load={loaded} path={env_path}")
-            if os.getenv("NOTION_TOKEN"):
-                break
-
 class NotionMCPServer:
     """Универсальный сервер для работы с Notion и Яндексом через MCP"""
     def __init__(self):
@@ -124,6 +88,7 @@ class NotionMCPServer:
         if not self.notion_token:
             raise ValueError("NOTION_TOKEN не найден в переменных окружения")
         
+        from notion_client import AsyncClient
         self.client = AsyncClient(auth=self.notion_token)
         logger.info(f"[MCP] NOTION_TOKEN loaded: {bool(self.notion_token)}")
         logger.info(f"[MCP] TASKS_DB_ID: {self.tasks_db_id}")
@@ -131,19 +96,36 @@ class NotionMCPServer:
         self.database_cache = {}
         self.cache_timestamp = {}
         self.cache_ttl = 3600  # 1 час по умолчанию
-        from pathlib import Path
         self.schema_cache_dir = Path(".notion_schema_cache")
         self.schema_cache_dir.mkdir(exist_ok=True)
         
-        # Инициализация MCP сервера
-        self.server = Server("notion-mcp-server")
+        # MCP сервер нужен только в режиме stdio - создается по требованию
+        self._server = None
         
         # Получаем все ID баз из схем
         self.database_ids = get_all_database_ids()
         logger.info(f"[MCP] Загружено {len(self.database_ids)} баз данных из схем")
+        
+        # Безопасные операции нужны только части инструментов - создаются по требованию
+        self._safe_ops = None
+    
+    @property
+    def server(self):
+        if self._server is None:
+            from mcp.server import Server
+            self._server = Server("notion-mcp-server")
+        return self._server
+    
+    def _get_safe_ops(self):
+        if self._safe_ops is None:
+            from safe_database_operations import SafeDatabaseOperations
+            self._safe_ops = SafeDatabaseOperations()
+        return self._safe_ops
 
-    async def list_tools(self, request: ListToolsRequest) -> ListToolsResult:
+    async def list_tools(self, request: "ListToolsRequest") -> "ListToolsResult":
         """Список доступных инструментов MCP"""
+        from mcp.types import ListToolsResult, Tool
+        
         tools = [
             Tool(
                 name="get_pages",
@@ -369,8 +351,10 @@ class NotionMCPServer:
         ]
         return ListToolsResult(tools=tools)
 
-    async def call_tool(self, request: CallToolRequest) -> CallToolResult:
+    async def call_tool(self, request: "CallToolRequest") -> "CallToolResult":
         """Вызов инструмента MCP"""
+        from mcp.types import CallToolResult, TextContent
+        
         try:
             tool_name = request.name
             arguments = request.arguments or {}
@@ -1637,7 +1621,7 @@ class NotionMCPServer:
     async def safe_create_page(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Безопасное создание страницы с валидацией и post-check"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             database_name = arguments.get("database_name")
             properties = arguments.get("properties", {})
             
@@ -1654,7 +1638,7 @@ class NotionMCPServer:
     async def safe_update_page(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Безопасное обновление страницы с валидацией и post-check"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             page_id = arguments.get("page_id")
             properties = arguments.get("properties", {})
             
@@ -1671,7 +1655,7 @@ class NotionMCPServer:
     async def safe_bulk_create(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Безопасное массовое создание с валидацией"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             database_name = arguments.get("database_name")
             properties_list = arguments.get("properties_list", [])
             
@@ -1688,7 +1672,7 @@ class NotionMCPServer:
     async def add_select_option(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Добавить новое значение в select поле"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             database_id = arguments.get("database_id")
             property_name = arguments.get("property_name")
             new_option = arguments.get("new_option")
@@ -1706,7 +1690,7 @@ class NotionMCPServer:
     async def add_multi_select_option(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Добавить новое значение в multi_select поле"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             database_id = arguments.get("database_id")
             property_name = arguments.get("property_name")
             new_option = arguments.get("new_option")
@@ -1724,7 +1708,7 @@ class NotionMCPServer:
     async def safe_create_with_auto_options(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Создать запись с автоматическим добавлением новых значений в select/multi_select поля"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             database_id = arguments.get("database_id")
             properties = arguments.get("properties", {})
             
@@ -1741,7 +1725,7 @@ class NotionMCPServer:
     async def add_multiple_options(self, arguments: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Добавить несколько новых значений в select или multi_select поле"""
         try:
-            safe_ops = SafeDatabaseOperations()
+            safe_ops = self._get_safe_ops()
             database_id = arguments.get("database_id")
             property_name = arguments.get("property_name")
             new_options = arguments.get("new_options", [])
@@ -1805,6 +1789,9 @@ class NotionMCPServer:
 
 async def main():
     """Основная функция запуска MCP сервера"""
+    from mcp.server.models import InitializationOptions
+    from mcp.server.stdio import stdio_server
+    
     server = NotionMCPServer()
     
     async with stdio_server() as (read_stream, write_stream):
@@ -21,13 +21,18 @@
 import os
 import json
 import asyncio
-import schedule
-import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 from notion_client import AsyncClient
 
+from utils.job_runner import JobRunner, JobRun, JobHistoryStore
+
+# Состояние и история запусков хранятся рядом со скриптом (или в PRODUCT_SYSTEM_DIR)
+STATE_DIR = os.getenv("PRODUCT_SYSTEM_DIR", os.path.dirname(os.path.abspath(__file__)))
+STATE_FILE = os.path.join(STATE_DIR, 'product_state.json')
+JOBS_FILE = os.path.join(STATE_DIR, 'product_jobs.jsonl')
+
 @dataclass
 class ProcessingRule:
     """Правило обработки"""
@@ -42,18 +47,25 @@ class ProcessingRule:
     last_used: str = ""
     usage_count: int = 0
 
-@dataclass
-class ProcessingJob:
-    """Задача обработки"""
-    id: str
-    type: str
-    status: str
-    created_at: str
-    started_at: Optional[str] = None
-    completed_at: Optional[str] = None
-    records_processed: int = 0
-    errors: List[str] = None
-    results: Dict = None
+# Запуск задачи обработки (история хранится в JobHistoryStore)
+ProcessingJob = JobRun
+
+def _interval_to_cron(minutes: int) -> str:
+    """
+    Интервал в минутах -> cron-выражение.
+
+    Cron-шаг сбрасывается на границе часа/суток, поэтому точно выражаются
+    только делители 60 минут и делители 24 часов. Для остальных интервалов
+    (например, 90 минут) нужно задать auto_processing_cron явно.
+    """
+    if 0 < minutes < 60 and 60 % minutes == 0:
+        return f"*/{minutes} * * * *"
+    if minutes % 60 == 0 and 0 < minutes // 60 <= 24 and 24 % (minutes // 60) == 0:
+        return f"0 */{minutes // 60} * * *"
+    raise ValueError(
+        f"schedule_interval={minutes} мин нельзя точно выразить через cron: "
+        f"задайте auto_processing_cron"
+    )
 
 class ProductSystem:
     """Система продукта для автоматической обработки"""
@@ -64,7 +76,6 @@ class ProductSystem:
         
         # Состояние системы
         self.rules: List[ProcessingRule] = []
-        self.jobs: List[ProcessingJob] = []
         self.analytics = {}
         
         # Конфигурация
@@ -73,26 +84,36 @@ class ProductSystem:
             'schedule_interval': 60,  # минут
             'max_llm_tokens_per_day': 10000,
             'quality_threshold': 0.85,
-            'backup_enabled': True
+            'backup_enabled': True,
+            'daily_report_cron': '0 9 * * *',
+            'optimize_rules_cron': '0 2 * * 0',
+            'job_history_limit': 200,
+            'job_max_retries': 2
         }
         
         self._load_system_state()
         self._init_default_rules()
+        
+        self.runner = JobRunner(
+            store=JobHistoryStore(JOBS_FILE, self.config['job_history_limit']),
+            max_history=self.config['job_history_limit']
+        )
+
+    @property
+    def jobs(self) -> List[ProcessingJob]:
+        """Последние завершенные запуски"""
+        return list(self.runner.history)
 
     def _load_system_state(self):
         """Загружает состояние системы"""
         try:
-            with open('product_state.json', 'r', encoding='utf-8') as f:
+            with open(STATE_FILE, 'r', encoding='utf-8') as f:
                 state = json.load(f)
                 
             # Загружаем правила
             if 'rules' in state:
                 self.rules = [ProcessingRule(**rule) for rule in state['rules']]
             
-            # Загружаем задачи
-            if 'jobs' in state:
-                self.jobs = [ProcessingJob(**job) for job in state['jobs']]
-            
             # Загружаем конфигурацию
             if 'config' in state:
                 self.config.update(state['config'])
@@ -105,13 +126,14 @@ class ProductSystem:
         state = {
             'timestamp': datetime.now().isoformat(),
             'rules': [asdict(rule) for rule in self.rules],
-            'jobs': [asdict(job) for job in self.jobs],
             'config': self.config,
             'analytics': self.analytics
         }
         
-        with open('product_state.json', 'w', encoding='utf-8') as f:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(STATE_FILE + '.tmp', 'w', encoding='utf-8') as f:
             json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(STATE_FILE + '.tmp', STATE_FILE)
 
     def _init_default_rules(self):
         """Инициализирует правила по умолчанию"""
@@ -162,99 +184,64 @@ class ProductSystem:
             self.rules.extend(default_rules)
             self._save_system_state()
 
+    def setup_jobs(self):
+        """Регистрирует задачи продукта в планировщике"""
+        auto_cron = self.config.get('auto_processing_cron') or _interval_to_cron(self.config['schedule_interval'])
+        retries = self.config['job_max_retries']
+        
+        self.runner.add_job("auto_processing", self.auto_process, cron=auto_cron, max_retries=retries)
+        self.runner.add_job("daily_report", self.generate_daily_report, cron=self.config['daily_report_cron'],
+                            max_retries=retries)
+        self.runner.add_job("optimize_rules", self.optimize_rules, cron=self.config['optimize_rules_cron'],
+                            max_retries=0)
+        return auto_cron
+
     async def start_scheduler(self):
         """Запускает планировщик автоматической обработки"""
         print("🕐 ЗАПУСК ПЛАНИРОВЩИКА АВТОМАТИЧЕСКОЙ ОБРАБОТКИ")
         print("="*60)
         
-        # Настройка расписания
-        schedule.every(self.config['schedule_interval']).minutes.do(
-            lambda: asyncio.create_task(self.auto_process())
-        )
-        
-        # Ежедневная аналитика
-        schedule.every().day.at("09:00").do(
-            lambda: asyncio.create_task(self.generate_daily_report())
-        )
-        
-        # Еженедельная оптимизация правил
-        schedule.every().sunday.at("02:00").do(
-            lambda: asyncio.create_task(self.optimize_rules())
-        )
+        auto_cron = self.setup_jobs()
         
         print(f"✅ Планировщик настроен:")
-        print(f"   📊 Автообработка каждые {self.config['schedule_interval']} минут")
-        print(f"   📈 Ежедневные отчеты в 09:00")
-        print(f"   🔧 Оптимизация правил по воскресеньям")
+        print(f"   📊 Автообработка по расписанию '{auto_cron}'")
+        print(f"   📈 Ежедневные отчеты: '{self.config['daily_report_cron']}'")
+        print(f"   🔧 Оптимизация правил: '{self.config['optimize_rules_cron']}'")
         
         # Основной цикл
-        while True:
-            schedule.run_pending()
-            await asyncio.sleep(60)
+        await self.runner.run_forever()
 
-    async def auto_process(self):
-        """Автоматическая обработка новых записей"""
-        job_id = f"auto_{int(time.time())}"
-        job = ProcessingJob(
-            id=job_id,
-            type="auto_processing",
-            status="running",
-            created_at=datetime.now().isoformat(),
-            started_at=datetime.now().isoformat(),
-            errors=[]
-        )
+    async def auto_process(self) -> Dict:
+        """Автоматическая обработка новых записей (ошибки уходят в планировщик для повтора)"""
+        print(f"\n🔄 АВТОМАТИЧЕСКАЯ ОБРАБОТКА - {datetime.now().strftime('%H:%M:%S')}")
         
-        self.jobs.append(job)
+        # Получаем новые записи
+        new_records = await self._get_new_records()
         
-        try:
-            print(f"\n🔄 АВТОМАТИЧЕСКАЯ ОБРАБОТКА - {datetime.now().strftime('%H:%M:%S')}")
-            
-            # Получаем новые записи
-            new_records = await self._get_new_records()
-            
-            if not new_records:
-                job.status = "completed"
-                job.completed_at = datetime.now().isoformat()
-                job.records_processed = 0
-                print("ℹ️ Новых записей для обработки нет")
-                return
-            
-            print(f"📥 Найдено новых записей: {len(new_records)}")
-            
-            # Применяем правила
-            processed = await self._apply_rules_to_records(new_records)
-            
-            # Обновляем статистику
-            job.status = "completed"
-            job.completed_at = datetime.now().isoformat()
-            job.records_processed = processed
-            job.results = {
-                'processed': processed,
-                'rules_applied': len([r for r in self.rules if r.enabled])
-            }
-            
-            # Обновляем аналитику
-            self._update_analytics(processed)
-            
-            print(f"✅ Обработано записей: {processed}")
-            
-        except Exception as e:
-            job.status = "failed"
-            job.completed_at = datetime.now().isoformat()
-            job.errors.append(str(e))
-            print(f"❌ Ошибка автообработки: {e}")
+        if not new_records:
+            print("ℹ️ Новых записей для обработки нет")
+            return {'processed': 0, 'rules_applied': 0}
+        
+        print(f"📥 Найдено новых записей: {len(new_records)}")
         
-        finally:
+        # Применяем правила
+        processed = await self._apply_rules_to_records(new_records)
+        
+        # Обновляем аналитику; состояние пишется только когда что-то изменилось
+        if processed:
+            self._update_analytics(processed)
             self._save_system_state()
+        
+        print(f"✅ Обработано записей: {processed}")
+        return {
+            'processed': processed,
+            'rules_applied': len([r for r in self.rules if r.enabled])
+        }
 
     async def _get_new_records(self) -> List[Dict]:
         """Получает новые записи для обработки"""
         # Определяем время последней обработки
-        last_job = None
-        for job in reversed(self.jobs):
-            if job.status == "completed" and job.type == "auto_processing":
-                last_job = job
-                break
+        last_job = self.runner.last_run("auto_processing")
         
         # Если это первый запуск, берем записи за последний час
         if not last_job:
@@ -363,8 +350,9 @@ class ProductSystem:
             'processed_today': today_stats.get('processed', 0),
             'processed_yesterday': yesterday_stats.get('processed', 0),
             'active_rules': len([r for r in self.rules if r.enabled]),
-            'total_jobs': len(self.jobs),
+            'total_jobs': self.runner.finished_count,
             'failed_jobs': len([j for j in self.jobs if j.status == 'failed']),
+            'jobs_now': self.runner.counts(),
             'top_rules': self._get_top_rules()
         }
         
@@ -373,6 +361,7 @@ class ProductSystem:
             json.dump(report, f, ensure_ascii=False, indent=2)
         
         print(f"✅ Отчет сохранен: daily_report_{today}.json")
+        return {'report': f'daily_report_{today}.json'}
 
     def _get_top_rules(self) -> List[Dict]:
         """Получает топ правил по использованию"""
@@ -403,6 +392,7 @@ class ProductSystem:
         
         self._save_system_state()
         print("✅ Оптимизация завершена")
+        return {'enabled_rules': len([r for r in self.rules if r.enabled])}
 
     def create_web_interface(self):
         """Создает веб-интерфейс для управления"""
@@ -439,7 +429,6 @@ class ProductSystem:
             'description': 'Автоматическая обработка контента Telegram → Notion',
             'requirements': [
                 'notion-client>=2.0.0',
-                'schedule>=1.2.0',
                 'fastapi>=0.100.0',
                 'uvicorn>=0.20.0'
             ],
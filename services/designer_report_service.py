@@ -5,7 +5,9 @@
 
 import re
 import json
+import time
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
@@ -37,12 +39,170 @@ class WorkReport:
         if self.links_added is None:
             self.links_added = []
 
+def normalize_name(name: str) -> str:
+    """Нормализация названия для поиска"""
+    return re.sub(r'\s+', ' ', name.casefold().replace('ё', 'е')).strip()
+
+def _page_title(page: Dict, prop_name: str) -> str:
+    title = page.get("properties", {}).get(prop_name, {}).get("title") or []
+    return "".join(part.get("plain_text", "") for part in title)
+
+class ProjectTaskDirectory:
+    """
+    Кэш проектов и задач Notion в памяти с поиском по названию.
+    
+    Первая загрузка синхронная, дальше устаревший кэш отдается сразу,
+    а обновление идет в фоновом потоке.
+    """
+    
+    def __init__(self, notion: Client, refresh_interval: int):
+        self.notion = notion
+        self.refresh_interval = refresh_interval
+        self.projects: Dict[str, Dict] = {}  # id -> {name, key, status}
+        self.tasks: Dict[str, Dict] = {}  # id -> {name, key, project_ids, page}
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+    
+    def _query_all(self, database_id: str, **params) -> List[Dict]:
+        results = []
+        start_cursor = None
+        while True:
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            response = self.notion.databases.query(database_id=database_id, page_size=100, **params)
+            results.extend(response.get("results", []))
+            if not response.get("has_more"):
+                return results
+            start_cursor = response.get("next_cursor")
+    
+    def add_project(self, page: Dict):
+        name = _page_title(page, "Name")
+        status = (page.get("properties", {}).get("Статус", {}).get("status") or {}).get("name")
+        self.projects[page["id"]] = {"name": name, "key": normalize_name(name), "status": status}
+    
+    def add_task(self, page: Dict):
+        name = _page_title(page, "Задача")
+        relations = page.get("properties", {}).get("Проект", {}).get("relation") or []
+        self.tasks[page["id"]] = {
+            "name": name,
+            "key": normalize_name(name),
+            "project_ids": {relation["id"] for relation in relations},
+            "page": page
+        }
+    
+    def refresh(self):
+        """Полная перезагрузка проектов и задач"""
+        started = time.time()
+        projects = self._query_all(config.notion.projects_database_id)
+        tasks = self._query_all(config.notion.tasks_database_id)
+        
+        directory = ProjectTaskDirectory(self.notion, self.refresh_interval)
+        for page in projects:
+            directory.add_project(page)
+        for page in tasks:
+            directory.add_task(page)
+        
+        self.projects, self.tasks = directory.projects, directory.tasks
+        self.loaded_at = time.time()
+        logger.info(f"Справочник обновлён: {len(self.projects)} проектов, {len(self.tasks)} задач "
+                    f"за {self.loaded_at - started:.1f}с")
+    
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка обновления справочника: {e}")
+        finally:
+            self._refreshing = False
+    
+    def ensure_fresh(self):
+        """Загрузить справочник или запустить фоновое обновление устаревшего"""
+        if time.time() - self.loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if not self.loaded_at:
+                self.refresh()
+            elif not self._refreshing and time.time() - self.loaded_at >= self.refresh_interval:
+                self._refreshing = True
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+    
+    @staticmethod
+    def _match(query: str, entries: Dict[str, Dict]) -> Optional[str]:
+        """
+        Точное совпадение нормализованного названия, затем единственное
+        совпадение по началу названия, затем единственное вхождение.
+        При нескольких кандидатах ничего не выбираем: часы не должны
+        попасть в соседнюю задачу ("макет 1" / "макет 2").
+        """
+        key = normalize_name(query)
+        if not key:
+            return None
+        
+        prefixed, contains = [], []
+        for entry_id, entry in entries.items():
+            if entry["key"] == key:
+                return entry_id
+            if entry["key"].startswith(key):
+                prefixed.append(entry_id)
+            elif key in entry["key"]:
+                contains.append(entry_id)
+        
+        for candidates in (prefixed, contains):
+            if len(candidates) == 1:
+                return candidates[0]
+            if candidates:
+                names = ", ".join(entries[entry_id]["name"] for entry_id in candidates[:5])
+                logger.warning(f"Неоднозначное название '{query}': {names}")
+                return None
+        return None
+    
+    def find_project_id(self, project_name: str) -> Optional[str]:
+        return self._match(project_name, self.projects)
+    
+    def find_task(self, task_name: str, project_id: Optional[str] = None) -> Optional[Dict]:
+        tasks = self.tasks
+        if project_id:
+            tasks = {task_id: task for task_id, task in tasks.items() if project_id in task["project_ids"]}
+        task_id = self._match(task_name, tasks)
+        return self.tasks[task_id]["page"] if task_id else None
+    
+    def active_project_names(self) -> List[str]:
+        return [project["name"] for project in self.projects.values()
+                if project["name"] and project["status"] != "Завершён"]
+    
+    def task_names_for_project(self, project_id: str) -> List[str]:
+        return [task["name"] for task in self.tasks.values()
+                if task["name"] and project_id in task["project_ids"]]
+
+_directories: Dict[str, ProjectTaskDirectory] = {}
+_directories_lock = threading.Lock()
+
+def get_directory(notion: Client) -> ProjectTaskDirectory:
+    """Общий справочник для всех экземпляров сервиса (по токену)"""
+    with _directories_lock:
+        directory = _directories.get(config.notion.token)
+        if directory is None:
+            directory = ProjectTaskDirectory(notion, config.reports.directory_refresh_interval)
+            _directories[config.notion.token] = directory
+        return directory
+
 class DesignerReportService:
     """Сервис для обработки отчётов дизайнеров"""
     
     def __init__(self):
         self.notion = Client(auth=config.notion.token)
         self.schemas = config.get_database_schemas()
+        self.directory = get_directory(self.notion)
+    
+    def _get_directory(self) -> Optional[ProjectTaskDirectory]:
+        """Справочник или None, если Notion недоступен"""
+        try:
+            self.directory.ensure_fresh()
+            return self.directory
+        except Exception as e:
+            logger.error(f"Ошибка загрузки справочника проектов: {e}")
+            return None
     
     def parse_quick_report(self, text: str) -> Optional[WorkReport]:
         """Парсинг быстрого отчёта из текста"""
@@ -142,7 +302,21 @@ class DesignerReportService:
         return result
     
     def find_task_in_notion(self, task_name: str, project_name: str = "") -> Optional[Dict]:
-        """Найти задачу в Notion"""
+        """Найти задачу: сначала в справочнике, при промахе - запросом в Notion"""
+        directory = self._get_directory()
+        if directory:
+            project_id = directory.find_project_id(project_name) if project_name else None
+            task = directory.find_task(task_name, project_id)
+            if task:
+                return task
+        
+        task = self._query_task(task_name, project_name)
+        if task and directory:
+            directory.add_task(task)
+        return task
+    
+    def _query_task(self, task_name: str, project_name: str = "") -> Optional[Dict]:
+        """Найти задачу запросом в Notion"""
         try:
             filters = []
             
@@ -172,17 +346,33 @@ class DesignerReportService:
                 } if len(filters) > 1 else filters[0]
             )
             
-            if response["results"]:
-                return response["results"][0]
-            
-            return None
+            return self._pick_page(task_name, response["results"], "Задача")
         
         except Exception as e:
             logger.error(f"Ошибка поиска задачи: {e}")
             return None
     
+    @staticmethod
+    def _pick_page(name: str, pages: List[Dict], prop_name: str) -> Optional[Dict]:
+        """Из результатов "contains" берем страницу по тем же правилам, что и справочник"""
+        entries = {}
+        for page in pages:
+            title = _page_title(page, prop_name)
+            entries[page["id"]] = {"name": title, "key": normalize_name(title), "page": page}
+        page_id = ProjectTaskDirectory._match(name, entries)
+        return entries[page_id]["page"] if page_id else None
+    
     def find_project_id(self, project_name: str) -> Optional[str]:
-        """Найти ID проекта по названию"""
+        """Найти ID проекта: сначала в справочнике, при промахе - запросом в Notion"""
+        directory = self._get_directory()
+        if directory:
+            project_id = directory.find_project_id(project_name)
+            if project_id:
+                return project_id
+        return self._query_project_id(project_name)
+    
+    def _query_project_id(self, project_name: str) -> Optional[str]:
+        """Найти ID проекта запросом в Notion"""
         try:
             response = self.notion.databases.query(
                 database_id=config.notion.projects_database_id,
@@ -194,8 +384,11 @@ class DesignerReportService:
                 }
             )
             
-            if response["results"]:
-                return response["results"][0]["id"]
+            page = self._pick_page(project_name, response["results"], "Name")
+            if page:
+                if self.directory.loaded_at:
+                    self.directory.add_project(page)
+                return page["id"]
             
             return None
         
@@ -213,6 +406,8 @@ class DesignerReportService:
                 return False
             
             task_id = task["id"]
+            # Свежие свойства: время и комментарии дописываются к текущим значениям
+            task = self.notion.pages.retrieve(page_id=task_id)
             current_properties = task["properties"]
             
             # Подготовить обновления
@@ -257,10 +452,12 @@ class DesignerReportService:
                 }
             
             # Применить обновления
-            self.notion.pages.update(
+            updated_task = self.notion.pages.update(
                 page_id=task_id,
                 properties=updates
             )
+            if isinstance(updated_task, dict) and updated_task.get("properties"):
+                self.directory.add_task(updated_task)
             
             logger.info(f"Обновлена задача: {report.task_name} (время: +{report.time_spent_hours}ч)")
             return True
@@ -423,57 +620,23 @@ class DesignerReportService:
     
     def get_active_projects(self) -> List[str]:
         """Получить список активных проектов"""
-        try:
-            response = self.notion.databases.query(
-                database_id=config.notion.projects_database_id,
-                filter={
-                    "property": "Статус",
-                    "status": {
-                        "does_not_equal": "Завершён"
-                    }
-                }
-            )
-            
-            projects = []
-            for page in response["results"]:
-                name_prop = page["properties"].get("Name", {})
-                if name_prop.get("title"):
-                    projects.append(name_prop["title"][0]["plain_text"])
-            
-            return projects[:10]  # Максимум 10 проектов
-        
-        except Exception as e:
-            logger.error(f"Ошибка получения проектов: {e}")
-            return ["Коробки мультиварки RMP04", "Брендинг", "Дизайн сайта"]
+        directory = self._get_directory()
+        if directory:
+            return directory.active_project_names()[:10]  # Максимум 10 проектов
+        return ["Коробки мультиварки RMP04", "Брендинг", "Дизайн сайта"]
     
     def get_tasks_for_project(self, project_name: str) -> List[str]:
         """Получить задачи для проекта"""
-        try:
-            project_id = self.find_project_id(project_name)
-            if not project_id:
-                return ["Общая работа"]
-            
-            response = self.notion.databases.query(
-                database_id=config.notion.tasks_database_id,
-                filter={
-                    "property": "Проект",
-                    "relation": {
-                        "contains": project_id
-                    }
-                }
-            )
-            
-            tasks = []
-            for page in response["results"]:
-                name_prop = page["properties"].get("Задача", {})
-                if name_prop.get("title"):
-                    tasks.append(name_prop["title"][0]["plain_text"])
-            
-            return tasks[:8] if tasks else ["Общая работа"]
-        
-        except Exception as e:
-            logger.error(f"Ошибка получения задач: {e}")
+        directory = self._get_directory()
+        if not directory:
             return ["Верстка", "Дизайн", "Брендинг", "Общая работа"]
+        
+        project_id = self.find_project_id(project_name)
+        if not project_id:
+            return ["Общая работа"]
+        
+        tasks = directory.task_names_for_project(project_id)
+        return tasks[:8] if tasks else ["Общая работа"]
 
 # Глобальный экземпляр сервиса
 service = DesignerReportService() 
\ No newline at end of file
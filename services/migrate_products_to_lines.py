@@ -12,6 +12,10 @@
 3. Определить категорию продукта (блендер, соковыжималка и т.д.)
 4. Создать запись в базе линеек продуктов с правильным названием
 5. Связать с исходным проектом через relation
+
+Существующие линейки читаются одним постраничным проходом по базе
+в карту артикул -> ID страницы, поэтому повторный запуск миграции
+не создает дублей и не делает лишних запросов.
 """
 
 import os
@@ -121,6 +125,24 @@ class ProductsMigrationService:
             'BDS': 'Блендер',
             'BDL': 'Блендер'
         }
+        
+        # Артикул -> ID линейки продукта (заполняется одним проходом по базе)
+        self._product_lines_by_article: Optional[Dict[str, str]] = None
+    
+    async def query_all(self, database_id: str, **query_params) -> List[Dict]:
+        """Постраничный запрос ко всей базе"""
+        
+        results = []
+        start_cursor = None
+        while True:
+            params = dict(query_params, page_size=100)
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            response = await self.client.databases.query(database_id=database_id, **params)
+            results.extend(response.get("results", []))
+            if not response.get("has_more"):
+                return results
+            start_cursor = response.get("next_cursor")
     
     async def get_polygraphy_projects(self) -> List[Dict]:
         """Получить все проекты с тегом 'Полиграфия товаров' за 2024-2025 годы"""
@@ -156,12 +178,7 @@ class ProductsMigrationService:
         }
         
         try:
-            response = await self.client.databases.query(
-                database_id=str(self.projects_db_id),
-                filter=filter_params
-            )
-            
-            projects = response.get("results", [])
+            projects = await self.query_all(str(self.projects_db_id), filter=filter_params)
             print(f"✅ Найдено {len(projects)} проектов с тегом 'Полиграфия товаров'")
             
             return projects
@@ -195,25 +212,27 @@ class ProductsMigrationService:
         """Сгенерировать название линейки продукта"""
         return f"{category} {article}"
     
+    async def load_product_lines_index(self) -> Dict[str, str]:
+        """Карта артикул -> ID линейки продукта по всей базе линеек"""
+        
+        if self._product_lines_by_article is None:
+            print("🔍 Загрузка существующих линеек продуктов...")
+            index = {}
+            for page in await self.query_all(str(self.product_lines_db_id)):
+                select_data = page.get("properties", {}).get("Артикул", {}).get("select") or {}
+                article = select_data.get("name")
+                if article and article not in index:
+                    index[article] = page["id"]
+            self._product_lines_by_article = index
+            print(f"✅ Существующих линеек продуктов: {len(index)}")
+        return self._product_lines_by_article
+    
     async def check_existing_product_line(self, article: str) -> Optional[str]:
         """Проверить существование линейки продукта с таким артикулом"""
         
         try:
-            response = await self.client.databases.query(
-                database_id=str(self.product_lines_db_id),
-                filter={
-                    "property": "Артикул",
-                    "select": {
-                        "equals": article
-                    }
-                }
-            )
-            
-            results = response.get("results", [])
-            if results:
-                return results[0]["id"]  # Возвращаем ID существующей записи
-            
-            return None
+            index = await self.load_product_lines_index()
+            return index.get(article)
             
         except Exception as e:
             print(f"❌ Ошибка при проверке существующей линейки: {e}")
@@ -290,6 +309,8 @@ class ProductsMigrationService:
             
             response = await self.client.pages.create(**page_data)
             created_page_id = response["id"]
+            if self._product_lines_by_article is not None:
+                self._product_lines_by_article[article] = created_page_id
             
             print(f"✅ Создана линейка продукта: {product_line_name} (ID: {created_page_id})")
             return created_page_id
@@ -298,12 +319,13 @@ class ProductsMigrationService:
             print(f"❌ Ошибка при создании линейки продукта: {e}")
             return None
     
-    async def update_project_with_relation(self, project_id: str, product_line_id: str):
+    async def update_project_with_relation(self, project_id: str, product_line_id: str,
+                                           project_data: Optional[Dict] = None):
         """Обновить проект, добавив связь с линейкой продукта"""
         
         try:
             # Проверяем, есть ли поле для связи с линеками продуктов
-            project_response = await self.client.pages.retrieve(project_id)
+            project_response = project_data or await self.client.pages.retrieve(project_id)
             project_properties = project_response.get("properties", {})
             
             # Ищем поле для связи с линеками продуктов
@@ -315,6 +337,11 @@ class ProductsMigrationService:
                         break
             
             if relation_field:
+                existing_ids = {relation["id"] for relation in project_properties[relation_field].get("relation", [])}
+                if product_line_id in existing_ids:
+                    print("   ✅ Связь проекта с линейкой продукта уже есть")
+                    return
+                
                 # Добавляем связь
                 await self.client.pages.update(
                     page_id=project_id,
@@ -352,6 +379,13 @@ class ProductsMigrationService:
         skipped_count = 0
         error_count = 0
         
+        # Один проход по базе линеек вместо запроса на каждый артикул
+        try:
+            await self.load_product_lines_index()
+        except Exception as e:
+            print(f"❌ Ошибка при загрузке линеек продуктов: {e}")
+            return
+        
         for project in projects:
             try:
                 # Получаем название проекта
@@ -390,7 +424,7 @@ class ProductsMigrationService:
                 if existing_id:
                     print(f"   ✅ Линейка продукта с артикулом {article} уже существует")
                     # Обновляем связь с проектом
-                    await self.update_project_with_relation(project["id"], existing_id)
+                    await self.update_project_with_relation(project["id"], existing_id, project)
                     migrated_count += 1
                 else:
                     # Создаем новую линейку продукта
@@ -398,7 +432,7 @@ class ProductsMigrationService:
                     
                     if product_line_id:
                         # Обновляем связь с проектом
-                        await self.update_project_with_relation(project["id"], product_line_id)
+                        await self.update_project_with_relation(project["id"], product_line_id, project)
                         migrated_count += 1
                     else:
                         error_count += 1
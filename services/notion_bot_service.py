@@ -8,7 +8,7 @@ import os
 import json
 import requests
 from typing import Dict, List, Optional, Any
-from dotenv import load_dotenv
+from utils.config_snapshot import load_env
 import logging
 
 # Настройка логирования
@@ -16,7 +16,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Загружаем переменные окружения
-load_dotenv()
+load_env()
 
 class NotionBotService:
     """Сервис для работы с Notion базами в боте"""
@@ -16,10 +16,11 @@
 
 import os
 import json
+import heapq
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from notion_client import AsyncClient
 from dotenv import load_dotenv
@@ -27,12 +28,19 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения
 load_dotenv()
 
+# Состояние и журналы лежат в каталоге проекта (или в PRODUCT_LIFECYCLE_DIR), а не в текущем каталоге
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_DIR = os.getenv("PRODUCT_LIFECYCLE_DIR", os.path.join(PROJECT_DIR, "data"))
+STATE_FILE = os.path.join(STATE_DIR, "product_lifecycle_state.json")
+LOGS_DIR = os.path.join(PROJECT_DIR, "logs")
+os.makedirs(LOGS_DIR, exist_ok=True)
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('logs/product_lifecycle.log', encoding='utf-8'),
+        logging.FileHandler(os.path.join(LOGS_DIR, 'product_lifecycle.log'), encoding='utf-8'),
         logging.StreamHandler()
     ]
 )
@@ -62,6 +70,178 @@ class ProductLifecycleEvent:
     triggered_by: str  # "manual", "auto", "system"
     metadata: Optional[Dict[str, Any]] = None
 
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+class ProductLifecycleEngine:
+    """
+    Состояние жизненного цикла продуктов в памяти.
+    
+    Продукты хранятся локально (JSON), сроки статусов лежат в куче,
+    поэтому проверка будит только продукты, у которых наступил срок.
+    Распределение по статусам и среднее время в статусе обновляются
+    инкрементально при каждом событии смены статуса.
+    """
+    
+    ATTENTION_SHARE = 0.8  # доля максимума, после которой продукт требует внимания
+    
+    def __init__(self, lifecycle_statuses: Dict[str, ProductStatus],
+                 state_file: str = STATE_FILE):
+        self.lifecycle_statuses = lifecycle_statuses
+        self.state_file = state_file
+        
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.last_edited_time: Optional[str] = None
+        self.last_full_sync: Optional[str] = None
+        
+        # Инкрементальная аналитика
+        self.status_counts: Dict[str, int] = {}
+        self._since_sum: Dict[str, float] = {}  # сумма начал статуса (epoch) по статусам
+        self.overdue: set = set()
+        self.attention: set = set()
+        
+        # Куча сроков: (срок, вид, product_id, начало статуса)
+        self._deadlines: List[Tuple[float, str, str, float]] = []
+        
+        self.load()
+    
+    # ---- хранение ----
+    
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки состояния жизненного цикла: {e}")
+            return
+        
+        self.last_edited_time = state.get("last_edited_time")
+        self.last_full_sync = state.get("last_full_sync")
+        for product in state.get("products", {}).values():
+            self._add(product)
+    
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "last_edited_time": self.last_edited_time,
+                "last_full_sync": self.last_full_sync,
+                "products": self.products
+            }, f, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+    
+    # ---- индексы ----
+    
+    def _add(self, product: Dict[str, Any]):
+        product_id = product["id"]
+        self.products[product_id] = product
+        status = product.get("status", "")
+        since = _parse_time(product["status_since"]).timestamp()
+        
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        self._since_sum[status] = self._since_sum.get(status, 0.0) + since
+        
+        config = self.lifecycle_statuses.get(status)
+        if config and config.next_statuses:
+            max_seconds = config.max_duration_days * 86400
+            heapq.heappush(self._deadlines, (since + max_seconds * self.ATTENTION_SHARE, "attention", product_id, since))
+            # Просрочка - когда полных дней в статусе больше максимума
+            heapq.heappush(self._deadlines, (since + max_seconds + 86400, "overdue", product_id, since))
+    
+    def _remove(self, product_id: str) -> Optional[Dict[str, Any]]:
+        # Записи кучи для старого статуса становятся неактуальными и пропускаются при извлечении
+        product = self.products.pop(product_id, None)
+        if product is None:
+            return None
+        status = product.get("status", "")
+        self.status_counts[status] -= 1
+        self._since_sum[status] -= _parse_time(product["status_since"]).timestamp()
+        if not self.status_counts[status]:
+            del self.status_counts[status]
+            del self._since_sum[status]
+        self.overdue.discard(product_id)
+        self.attention.discard(product_id)
+        return product
+    
+    # ---- события ----
+    
+    def apply(self, product: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """
+        Применяет актуальную версию продукта.
+        
+        Возвращает (старый статус, новый статус), если статус изменился.
+        Время смены статуса берется из last_edited_time страницы.
+        """
+        previous = self.products.get(product["id"])
+        if previous is None:
+            product["status_since"] = product.get("status_since") or product["created_time"]
+            self._add(product)
+            return None
+        
+        if previous.get("status") == product.get("status"):
+            # Статус не менялся - индексы и сроки остаются прежними
+            product["status_since"] = previous["status_since"]
+            self.products[product["id"]] = product
+            return None
+        
+        self._remove(product["id"])
+        product["status_since"] = product.get("last_edited_time") or datetime.now(timezone.utc).isoformat()
+        self._add(product)
+        return previous.get("status", ""), product.get("status", "")
+    
+    def set_status(self, product_id: str, new_status: str, when: Optional[datetime] = None) -> Optional[Tuple[str, str]]:
+        """Событие смены статуса, выполненной этим процессом"""
+        product = self.products.get(product_id)
+        if product is None:
+            return None
+        when = (when or datetime.now(timezone.utc)).isoformat()
+        return self.apply({**product, "status": new_status, "last_edited_time": when})
+    
+    def remove(self, product_id: str):
+        self._remove(product_id)
+    
+    def pop_due(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Извлекает наступившие сроки, возвращает продукты, ставшие просроченными"""
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        became_overdue = []
+        while self._deadlines and self._deadlines[0][0] <= now_ts:
+            _, kind, product_id, since = heapq.heappop(self._deadlines)
+            product = self.products.get(product_id)
+            if product is None or _parse_time(product["status_since"]).timestamp() != since:
+                continue
+            if kind == "attention":
+                self.attention.add(product_id)
+            else:
+                self.overdue.add(product_id)
+                became_overdue.append(product)
+        return became_overdue
+    
+    def next_due(self) -> Optional[datetime]:
+        """Ближайший срок (внимание или просрочка) среди актуальных записей"""
+        while self._deadlines:
+            _, _, product_id, since = self._deadlines[0]
+            product = self.products.get(product_id)
+            if product is not None and _parse_time(product["status_since"]).timestamp() == since:
+                return datetime.fromtimestamp(self._deadlines[0][0], timezone.utc)
+            heapq.heappop(self._deadlines)
+        return None
+    
+    # ---- аналитика ----
+    
+    def days_in_status(self, product: Dict[str, Any], now: Optional[datetime] = None) -> int:
+        now = now or datetime.now(timezone.utc)
+        return (now - _parse_time(product["status_since"])).days
+    
+    def avg_days_by_status(self, now: Optional[datetime] = None) -> Dict[str, float]:
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        return {
+            status: (self.status_counts[status] * now_ts - self._since_sum[status]) / self.status_counts[status] / 86400
+            for status in self.lifecycle_statuses if self.status_counts.get(status)
+        }
+
 class ProductLifecycleManager:
     """Менеджер жизненного цикла продуктов"""
     
@@ -146,27 +326,98 @@ class ProductLifecycleManager:
             "overdue_products": 0,
             "avg_time_in_status": {}
         }
+        
+        # Локальное состояние продуктов с индексами по статусам и срокам
+        self.engine = ProductLifecycleEngine(self.lifecycle_statuses)
+        self.full_resync_days = 7  # полная сверка ловит удаленные в Notion страницы
 
-    async def get_all_products(self) -> List[Dict[str, Any]]:
-        """Получить все продукты из базы линеек"""
-        try:
+    async def _query_products(self, **params) -> List[Dict[str, Any]]:
+        """Запрос к базе линеек с пагинацией"""
+        pages = []
+        cursor = None
+        while True:
+            if cursor:
+                params["start_cursor"] = cursor
             response = await self.notion.databases.query(
-                database_id=self.product_lines_db,
-                sorts=[{"property": "Name", "direction": "ascending"}]
+                database_id=self.product_lines_db, page_size=100, **params
             )
-            
-            products = []
-            for page in response.get("results", []):
-                product = self._parse_product_page(page)
-                if product:
-                    products.append(product)
-            
-            logger.info(f"📦 Получено {len(products)} продуктов")
-            return products
-            
+            pages.extend(response.get("results", []))
+            if not response.get("has_more"):
+                return pages
+            cursor = response.get("next_cursor")
+
+    async def sync_products(self, force_full: bool = False) -> List[Tuple[str, str, str]]:
+        """
+        Синхронизировать локальное состояние с Notion.
+        
+        Запрашиваются только страницы, измененные с прошлой синхронизации;
+        полная выборка - при первом запуске, без курсора last_edited_time
+        и раз в full_resync_days.
+        Возвращает события смены статуса (product_id, старый, новый).
+        """
+        now = datetime.now(timezone.utc)
+        full = (
+            force_full
+            or not self.engine.last_full_sync
+            # Полная выборка не нашла страниц - курсора для инкрементального запроса нет
+            or not self.engine.last_edited_time
+            or now - _parse_time(self.engine.last_full_sync) > timedelta(days=self.full_resync_days)
+        )
+        
+        try:
+            if full:
+                pages = await self._query_products()
+            else:
+                # last_edited_time в Notion округляется до минуты, поэтому on_or_after
+                pages = await self._query_products(filter={
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": self.engine.last_edited_time}
+                })
         except Exception as e:
             logger.error(f"❌ Ошибка получения продуктов: {e}")
             return []
+        
+        events = []
+        seen_ids = set()
+        for page in pages:
+            product = self._parse_product_page(page)
+            if not product:
+                continue
+            seen_ids.add(product["id"])
+            change = self.engine.apply(product)
+            if change:
+                events.append((product["id"], *change))
+            edited = product.get("last_edited_time")
+            if edited and (self.engine.last_edited_time is None or edited > self.engine.last_edited_time):
+                self.engine.last_edited_time = edited
+        
+        if full:
+            for product_id in set(self.engine.products) - seen_ids:
+                self.engine.remove(product_id)
+            self.engine.last_full_sync = now.isoformat()
+        
+        for product_id, old_status, new_status in events:
+            product = self.engine.products[product_id]
+            await self._log_lifecycle_event(ProductLifecycleEvent(
+                product_id=product_id,
+                product_name=product.get("name", ""),
+                old_status=old_status,
+                new_status=new_status,
+                timestamp=_parse_time(product["status_since"]),
+                reason="Статус изменен в Notion",
+                triggered_by="system"
+            ))
+        
+        self.engine.save()
+        logger.info(f"📦 Синхронизировано {len(pages)} страниц ({'полная' if full else 'инкрементальная'}), смен статуса: {len(events)}")
+        return events
+
+    async def get_all_products(self) -> List[Dict[str, Any]]:
+        """Получить все продукты из базы линеек"""
+        await self.sync_products()
+        products = sorted(self.engine.products.values(), key=lambda p: p.get("name", ""))
+        logger.info(f"📦 Получено {len(products)} продуктов")
+        return products
 
     def _parse_product_page(self, page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Парсинг страницы продукта"""
@@ -234,11 +485,17 @@ class ProductLifecycleManager:
                 }
             )
             
+            # Событие смены статуса обновляет локальное состояние и аналитику
+            product = self.engine.products.get(product_id, {})
+            old_status = product.get("status", "")
+            self.engine.set_status(product_id, new_status)
+            self.engine.save()
+            
             # Логируем событие
             event = ProductLifecycleEvent(
                 product_id=product_id,
-                product_name="",  # Будет заполнено позже
-                old_status="",    # Будет заполнено позже
+                product_name=product.get("name", ""),
+                old_status=old_status,
                 new_status=new_status,
                 timestamp=datetime.now(),
                 reason=reason,
@@ -254,137 +511,107 @@ class ProductLifecycleManager:
             logger.error(f"❌ Ошибка обновления статуса: {e}")
             return False
 
-    async def check_auto_transitions(self) -> Dict[str, Any]:
+    async def check_auto_transitions(self, sync: bool = True) -> Dict[str, Any]:
         """Проверить и выполнить автоматические переходы"""
         logger.info("🔄 Проверка автоматических переходов...")
         
-        products = await self.get_all_products()
+        if sync:
+            await self.sync_products()
+        
+        # Только продукты, у которых наступил срок; неудачные переходы
+        # остаются в просроченных и повторяются при следующей проверке
+        self.engine.pop_due()
+        due_products = [self.engine.products[product_id] for product_id in list(self.engine.overdue)]
         transitions_made = []
         overdue_products = []
         
-        for product in products:
+        for product in due_products:
             current_status = product.get("status", "")
-            
-            if current_status not in self.lifecycle_statuses:
-                continue
-            
             status_config = self.lifecycle_statuses[current_status]
+            days_in_status = self.engine.days_in_status(product)
             
-            # Проверяем время в статусе
-            created_time = datetime.fromisoformat(product["created_time"].replace("Z", "+00:00"))
-            time_in_status = datetime.now(created_time.tzinfo) - created_time
-            days_in_status = time_in_status.days
+            overdue_products.append({
+                "product": dict(product),
+                "days_overdue": days_in_status - status_config.max_duration_days
+            })
             
-            # Проверяем превышение максимального времени
-            if days_in_status > status_config.max_duration_days:
-                overdue_products.append({
-                    "product": product,
-                    "days_overdue": days_in_status - status_config.max_duration_days
+            # Автоматический переход в следующий статус или архив
+            next_status = status_config.next_statuses[0]  # Берем первый доступный
+            success = await self.update_product_status(
+                product["id"], 
+                next_status, 
+                f"Автоматический переход: превышено время в статусе '{current_status}' ({days_in_status} дней)",
+                "auto"
+            )
+            
+            if success:
+                transitions_made.append({
+                    "product": overdue_products[-1]["product"],
+                    "from_status": current_status,
+                    "to_status": next_status,
+                    "reason": "Превышение времени"
                 })
-                
-                # Автоматический переход в следующий статус или архив
-                if status_config.next_statuses:
-                    next_status = status_config.next_statuses[0]  # Берем первый доступный
-                    success = await self.update_product_status(
-                        product["id"], 
-                        next_status, 
-                        f"Автоматический переход: превышено время в статусе '{current_status}' ({days_in_status} дней)",
-                        "auto"
-                    )
-                    
-                    if success:
-                        transitions_made.append({
-                            "product": product,
-                            "from_status": current_status,
-                            "to_status": next_status,
-                            "reason": "Превышение времени"
-                        })
         
         # Обновляем статистику
         self.stats["transitions_today"] += len(transitions_made)
-        self.stats["overdue_products"] = len(overdue_products)
+        self.stats["overdue_products"] = len(self.engine.overdue)
         
         logger.info(f"✅ Автоматические переходы: {len(transitions_made)} выполнено, {len(overdue_products)} просрочено")
         
         return {
             "transitions_made": transitions_made,
             "overdue_products": overdue_products,
-            "total_checked": len(products)
+            "total_checked": len(due_products)
         }
 
-    async def get_lifecycle_analytics(self) -> Dict[str, Any]:
+    async def get_lifecycle_analytics(self, sync: bool = True) -> Dict[str, Any]:
         """Получить аналитику жизненного цикла"""
-        products = await self.get_all_products()
-        
-        # Статистика по статусам
-        status_counts = {}
-        for product in products:
-            status = product.get("status", "Неизвестно")
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
-        # Среднее время в статусах
-        avg_time_by_status = {}
-        for status in self.lifecycle_statuses:
-            products_in_status = [p for p in products if p.get("status") == status]
-            if products_in_status:
-                total_days = 0
-                for product in products_in_status:
-                    created_time = datetime.fromisoformat(product["created_time"].replace("Z", "+00:00"))
-                    time_in_status = datetime.now(created_time.tzinfo) - created_time
-                    total_days += time_in_status.days
-                
-                avg_time_by_status[status] = total_days / len(products_in_status)
+        if sync:
+            await self.sync_products()
+        
+        # Наступившие сроки переводят продукты в "внимание" и "просрочено"
+        self.engine.pop_due()
+        
+        engine = self.engine
+        now = datetime.now(timezone.utc)
         
         # Продукты, требующие внимания
         attention_needed = []
-        for product in products:
-            status = product.get("status", "")
-            if status in self.lifecycle_statuses:
-                status_config = self.lifecycle_statuses[status]
-                created_time = datetime.fromisoformat(product["created_time"].replace("Z", "+00:00"))
-                time_in_status = datetime.now(created_time.tzinfo) - created_time
-                days_in_status = time_in_status.days
-                
-                if days_in_status > status_config.max_duration_days * 0.8:  # 80% от максимума
-                    attention_needed.append({
-                        "product": product,
-                        "days_in_status": days_in_status,
-                        "max_days": status_config.max_duration_days
-                    })
+        for product_id in engine.attention | engine.overdue:
+            product = engine.products[product_id]
+            attention_needed.append({
+                "product": product,
+                "days_in_status": engine.days_in_status(product, now),
+                "max_days": self.lifecycle_statuses[product["status"]].max_duration_days
+            })
+        attention_needed.sort(key=lambda item: item["days_in_status"] / item["max_days"], reverse=True)
+        
+        self.stats["total_products"] = len(engine.products)
+        self.stats["products_by_status"] = dict(engine.status_counts)
+        self.stats["avg_time_in_status"] = engine.avg_days_by_status(now)
         
         return {
-            "total_products": len(products),
-            "status_distribution": status_counts,
-            "avg_time_by_status": avg_time_by_status,
+            "total_products": len(engine.products),
+            "status_distribution": dict(engine.status_counts),
+            "avg_time_by_status": self.stats["avg_time_in_status"],
             "attention_needed": attention_needed,
-            "lifecycle_efficiency": self._calculate_lifecycle_efficiency(products)
+            "lifecycle_efficiency": self._calculate_lifecycle_efficiency()
         }
 
-    def _calculate_lifecycle_efficiency(self, products: List[Dict[str, Any]]) -> Dict[str, float]:
+    def _calculate_lifecycle_efficiency(self) -> Dict[str, float]:
         """Рассчитать эффективность жизненного цикла"""
-        total_products = len(products)
+        total_products = len(self.engine.products)
         if total_products == 0:
             return {}
         
         # Продукты в правильных статусах
-        correct_status_count = 0
-        for product in products:
-            status = product.get("status", "")
-            if status in self.lifecycle_statuses:
-                correct_status_count += 1
+        correct_status_count = sum(
+            count for status, count in self.engine.status_counts.items()
+            if status in self.lifecycle_statuses
+        )
         
         # Продукты без задержек
-        no_delay_count = 0
-        for product in products:
-            status = product.get("status", "")
-            if status in self.lifecycle_statuses:
-                status_config = self.lifecycle_statuses[status]
-                created_time = datetime.fromisoformat(product["created_time"].replace("Z", "+00:00"))
-                time_in_status = datetime.now(created_time.tzinfo) - created_time
-                days_in_status = time_in_status.days
-                
-                if days_in_status <= status_config.max_duration_days:
-                    no_delay_count += 1
+        no_delay_count = correct_status_count - len(self.engine.overdue)
         
         return {
             "status_accuracy": (correct_status_count / total_products) * 100,
@@ -395,7 +622,7 @@ class ProductLifecycleManager:
     async def _log_lifecycle_event(self, event: ProductLifecycleEvent):
         """Логировать событие жизненного цикла"""
         try:
-            log_file = "logs/product_lifecycle_events.json"
+            log_file = os.path.join(LOGS_DIR, "product_lifecycle_events.json")
             
             # Загружаем существующие события
             events = []
@@ -417,9 +644,9 @@ class ProductLifecycleManager:
         except Exception as e:
             logger.error(f"❌ Ошибка логирования события: {e}")
 
-    async def generate_lifecycle_report(self) -> Dict[str, Any]:
+    async def generate_lifecycle_report(self, analytics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Сгенерировать отчет по жизненному циклу"""
-        analytics = await self.get_lifecycle_analytics()
+        analytics = analytics or await self.get_lifecycle_analytics()
         
         report = {
             "timestamp": datetime.now().isoformat(),
@@ -481,14 +708,17 @@ class ProductLifecycleManager:
         
         start_time = datetime.now()
         
-        # 1. Проверяем автоматические переходы
-        transitions_result = await self.check_auto_transitions()
+        # 1. Догружаем изменения из Notion (один инкрементальный запрос)
+        await self.sync_products()
+        
+        # 2. Проверяем автоматические переходы
+        transitions_result = await self.check_auto_transitions(sync=False)
         
-        # 2. Генерируем аналитику
-        analytics = await self.get_lifecycle_analytics()
+        # 3. Генерируем аналитику
+        analytics = await self.get_lifecycle_analytics(sync=False)
         
-        # 3. Создаем отчет
-        report = await self.generate_lifecycle_report()
+        # 4. Создаем отчет
+        report = await self.generate_lifecycle_report(analytics)
         
         execution_time = (datetime.now() - start_time).total_seconds()
         
@@ -503,6 +733,21 @@ class ProductLifecycleManager:
         logger.info(f"✅ Ежедневная проверка завершена за {execution_time:.2f}с")
         return result
 
+    async def run_lifecycle_loop(self, sync_interval_seconds: float = 3600):
+        """
+        Фоновый цикл: просыпается к ближайшему сроку статуса или раз в
+        sync_interval_seconds, чтобы подхватить изменения из Notion.
+        """
+        while True:
+            await self.sync_products()
+            await self.check_auto_transitions(sync=False)
+            
+            next_due = self.engine.next_due()
+            delay = sync_interval_seconds
+            if next_due:
+                delay = min(delay, max((next_due - datetime.now(timezone.utc)).total_seconds(), 0))
+            await asyncio.sleep(delay)
+
 # Функция для запуска из командной строки
 async def main():
     """Основная функция для запуска менеджера жизненного цикла"""
@@ -11,6 +11,10 @@
 2. Найти материалы на Яндекс.Диске по артикулу продукта
 3. Создать связи между продуктами и материалами
 4. Валидировать ссылки и проверять доступность
+
+Материалы не ищутся отдельным запросом на каждый артикул: дерево
+материалов на Диске читается одним постраничным листингом и
+раскладывается в индекс по нормализованному артикулу.
 """
 
 import os
@@ -23,8 +27,20 @@ from dotenv import load_dotenv
 from notion_client import AsyncClient
 import requests
 
+from utils.notion_rate_limiter import notion_rate_limiter
+
 load_dotenv()
 
+YANDEX_DISK_FILES_URL = "https://cloud-api.yandex.net/v1/disk/resources/files"
+# Артикул в имени файла или папки: RGJ-04, RGJ04, RGJ_04, rgj 04.
+# Только 2-4 буквы и две цифры, чтобы IMG_1234 или DSC01 не становились ключами
+ARTICLE_TOKEN_PATTERN = re.compile(r'(?<![A-Za-zА-Яа-яЁё])([A-Za-zА-Яа-яЁё]{2,4})[\s_-]?(\d{2})(?!\d)')
+
+
+def normalize_article(article: str) -> str:
+    """RGJ-04, rgj_04, RGJ 04 -> RGJ04"""
+    return re.sub(r'[\s_-]', '', article).upper()
+
 class ProductMaterialsManager:
     """Менеджер материалов для продуктов RAMIT"""
     
@@ -62,6 +78,15 @@ class ProductMaterialsManager:
             r'(\w+\d+)',   # RGJ04, BDM07
             r'(\w+_\d+)',  # RGJ_04, BDM_07
         ]
+        
+        # Корень дерева материалов на Диске (пусто - весь диск)
+        self.materials_root = os.getenv('YANDEX_DISK_MATERIALS_ROOT', '')
+        self.listing_page_size = 1000
+        
+        # Нормализованный артикул -> {путь: материал}
+        self._materials_index: Optional[Dict[str, Dict[str, Dict]]] = None
+        # Путь на Диске -> задача создания материала (один материал на путь за запуск)
+        self._material_tasks: Dict[str, asyncio.Future] = {}
     
     async def get_all_product_lines(self) -> List[Dict]:
         """Получить все линейки продуктов"""
@@ -95,68 +120,95 @@ class ProductMaterialsManager:
         
         return None
     
-    def search_materials_on_yandex_disk(self, article: str) -> List[Dict]:
-        """Поиск материалов на Яндекс.Диске по артикулу"""
-        
-        print(f"🔍 Поиск материалов для артикула {article} на Яндекс.Диске...")
+    def list_disk_files(self) -> List[Dict]:
+        """Один постраничный листинг файлов Яндекс.Диска"""
+        
+        headers = {"Authorization": f"OAuth {self.yandex_disk_token}"}
+        fields = ",".join(f"items.{field}" for field in ("name", "path", "mime_type", "size"))
+        files = []
+        offset = 0
+        
+        with requests.Session() as session:
+            while True:
+                response = session.get(
+                    YANDEX_DISK_FILES_URL,
+                    headers=headers,
+                    params={"limit": self.listing_page_size, "offset": offset, "fields": fields},
+                    timeout=60
+                )
+                response.raise_for_status()
+                items = response.json().get("items", [])
+                files.extend(items)
+                if len(items) < self.listing_page_size:
+                    return files
+                offset += len(items)
+    
+    def extract_article_keys(self, file_path: str) -> set:
+        """Нормализованные артикулы из имени файла и папок его пути"""
+        
+        relative_path = file_path.split(":", 1)[-1]
+        if self.materials_root:
+            relative_path = relative_path[len(self.materials_root.rstrip("/")):]
+        name_without_ext = os.path.splitext(relative_path)[0]
+        return {normalize_article(letters + digits) for letters, digits in ARTICLE_TOKEN_PATTERN.findall(name_without_ext)}
+    
+    def build_materials_index(self, files: List[Dict], articles: Optional[set] = None) -> Dict[str, Dict[str, Dict]]:
+        """Раскладывает листинг в индекс артикул -> материалы (без дублей по пути)
+
+        articles - нормализованные артикулы продуктов; если заданы, в индекс
+        попадают только они.
+        """
         
-        materials = []
+        root = self.materials_root.rstrip("/")
+        index: Dict[str, Dict[str, Dict]] = {}
         
-        try:
-            # Поиск по разным вариантам артикула
-            search_variants = [
-                article,
-                article.replace('-', ''),
-                article.replace('-', '_'),
-                article.lower(),
-                article.upper()
-            ]
+        for item in files:
+            file_path = item.get("path", "")
+            if root and not file_path.split(":", 1)[-1].startswith(root + "/"):
+                continue
             
-            for variant in search_variants:
-                # Поиск файлов на Яндекс.Диске
-                search_url = "https://cloud-api.yandex.net/v1/disk/resources/search"
-                headers = {
-                    "Authorization": f"OAuth {self.yandex_disk_token}",
-                    "Content-Type": "application/json"
-                }
-                
-                params = {
-                    "q": variant,
-                    "limit": 100
-                }
-                
-                response = requests.get(search_url, headers=headers, params=params)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    items = data.get("items", [])
-                    
-                    for item in items:
-                        file_path = item.get("path", "")
-                        file_name = item.get("name", "")
-                        file_type = item.get("mime_type", "")
-                        file_size = item.get("size", 0)
-                        
-                        # Определяем тип материала
-                        material_type = self.determine_material_type(file_name, file_type)
-                        
-                        if material_type:
-                            materials.append({
-                                "name": file_name,
-                                "path": file_path,
-                                "type": material_type,
-                                "size": file_size,
-                                "mime_type": file_type,
-                                "article": article,
-                                "search_variant": variant
-                            })
-            
-            print(f"✅ Найдено {len(materials)} материалов для артикула {article}")
-            return materials
+            file_name = item.get("name", "")
+            file_type = item.get("mime_type", "")
+            material_type = self.determine_material_type(file_name, file_type)
+            if not material_type:
+                continue
             
-        except Exception as e:
-            print(f"❌ Ошибка при поиске материалов: {e}")
-            return []
+            keys = self.extract_article_keys(file_path)
+            if articles is not None:
+                keys &= articles
+            for key in keys:
+                index.setdefault(key, {})[file_path] = {
+                    "name": file_name,
+                    "path": file_path,
+                    "type": material_type,
+                    "size": item.get("size", 0),
+                    "mime_type": file_type
+                }
+        
+        return index
+    
+    def load_materials_index(self, force: bool = False, articles: Optional[set] = None) -> Dict[str, Dict[str, Dict]]:
+        """Индекс материалов (листинг Диска выполняется один раз за запуск)"""
+        
+        if self._materials_index is None or force:
+            print("🔍 Листинг материалов на Яндекс.Диске...")
+            try:
+                files = self.list_disk_files()
+            except Exception as e:
+                print(f"❌ Ошибка при листинге Яндекс.Диска: {e}")
+                files = []
+            self._materials_index = self.build_materials_index(files, articles)
+            print(f"✅ Файлов: {len(files)}, артикулов в индексе: {len(self._materials_index)}")
+        return self._materials_index
+    
+    def search_materials_on_yandex_disk(self, article: str) -> List[Dict]:
+        """Поиск материалов на Яндекс.Диске по артикулу (по индексу в памяти)"""
+        
+        matches = self.load_materials_index().get(normalize_article(article), {})
+        materials = [dict(material, article=article) for material in matches.values()]
+        
+        print(f"✅ Найдено {len(materials)} материалов для артикула {article}")
+        return materials
     
     def determine_material_type(self, file_name: str, mime_type: str) -> Optional[str]:
         """Определить тип материала по имени файла и MIME-типу"""
@@ -225,7 +277,8 @@ class ProductMaterialsManager:
                 }
             }
             
-            response = await self.client.pages.create(**page_data)
+            async with notion_rate_limiter:
+                response = await self.client.pages.create(**page_data)
             created_page_id = response["id"]
             
             print(f"✅ Создан материал: {material_data['name']} (ID: {created_page_id})")
@@ -235,12 +288,31 @@ class ProductMaterialsManager:
             print(f"❌ Ошибка при создании материала: {e}")
             return None
     
+    async def get_or_create_material(self, material_data: Dict) -> Optional[str]:
+        """Создать материал в Notion не больше одного раза за запуск
+
+        Путь с разными артикулами в папке и имени файла подходит нескольким
+        продуктам; все они ждут одну задачу создания и получают один ID.
+        """
+        
+        task = self._material_tasks.get(material_data["path"])
+        if task is None:
+            task = asyncio.ensure_future(self.create_material_in_notion(material_data))
+            self._material_tasks[material_data["path"]] = task
+        return await task
+    
     async def link_material_to_product(self, product_id: str, material_id: str):
         """Связать материал с продуктом"""
         
+        await self.link_materials_to_product(product_id, [material_id])
+    
+    async def link_materials_to_product(self, product_id: str, material_ids: List[str]):
+        """Связать материалы с продуктом одним обновлением"""
+        
         try:
             # Получаем текущие связи продукта
-            product_response = await self.client.pages.retrieve(product_id)
+            async with notion_rate_limiter:
+                product_response = await self.client.pages.retrieve(product_id)
             product_properties = product_response.get("properties", {})
             
             # Ищем поле для связи с материалами
@@ -254,36 +326,40 @@ class ProductMaterialsManager:
             if materials_field:
                 # Получаем существующие связи
                 existing_relations = product_properties[materials_field].get("relation", [])
+                existing_ids = {relation["id"] for relation in existing_relations}
                 
-                # Добавляем новую связь
-                new_relations = existing_relations + [{"id": material_id}]
+                # Добавляем новые связи
+                new_relations = existing_relations + [
+                    {"id": material_id} for material_id in material_ids if material_id not in existing_ids
+                ]
                 
                 # Обновляем продукт
-                await self.client.pages.update(
-                    page_id=product_id,
-                    properties={
-                        materials_field: {
-                            "relation": new_relations
+                async with notion_rate_limiter:
+                    await self.client.pages.update(
+                        page_id=product_id,
+                        properties={
+                            materials_field: {
+                                "relation": new_relations
+                            }
                         }
-                    }
-                )
+                    )
                 
-                print(f"✅ Материал связан с продуктом")
+                print(f"✅ Связано материалов с продуктом: {len(material_ids)}")
             else:
                 print(f"⚠️ Поле для связи с материалами не найдено в продукте")
                 
         except Exception as e:
             print(f"❌ Ошибка при связывании материала: {e}")
     
-    async def process_product_materials(self, product_data: Dict):
-        """Обработать материалы для одного продукта"""
+    async def process_product_materials(self, product_data: Dict) -> int:
+        """Обработать материалы для одного продукта, вернуть число связанных материалов"""
         
         # Извлекаем артикул
         article = self.extract_article_from_product(product_data)
         
         if not article:
             print(f"⚠️ Не удалось извлечь артикул из продукта")
-            return
+            return 0
         
         # Получаем название продукта
         properties = product_data.get("properties", {})
@@ -291,30 +367,31 @@ class ProductMaterialsManager:
         
         if name_property.get("type") != "title":
             print(f"⚠️ Неверный тип поля названия продукта")
-            return
+            return 0
         
         title_content = name_property.get("title", [])
         if not title_content:
             print(f"⚠️ Пустое название продукта")
-            return
+            return 0
         
         product_name = title_content[0].get("plain_text", "")
         
         print(f"\n📋 Обработка продукта: {product_name} (артикул: {article})")
         
-        # Ищем материалы на Яндекс.Диске
+        # Ищем материалы в индексе Яндекс.Диска
         materials = self.search_materials_on_yandex_disk(article)
         
         if not materials:
             print(f"⚠️ Материалы для артикула {article} не найдены")
-            return
+            return 0
         
-        # Создаем материалы в Notion и связываем с продуктом
-        for material in materials:
-            material_id = await self.create_material_in_notion(material)
-            
-            if material_id:
-                await self.link_material_to_product(product_data["id"], material_id)
+        # Создаем материалы в Notion параллельно и связываем с продуктом одним обновлением
+        material_ids = await asyncio.gather(*(self.get_or_create_material(material) for material in materials))
+        material_ids = [material_id for material_id in material_ids if material_id]
+        
+        if material_ids:
+            await self.link_materials_to_product(product_data["id"], material_ids)
+        return len(material_ids)
     
     async def process_all_products(self):
         """Обработать материалы для всех продуктов"""
@@ -329,18 +406,29 @@ class ProductMaterialsManager:
             print("❌ Линеки продуктов не найдены")
             return
         
+        # Один листинг Диска на весь запуск; в индекс попадают только артикулы продуктов
+        articles = {
+            normalize_article(article) for article in map(self.extract_article_from_product, products) if article
+        }
+        await asyncio.to_thread(self.load_materials_index, articles=articles)
+        self._material_tasks = {}
+        
         processed_count = 0
         materials_count = 0
         error_count = 0
         
-        for product in products:
-            try:
-                await self.process_product_materials(product)
-                processed_count += 1
-                
-            except Exception as e:
-                print(f"❌ Ошибка при обработке продукта: {e}")
+        results = await asyncio.gather(
+            *(self.process_product_materials(product) for product in products),
+            return_exceptions=True
+        )
+        
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"❌ Ошибка при обработке продукта: {result}")
                 error_count += 1
+            else:
+                processed_count += 1
+                materials_count += result
         
         print("\n" + "=" * 60)
         print("📊 РЕЗУЛЬТАТЫ ОБРАБОТКИ МАТЕРИАЛОВ:")
@@ -23,22 +23,18 @@ from dataclasses import dataclass
 from urllib.parse import urlparse
 import base64
 import io
-from PIL import Image
 
-import requests
 import aiohttp
-from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, File
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ContextTypes
 
 # Наследуем от готовых ботов
 from services.figma_materials_bot import FigmaMaterialsBot, FigmaLink, MaterialRequest
-from shared_code.integrations.notion import NotionManager
-from shared_code.integrations.yandex_cloud import YandexDiskManager
 from shared_code.utils.logging_utils import setup_logging
+from utils.config_snapshot import load_env
 
 # Загружаем окружение
-load_dotenv()
+load_env()
 
 # Настройка логирования
 logger = setup_logging("universal_materials_bot")
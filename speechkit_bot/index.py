@@ -1,10 +1,18 @@
 import json
 import os
-import requests
+import sys
+import time
 import logging
-import base64
-import tempfile
 import subprocess
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request
 
 logging.basicConfig(level=logging.INFO)
@@ -14,81 +22,284 @@ TELEGRAM_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 IAM_TOKEN = os.environ.get("YANDEX_IAM_TOKEN")
 FOLDER_ID = os.environ.get("YANDEX_FOLDER_ID")
 
+STT_URL = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
+TELEGRAM_API = "https://api.telegram.org"
+
+# Синхронное распознавание SpeechKit: не длиннее 30 с и не больше 1 МБ
+SYNC_MAX_SECONDS = 30
+SYNC_MAX_BYTES = 1024 * 1024
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2  # LPCM 16 бит, моно
+CHUNK_SECONDS = int(os.environ.get("SPEECHKIT_CHUNK_SECONDS", 25))
+MAX_WORKERS = int(os.environ.get("SPEECHKIT_MAX_WORKERS", 4))
+CACHE_SIZE = int(os.environ.get("SPEECHKIT_CACHE_SIZE", 512))
+HTTP_TIMEOUT = (5, 60)
+
 app = Flask(__name__)
 
+
+def create_session() -> requests.Session:
+    """Одна сессия на контейнер: keep-alive к Telegram и SpeechKit"""
+    session = requests.Session()
+    retry = Retry(total=2, connect=2, read=0, backoff_factor=0.3)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS * 2, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+
+session = create_session()
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+
 @app.route("/", methods=["POST"])
 def main():
     event = request.get_json(force=True)
     return handler(event, {})
 
-def recognize_audio(file_path):
-    with open(file_path, "rb") as f:
-        audio_bytes = f.read()
-    headers = {
-        "Authorization": f"Bearer {IAM_TOKEN}",
-        "Content-Type": "audio/ogg"
-    }
-    params = {
-        "folderId": FOLDER_ID,
-        "lang": "ru-RU",
-        "enableAutomaticPunctuation": "true"
-    }
-    response = requests.post(
-        "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize",
-        headers=headers,
-        params=params,
-        data=audio_bytes,
+
+# === Распознавание ===
+
+class SpeechKitRecognizer:
+    """Синхронное распознавание через SpeechKit v1"""
+
+    def __init__(self, http: requests.Session, iam_token: Optional[str], folder_id: Optional[str]):
+        self.http = http
+        self.iam_token = iam_token
+        self.folder_id = folder_id
+
+    def recognize(self, audio: bytes, audio_format: str = "oggopus") -> str:
+        params = {
+            "folderId": self.folder_id,
+            "lang": "ru-RU",
+            "enableAutomaticPunctuation": "true",
+            "format": audio_format
+        }
+        if audio_format == "lpcm":
+            params["sampleRateHertz"] = SAMPLE_RATE
+        response = self.http.post(
+            STT_URL,
+            headers={"Authorization": f"Bearer {self.iam_token}"},
+            params=params,
+            data=audio,
+            timeout=HTTP_TIMEOUT
+        )
+        result = response.json()
+        if response.status_code != 200 or "error_code" in result:
+            raise RuntimeError(f"SpeechKit {response.status_code}: {result.get('error_message', result)}")
+        return result.get("result", "")
+
+
+class StubRecognizer:
+    """Локальная заглушка для офлайн-замеров: задержка как у сервиса, без сети"""
+
+    def __init__(self, base_latency: float = 0.3, latency_per_second: float = 0.02):
+        self.base_latency = base_latency
+        self.latency_per_second = latency_per_second
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def recognize(self, audio: bytes, audio_format: str = "oggopus") -> str:
+        with self._lock:
+            self.calls += 1
+        seconds = len(audio) / BYTES_PER_SECOND if audio_format == "lpcm" else 0.0
+        time.sleep(self.base_latency + self.latency_per_second * seconds)
+        return f"[{audio_format} {len(audio)} байт]"
+
+
+def create_recognizer():
+    if os.environ.get("SPEECHKIT_RECOGNIZER") == "stub":
+        return StubRecognizer(
+            base_latency=float(os.environ.get("SPEECHKIT_STUB_LATENCY", 0.3))
+        )
+    return SpeechKitRecognizer(session, IAM_TOKEN, FOLDER_ID)
+
+
+# === Перекодирование и нарезка ===
+
+def ogg_to_pcm(ogg_data: bytes) -> bytes:
+    """OGG/Opus -> LPCM 16 кГц моно через каналы ffmpeg, без временных файлов"""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-ar", str(SAMPLE_RATE), "-ac", "1",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "pipe:1"
+        ],
+        input=ogg_data,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False
     )
-    logging.info(f"SpeechKit response: {response.text}")
-    result = response.json()
-    return result.get("result")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def _quietest_offset(pcm: bytes, start: int, end: int, frame_bytes: int = 640) -> int:
+    """
+    Граница самого тихого кадра (20 мс) в диапазоне, чтобы не резать слова.
+
+    При равной громкости берется самый поздний кадр: куски не дробятся.
+    """
+    best_offset, best_energy = end, None
+    for offset in range(start, end - frame_bytes + 1, frame_bytes):
+        samples = array("h", pcm[offset:offset + frame_bytes])
+        energy = sum(abs(sample) for sample in samples[::4])
+        if best_energy is None or energy <= best_energy:
+            best_offset, best_energy = offset, energy
+    return best_offset
+
+
+def split_pcm(pcm: bytes, chunk_seconds: int = CHUNK_SECONDS, search_seconds: int = 3) -> List[bytes]:
+    """Нарезает LPCM на куски не длиннее chunk_seconds по паузам"""
+    chunk_bytes = chunk_seconds * BYTES_PER_SECOND
+    search_bytes = search_seconds * BYTES_PER_SECOND
+    chunks = []
+    position = 0
+    while len(pcm) - position > chunk_bytes:
+        end = position + chunk_bytes
+        cut = _quietest_offset(pcm, max(position + 2, end - search_bytes), end)
+        cut -= cut % 2
+        chunks.append(pcm[position:cut])
+        position = cut
+    if position < len(pcm):
+        chunks.append(pcm[position:])
+    return chunks
+
 
+class RecognitionCache:
+    """LRU результатов по file_unique_id (одинаков у пересланных голосовых)"""
 
-def ogg_to_wav(ogg_path):
-    wav_path = tempfile.mktemp(suffix=".wav")
-    subprocess.run([
-        "ffmpeg", "-y", "-i", ogg_path,
-        "-ar", "16000", "-ac", "1",
-        "-f", "wav", "-acodec", "pcm_s16le",
-        wav_path
-    ], check=True)
-    return wav_path
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._items[key] = text
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class VoicePipeline:
+    """
+    Голосовое -> текст.
+
+    Короткие записи уходят в SpeechKit как есть (OGG/Opus), длинные
+    перекодируются в LPCM и распознаются кусками параллельно. Результат
+    кэшируется по file_unique_id; одновременные запросы одного файла
+    (повторная доставка вебхука) ждут общий результат.
+    """
+
+    def __init__(self, recognizer, fetch_audio: Callable[[str], bytes],
+                 transcode: Callable[[bytes], bytes] = ogg_to_pcm,
+                 cache: Optional[RecognitionCache] = None, pool: Optional[ThreadPoolExecutor] = None):
+        self.recognizer = recognizer
+        self.fetch_audio = fetch_audio
+        self.transcode = transcode
+        self.cache = cache or RecognitionCache()
+        self.pool = pool or executor
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, audio: bytes, duration: int) -> List[Tuple[bytes, str]]:
+        if duration < SYNC_MAX_SECONDS and len(audio) <= SYNC_MAX_BYTES:
+            return [(audio, "oggopus")]
+        return [(chunk, "lpcm") for chunk in split_pcm(self.transcode(audio))]
+
+    def _recognize(self, voice: Dict) -> str:
+        audio = self.fetch_audio(voice["file_id"])
+        parts = self.prepare(audio, voice.get("duration", 0))
+        if len(parts) == 1:
+            return self.recognizer.recognize(*parts[0])
+        futures = [self.pool.submit(self.recognizer.recognize, data, fmt) for data, fmt in parts]
+        texts = [future.result() for future in futures]
+        return " ".join(text for text in texts if text)
+
+    def process(self, voice: Dict) -> str:
+        key = voice.get("file_unique_id") or voice["file_id"]
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            text = self._recognize(voice)
+            self.cache.put(key, text)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+# === Telegram ===
+
+def download_voice(file_id: str) -> bytes:
+    resp = session.get(
+        f"{TELEGRAM_API}/bot{TELEGRAM_TOKEN}/getFile",
+        params={"file_id": file_id},
+        timeout=HTTP_TIMEOUT
+    )
+    file_path = resp.json()["result"]["file_path"]
+    file_resp = session.get(f"{TELEGRAM_API}/file/bot{TELEGRAM_TOKEN}/{file_path}", timeout=HTTP_TIMEOUT)
+    file_resp.raise_for_status()
+    return file_resp.content
+
+
+def send_message(chat_id, text: str):
+    session.post(
+        f"{TELEGRAM_API}/bot{TELEGRAM_TOKEN}/sendMessage",
+        json={"chat_id": chat_id, "text": text},
+        timeout=HTTP_TIMEOUT
+    )
+
+
+pipeline = VoicePipeline(create_recognizer(), download_voice)
 
 
 def handler(event, context):
-    logging.info(f"EVENT: {json.dumps(event)}")
+    message = event.get("message", {})
+    logging.info(f"EVENT: update {event.get('update_id')}, chat {message.get('chat', {}).get('id')}")
     try:
-        message = event.get("message", {})
         chat_id = message.get("chat", {}).get("id")
         text = message.get("text", "")
 
         # === Обработка голосовых сообщений ===
         if "voice" in message:
-            file_id = message["voice"]["file_id"]
-            resp = requests.get(
-                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getFile",
-                params={"file_id": file_id}
-            )
-            file_path = resp.json()["result"]["file_path"]
-            file_url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{file_path}"
-            ogg_data = requests.get(file_url).content
-
-            with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as ogg_file:
-                ogg_file.write(ogg_data)
-                ogg_path = ogg_file.name
-            recognized = recognize_audio(ogg_path)
+            started = time.perf_counter()
+            try:
+                recognized = pipeline.process(message["voice"])
+                logging.info(f"Распознано за {time.perf_counter() - started:.2f} с")
+            except Exception as e:
+                # Отвечаем 200: иначе Telegram повторит доставку и файл распознается заново
+                logging.error(f"Ошибка распознавания: {e}", exc_info=True)
+                recognized = None
 
             reply = f"Распознано: {recognized}" if recognized else "Ошибка распознавания"
-            requests.post(
-                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-                json={"chat_id": chat_id, "text": reply}
-            )
+            send_message(chat_id, reply)
         elif TELEGRAM_TOKEN and chat_id and text:
-            reply = f"Вы написали: {text}"
-            requests.post(
-                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-                json={"chat_id": chat_id, "text": reply}
-            )
+            send_message(chat_id, f"Вы написали: {text}")
         elif not TELEGRAM_TOKEN:
             logging.error("TELEGRAM_BOT_TOKEN не найден!")
 
@@ -103,6 +314,48 @@ def handler(event, context):
             "body": json.dumps({"ok": False, "error": str(e)})
         }
 
+
+# === Офлайн-замер ===
+
+def benchmark(messages: int = 40, duration: int = 75, repeat_share: float = 0.25, concurrency: int = 8):
+    """
+    Прогон пайплайна на заглушке: python index.py bench [сообщений] [секунд]
+
+    Аудио синтетическое (LPCM), перекодирование пропускается; часть
+    сообщений повторяет file_unique_id, чтобы проверить кэш.
+    """
+    recognizer = StubRecognizer(base_latency=float(os.environ.get("SPEECHKIT_STUB_LATENCY", 0.3)))
+    audio = bytes(duration * BYTES_PER_SECOND)
+    bench = VoicePipeline(recognizer, lambda file_id: audio, transcode=lambda data: data,
+                          cache=RecognitionCache(), pool=ThreadPoolExecutor(max_workers=MAX_WORKERS))
+    unique = max(1, int(messages * (1 - repeat_share)))
+    voices = [
+        {"file_id": f"file_{i % unique}", "file_unique_id": f"uniq_{i % unique}", "duration": duration}
+        for i in range(messages)
+    ]
+
+    latencies = []
+
+    def timed(voice):
+        started = time.perf_counter()
+        bench.process(voice)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(timed, voices))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Сообщений: {messages} по {duration} с, уникальных: {unique}")
+    print(f"Вызовов распознавания: {recognizer.calls}")
+    print(f"Задержка p50: {latencies[len(latencies) // 2]:.2f} с, p95: {latencies[int(len(latencies) * 0.95) - 1]:.2f} с")
+    print(f"Пропускная способность: {messages / elapsed:.1f} сообщений/с")
+
+
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port) 
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*(int(arg) for arg in sys.argv[2:4]))
+    else:
+        port = int(os.environ.get("PORT", 8080))
+        app.run(host="0.0.0.0", port=port)
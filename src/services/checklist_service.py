@@ -15,6 +15,7 @@ from notion_client import AsyncClient
 from ..core.config import settings
 from ..models.base import BaseModel
 from src.utils.logging_utils import get_logger
+from src.utils.notion_blocks import NotionBlockReader
 
 logger = get_logger(__name__)
 
@@ -26,6 +27,7 @@ class ChecklistService(BaseModel):
     def __init__(self):
         super().__init__()
         self.client = AsyncClient(auth=settings.NOTION_TOKEN)
+        self.block_reader = NotionBlockReader(self.client)
         
         # ID баз данных
         self.databases = {
@@ -53,14 +55,25 @@ class ChecklistService(BaseModel):
                 if match.strip():
                     # Извлекаем отдельные пункты
                     items = re.findall(r'- \[ \] (.*?)(?=\n- \[ \]|\n##|\n###|\Z)', match, re.DOTALL)
-                    if items:
+                    items = [self._clean_checklist_item(item) for item in items]
+                    if any(items):
                         checklists.append({
                             'title': 'Чеклист из гайда',
-                            'items': [item.strip() for item in items if item.strip()]
+                            'items': [item for item in items if item]
                         })
         
         return checklists
     
+    @staticmethod
+    def _clean_checklist_item(item: str) -> str:
+        """Пункт с вложенными строками -> текст без отступов и маркеров списка"""
+        lines = []
+        for line in item.splitlines():
+            line = re.sub(r'^\s*(?:[-*]\s+(?:\[[ x]\]\s+)?|\d+\.\s+|>\s*)?', '', line).strip()
+            if line:
+                lines.append(line)
+        return "\n".join(lines)
+    
     async def create_checklist_item(self, title: str, items: List[str], task_id: str, guide_id: str = None) -> Optional[str]:
         """Создает запись чеклиста (только необходимые поля)"""
         
@@ -130,7 +143,7 @@ class ChecklistService(BaseModel):
             logger.error(f"❌ Ошибка создания чеклиста: {e}")
             return None
     
-    async def process_task_creation(self, task_id: str) -> int:
+    async def _process_task_creation(self, task_id: str) -> int:
         """Обрабатывает создание новой задачи"""
         
         logger.info(f"🎯 Обработка задачи: {task_id}")
@@ -161,8 +174,8 @@ class ChecklistService(BaseModel):
                 
                 logger.info(f"📖 Обработка гайда: {guide_title}")
                 
-                # Получаем контент гайда
-                guide_content = await self.get_guide_content(guide_id)
+                # Получаем контент гайда (из кэша, если гайд не менялся); без разметки - пункты копируются в Notion
+                guide_content = await self.get_guide_content(guide_id, guide.get('last_edited_time'), plain=True)
                 
                 if guide_content:
                     # Извлекаем чеклисты
@@ -195,35 +208,15 @@ class ChecklistService(BaseModel):
             logger.error(f"❌ Ошибка обработки задачи: {e}")
             return 0
     
-    async def get_guide_content(self, guide_id: str) -> Optional[str]:
-        """Получает контент гайда"""
+    async def get_guide_content(self, guide_id: str, last_edited_time: Optional[str] = None,
+                                plain: bool = False) -> Optional[str]:
+        """
+        Получает полный контент гайда в markdown (все страницы и вложенные блоки).
+        plain=True - структура markdown, но текст без inline-разметки.
+        """
         
         try:
-            # Получаем блоки гайда
-            blocks = await self.client.blocks.children.list(block_id=guide_id)
-            
-            content = []
-            for block in blocks.get('results', []):
-                if block['type'] == 'paragraph':
-                    rich_text = block['paragraph'].get('rich_text', [])
-                    if rich_text:
-                        content.append(rich_text[0]['text']['content'])
-                elif block['type'] == 'heading_2':
-                    rich_text = block['heading_2'].get('rich_text', [])
-                    if rich_text:
-                        content.append(f"## {rich_text[0]['text']['content']}")
-                elif block['type'] == 'heading_3':
-                    rich_text = block['heading_3'].get('rich_text', [])
-                    if rich_text:
-                        content.append(f"### {rich_text[0]['text']['content']}")
-                elif block['type'] == 'to_do':
-                    rich_text = block['to_do'].get('rich_text', [])
-                    checked = block['to_do'].get('checked', False)
-                    if rich_text:
-                        checkbox = "[x]" if checked else "[ ]"
-                        content.append(f"- {checkbox} {rich_text[0]['text']['content']}")
-            
-            return "\n".join(content)
+            return await self.block_reader.read_markdown(guide_id, last_edited_time, plain)
             
         except Exception as e:
             logger.error(f"❌ Ошибка получения контента гайда: {e}")
@@ -263,7 +256,7 @@ class ChecklistService(BaseModel):
 
     async def copy_checklists_from_guides_to_task(self, task_id: str) -> int:
         """Копирует чеклисты из всех связанных с задачей гайдов в задачу (универсально)"""
-        return await self.process_task_creation(task_id)
+        return await self._process_task_creation(task_id)
 
     # process_task_creation оставляем как алиас для обратной совместимости
     process_task_creation = copy_checklists_from_guides_to_task
@@ -4,9 +4,11 @@ Content Manager - Система управления контентом
 """
 
 import asyncio
+import bisect
 import logging
 import os
-from typing import Dict, List, Any, Optional, Union
+import time
+from typing import Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
@@ -73,33 +75,102 @@ class ContentPiece:
     notes: str = ""
     engagement_target: Optional[Dict[str, int]] = None  # likes, comments, views
     
+def _time_key(value: datetime) -> str:
+    """Ключ сортировки по локальному времени публикации (как в strftime)"""
+    return value.strftime("%Y-%m-%dT%H:%M:%S")
+
 class ContentCalendar:
-    """Календарь контента с планированием"""
+    """
+    Календарь контента с индексами по дате и статусу.
+    
+    Повторное добавление контента с тем же ID заменяет прежнюю запись,
+    поэтому календарь можно пополнять инкрементальной синхронизацией.
+    Статус и время, под которыми запись проиндексирована, хранятся
+    отдельно: объект контента могут изменить на месте до повторного
+    добавления.
+    """
     
     def __init__(self):
+        self.items: Dict[str, ContentPiece] = {}  # content id -> content
+        self.page_ids: Dict[str, str] = {}  # content id -> Notion page id
         self.scheduled_content: Dict[str, List[ContentPiece]] = {}  # date -> content list
-        
-    def add_content(self, content: ContentPiece):
-        """Добавление контента в календарь"""
-        if content.scheduled_time:
-            date_key = content.scheduled_time.strftime("%Y-%m-%d")
-            if date_key not in self.scheduled_content:
-                self.scheduled_content[date_key] = []
-            self.scheduled_content[date_key].append(content)
+        self._timeline: List[tuple] = []  # отсортированные (время, content id)
+        self._by_status: Dict[ContentStatus, Dict[str, ContentPiece]] = {}
+        self._status_sorted: Dict[ContentStatus, List[ContentPiece]] = {}  # кэш сортировки
+        self._indexed: Dict[str, Tuple[ContentStatus, Optional[str]]] = {}  # content id -> (статус, ключ времени)
+        
+    def add_content(self, content: ContentPiece, page_id: Optional[str] = None):
+        """Добавление (или замена) контента в календаре"""
+        self.remove_content(content.id)
+        self.items[content.id] = content
+        if page_id:
+            self.page_ids[content.id] = page_id
+        self._by_status.setdefault(content.status, {})[content.id] = content
+        self._status_sorted.pop(content.status, None)
+        
+        key = _time_key(content.scheduled_time) if content.scheduled_time else None
+        self._indexed[content.id] = (content.status, key)
+        if key:
+            bisect.insort(self._timeline, (key, content.id))
+            self.scheduled_content.setdefault(key[:10], []).append(content)
+    
+    def remove_content(self, content_id: str):
+        """Удаление контента из всех индексов"""
+        self.items.pop(content_id, None)
+        indexed = self._indexed.pop(content_id, None)
+        if not indexed:
+            return
+        status, key = indexed
+        self._by_status.get(status, {}).pop(content_id, None)
+        self._status_sorted.pop(status, None)
+        
+        if key:
+            entry = (key, content_id)
+            index = bisect.bisect_left(self._timeline, entry)
+            if index < len(self._timeline) and self._timeline[index] == entry:
+                del self._timeline[index]
+            day = self.scheduled_content.get(key[:10], [])
+            day[:] = [item for item in day if item.id != content_id]
+            if not day:
+                self.scheduled_content.pop(key[:10], None)
+    
+    def _slice(self, start: datetime, end: datetime) -> List[tuple]:
+        left = bisect.bisect_left(self._timeline, (_time_key(start),))
+        right = bisect.bisect_left(self._timeline, (_time_key(end),))
+        return self._timeline[left:right]
+    
+    def get_range(self, start: datetime, end: datetime) -> List[ContentPiece]:
+        """Контент с временем публикации в [start, end), по возрастанию"""
+        return [self.items[content_id] for _, content_id in self._slice(start, end)]
     
     def get_content_for_date(self, date: datetime) -> List[ContentPiece]:
         """Получение контента на определенную дату"""
-        date_key = date.strftime("%Y-%m-%d")
-        return self.scheduled_content.get(date_key, [])
+        start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.get_range(start, start + timedelta(days=1))
+    
+    def _group_by_day(self, start: datetime, days: int) -> Dict[str, List[ContentPiece]]:
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        grouped = {(start + timedelta(days=i)).strftime("%Y-%m-%d"): [] for i in range(days)}
+        for key, content_id in self._slice(start, start + timedelta(days=days)):
+            grouped[key[:10]].append(self.items[content_id])
+        return grouped
     
     def get_week_content(self, start_date: datetime) -> Dict[str, List[ContentPiece]]:
         """Получение контента на неделю"""
-        week_content = {}
-        for i in range(7):
-            current_date = start_date + timedelta(days=i)
-            date_key = current_date.strftime("%Y-%m-%d")
-            week_content[date_key] = self.get_content_for_date(current_date)
-        return week_content
+        return self._group_by_day(start_date, 7)
+    
+    def get_month_content(self, year: int, month: int) -> Dict[str, List[ContentPiece]]:
+        """Получение контента на месяц"""
+        start = datetime(year, month, 1)
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        return self._group_by_day(start, (next_month - start).days)
+    
+    def get_by_status(self, status: ContentStatus) -> List[ContentPiece]:
+        """Контент со статусом, сначала недавно обновленный"""
+        if status not in self._status_sorted:
+            self._status_sorted[status] = sorted(self._by_status.get(status, {}).values(),
+                                                 key=lambda content: _time_key(content.updated_at), reverse=True)
+        return list(self._status_sorted[status])
 
 class ContentManager:
     """Менеджер контента с полным функционалом"""
@@ -111,6 +182,14 @@ class ContentManager:
         self.calendar = ContentCalendar()
         self.content_templates = {}
         
+        # Инкрементальная синхронизация календаря с базой контента
+        self.sync_interval = 60  # секунд между запросами к Notion
+        self.full_sync_interval = timedelta(hours=24)  # полная пересборка (удаленные страницы)
+        self._last_edited_cursor: Optional[str] = None
+        self._last_sync = 0.0
+        self._last_full_sync: Optional[datetime] = None
+        self._sync_lock = asyncio.Lock()
+        
     async def create_content_draft(
         self,
         title: str,
@@ -148,12 +227,8 @@ class ContentManager:
             author_id=author_telegram_id or "unknown"
         )
         
-        # Сохранение в Notion
+        # Сохранение в Notion (и в календарь)
         await self._save_content_to_notion(content)
-        
-        # Добавление в календарь если запланировано
-        if scheduled_time:
-            self.calendar.add_content(content)
             
         return content
     
@@ -188,7 +263,6 @@ class ContentManager:
             content.hashtags = hashtags
         if scheduled_time:
             content.scheduled_time = scheduled_time
-            self.calendar.add_content(content)
         if notes is not None:
             content.notes = notes
             
@@ -203,8 +277,71 @@ class ContentManager:
             
         return True
     
+    async def _query_all(self, database_id: str, **params) -> List[Dict]:
+        """Постраничный запрос к базе (больше 100 результатов)"""
+        results = []
+        start_cursor = None
+        while True:
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            response = await self.notion.databases.query(database_id=database_id, page_size=100, **params)
+            results.extend(response.get("results", []))
+            if not response.get("has_more"):
+                return results
+            start_cursor = response.get("next_cursor")
+    
+    async def sync_calendar(self, force: bool = False, force_full: bool = False) -> int:
+        """
+        Синхронизация календаря с базой контента.
+        
+        Запрашивает только страницы, измененные с прошлой синхронизации;
+        раз в full_sync_interval календарь пересобирается целиком, чтобы
+        убрать удаленные страницы. Возвращает число обновленных записей.
+        """
+        async with self._sync_lock:
+            if not force and not force_full and time.monotonic() - self._last_sync < self.sync_interval:
+                return 0
+            
+            now = datetime.now()
+            full = force_full or self._last_edited_cursor is None or \
+                self._last_full_sync is None or now - self._last_full_sync >= self.full_sync_interval
+            
+            params = {"sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+            if not full:
+                params["filter"] = {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": self._last_edited_cursor}
+                }
+            
+            try:
+                pages = await self._query_all(self.content_db_id, **params)
+            except Exception as e:
+                logger.error(f"Error syncing content calendar: {e}")
+                return 0
+            
+            if full:
+                self.calendar = ContentCalendar()
+                self._last_full_sync = now
+            
+            for page in pages:
+                content = self._parse_content_page(page)
+                if content:
+                    self.calendar.add_content(content, page["id"])
+                edited = page.get("last_edited_time")
+                if edited and (self._last_edited_cursor is None or edited > self._last_edited_cursor):
+                    self._last_edited_cursor = edited
+            
+            self._last_sync = time.monotonic()
+            logger.info(f"Content calendar synced: {len(pages)} pages ({'full' if full else 'incremental'})")
+            return len(pages)
+    
     async def get_content(self, content_id: str) -> Optional[ContentPiece]:
         """Получение контента по ID"""
+        await self.sync_calendar()
+        content = self.calendar.items.get(content_id)
+        if content:
+            return content
+        
         try:
             # Поиск в базе Notion
             response = await self.notion.databases.query(
@@ -216,7 +353,11 @@ class ContentManager:
             )
             
             if response["results"]:
-                return await self._parse_content_from_notion(response["results"][0])
+                page = response["results"][0]
+                content = self._parse_content_page(page)
+                if content:
+                    self.calendar.add_content(content, page["id"])
+                return content
                 
         except Exception as e:
             logger.error(f"Error getting content {content_id}: {e}")
@@ -225,66 +366,24 @@ class ContentManager:
     
     async def get_content_by_status(self, status: ContentStatus) -> List[ContentPiece]:
         """Получение контента по статусу"""
-        try:
-            response = await self.notion.databases.query(
-                database_id=self.content_db_id,
-                filter={
-                    "property": "Статус",
-                    "select": {"equals": status.value}
-                },
-                sorts=[{"property": "Обновлено", "direction": "descending"}]
-            )
-            
-            content_list = []
-            for page in response["results"]:
-                content = await self._parse_content_from_notion(page)
-                if content:
-                    content_list.append(content)
-                    
-            return content_list
-            
-        except Exception as e:
-            logger.error(f"Error getting content by status {status}: {e}")
-            return []
+        await self.sync_calendar()
+        return self.calendar.get_by_status(status)
     
     async def get_scheduled_content(self, date: datetime) -> List[ContentPiece]:
         """Получение запланированного контента на дату"""
-        try:
-            start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=1)
-            
-            response = await self.notion.databases.query(
-                database_id=self.content_db_id,
-                filter={
-                    "and": [
-                        {
-                            "property": "Дата публикации",
-                            "date": {"on_or_after": start_date.isoformat()}
-                        },
-                        {
-                            "property": "Дата публикации",  
-                            "date": {"before": end_date.isoformat()}
-                        },
-                        {
-                            "property": "Статус",
-                            "select": {"equals": ContentStatus.SCHEDULED.value}
-                        }
-                    ]
-                },
-                sorts=[{"property": "Дата публикации", "direction": "ascending"}]
-            )
-            
-            content_list = []
-            for page in response["results"]:
-                content = await self._parse_content_from_notion(page)
-                if content:
-                    content_list.append(content)
-                    
-            return content_list
-            
-        except Exception as e:
-            logger.error(f"Error getting scheduled content: {e}")
-            return []
+        await self.sync_calendar()
+        return [content for content in self.calendar.get_content_for_date(date)
+                if content.status == ContentStatus.SCHEDULED]
+    
+    async def get_week_content(self, start_date: datetime) -> Dict[str, List[ContentPiece]]:
+        """Календарь контента на неделю"""
+        await self.sync_calendar()
+        return self.calendar.get_week_content(start_date)
+    
+    async def get_month_content(self, year: int, month: int) -> Dict[str, List[ContentPiece]]:
+        """Календарь контента на месяц"""
+        await self.sync_calendar()
+        return self.calendar.get_month_content(year, month)
     
     async def upload_media_file(
         self,
@@ -548,27 +647,34 @@ class ContentManager:
             properties["Хештеги"] = {"rich_text": [{"text": {"content": " ".join(["#" + tag for tag in content.hashtags])}}]}
         
         try:
-            # Проверяем, существует ли уже страница
-            existing = await self.notion.databases.query(
-                database_id=self.content_db_id,
-                filter={
-                    "property": "ID",
-                    "rich_text": {"equals": content.id}
-                }
-            )
+            # Проверяем, существует ли уже страница (сначала по календарю)
+            page_id = self.calendar.page_ids.get(content.id)
+            if not page_id:
+                existing = await self.notion.databases.query(
+                    database_id=self.content_db_id,
+                    filter={
+                        "property": "ID",
+                        "rich_text": {"equals": content.id}
+                    }
+                )
+                if existing["results"]:
+                    page_id = existing["results"][0]["id"]
             
-            if existing["results"]:
+            if page_id:
                 # Обновляем существующую
                 await self.notion.pages.update(
-                    page_id=existing["results"][0]["id"],
+                    page_id=page_id,
                     properties=properties
                 )
             else:
                 # Создаем новую
-                await self.notion.pages.create(
+                page = await self.notion.pages.create(
                     parent={"database_id": self.content_db_id},
                     properties=properties
                 )
+                page_id = page["id"]
+            
+            self.calendar.add_content(content, page_id)
                 
         except Exception as e:
             logger.error(f"Error saving content to Notion: {e}")
@@ -601,8 +707,63 @@ class ContentManager:
     
     async def _parse_content_from_notion(self, page: Dict) -> Optional[ContentPiece]:
         """Парсинг контента из страницы Notion"""
-        # Реализация парсинга свойств Notion в объект ContentPiece
-        return None
+        return self._parse_content_page(page)
+    
+    @staticmethod
+    def _parse_content_page(page: Dict) -> Optional[ContentPiece]:
+        """Синхронный парсинг свойств Notion в объект ContentPiece"""
+        props = page.get("properties", {})
+        
+        def text(name: str, kind: str = "rich_text") -> str:
+            return "".join(part.get("plain_text", "") for part in props.get(name, {}).get(kind) or [])
+        
+        def select(name: str) -> Optional[str]:
+            return (props.get(name, {}).get("select") or {}).get("name")
+        
+        def date(name: str) -> Optional[datetime]:
+            start = (props.get(name, {}).get("date") or {}).get("start")
+            return datetime.fromisoformat(start.replace("Z", "+00:00")) if start else None
+        
+        content_id = text("ID")
+        if not content_id:
+            return None
+        
+        try:
+            content_type = ContentType(select("Тип"))
+        except ValueError:
+            content_type = ContentType.POST
+        try:
+            status = ContentStatus(select("Статус"))
+        except ValueError:
+            status = ContentStatus.DRAFT
+        
+        platform_values = {platform.value: platform for platform in Platform}
+        platforms = [platform_values[option["name"]] for option in props.get("Платформы", {}).get("multi_select") or []
+                     if option.get("name") in platform_values]
+        hashtags = [tag.lstrip("#") for tag in text("Хештеги").split() if tag.strip("#")]
+        
+        try:
+            created_at = date("Создано") or datetime.fromisoformat(page["created_time"].replace("Z", "+00:00"))
+            updated_at = date("Обновлено") or datetime.fromisoformat(page["last_edited_time"].replace("Z", "+00:00"))
+            scheduled_time = date("Дата публикации")
+        except (KeyError, ValueError) as e:
+            logger.error(f"Error parsing content dates {content_id}: {e}")
+            return None
+        
+        return ContentPiece(
+            id=content_id,
+            title=text("Название", "title"),
+            content_type=content_type,
+            status=status,
+            text_content=text("Текст"),
+            media_files=[],
+            platforms=platforms,
+            hashtags=hashtags,
+            scheduled_time=scheduled_time,
+            created_at=created_at,
+            updated_at=updated_at,
+            author_id="unknown"
+        )
     
     async def _parse_media_from_notion(self, page: Dict) -> Optional[MediaFile]:
         """Парсинг медиафайла из страницы Notion"""
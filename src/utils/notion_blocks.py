@@ -0,0 +1,147 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Блоки-страницы не раскрываем: это отдельные документы
+SKIP_CHILDREN = {"child_page", "child_database"}
+
+def rich_text_to_markdown(rich_text: List[Dict[str, Any]], plain: bool = False) -> str:
+    """Convert all rich text fragments to markdown, keeping inline formatting (unless plain)."""
+    parts = []
+    for fragment in rich_text or []:
+        text = fragment.get("plain_text", "")
+        if not text:
+            continue
+        if plain:
+            parts.append(text)
+            continue
+        annotations = fragment.get("annotations") or {}
+        if annotations.get("code"):
+            text = f"`{text}`"
+        if annotations.get("bold"):
+            text = f"**{text}**"
+        if annotations.get("italic"):
+            text = f"_{text}_"
+        if annotations.get("strikethrough"):
+            text = f"~~{text}~~"
+        href = fragment.get("href")
+        if href:
+            text = f"[{text}]({href})"
+        parts.append(text)
+    return "".join(parts)
+
+def block_to_markdown(block: Dict[str, Any], depth: int = 0, plain: bool = False) -> Optional[str]:
+    """
+    Convert a single block (without children) to a markdown line.
+
+    With plain=True the line keeps its structure (headings, list markers,
+    indentation) but the text has no inline markup - for copying into Notion.
+    """
+    block_type = block.get("type")
+    data = block.get(block_type) or {}
+    text = rich_text_to_markdown(data.get("rich_text", []), plain)
+    indent = "  " * depth
+
+    if block_type == "paragraph":
+        return f"{indent}{text}" if text else None
+    if block_type in ("heading_1", "heading_2", "heading_3"):
+        return f"{'#' * int(block_type[-1])} {text}"
+    if block_type == "to_do":
+        return f"{indent}- {'[x]' if data.get('checked') else '[ ]'} {text}"
+    if block_type in ("bulleted_list_item", "toggle"):
+        return f"{indent}- {text}"
+    if block_type == "numbered_list_item":
+        return f"{indent}1. {text}"
+    if block_type == "quote":
+        return f"{indent}> {text}"
+    if block_type == "callout":
+        icon = (data.get("icon") or {}).get("emoji", "")
+        return f"{indent}> {icon} {text}".rstrip()
+    if block_type == "code":
+        return f"{indent}```{data.get('language', '')}\n{text}\n{indent}```"
+    if block_type == "divider":
+        return f"{indent}---"
+    if block_type == "child_page":
+        return f"{indent}📄 {data.get('title', '')}"
+    if block_type in ("bookmark", "embed", "link_preview"):
+        return f"{indent}{data.get('url', '')}"
+    if block_type in ("image", "file", "pdf", "video"):
+        url = (data.get("external") or data.get("file") or {}).get("url", "")
+        caption = rich_text_to_markdown(data.get("caption", []), plain)
+        if plain:
+            return f"{indent}{caption} {url}".rstrip() if caption else f"{indent}{url}"
+        return f"{indent}[{caption or block_type}]({url})"
+    return f"{indent}{text}" if text else None
+
+class NotionBlockReader:
+    """
+    Постраничное рекурсивное чтение дерева блоков в markdown.
+
+    Дочерние блоки загружаются параллельно (не больше max_concurrency
+    запросов), строки отдаются по порядку. Результат кэшируется по
+    last_edited_time корневого блока. plain=True отдает текст без
+    inline-разметки (см. block_to_markdown).
+    """
+
+    def __init__(self, client, max_concurrency: int = 3):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._cache: Dict[Tuple[str, bool], Tuple[str, str]] = {}  # (block id, plain) -> (last_edited_time, текст)
+
+    async def _list_children(self, block_id: str, semaphore: asyncio.Semaphore) -> AsyncIterator[List[Dict]]:
+        start_cursor = None
+        while True:
+            params = {"block_id": block_id, "page_size": 100}
+            if start_cursor:
+                params["start_cursor"] = start_cursor
+            async with semaphore:
+                response = await self.client.blocks.children.list(**params)
+            yield response.get("results", [])
+            if not response.get("has_more"):
+                return
+            start_cursor = response.get("next_cursor")
+
+    async def _collect(self, block_id: str, depth: int, semaphore: asyncio.Semaphore, plain: bool) -> List[str]:
+        return [line async for line in self._stream(block_id, depth, semaphore, plain)]
+
+    async def _stream(self, block_id: str, depth: int, semaphore: asyncio.Semaphore,
+                      plain: bool = False) -> AsyncIterator[str]:
+        async for blocks in self._list_children(block_id, semaphore):
+            # Поддеревья всей страницы результатов загружаются параллельно
+            subtrees = {
+                block["id"]: asyncio.ensure_future(self._collect(block["id"], depth + 1, semaphore, plain))
+                for block in blocks
+                if block.get("has_children") and block.get("type") not in SKIP_CHILDREN
+            }
+            try:
+                for block in blocks:
+                    line = block_to_markdown(block, depth, plain)
+                    if line is not None:
+                        yield line
+                    if block["id"] in subtrees:
+                        for child_line in await subtrees[block["id"]]:
+                            yield child_line
+            finally:
+                for task in subtrees.values():
+                    task.cancel()
+
+    async def iter_markdown(self, block_id: str, plain: bool = False) -> AsyncIterator[str]:
+        """Строки markdown всего дерева блоков по мере загрузки"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async for line in self._stream(block_id, 0, semaphore, plain):
+            yield line
+
+    async def read_markdown(self, block_id: str, last_edited_time: Optional[str] = None,
+                            plain: bool = False) -> str:
+        """Markdown всего дерева; без изменений блока возвращается из кэша"""
+        if last_edited_time is None:
+            block = await self.client.blocks.retrieve(block_id=block_id)
+            last_edited_time = block.get("last_edited_time")
+
+        cached = self._cache.get((block_id, plain))
+        if cached and last_edited_time and cached[0] == last_edited_time:
+            return cached[1]
+
+        markdown = "\n".join([line async for line in self.iter_markdown(block_id, plain)])
+        if last_edited_time:
+            self._cache[(block_id, plain)] = (last_edited_time, markdown)
+        return markdown
@@ -1,3 +1,6 @@
+import argparse
+import asyncio
+import hashlib
 import json
 import os
 from datetime import datetime, timedelta
@@ -6,6 +9,8 @@ from typing import Dict, List, Any, Optional
 import requests
 from dotenv import load_dotenv
 
+from utils.notion_rate_limiter import notion_rate_limiter
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -16,17 +21,47 @@ TEAMS_DB_ID = os.getenv("NOTION_TEAMS_DB_ID")
 if not all([NOTION_TOKEN, TASKS_DB_ID, TEAMS_DB_ID]):
     raise RuntimeError("Необходимы NOTION_TOKEN, NOTION_TASKS_DB_ID, NOTION_TEAMS_DB_ID")
 
+CHECKPOINT_FILE = "task_fixes_checkpoint.jsonl"
+
+# Сколько исправлений каждого типа применять за запуск (--all снимает ограничения)
+FIX_LIMITS = {
+    "assigned_employee": 10,
+    "set_status": 10,
+    "moved_to_progress": 5
+}
+
+ASSIGNEE_FIELDS = ["Участники", "Assignee", "Исполнитель", "Responsible"]
+STATUS_FIELDS = ["Статус", "Status"]
+
 class TaskManagementFixer:
-    """Автоматическое исправление проблем в системе управления задачами"""
+    """
+    Автоматическое исправление проблем в системе управления задачами
+
+    Проходы fix_* только планируют изменения: по одной записи на задачу,
+    без повторов и без изменений, которые ничего не меняют. apply_changes()
+    отправляет план параллельно через общий ограничитель Notion и отмечает
+    каждое примененное изменение в checkpoint-файле, поэтому повторный
+    запуск продолжает с места остановки.
+    """
     
-    def __init__(self):
+    def __init__(self, limits: Optional[Dict[str, int]] = FIX_LIMITS, checkpoint_path: str = CHECKPOINT_FILE):
         self.headers = {
             "Authorization": f"Bearer {NOTION_TOKEN}",
             "Notion-Version": "2022-06-28",
             "Content-Type": "application/json"
         }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.limits = limits or {}
+        self.checkpoint_path = checkpoint_path
         self.employees = {}
+        self.employees_by_name: Dict[str, Dict] = {}
         self.tasks = []
+        self.changes: Dict[str, Dict[str, Any]] = {}  # task id -> запланированное изменение
+        self.applied_keys: Optional[set] = None  # ключи из checkpoint, читаются при планировании
+        self._claimed = set()  # (task id, поле), уже занятые проходами или checkpoint
+        self.planned_counts = defaultdict(int)
+        self.skipped_from_checkpoint = 0
         self.fixes_applied = defaultdict(list)
         self.errors = []
         
@@ -39,6 +74,7 @@ class TaskManagementFixer:
             # Загружаем сотрудников
             for emp in report.get("employees", []):
                 self.employees[emp["id"]] = emp
+                self.employees_by_name.setdefault(self._normalize_name(emp["name"]), emp)
             
             # Загружаем задачи из отчета
             if "tasks" in report:
@@ -65,7 +101,7 @@ class TaskManagementFixer:
         results = []
         payload = {}
         while True:
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self.session.post(url, json=payload)
             data = response.json()
             results.extend(data.get('results', []))
             if not data.get('has_more'):
@@ -123,13 +159,69 @@ class TaskManagementFixer:
             return props["Created time"]["created_time"]
         return ""
     
+    @staticmethod
+    def _normalize_name(name: str) -> str:
+        return " ".join(name.lower().split())
+    
     def find_employee_by_name(self, name: str) -> Optional[Dict]:
         """Находим сотрудника по имени"""
-        for emp in self.employees.values():
-            if emp["name"].lower() == name.lower():
-                return emp
+        return self.employees_by_name.get(self._normalize_name(name))
+    
+    def _find_field(self, candidates: List[str]) -> Optional[str]:
+        """Первое из полей-кандидатов, которое есть у задач"""
+        for task in self.tasks:
+            for field in candidates:
+                if field in task["properties"]:
+                    return field
         return None
     
+    def _plan_change(self, task: Dict, fix_type: str, field: str, value: Dict, detail: Dict) -> bool:
+        """
+        Добавляет изменение поля в план; False, если поле уже занято,
+        изменение применено прошлым запуском или лимит исчерпан.
+        Примененные ранее изменения в лимит не засчитываются, поэтому
+        повторный запуск берет следующую порцию.
+        """
+        # Первый проход, запланировавший поле, имеет приоритет
+        if (task["id"], field) in self._claimed:
+            return False
+        
+        if self.applied_keys is None:
+            self.applied_keys = self._load_checkpoint()
+        key = self._change_key(task["id"], field, value)
+        if key in self.applied_keys:
+            self._claimed.add((task["id"], field))
+            self.skipped_from_checkpoint += 1
+            return False
+        
+        limit = self.limits.get(fix_type)
+        if limit is not None and self.planned_counts[fix_type] >= limit:
+            return False
+        
+        self._claimed.add((task["id"], field))
+        change = self.changes.setdefault(task["id"], {
+            "task_id": task["id"],
+            "title": task["title"],
+            "properties": {},
+            "keys": [],
+            "fixes": []
+        })
+        change["properties"][field] = value
+        change["keys"].append(key)
+        change["fixes"].append({"type": fix_type, **detail})
+        self.planned_counts[fix_type] += 1
+        return True
+    
+    def _status_value(self, field: str, status: str) -> Dict:
+        """Значение поля статуса с учетом его типа (status или select)"""
+        for task in self.tasks:
+            prop = task["properties"].get(field)
+            if prop and prop.get("type") == "status":
+                return {"status": {"name": status}}
+            if prop:
+                break
+        return {"select": {"name": status}}
+    
     def fix_no_assignee_tasks(self) -> None:
         """Исправляем задачи без исполнителей"""
         print("\n🔧 Исправляем задачи без исполнителей...")
@@ -147,20 +239,20 @@ class TaskManagementFixer:
             print("   ⚠️ Нет доступных сотрудников для назначения")
             return
         
-        for task in no_assignee_tasks[:10]:  # Ограничиваем количество для безопасности
+        assignee_field = self._find_field(ASSIGNEE_FIELDS)
+        if not assignee_field:
+            self.errors.append("Не найдено поле для назначения исполнителя")
+            return
+        
+        planned = 0
+        for task in no_assignee_tasks:
             # Простая логика: назначаем первого доступного сотрудника
             employee = available_employees[0]
-            
-            try:
-                self._assign_employee_to_task(task["id"], employee["id"])
-                self.fixes_applied["assigned_employee"].append({
-                    "task": task["title"],
-                    "employee": employee["name"]
-                })
-                print(f"   ✅ Назначен {employee['name']} на задачу: {task['title']}")
-                
-            except Exception as e:
-                self.errors.append(f"Ошибка назначения {employee['name']} на {task['title']}: {e}")
+            if self._plan_change(task, "assigned_employee", assignee_field,
+                                 {"people": [{"id": employee["id"]}]},
+                                 {"task": task["title"], "employee": employee["name"]}):
+                planned += 1
+        print(f"   📋 Запланировано назначений: {planned}")
     
     def fix_unknown_assignees(self) -> None:
         """Исправляем неизвестных исполнителей"""
@@ -197,18 +289,19 @@ class TaskManagementFixer:
             print("   ✅ Нет задач без статуса")
             return
         
+        status_field = self._find_field(STATUS_FIELDS)
+        if not status_field:
+            self.errors.append("Не найдено поле для статуса")
+            return
+        
         # Устанавливаем статус "To Do" для задач без статуса
-        for task in no_status_tasks[:10]:  # Ограничиваем количество
-            try:
-                self._update_task_status(task["id"], "To Do")
-                self.fixes_applied["set_status"].append({
-                    "task": task["title"],
-                    "status": "To Do"
-                })
-                print(f"   ✅ Установлен статус 'To Do' для: {task['title']}")
-                
-            except Exception as e:
-                self.errors.append(f"Ошибка установки статуса для {task['title']}: {e}")
+        value = self._status_value(status_field, "To Do")
+        planned = sum(
+            self._plan_change(task, "set_status", status_field, value,
+                              {"task": task["title"], "status": "To Do"})
+            for task in no_status_tasks
+        )
+        print(f"   📋 Запланировано статусов 'To Do': {planned}")
     
     def fix_overdue_tasks(self) -> None:
         """Исправляем просроченные задачи"""
@@ -265,66 +358,92 @@ class TaskManagementFixer:
         for task, created in old_todo_tasks[:5]:
             print(f"      - {task['title']} (создана {created})")
         
+        status_field = self._find_field(STATUS_FIELDS)
+        if not status_field:
+            self.errors.append("Не найдено поле для статуса")
+            return
+        
         # Переводим в статус "В работе"
-        for task, created in old_todo_tasks[:5]:  # Ограничиваем количество
-            try:
-                self._update_task_status(task["id"], "In Progress")
-                self.fixes_applied["moved_to_progress"].append({
-                    "task": task["title"],
-                    "created": str(created)
-                })
-                print(f"   ✅ Переведена в 'In Progress': {task['title']}")
-                
-            except Exception as e:
-                self.errors.append(f"Ошибка перевода статуса для {task['title']}: {e}")
+        value = self._status_value(status_field, "In Progress")
+        planned = sum(
+            self._plan_change(task, "moved_to_progress", status_field, value,
+                              {"task": task["title"], "created": str(created)})
+            for task, created in old_todo_tasks
+        )
+        print(f"   📋 Запланировано переводов в 'In Progress': {planned}")
     
-    def _assign_employee_to_task(self, task_id: str, employee_id: str) -> None:
-        """Назначаем сотрудника на задачу"""
-        url = f"https://api.notion.com/v1/pages/{task_id}"
-        
-        # Определяем поле для исполнителя
-        assignee_field = None
-        for field in ["Участники", "Assignee", "Исполнитель", "Responsible"]:
-            if field in self.tasks[0]["properties"]:
-                assignee_field = field
-                break
-        
-        if not assignee_field:
-            raise ValueError("Не найдено поле для назначения исполнителя")
-        
-        properties = {
-            assignee_field: {
-                "people": [{"id": employee_id}]
-            }
-        }
-        
-        response = requests.patch(url, headers=self.headers, json={"properties": properties})
-        if response.status_code != 200:
-            raise Exception(f"API error: {response.status_code} - {response.text}")
+    @staticmethod
+    def _change_key(task_id: str, field: str, value: Dict) -> str:
+        """Ключ изменения: задача + поле + новое значение"""
+        payload = json.dumps({field: value}, sort_keys=True, ensure_ascii=False)
+        return f"{task_id}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]}"
     
-    def _update_task_status(self, task_id: str, status: str) -> None:
-        """Обновляем статус задачи"""
-        url = f"https://api.notion.com/v1/pages/{task_id}"
-        
-        # Определяем поле для статуса
-        status_field = None
-        for field in ["Статус", "Status"]:
-            if field in self.tasks[0]["properties"]:
-                status_field = field
-                break
-        
-        if not status_field:
-            raise ValueError("Не найдено поле для статуса")
-        
-        properties = {
-            status_field: {
-                "select": {"name": status}
-            }
-        }
-        
-        response = requests.patch(url, headers=self.headers, json={"properties": properties})
-        if response.status_code != 200:
-            raise Exception(f"API error: {response.status_code} - {response.text}")
+    def _load_checkpoint(self) -> set:
+        """Ключи изменений, примененных прошлыми запусками"""
+        done = set()
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)["key"])
+                    except (ValueError, KeyError):
+                        # Оборванная последняя строка после аварийного завершения
+                        continue
+        except FileNotFoundError:
+            pass
+        return done
+    
+    def _mark_applied(self, change: Dict) -> None:
+        applied_at = datetime.now().isoformat()
+        with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps({
+                "key": key,
+                "task": change["title"],
+                "applied_at": applied_at
+            }, ensure_ascii=False) + "\n" for key in change["keys"]))
+    
+    def _patch_page(self, task_id: str, properties: Dict) -> requests.Response:
+        return self.session.patch(
+            f"https://api.notion.com/v1/pages/{task_id}",
+            json={"properties": properties},
+            timeout=30
+        )
+    
+    async def _apply_change(self, change: Dict, max_attempts: int = 3) -> None:
+        for attempt in range(max_attempts):
+            async with notion_rate_limiter:
+                response = await asyncio.to_thread(self._patch_page, change["task_id"], change["properties"])
+            if response.status_code == 429 or response.status_code >= 500:
+                notion_rate_limiter.backoff(float(response.headers.get("Retry-After", 2 ** attempt)))
+                continue
+            if response.status_code != 200:
+                raise Exception(f"API error: {response.status_code} - {response.text}")
+            break
+        else:
+            raise Exception(f"API error: {response.status_code} после {max_attempts} попыток")
+        
+        self._mark_applied(change)
+        for fix in change["fixes"]:
+            fix = dict(fix)
+            self.fixes_applied[fix.pop("type")].append(fix)
+        print(f"   ✅ {change['title']}: {', '.join(fix['type'] for fix in change['fixes'])}")
+    
+    async def apply_changes(self) -> None:
+        """Применяем план параллельно (изменения из checkpoint отсеяны при планировании)"""
+        pending = list(self.changes.values())
+        print(f"\n🚀 Применяем изменения: {len(pending)} (уже применено ранее: {self.skipped_from_checkpoint})")
+        results = await asyncio.gather(
+            *(self._apply_change(change) for change in pending),
+            return_exceptions=True
+        )
+        for change, result in zip(pending, results):
+            if isinstance(result, Exception):
+                self.errors.append(f"Ошибка обновления {change['title']}: {result}")
+    
+    def print_plan(self) -> None:
+        print(f"\n📋 ПЛАН ИЗМЕНЕНИЙ: {len(self.changes)} задач")
+        for change in self.changes.values():
+            print(f"   • {change['title']}: {', '.join(fix['type'] for fix in change['fixes'])}")
     
     def generate_fix_report(self) -> None:
         """Генерируем отчет об исправлениях"""
@@ -333,6 +452,8 @@ class TaskManagementFixer:
         
         total_fixes = sum(len(fixes) for fixes in self.fixes_applied.values())
         print(f"✅ Всего применено исправлений: {total_fixes}")
+        if self.skipped_from_checkpoint:
+            print(f"⏭️ Пропущено (применены прошлым запуском): {self.skipped_from_checkpoint}")
         
         for fix_type, fixes in self.fixes_applied.items():
             if fixes:
@@ -354,7 +475,8 @@ class TaskManagementFixer:
             "timestamp": datetime.now().isoformat(),
             "fixes_applied": dict(self.fixes_applied),
             "errors": self.errors,
-            "total_fixes": total_fixes
+            "total_fixes": total_fixes,
+            "skipped_from_checkpoint": self.skipped_from_checkpoint
         }
         
         with open("task_fixes_report.json", "w", encoding="utf-8") as f:
@@ -364,22 +486,33 @@ class TaskManagementFixer:
 
 def main():
     """Основная функция"""
+    parser = argparse.ArgumentParser(description="Исправление проблем в задачах Notion")
+    parser.add_argument("--dry-run", action="store_true", help="только показать план изменений")
+    parser.add_argument("--all", action="store_true", help="без ограничения числа исправлений")
+    args = parser.parse_args()
+    
     print("🔧 АВТОМАТИЧЕСКОЕ ИСПРАВЛЕНИЕ СИСТЕМЫ УПРАВЛЕНИЯ ЗАДАЧАМИ")
     print("=" * 60)
     
-    fixer = TaskManagementFixer()
+    fixer = TaskManagementFixer(limits=None if args.all else FIX_LIMITS)
     
     if not fixer.load_audit_report():
         return 1
     
     try:
-        # Применяем исправления
+        # Планируем исправления
         fixer.fix_no_assignee_tasks()
         fixer.fix_unknown_assignees()
         fixer.fix_no_status_tasks()
         fixer.fix_overdue_tasks()
         fixer.fix_old_todo_tasks()
         
+        fixer.print_plan()
+        if args.dry_run:
+            return 0
+        
+        asyncio.run(fixer.apply_changes())
+        
         # Генерируем отчет
         fixer.generate_fix_report()
         
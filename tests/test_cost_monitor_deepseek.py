@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Тесты журнала затрат CostLedger: сжатие и восстановление после сбоя
+"""
+
+import json
+import os
+
+import pytest
+
+from cost_monitor_deepseek import CostLedger
+
+
+def record(index, cost=1.0, success=True, hour=10):
+    return {"timestamp": f"2026-10-19T{hour:02d}:{index % 60:02d}:00", "cost": cost,
+            "success": success, "request_id": f"r{index}"}
+
+
+def reopened(directory, **kwargs):
+    ledger = CostLedger(directory, **kwargs)
+    ledger.sync()
+    return ledger
+
+
+def state(ledger):
+    return ledger.totals, ledger.hourly, ledger.daily
+
+
+class TestCostLedger:
+    """Тесты CostLedger"""
+
+    def test_totals_and_buckets_survive_reopen(self, tmp_path):
+        ledger = CostLedger(tmp_path)
+        ledger.append(record(1, cost=0.5))
+        ledger.append(record(2, cost=0.25, success=False, hour=11))
+
+        assert ledger.totals == {"cost": 0.75, "requests": 2, "successful": 1, "failed": 1}
+        assert ledger.hourly == {"2026-10-19T10": 0.5, "2026-10-19T11": 0.25}
+        assert ledger.daily == {"2026-10-19": 0.75}
+        assert state(reopened(tmp_path)) == state(ledger)
+
+    def test_compaction_starts_new_generation(self, tmp_path):
+        ledger = CostLedger(tmp_path, compact_every=2)
+        for index in range(5):
+            ledger.append(record(index))
+
+        assert ledger.generation == 2
+        assert sorted(path.name for path in tmp_path.glob("*.jsonl")) == ["deepseek_costs.2.jsonl"]
+        snapshot = json.loads((tmp_path / "deepseek_costs.snapshot.json").read_text(encoding="utf-8"))
+        assert snapshot["totals"]["requests"] == 4
+        assert reopened(tmp_path, compact_every=2).totals["requests"] == 5
+
+    def test_crash_after_snapshot_does_not_double_count(self, tmp_path):
+        ledger = CostLedger(tmp_path)
+        for index in range(3):
+            ledger.append(record(index))
+        old_ledger = ledger.ledger_path().read_bytes()
+        ledger.compact()
+        # Процесс упал после замены снимка, но до удаления старого журнала
+        ledger.ledger_path(ledger.generation - 1).write_bytes(old_ledger)
+
+        recovered = reopened(tmp_path)
+        assert recovered.totals["requests"] == 3
+        assert not recovered.ledger_path(recovered.generation - 1).exists()
+
+    def test_crash_before_snapshot_keeps_old_generation(self, tmp_path):
+        ledger = CostLedger(tmp_path)
+        for index in range(3):
+            ledger.append(record(index))
+        ledger.compact()
+        ledger.append(record(3))
+        # Процесс упал до замены снимка: есть только файл следующего поколения и tmp
+        ledger.ledger_path(ledger.generation + 1).touch()
+        (tmp_path / "deepseek_costs.snapshot.json.tmp").write_text("{", encoding="utf-8")
+
+        recovered = reopened(tmp_path)
+        assert recovered.generation == ledger.generation
+        assert recovered.totals["requests"] == 4
+        recovered.append(record(4))
+        assert reopened(tmp_path).totals["requests"] == 5
+
+    def test_torn_last_line_is_overwritten(self, tmp_path):
+        ledger = CostLedger(tmp_path)
+        ledger.append(record(1))
+        with open(ledger.ledger_path(), "ab") as f:
+            f.write(b'{"timestamp": "2026-10-19T10:0')
+
+        writer = reopened(tmp_path)
+        assert writer.totals["requests"] == 1
+        writer.append(record(2))
+
+        lines = writer.ledger_path().read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["request_id"] for line in lines] == ["r1", "r2"]
+        assert reopened(tmp_path).totals["requests"] == 2
+
+    def test_instances_see_each_other_across_compaction(self, tmp_path):
+        first = CostLedger(tmp_path, compact_every=3)
+        second = CostLedger(tmp_path, compact_every=3)
+        for index in range(4):
+            (first if index % 2 else second).append(record(index))
+
+        first.sync()
+        second.sync()
+        assert first.totals["requests"] == second.totals["requests"] == 4
+        assert state(first) == state(second)
+
+    def test_old_buckets_are_dropped(self, tmp_path):
+        ledger = CostLedger(tmp_path, hourly_keep=2)
+        for hour in (8, 9, 10):
+            ledger.append(record(hour, hour=hour))
+
+        assert sorted(ledger.hourly) == ["2026-10-19T09", "2026-10-19T10"]
+        assert ledger.daily == {"2026-10-19": pytest.approx(3.0)}
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен fork")
+def test_concurrent_processes_do_not_lose_records(tmp_path):
+    children = []
+    for worker in range(4):
+        pid = os.fork()
+        if pid == 0:
+            ledger = CostLedger(tmp_path, compact_every=7)
+            for index in range(25):
+                ledger.append(record(worker * 100 + index, cost=0.01))
+            os._exit(0)
+        children.append(pid)
+    for pid in children:
+        assert os.waitpid(pid, 0)[1] == 0
+
+    ledger = reopened(tmp_path, compact_every=7)
+    assert ledger.totals["requests"] == 100
+    assert ledger.totals["cost"] == pytest.approx(1.0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тесты агрегатов WorkloadModel и плана перераспределения задач
+"""
+
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def dtm(monkeypatch):
+    monkeypatch.setenv("NOTION_TOKEN", "test")
+    monkeypatch.setenv("NOTION_TASKS_DB_ID", "tasks")
+    import designer_task_manager
+    return designer_task_manager
+
+
+def make_task(dtm, task_id, status="To Do", assignees=("Анна",), deadline=""):
+    return dtm.TaskInfo(
+        id=task_id, title=task_id, status=status, group=dtm._status_group(status),
+        assignees=list(assignees), deadline=deadline, deadline_date=dtm._parse_deadline(deadline), priority=""
+    )
+
+
+def make_model(dtm, *names):
+    model = dtm.WorkloadModel()
+    model.set_designers([dtm.Designer(id=name.lower(), name=name) for name in names])
+    return model
+
+
+class TestWorkloadModel:
+    """Тесты WorkloadModel"""
+
+    def test_reupsert_after_status_change_moves_aggregates(self, dtm):
+        model = make_model(dtm, "Анна", "Борис")
+        model.upsert(make_task(dtm, "t1", deadline="2026-10-01"))
+        model.upsert(make_task(dtm, "t2", assignees=("Борис",)))
+        assert model.workload() == {"анна": 1, "борис": 1}
+        assert model.overdue_count(date(2026, 10, 19)) == 1
+
+        model.upsert(make_task(dtm, "t1", status="Done", deadline="2026-10-01"))
+
+        assert model.workload() == {"анна": 0, "борис": 1}
+        assert model.todo_total == 1
+        assert model.stats_by_designer["анна"] == {"todo": 0, "in_progress": 0, "done": 1, "total": 1}
+        # Закрытая задача больше не просрочена
+        assert model.overdue_count(date(2026, 10, 19)) == 0
+
+        model.remove("t2")
+        assert model.todo_total == 0
+        assert model.stats_by_designer["борис"]["total"] == 0
+
+    def test_set_designers_rebinds_existing_tasks(self, dtm):
+        model = make_model(dtm, "Анна")
+        model.upsert(make_task(dtm, "t1", assignees=("Анна", "Вера")))
+        model.upsert(make_task(dtm, "t2", assignees=("вера",)))
+        assert model.workload() == {"анна": 1}
+        assert model.todo_assigned() == 2
+
+        model.set_designers([dtm.Designer(id="anna", name="Анна"), dtm.Designer(id="vera", name="Вера")])
+
+        assert model.workload() == {"anna": 1, "vera": 2}
+        assert model.tasks["t1"].designer_ids == ["anna", "vera"]
+        assert "анна" not in model.todo_by_designer or not model.todo_by_designer["анна"]
+
+    def test_overdue_counts_per_designer(self, dtm):
+        model = make_model(dtm, "Анна", "Борис")
+        model.upsert(make_task(dtm, "t1", deadline="2026-10-10"))
+        model.upsert(make_task(dtm, "t2", status="В работе", deadline="2026-10-18T12:00:00"))
+        model.upsert(make_task(dtm, "t3", assignees=("Борис",), deadline="2026-10-19"))
+        model.upsert(make_task(dtm, "t4", assignees=("Анна", "Борис"), deadline="2026-10-01"))
+        model.upsert(make_task(dtm, "t5", assignees=("Борис",)))
+
+        today = date(2026, 10, 19)
+        assert model.overdue_count(today) == 3
+        assert model.overdue_count(today, "анна") == 3
+        # Дедлайн сегодня еще не просрочен
+        assert model.overdue_count(today, "борис") == 1
+        assert model.overdue_count(today, "нет такого") == 0
+
+
+def test_plan_redistribution_moves_latest_single_assignee_tasks(dtm):
+    manager = dtm.DesignerTaskManager()
+    manager.model = make_model(dtm, "Анна", "Борис", "Вера")
+    for index, deadline in enumerate(["2026-10-20", "", "2026-11-30", "2026-10-25", ""]):
+        manager.model.upsert(make_task(dtm, f"a{index}", deadline=deadline))
+    manager.model.upsert(make_task(dtm, "shared", assignees=("Анна", "Борис")))
+
+    moves = manager.plan_redistribution()
+
+    assert [(task.id, donor) for task, donor, _ in moves] == [("a1", "анна"), ("a4", "анна"), ("a2", "анна")]
+    assert {receiver for _, _, receiver in moves} == {"борис", "вера"}
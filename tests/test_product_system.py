@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Тесты перевода schedule_interval в cron
+"""
+
+import pytest
+
+pytest.importorskip("notion_client")
+
+from product_system import _interval_to_cron
+
+
+@pytest.mark.parametrize("minutes, expected", [
+    (1, "*/1 * * * *"),
+    (15, "*/15 * * * *"),
+    (60, "0 */1 * * *"),
+    (120, "0 */2 * * *"),
+    (24 * 60, "0 */24 * * *"),
+])
+def test_interval_to_cron_exact(minutes, expected):
+    assert _interval_to_cron(minutes) == expected
+
+
+@pytest.mark.parametrize("minutes", [0, 45, 90, 7 * 60, 48 * 60])
+def test_interval_to_cron_rejects_inexact(minutes):
+    with pytest.raises(ValueError):
+        _interval_to_cron(minutes)
@@ -0,0 +1,69 @@
+"""Tests for ContentCalendar date and status indexes."""
+import pytest
+from datetime import datetime
+
+pytest.importorskip("telegram")
+
+from src.services.content_manager import ContentCalendar, ContentPiece, ContentStatus, ContentType
+
+
+def piece(content_id, status, scheduled_time, updated_at=datetime(2026, 1, 1)):
+    return ContentPiece(
+        id=content_id, title=content_id, content_type=ContentType.POST, status=status,
+        text_content="", media_files=[], platforms=[], hashtags=[],
+        scheduled_time=scheduled_time, created_at=updated_at, updated_at=updated_at, author_id="a"
+    )
+
+
+def test_range_and_day_views_are_sorted():
+    calendar = ContentCalendar()
+    calendar.add_content(piece("late", ContentStatus.SCHEDULED, datetime(2026, 1, 5, 18)))
+    calendar.add_content(piece("early", ContentStatus.SCHEDULED, datetime(2026, 1, 5, 9)))
+    calendar.add_content(piece("other", ContentStatus.SCHEDULED, datetime(2026, 1, 7, 9)))
+
+    assert [c.id for c in calendar.get_content_for_date(datetime(2026, 1, 5))] == ["early", "late"]
+    week = calendar.get_week_content(datetime(2026, 1, 5))
+    assert [c.id for c in week["2026-01-07"]] == ["other"]
+    assert len(calendar.get_month_content(2026, 1)) == 31
+
+
+def test_in_place_update_moves_item_between_status_and_day():
+    calendar = ContentCalendar()
+    content = piece("c1", ContentStatus.DRAFT, datetime(2026, 1, 1, 10))
+    calendar.add_content(content, page_id="p1")
+
+    # update_content меняет объект из кэша на месте, затем добавляет его заново
+    content.status = ContentStatus.SCHEDULED
+    content.scheduled_time = datetime(2026, 1, 5, 10)
+    calendar.add_content(content)
+
+    assert calendar.get_by_status(ContentStatus.DRAFT) == []
+    assert [c.id for c in calendar.get_by_status(ContentStatus.SCHEDULED)] == ["c1"]
+    assert calendar.get_content_for_date(datetime(2026, 1, 1)) == []
+    assert [c.id for c in calendar.get_content_for_date(datetime(2026, 1, 5))] == ["c1"]
+    assert "2026-01-01" not in calendar.scheduled_content
+    assert calendar.page_ids["c1"] == "p1"
+
+
+def test_remove_clears_every_index():
+    calendar = ContentCalendar()
+    content = piece("c1", ContentStatus.DRAFT, datetime(2026, 1, 1, 10))
+    calendar.add_content(content)
+    content.scheduled_time = datetime(2026, 1, 2, 10)
+
+    calendar.remove_content("c1")
+
+    assert calendar.get_content_for_date(datetime(2026, 1, 1)) == []
+    assert calendar.get_content_for_date(datetime(2026, 1, 2)) == []
+    assert calendar.get_by_status(ContentStatus.DRAFT) == []
+    assert calendar.scheduled_content == {}
+
+
+def test_status_view_is_newest_first_and_refreshed_on_change():
+    calendar = ContentCalendar()
+    calendar.add_content(piece("old", ContentStatus.DRAFT, None, datetime(2026, 1, 1)))
+    calendar.add_content(piece("new", ContentStatus.DRAFT, None, datetime(2026, 1, 3)))
+    assert [c.id for c in calendar.get_by_status(ContentStatus.DRAFT)] == ["new", "old"]
+
+    calendar.add_content(piece("old", ContentStatus.DRAFT, None, datetime(2026, 1, 4)))
+    assert [c.id for c in calendar.get_by_status(ContentStatus.DRAFT)] == ["old", "new"]
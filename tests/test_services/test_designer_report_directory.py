@@ -0,0 +1,36 @@
+"""Tests for name matching in the designer report directory."""
+import pytest
+
+from services.designer_report_service import DesignerReportService, ProjectTaskDirectory, normalize_name
+
+
+def entries(*names):
+    return {f"id{i}": {"name": name, "key": normalize_name(name)} for i, name in enumerate(names)}
+
+
+def page(page_id, title):
+    return {"id": page_id, "properties": {"Задача": {"title": [{"plain_text": title}]}}}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("макет 2", "id1"),
+    ("  МАКЕТ   1 ", "id0"),
+    ("коробка rmp04", "id2"),
+    ("обложка", "id3"),
+    ("каталог", "id3"),
+])
+def test_match_exact_prefix_and_unique_substring(query, expected):
+    directory = entries("Макет 1", "Макет 2", "Коробка RMP04", "Обложка каталога")
+    assert ProjectTaskDirectory._match(query, directory) == expected
+
+
+@pytest.mark.parametrize("query", ["макет 3", "коробка rmp05", "макет", ""])
+def test_match_rejects_siblings_and_ambiguous_names(query):
+    directory = entries("Макет 1", "Макет 2", "Коробка RMP04")
+    assert ProjectTaskDirectory._match(query, directory) is None
+
+
+def test_notion_fallback_does_not_take_first_contains_result():
+    results = [page("a", "Макет 1"), page("b", "Макет 2")]
+    assert DesignerReportService._pick_page("Макет", results, "Задача") is None
+    assert DesignerReportService._pick_page("макет 2", results, "Задача")["id"] == "b"
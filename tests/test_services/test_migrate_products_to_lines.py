@@ -0,0 +1,96 @@
+"""Tests for the project -> product line migration against a fake Notion."""
+import asyncio
+
+import pytest
+
+from services.migrate_products_to_lines import ProductsMigrationService
+
+PREFIXES = ["RGJ", "BDM", "RMP", "ODM", "RMD", "RAP", "RMC", "RMA", "RMO", "RPB"]
+ARTICLES = [f"{prefix}-{number:02d}" for prefix in PREFIXES for number in range(10)]
+
+
+class FakeNotion:
+    """Базы проектов и линеек в памяти со счетчиками запросов"""
+
+    def __init__(self, projects):
+        self.databases_data = {"projects": projects, "lines": []}
+        self.queries = 0
+        self.creates = 0
+        self.updates = 0
+        notion = self
+
+        class Databases:
+            async def query(self, database_id, page_size=100, start_cursor=None, **kwargs):
+                notion.queries += 1
+                rows = notion.databases_data[database_id]
+                start = int(start_cursor or 0)
+                end = start + page_size
+                return {"results": rows[start:end], "has_more": end < len(rows), "next_cursor": str(end)}
+
+        class Pages:
+            async def create(self, parent, properties):
+                notion.creates += 1
+                page = {"id": f"line{notion.creates}", "properties": dict(
+                    properties, **{"Артикул": {"type": "select", "select": properties["Артикул"]["select"]}})}
+                notion.databases_data[parent["database_id"]].append(page)
+                return page
+
+            async def retrieve(self, page_id):
+                raise AssertionError("страница проекта уже загружена запросом")
+
+            async def update(self, page_id, properties):
+                notion.updates += 1
+                project = next(p for p in notion.databases_data["projects"] if p["id"] == page_id)
+                for name, value in properties.items():
+                    project["properties"][name] = dict(value, type="relation")
+
+        self.databases = Databases()
+        self.pages = Pages()
+
+
+def project(index):
+    article = ARTICLES[index % len(ARTICLES)]
+    return {
+        "id": f"proj{index}",
+        "properties": {
+            "Проект": {"type": "title", "title": [{"plain_text": f"Полиграфия {article} коробка"}]},
+            "Линейка продукта": {"type": "relation", "relation": []},
+        }
+    }
+
+
+@pytest.fixture
+def service(monkeypatch):
+    for name, value in [("NOTION_TOKEN", "t"), ("PROJECTS_DB", "projects"), ("PRODUCT_LINES_DB", "lines")]:
+        monkeypatch.setenv(name, value)
+    return ProductsMigrationService
+
+
+def run(service_class, notion):
+    service = service_class()
+    service.client = notion
+    asyncio.run(service.migrate_projects_to_product_lines())
+
+
+def test_one_line_per_article_and_rerun_makes_no_writes(service):
+    notion = FakeNotion([project(i) for i in range(1000)])
+
+    run(service, notion)
+    # 10 страниц проектов + 1 страница линеек, без запроса на каждый артикул
+    assert (notion.queries, notion.creates, notion.updates) == (11, 100, 1000)
+
+    notion.queries = notion.creates = notion.updates = 0
+    run(service, notion)
+    assert (notion.queries, notion.creates, notion.updates) == (11, 0, 0)
+
+
+def test_existing_lines_are_reused(service):
+    notion = FakeNotion([project(i) for i in range(3)])
+    notion.databases_data["lines"].append(
+        {"id": "old", "properties": {"Артикул": {"type": "select", "select": {"name": "RGJ-00"}}}})
+
+    run(service, notion)
+
+    assert notion.creates == 2
+    relation = notion.databases_data["projects"][0]["properties"]["Линейка продукта"]["relation"]
+    assert relation == [{"id": "old"}]
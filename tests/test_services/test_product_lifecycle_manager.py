@@ -0,0 +1,117 @@
+"""Tests for the product lifecycle engine: deadlines, Notion sync cursor and restart."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("notion_client")
+
+from services import product_lifecycle_manager as plm
+
+DAY0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def at(days):
+    return DAY0 + timedelta(days=days)
+
+
+def page(product_id, status, edited_days=0):
+    return {
+        "id": product_id,
+        "created_time": DAY0.isoformat(),
+        "last_edited_time": at(edited_days).isoformat(),
+        "properties": {
+            "Name": {"type": "title", "title": [{"plain_text": product_id}]},
+            "Статус": {"type": "status", "status": {"name": status}},
+        }
+    }
+
+
+class FakeNotion:
+    """AsyncClient: databases.query отдает заданные страницы и запоминает фильтры"""
+
+    def __init__(self):
+        self.pages = []
+        self.queries = []
+        notion = self
+
+        class Databases:
+            async def query(self, database_id, **params):
+                notion.queries.append(params.get("filter"))
+                return {"results": list(notion.pages), "has_more": False}
+
+        self.databases = Databases()
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(plm, "LOGS_DIR", str(tmp_path))
+    manager = plm.ProductLifecycleManager()
+    manager.notion = FakeNotion()
+    manager.engine = plm.ProductLifecycleEngine(manager.lifecycle_statuses, state_file=str(tmp_path / "state.json"))
+    return manager
+
+
+def product(product_id, status, since_days):
+    return {"id": product_id, "name": product_id, "status": status, "created_time": at(since_days).isoformat()}
+
+
+def test_deadlines_fire_in_order_and_skip_stale_entries(manager):
+    engine = manager.engine
+    engine.apply(product("a", "Предпроизводство", 0))   # внимание на 72-й день, просрочка на 91-й
+    engine.apply(product("b", "Производство", 0))       # внимание на 144-й день
+    engine.apply(product("c", "Предпроизводство", 10))  # внимание на 82-й день
+    engine.apply(product("z", "Архив", 0))               # у архива сроков нет
+
+    assert engine.next_due() == at(72)
+    assert engine.pop_due(at(71)) == []
+    assert engine.attention == set()
+
+    engine.pop_due(at(72))
+    assert engine.attention == {"a"}
+    assert engine.pop_due(at(90)) == []
+    assert engine.attention == {"a", "c"}
+
+    # Смена статуса делает старые сроки c неактуальными
+    assert engine.set_status("c", "Производство", when=at(95)) == ("Предпроизводство", "Производство")
+    assert [p["id"] for p in engine.pop_due(at(101))] == ["a"]
+    assert engine.overdue == {"a"}
+    assert engine.attention == {"a"}
+    assert engine.next_due() == at(144)
+    assert engine.status_counts == {"Предпроизводство": 1, "Производство": 2, "Архив": 1}
+
+
+def test_empty_full_sync_falls_back_to_full_query(manager):
+    notion = manager.notion
+    assert asyncio.run(manager.sync_products()) == []
+    assert manager.engine.last_edited_time is None
+
+    # Курсора нет - снова полная выборка, а не фильтр on_or_after None
+    notion.pages = [page("p1", "Предпроизводство", edited_days=1)]
+    asyncio.run(manager.sync_products())
+    assert notion.queries == [None, None]
+    assert manager.engine.last_edited_time == at(1).isoformat()
+
+    notion.pages = [page("p1", "Производство", edited_days=3)]
+    events = asyncio.run(manager.sync_products())
+    assert notion.queries[-1] == {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": at(1).isoformat()}}
+    assert events == [("p1", "Предпроизводство", "Производство")]
+
+
+def test_restart_restores_products_indexes_and_deadlines(manager, tmp_path):
+    notion = manager.notion
+    notion.pages = [page("p1", "Предпроизводство"), page("p2", "Поддержка", edited_days=2)]
+    asyncio.run(manager.sync_products())
+
+    restarted = plm.ProductLifecycleEngine(manager.lifecycle_statuses, state_file=str(tmp_path / "state.json"))
+
+    assert restarted.products == manager.engine.products
+    assert restarted.last_edited_time == at(2).isoformat()
+    assert restarted.status_counts == {"Предпроизводство": 1, "Поддержка": 1}
+    assert restarted.avg_days_by_status(at(10)) == {"Предпроизводство": 10.0, "Поддержка": 10.0}
+    assert [p["id"] for p in restarted.pop_due(at(91))] == ["p1"]
+
+    # После рестарта синхронизация инкрементальная
+    manager.engine = restarted
+    asyncio.run(manager.sync_products())
+    assert notion.queries[-1]["last_edited_time"] == {"on_or_after": at(2).isoformat()}
@@ -0,0 +1,166 @@
+"""Tests for matching Disk materials to product lines through one listing."""
+import asyncio
+
+import pytest
+
+from services import product_materials_manager
+from services.product_materials_manager import ProductMaterialsManager, normalize_article
+
+ARTICLES = [f"R{chr(ord('A') + i % 26)}{chr(ord('A') + i // 26)}-{i:02d}" for i in range(40)]
+
+
+def disk_files():
+    """4 файла на артикул; артикул есть и в папке, и в имени файла"""
+    files = []
+    for article in ARTICLES:
+        compact = article.replace("-", "")
+        for name, mime in [(f"{compact}_front.jpg", "image/jpeg"), (f"{article} обзор.mp4", "video/mp4"),
+                           (f"{compact.lower()}_инструкция.pdf", "application/pdf"), (f"{article}_исходники.zip", "")]:
+            files.append({"name": name, "path": f"disk:/Материалы/{article}/{name}", "mime_type": mime, "size": 1})
+    files.append({"name": "readme.txt", "path": "disk:/Материалы/readme.txt", "mime_type": "text/plain", "size": 1})
+    return files
+
+
+class FakeDiskSession:
+    """requests.Session для resources/files с постраничной выдачей"""
+
+    calls = 0
+
+    def __init__(self):
+        self.files = disk_files()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get(self, url, headers, params, timeout):
+        FakeDiskSession.calls += 1
+        page = self.files[params["offset"]:params["offset"] + params["limit"]]
+        return FakeDiskResponse({"items": page})
+
+
+class FakeDiskResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeNotion:
+    def __init__(self, products):
+        self.store = {product["id"]: product for product in products}
+        self.created = []
+        self.updated = []
+        notion = self
+
+        class Databases:
+            async def query(self, database_id, **kwargs):
+                return {"results": list(products), "has_more": False}
+
+        class Pages:
+            async def create(self, **page_data):
+                notion.created.append(page_data)
+                return {"id": f"m{len(notion.created)}"}
+
+            async def retrieve(self, page_id):
+                return notion.store[page_id]
+
+            async def update(self, page_id, properties):
+                notion.updated.append(page_id)
+                notion.store[page_id]["properties"].update(
+                    {name: dict(value, type="relation") for name, value in properties.items()})
+
+        self.databases = Databases()
+        self.pages = Pages()
+
+
+def product(index, article):
+    return {
+        "id": f"p{index}",
+        "properties": {
+            "Name": {"type": "title", "title": [{"plain_text": f"Продукт {article}"}]},
+            "Артикул": {"type": "select", "select": {"name": article}},
+            "Материалы": {"type": "relation", "relation": []},
+        }
+    }
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    for name, value in [("NOTION_TOKEN", "t"), ("PRODUCT_LINES_DB", "lines"), ("MATERIALS_DB", "materials"),
+                        ("YANDEX_DISK_TOKEN", "y"), ("YANDEX_DISK_MATERIALS_ROOT", "/Материалы")]:
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(product_materials_manager.requests, "Session", FakeDiskSession)
+    from utils.notion_rate_limiter import notion_rate_limiter
+    monkeypatch.setattr(notion_rate_limiter, "rate_per_second", 10000.0)
+    monkeypatch.setattr(notion_rate_limiter, "burst", 1000)
+    FakeDiskSession.calls = 0
+
+    manager = ProductMaterialsManager()
+    notion = FakeNotion([product(i, article) for i, article in enumerate(ARTICLES)])
+    manager.client = notion
+    manager.listing_page_size = 100
+    return manager, notion
+
+
+@pytest.mark.parametrize("article", ["RGJ-04", "rgj_04", "RGJ 04", "RGJ04"])
+def test_normalize_article(article):
+    assert normalize_article(article) == "RGJ04"
+
+
+def test_one_disk_listing_and_no_duplicate_materials(manager):
+    manager, notion = manager
+    asyncio.run(manager.process_all_products())
+
+    # 161 файл при странице 100 - два запроса листинга на весь запуск, а не поиск на каждый артикул
+    assert FakeDiskSession.calls == 2
+    assert len(notion.created) == 160
+    urls = [page["properties"]["URL"]["url"] for page in notion.created]
+    assert len(set(urls)) == len(urls)
+    # Связи продукта записываются одним обновлением
+    assert sorted(notion.updated) == sorted(f"p{i}" for i in range(len(ARTICLES)))
+    assert all(len(page["properties"]["Материалы"]["relation"]) == 4 for page in notion.store.values())
+
+
+def test_index_takes_article_from_folder_or_file_name(manager):
+    manager, _ = manager
+    index = manager.build_materials_index([
+        {"name": "cover.png", "path": "disk:/Материалы/BDM-07/cover.png", "mime_type": "image/png"},
+        {"name": "bdm_07 видео.mov", "path": "disk:/Материалы/Общее/bdm_07 видео.mov", "mime_type": ""},
+        {"name": "BDM07.png", "path": "disk:/Другое/BDM07.png", "mime_type": "image/png"},
+    ])
+    assert sorted(index["BDM07"]) == ["disk:/Материалы/BDM-07/cover.png", "disk:/Материалы/Общее/bdm_07 видео.mov"]
+
+
+def test_index_keeps_only_article_shaped_tokens(manager):
+    manager, _ = manager
+    index = manager.build_materials_index([
+        {"name": "IMG_1234.jpg", "path": "disk:/Материалы/BDM-07/IMG_1234.jpg", "mime_type": "image/jpeg"},
+        {"name": "DSC01 RGJ04.jpg", "path": "disk:/Материалы/Общее/DSC01 RGJ04.jpg", "mime_type": "image/jpeg"},
+    ])
+    assert sorted(index) == ["BDM07", "DSC01", "RGJ04"]
+
+    # С артикулами продуктов в индекс не попадают посторонние токены
+    index = manager.build_materials_index([
+        {"name": "DSC01 RGJ04.jpg", "path": "disk:/Материалы/Общее/DSC01 RGJ04.jpg", "mime_type": "image/jpeg"},
+    ], articles={"RGJ04", "BDM07"})
+    assert sorted(index) == ["RGJ04"]
+
+
+def test_path_with_two_articles_creates_one_material(manager, monkeypatch):
+    manager, _ = manager
+    shared = {"name": "BDM07_front.jpg", "path": "disk:/Материалы/RGJ-04/BDM07_front.jpg",
+              "mime_type": "image/jpeg", "size": 1}
+    monkeypatch.setattr(FakeDiskSession, "__init__", lambda self: setattr(self, "files", [shared]))
+    notion = manager.client = FakeNotion([product(0, "RGJ-04"), product(1, "BDM-07")])
+
+    asyncio.run(manager.process_all_products())
+
+    assert len(notion.created) == 1
+    assert [page["properties"]["Материалы"]["relation"] for page in notion.store.values()] == [[{"id": "m1"}]] * 2
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Тесты голосового пайплайна SpeechKit бота
+"""
+
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("flask")
+
+from speechkit_bot import index
+from speechkit_bot.index import BYTES_PER_SECOND, RecognitionCache, StubRecognizer, VoicePipeline, split_pcm
+
+
+def loud_pcm(seconds: float, quiet_from: float = None, quiet_to: float = None) -> bytes:
+    samples = array("h", [3000, -3000] * int(seconds * index.SAMPLE_RATE / 2))
+    if quiet_from is not None:
+        for i in range(int(quiet_from * index.SAMPLE_RATE), int(quiet_to * index.SAMPLE_RATE)):
+            samples[i] = 0
+    return samples.tobytes()
+
+
+class FailingRecognizer:
+    def __init__(self):
+        self.calls = 0
+
+    def recognize(self, audio, audio_format="oggopus"):
+        self.calls += 1
+        raise RuntimeError("SpeechKit 401: IAM token expired")
+
+
+def make_pipeline(recognizer, audio=b"ogg", cache=None):
+    return VoicePipeline(recognizer, lambda file_id: audio, transcode=lambda data: data,
+                         cache=cache or RecognitionCache(), pool=ThreadPoolExecutor(max_workers=4))
+
+
+class TestSplitPcm:
+    """Тесты нарезки LPCM"""
+
+    @pytest.mark.parametrize("seconds", [0.5, 1])
+    def test_short_audio_is_one_chunk(self, seconds):
+        pcm = loud_pcm(seconds)
+        assert split_pcm(pcm, chunk_seconds=1, search_seconds=1) == [pcm]
+
+    def test_chunks_cover_audio_with_even_cuts(self):
+        pcm = loud_pcm(3.3)[:-2] + b"\x01\x00"
+        chunks = split_pcm(pcm, chunk_seconds=1, search_seconds=1)
+
+        assert b"".join(chunks) == pcm
+        assert all(len(chunk) <= BYTES_PER_SECOND for chunk in chunks)
+        assert all(len(chunk) % 2 == 0 for chunk in chunks)
+        assert len(chunks) == 4
+
+    def test_cut_lands_in_pause(self):
+        pcm = loud_pcm(1.5, quiet_from=0.6, quiet_to=0.7)
+        first = split_pcm(pcm, chunk_seconds=1, search_seconds=1)[0]
+        assert 0.6 * BYTES_PER_SECOND <= len(first) < 0.7 * BYTES_PER_SECOND
+
+
+def test_recognition_cache_evicts_least_recently_used():
+    cache = RecognitionCache(max_size=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+
+class TestVoicePipeline:
+    """Тесты VoicePipeline на StubRecognizer"""
+
+    def test_concurrent_deliveries_share_one_recognition(self):
+        recognizer = StubRecognizer(base_latency=0.2)
+        pipeline = make_pipeline(recognizer)
+        voice = {"file_id": "f1", "file_unique_id": "u1", "duration": 3}
+        barrier = threading.Barrier(5)
+
+        def deliver(_):
+            barrier.wait()
+            return pipeline.process(voice)
+
+        with ThreadPoolExecutor(max_workers=5) as clients:
+            texts = list(clients.map(deliver, range(5)))
+
+        assert recognizer.calls == 1
+        assert len(set(texts)) == 1
+        # Повторная доставка берется из кэша
+        assert pipeline.process(dict(voice, file_id="f2")) == texts[0]
+        assert recognizer.calls == 1
+
+    def test_long_audio_is_recognized_in_parallel_chunks(self):
+        recognizer = StubRecognizer(base_latency=0)
+        pipeline = make_pipeline(recognizer, audio=loud_pcm(index.CHUNK_SECONDS * 2 + 1))
+        text = pipeline.process({"file_id": "long", "duration": index.CHUNK_SECONDS * 2 + 1})
+
+        assert recognizer.calls == 3
+        assert text.count("[lpcm") == 3
+
+    def test_failure_is_not_cached(self):
+        recognizer = FailingRecognizer()
+        pipeline = make_pipeline(recognizer)
+        voice = {"file_id": "f1", "file_unique_id": "u1", "duration": 3}
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                pipeline.process(voice)
+        assert recognizer.calls == 2
+        assert pipeline.cache.get("u1") is None
+
+
+def test_handler_replies_and_returns_200_on_recognition_error(monkeypatch):
+    sent = []
+    monkeypatch.setattr(index, "pipeline", make_pipeline(FailingRecognizer()))
+    monkeypatch.setattr(index, "send_message", lambda chat_id, text: sent.append((chat_id, text)))
+
+    result = index.handler({"update_id": 1, "message": {
+        "chat": {"id": 42}, "voice": {"file_id": "f1", "file_unique_id": "u1", "duration": 3}}}, {})
+
+    assert result["statusCode"] == 200
+    assert sent == [(42, "Ошибка распознавания")]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Тесты плана исправлений и checkpoint в TaskManagementFixer
+"""
+
+import asyncio
+
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+        self.headers = {}
+
+
+class FakeSession:
+    """PATCH отвечает 200, после fail_after вызовов - 400"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.patched = []
+
+    def patch(self, url, json, timeout):
+        if self.fail_after is not None and len(self.patched) >= self.fail_after:
+            return FakeResponse(400)
+        self.patched.append(url.rsplit("/", 1)[-1])
+        return FakeResponse(200)
+
+
+def make_task(index, status="Не указан", assignees=None):
+    return {
+        "id": f"t{index}",
+        "title": f"Задача {index}",
+        "status": status,
+        "assignees": assignees or [],
+        "deadline": "",
+        "created": "",
+        "properties": {
+            "Статус": {"type": "select", "select": None},
+            "Участники": {"type": "people", "people": []}
+        }
+    }
+
+
+def run_fixer(tmp_path, tasks, session, limits=None):
+    from task_management_fixer import TaskManagementFixer
+    fixer = TaskManagementFixer(checkpoint_path=str(tmp_path / "checkpoint.jsonl"),
+                                **({"limits": limits} if limits is not None else {}))
+    fixer.session = session
+    fixer.employees = {"u1": {"id": "u1", "name": "Анна"}}
+    fixer.employees_by_name = {"анна": fixer.employees["u1"]}
+    fixer.tasks = tasks
+    fixer.fix_no_assignee_tasks()
+    fixer.fix_no_status_tasks()
+    asyncio.run(fixer.apply_changes())
+    return fixer
+
+
+class TestTaskManagementFixer:
+    """Тесты TaskManagementFixer"""
+
+    @pytest.fixture(autouse=True)
+    def environment(self, monkeypatch):
+        for name, value in [("NOTION_TOKEN", "test"), ("NOTION_TASKS_DB_ID", "tasks"),
+                            ("NOTION_TEAMS_DB_ID", "teams")]:
+            monkeypatch.setenv(name, value)
+    
+    @pytest.fixture(autouse=True)
+    def fast_limiter(self, monkeypatch):
+        from utils.notion_rate_limiter import notion_rate_limiter
+        monkeypatch.setattr(notion_rate_limiter, "rate_per_second", 1000.0)
+        monkeypatch.setattr(notion_rate_limiter, "burst", 100)
+
+    def test_fixes_for_one_task_are_merged_into_one_patch(self, tmp_path):
+        session = FakeSession()
+        fixer = run_fixer(tmp_path, [make_task(1)], session)
+
+        assert session.patched == ["t1"]
+        assert set(fixer.changes["t1"]["properties"]) == {"Участники", "Статус"}
+
+    def test_rerun_with_default_limits_takes_next_batch(self, tmp_path):
+        tasks = [make_task(i, status="To Do") for i in range(25)]
+
+        first = FakeSession()
+        run_fixer(tmp_path, tasks, first)
+        second = FakeSession()
+        fixer = run_fixer(tmp_path, tasks, second)
+        third = FakeSession()
+        run_fixer(tmp_path, tasks, third)
+
+        assert len(first.patched) == 10
+        assert len(second.patched) == 10
+        assert not set(first.patched) & set(second.patched)
+        assert fixer.skipped_from_checkpoint == 10
+        assert len(third.patched) == 5
+
+    def test_interrupted_run_resumes_after_failures(self, tmp_path):
+        tasks = [make_task(i) for i in range(8)]
+
+        broken = FakeSession(fail_after=3)
+        fixer = run_fixer(tmp_path, tasks, broken, limits={})
+        assert len(broken.patched) == 3
+        assert len(fixer.errors) == 5
+
+        resumed = FakeSession()
+        fixer = run_fixer(tmp_path, tasks, resumed, limits={})
+        assert sorted(resumed.patched + broken.patched) == sorted(task["id"] for task in tasks)
+        assert not fixer.errors
+
+        again = FakeSession()
+        run_fixer(tmp_path, tasks, again, limits={})
+        assert again.patched == []
@@ -0,0 +1,47 @@
+"""Tests for .env discovery and the parsed snapshot."""
+import os
+
+from utils import config_snapshot
+
+
+def test_project_env_wins_over_cwd_parents(tmp_path, monkeypatch):
+    project = tmp_path / "project"
+    elsewhere = tmp_path / "home" / "work"
+    project.mkdir()
+    elsewhere.mkdir(parents=True)
+    (project / ".env").write_text("A=project\n", encoding="utf-8")
+    (tmp_path / "home" / ".env").write_text("A=home\n", encoding="utf-8")
+    monkeypatch.setattr(config_snapshot, "PROJECT_ROOT", project)
+    monkeypatch.chdir(elsewhere)
+
+    assert config_snapshot.find_env_file() == project / ".env"
+
+
+def test_cwd_is_fallback_when_project_has_no_env(tmp_path, monkeypatch):
+    project = tmp_path / "project"
+    other = tmp_path / "other"
+    project.mkdir()
+    other.mkdir()
+    (other / ".env").write_text("A=other\n", encoding="utf-8")
+    monkeypatch.setattr(config_snapshot, "PROJECT_ROOT", project)
+    monkeypatch.chdir(other)
+
+    assert config_snapshot.find_env_file() == other / ".env"
+
+
+def test_load_env_writes_private_snapshot_and_reuses_it(tmp_path, monkeypatch):
+    (tmp_path / ".env").write_text("SNAPSHOT_TEST_KEY=one\n", encoding="utf-8")
+    monkeypatch.setattr(config_snapshot, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(config_snapshot, "_loaded", False)
+    monkeypatch.setattr(config_snapshot, "_env_file", None)
+    monkeypatch.delenv("SNAPSHOT_TEST_KEY", raising=False)
+
+    assert config_snapshot.load_env() == tmp_path / ".env"
+    assert os.environ["SNAPSHOT_TEST_KEY"] == "one"
+    snapshot = tmp_path / config_snapshot.SNAPSHOT_NAME
+    assert snapshot.stat().st_mode & 0o777 == 0o600
+
+    monkeypatch.delenv("SNAPSHOT_TEST_KEY")
+    assert config_snapshot.load_env(override=True) == tmp_path / ".env"
+    assert os.environ["SNAPSHOT_TEST_KEY"] == "one"
+    monkeypatch.delenv("SNAPSHOT_TEST_KEY")
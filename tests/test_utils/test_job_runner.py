@@ -0,0 +1,209 @@
+"""Tests for the in-process job runner, driven by a fake clock."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.job_runner import CronTrigger, JobHistoryStore, JobRunner
+
+
+class FakeClock:
+    def __init__(self, start: datetime):
+        self.now = start
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+
+# ---- cron ----
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", datetime(2026, 10, 19, 10, 7, 30), datetime(2026, 10, 19, 10, 15)),
+    ("*/15 * * * *", datetime(2026, 10, 19, 10, 15), datetime(2026, 10, 19, 10, 30)),
+    ("0 */6 * * *", datetime(2026, 10, 19, 19, 0), datetime(2026, 10, 20, 0, 0)),
+    ("30 8 * * 1-5", datetime(2026, 10, 23, 9, 0), datetime(2026, 10, 26, 8, 30)),  # пятница -> понедельник
+    ("0 0 29 2 *", datetime(2026, 3, 1), datetime(2028, 2, 29, 0, 0)),
+])
+def test_cron_next_after(expression, moment, expected):
+    assert CronTrigger(expression).next_after(moment) == expected
+
+
+def test_cron_day_of_month_or_day_of_week():
+    # Заданы оба поля: достаточно совпадения любого (1-е число ИЛИ понедельник)
+    trigger = CronTrigger("0 9 1 * 1")
+    assert trigger.next_after(datetime(2026, 10, 18, 10, 0)) == datetime(2026, 10, 19, 9, 0)  # понедельник
+    assert trigger.next_after(datetime(2026, 10, 31, 10, 0)) == datetime(2026, 11, 1, 9, 0)  # 1-е, воскресенье
+
+
+def test_cron_single_field_restricts_days_and_accepts_sunday_as_7():
+    assert CronTrigger("0 9 * * 1").next_after(datetime(2026, 10, 20)) == datetime(2026, 10, 26, 9, 0)
+    assert CronTrigger("0 9 * * 7").next_after(datetime(2026, 10, 19)) == datetime(2026, 10, 25, 9, 0)
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "61 * * * *", "0 25 * * *", "*/0 * * * *"])
+def test_cron_rejects_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronTrigger(expression)
+
+
+# ---- runner ----
+
+def test_cron_job_runs_when_due_and_reschedules():
+    clock = FakeClock(datetime(2026, 10, 19, 10, 7))
+    runner = JobRunner(clock=clock)
+    calls = []
+
+    async def job():
+        calls.append(clock())
+        return {"ok": True}
+
+    async def scenario():
+        runner.add_job("report", job, cron="*/15 * * * *")
+        assert await runner.tick() == []
+        clock.advance(minutes=8)
+        assert len(await runner.tick()) == 1
+        await runner.wait_running()
+        assert runner.jobs["report"].next_run == datetime(2026, 10, 19, 10, 30)
+
+    asyncio.run(scenario())
+    assert calls == [datetime(2026, 10, 19, 10, 15)]
+    assert runner.last_run("report").results == {"ok": True}
+
+
+def test_submit_coalesces_while_job_is_active():
+    clock = FakeClock(datetime(2026, 10, 19, 10, 0))
+    runner = JobRunner(clock=clock)
+    release = None
+    calls = []
+
+    async def job():
+        calls.append(1)
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        runner.add_job("sync", job)
+        first = runner.submit("sync")
+        assert first is not None
+        assert runner.submit("sync") is None  # в очереди
+        await runner.tick()
+        assert runner.counts()["running"] == 1
+        assert runner.submit("sync") is None  # выполняется
+        assert await runner.tick() == []
+        release.set()
+        await runner.wait_running()
+        assert runner.submit("sync") is not None  # после завершения снова можно
+
+    asyncio.run(scenario())
+    assert calls == [1]
+    assert runner.counts()["finished"] == 1
+
+
+def test_retry_with_exponential_backoff_then_success():
+    clock = FakeClock(datetime(2026, 10, 19, 10, 0))
+    runner = JobRunner(clock=clock)
+    attempts = []
+
+    async def flaky():
+        attempts.append(clock())
+        if len(attempts) < 3:
+            raise RuntimeError(f"fail {len(attempts)}")
+        return {"attempt": len(attempts)}
+
+    async def step():
+        started = await runner.tick()
+        await runner.wait_running()
+        return started
+
+    async def scenario():
+        runner.add_job("flaky", flaky, max_retries=2, backoff_seconds=30)
+        run = runner.submit("flaky")
+        await step()
+        assert run.status == "retrying"
+
+        clock.advance(seconds=29)
+        assert await step() == []  # задержка 30 с еще не прошла
+        clock.advance(seconds=1)
+        await step()
+        assert run.status == "retrying"
+
+        clock.advance(seconds=59)
+        assert await step() == []  # вторая задержка 60 с
+        clock.advance(seconds=1)
+        await step()
+        return run
+
+    run = asyncio.run(scenario())
+    start = datetime(2026, 10, 19, 10, 0)
+    assert attempts == [start, start + timedelta(seconds=30), start + timedelta(seconds=90)]
+    assert run.status == "completed"
+    assert run.attempts == 3
+    assert run.errors == ["fail 1", "fail 2"]
+    assert run.results == {"attempt": 3}
+
+
+def test_retries_exhausted_marks_failed_and_backoff_is_capped():
+    clock = FakeClock(datetime(2026, 10, 19, 10, 0))
+    runner = JobRunner(clock=clock)
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        runner.add_job("broken", broken, max_retries=3, backoff_seconds=100, backoff_max_seconds=150)
+        run = runner.submit("broken")
+        delays = []
+        while run.status != "failed":
+            await runner.tick()
+            await runner.wait_running()
+            if run.status == "retrying":
+                delays.append((runner.next_wakeup() - clock()).total_seconds())
+                clock.now = runner.next_wakeup()
+        return run, delays
+
+    run, delays = asyncio.run(scenario())
+    assert delays == [100, 150, 150]
+    assert run.attempts == 4
+    assert runner.last_run("broken", status="failed") is run
+
+
+# ---- history ----
+
+def test_history_store_compacts_and_reloads_last_runs(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    clock = FakeClock(datetime(2026, 10, 19, 10, 0))
+    runner = JobRunner(store=JobHistoryStore(str(path), max_history=3), clock=clock, max_history=3)
+
+    async def job():
+        return {"at": clock().isoformat()}
+
+    async def scenario():
+        runner.add_job("job", job)
+        for _ in range(10):
+            runner.submit("job")
+            await runner.tick()
+            await runner.wait_running()
+            clock.advance(minutes=1)
+            assert len(path.read_text(encoding="utf-8").splitlines()) <= 6
+
+    asyncio.run(scenario())
+    assert runner.finished_count == 10
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert lines[-1]["results"] == {"at": "2026-10-19T10:09:00"}
+
+    reloaded = JobRunner(store=JobHistoryStore(str(path), max_history=3), clock=clock, max_history=3)
+    assert [run.results["at"][-8:-3] for run in reloaded.history] == ["10:07", "10:08", "10:09"]
+
+
+def test_history_store_skips_torn_line(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"id": "a", "type": "job", "status": "completed", "created_at": "x"}\n{"id": "b", "ty',
+                    encoding="utf-8")
+    runs = JobHistoryStore(str(path)).load()
+    assert [run.id for run in runs] == ["a"]
@@ -0,0 +1,81 @@
+"""Tests for the recursive Notion block reader."""
+import asyncio
+
+from src.utils.notion_blocks import NotionBlockReader, block_to_markdown
+
+
+def rich_text(text, href=None, **annotations):
+    return [{"plain_text": text, "annotations": annotations, "href": href}]
+
+
+TREE = {
+    "guide": [
+        {"id": "h", "type": "heading_2", "heading_2": {"rich_text": rich_text("✅ Чеклист:")}},
+        {"id": "a", "type": "to_do", "has_children": True, "to_do": {
+            "rich_text": rich_text("Проверить ") + rich_text("шрифты", href="https://example.com", bold=True),
+            "checked": False}},
+        {"id": "b", "type": "to_do", "to_do": {"rich_text": rich_text("Экспорт", code=True), "checked": True}},
+    ],
+    "a": [
+        {"id": "a1", "type": "bulleted_list_item", "bulleted_list_item": {"rich_text": rich_text("кириллица", italic=True)}},
+    ],
+}
+
+
+class FakeClient:
+    """Минимальный AsyncClient: blocks.children.list по словарю TREE"""
+
+    def __init__(self):
+        self.calls = 0
+        client = self
+
+        class Children:
+            async def list(self, block_id, page_size, start_cursor=None):
+                client.calls += 1
+                return {"results": TREE.get(block_id, []), "has_more": False}
+
+        class Blocks:
+            children = Children()
+
+        self.blocks = Blocks()
+
+
+def read(reader, **kwargs):
+    return asyncio.run(reader.read_markdown("guide", "2026-01-01T00:00:00.000Z", **kwargs))
+
+
+def test_markdown_keeps_inline_formatting_and_nesting():
+    markdown = read(NotionBlockReader(FakeClient()))
+    assert markdown.splitlines() == [
+        "## ✅ Чеклист:",
+        "- [ ] Проверить [**шрифты**](https://example.com)",
+        "  - _кириллица_",
+        "- [x] `Экспорт`",
+    ]
+
+
+def test_plain_keeps_structure_without_inline_markup():
+    plain = read(NotionBlockReader(FakeClient()), plain=True)
+    assert plain.splitlines() == [
+        "## ✅ Чеклист:",
+        "- [ ] Проверить шрифты",
+        "  - кириллица",
+        "- [x] Экспорт",
+    ]
+
+
+def test_cache_is_separate_per_rendering():
+    client = FakeClient()
+    reader = NotionBlockReader(client)
+    markdown = read(reader)
+    calls = client.calls
+    assert read(reader) == markdown
+    assert client.calls == calls
+    assert read(reader, plain=True) != markdown
+    assert client.calls > calls
+
+
+def test_plain_image_has_no_link_syntax():
+    block = {"type": "image", "image": {"external": {"url": "https://img"}, "caption": rich_text("Схема", bold=True)}}
+    assert block_to_markdown(block, plain=True) == "Схема https://img"
+    assert block_to_markdown(block) == "[**Схема**](https://img)"
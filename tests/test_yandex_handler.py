@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Тесты вебхука обложек: теплый старт, таймаут и PATCH с повтором
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from yandex_functions import handler as webhook
+
+PAGE_ID = "11111111-2222-3333-4444-555555555555"
+MATERIALS_DB = webhook.DATABASES["materials"]
+
+
+class FakeResponse:
+    def __init__(self, status, data=None):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.data
+
+    async def text(self):
+        return "error"
+
+
+class FakeSession:
+    """aiohttp.ClientSession: GET страницы и PATCH, отклоняющий 'Files & media'"""
+
+    def __init__(self, reject_files=False):
+        self.reject_files = reject_files
+        self.patches = []
+        self.closed = False
+
+    def get(self, url, headers=None, **kwargs):
+        return FakeResponse(200, {
+            "id": PAGE_ID,
+            "parent": {"database_id": MATERIALS_DB},
+            "properties": {"URL": {"type": "url", "url": "https://example.com/cover.png"}}
+        })
+
+    def patch(self, url, json, headers=None):
+        self.patches.append(json)
+        rejected = self.reject_files and "properties" in json
+        return FakeResponse(400 if rejected else 200)
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(webhook, "_loop", None)
+    monkeypatch.setattr(webhook, "_loop_thread", None)
+    monkeypatch.setattr(webhook, "_session", None)
+    monkeypatch.setattr(webhook, "_session_loop", None)
+    yield
+    if webhook._loop is not None:
+        webhook._loop.call_soon_threadsafe(webhook._loop.stop)
+
+
+def event():
+    return {"body": {"page": {"id": PAGE_ID.replace("-", "")}}}
+
+
+def test_combined_patch_falls_back_to_cover_only():
+    session = FakeSession(reject_files=True)
+    assert asyncio.run(webhook.update_notion_page(session, PAGE_ID, "https://c", "https://f"))
+    assert [sorted(patch) for patch in session.patches] == [["cover", "properties"], ["cover"]]
+
+    session = FakeSession()
+    assert asyncio.run(webhook.update_notion_page(session, PAGE_ID, "https://c", "https://f"))
+    assert len(session.patches) == 1
+
+
+def test_warm_calls_reuse_loop_and_session(fresh_state, monkeypatch):
+    sessions = []
+    real_get_session = webhook.get_session
+
+    async def tracked_session():
+        session = await real_get_session()
+        sessions.append(session)
+        return FakeSession()
+
+    monkeypatch.setattr(webhook, "get_session", tracked_session)
+    assert webhook.handler(event(), None)["body"] == "OK"
+    loop = webhook._loop
+    assert webhook.handler(event(), None)["body"] == "OK"
+
+    assert webhook._loop is loop
+    assert sessions[0] is sessions[1]
+
+    # Поток цикла умер: get_loop создает новый, сессия пересоздается под него
+    loop.call_soon_threadsafe(loop.stop)
+    webhook._loop_thread.join(timeout=2)
+    assert webhook.handler(event(), None)["body"] == "OK"
+    assert webhook._loop is not loop
+    assert sessions[2] is not sessions[0]
+
+
+def test_timeout_cancels_pending_patch(fresh_state, monkeypatch):
+    patched = []
+
+    async def slow_handler(event, context):
+        await asyncio.sleep(0.3)
+        patched.append(True)
+        return {"statusCode": 200, "body": "OK"}
+
+    monkeypatch.setattr(webhook, "handler_async", slow_handler)
+    monkeypatch.setattr(webhook, "HANDLER_TIMEOUT_SECONDS", 0.05)
+
+    result = webhook.handler(event(), None)
+    time.sleep(0.5)
+
+    assert result["statusCode"] == 200
+    assert patched == []
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Загрузка .env через предкомпилированный снимок
+
+При первом запуске .env разбирается python-dotenv, а результат
+сохраняется рядом в .env.snapshot.json. Пока .env не менялся
+(mtime и размер совпадают), следующие процессы читают готовый JSON
+и не импортируют dotenv. Повторные вызовы в одном процессе ничего
+не делают.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SNAPSHOT_NAME = ".env.snapshot.json"
+
+_loaded = False
+_env_file: Optional[Path] = None
+
+
+def find_env_file() -> Optional[Path]:
+    """
+    Ищет .env от корня проекта вверх, затем от текущей директории.
+
+    Корень проекта идет первым: MCP сервер запускается редактором с
+    произвольной cwd, и случайный ~/.env не должен перекрывать .env проекта.
+    """
+    for base in (PROJECT_ROOT, Path.cwd()):
+        for directory in (base, *base.parents):
+            candidate = directory / ".env"
+            if candidate.is_file():
+                return candidate
+    return None
+
+
+def _read_snapshot(env_file: Path, stat: os.stat_result) -> Optional[Dict[str, str]]:
+    try:
+        with open(env_file.with_name(SNAPSHOT_NAME), 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("mtime_ns") != stat.st_mtime_ns or snapshot.get("size") != stat.st_size:
+        return None
+    return snapshot.get("values")
+
+
+def _write_snapshot(env_file: Path, stat: os.stat_result, values: Dict[str, str]):
+    snapshot_file = env_file.with_name(SNAPSHOT_NAME)
+    tmp_file = snapshot_file.with_name(SNAPSHOT_NAME + ".tmp")
+    try:
+        # Снимок содержит те же секреты, что и .env - только для владельца
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "values": values}, f, ensure_ascii=False)
+        os.replace(tmp_file, snapshot_file)
+    except OSError:
+        # Только для чтения (например, облачная функция) - работаем без снимка
+        pass
+
+
+def load_env(override: bool = False) -> Optional[Path]:
+    """
+    Загружает переменные из .env в os.environ.
+
+    Возвращает путь к найденному .env или None. Уже заданные
+    переменные окружения не перезаписываются, если не указан override.
+    """
+    global _loaded, _env_file
+    if _loaded and not override:
+        return _env_file
+
+    _loaded = True
+    _env_file = find_env_file()
+    if _env_file is None:
+        return None
+
+    stat = _env_file.stat()
+    values = _read_snapshot(_env_file, stat)
+    if values is None:
+        from dotenv import dotenv_values
+        values = {key: value for key, value in dotenv_values(_env_file).items() if value is not None}
+        _write_snapshot(_env_file, stat, values)
+
+    for key, value in values.items():
+        if override or key not in os.environ:
+            os.environ[key] = value
+    return _env_file
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Асинхронный планировщик задач внутри процесса
+
+- cron-триггеры (минуты, часы, день месяца, месяц, день недели)
+- не больше одного активного запуска на тип задачи
+- повторы с экспоненциальной задержкой
+- ограниченная история запусков в append-only JSONL
+
+Время берется из clock, поэтому в тестах планировщик можно вести
+поддельными часами через tick() и wait_running().
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+
+@dataclass
+class JobRun:
+    """Запуск задачи"""
+    id: str
+    type: str
+    status: str  # queued, running, retrying, completed, failed
+    created_at: str
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    attempts: int = 0
+    errors: List[str] = field(default_factory=list)
+    results: Optional[Dict] = None
+
+
+def _parse_cron_field(spec: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = end = int(part)
+            if step > 1:
+                end = high
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Неверное поле cron: {spec}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """Cron-выражение из 5 полей: 'мин час день месяц день_недели' (0 - воскресенье)"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron-выражение должно содержать 5 полей: {expression}")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+        # Как в cron: если заданы оба поля, достаточно одного совпадения
+        if not self._any_day and not self._any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Первое время срабатывания строго после moment"""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for offset in range(366 * 5):
+            current = day + timedelta(days=offset)
+            if not self._day_matches(current):
+                continue
+            for hour in sorted(self.hours):
+                for minute in sorted(self.minutes):
+                    candidate = current.replace(hour=hour, minute=minute)
+                    if candidate >= start:
+                        return candidate
+        raise ValueError(f"Cron-выражение никогда не срабатывает: {self.expression}")
+
+
+class JobHistoryStore:
+    """История запусков: дописывается построчно, периодически ужимается"""
+
+    def __init__(self, path: str = "data/job_history.jsonl", max_history: int = 200):
+        self.path = path
+        self.max_history = max_history
+        self._lines = 0
+
+    def load(self) -> List[JobRun]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        self._lines = len(lines)
+        runs = []
+        for line in lines[-self.max_history:]:
+            try:
+                runs.append(JobRun(**json.loads(line)))
+            except (ValueError, TypeError):
+                continue
+        return runs
+
+    def append(self, run: JobRun, history: Deque[JobRun]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(asdict(run), ensure_ascii=False) + "\n")
+        self._lines += 1
+        if self._lines > 2 * self.max_history:
+            self._compact(history)
+
+    def _compact(self, history: Deque[JobRun]):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for run in history:
+                f.write(json.dumps(asdict(run), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(history)
+
+
+@dataclass
+class JobSpec:
+    """Зарегистрированная задача"""
+    name: str
+    func: Callable[[], Awaitable[Optional[Dict]]]
+    trigger: Optional[CronTrigger] = None
+    max_retries: int = 2
+    backoff_seconds: float = 30.0
+    backoff_max_seconds: float = 900.0
+    next_run: Optional[datetime] = None
+
+
+class JobRunner:
+    """Планировщик задач с cron-триггерами, взаимоисключением и повторами"""
+
+    def __init__(self, store: Optional[JobHistoryStore] = None,
+                 clock: Callable[[], datetime] = datetime.now, max_history: int = 200):
+        self.store = store
+        self.clock = clock
+        self.jobs: Dict[str, JobSpec] = {}
+        self.history: Deque[JobRun] = deque(store.load() if store else [], maxlen=max_history)
+        self.finished_count = len(self.history)
+
+        self._active: Dict[str, JobRun] = {}  # тип задачи -> текущий запуск
+        self._due_at: Dict[str, datetime] = {}  # когда стартовать (повтор с задержкой)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._sequence = 0
+
+    def add_job(self, name: str, func: Callable[[], Awaitable[Optional[Dict]]], cron: Optional[str] = None,
+                max_retries: int = 2, backoff_seconds: float = 30.0, backoff_max_seconds: float = 900.0):
+        """Регистрирует задачу; без cron она запускается только через submit()"""
+        trigger = CronTrigger(cron) if cron else None
+        self.jobs[name] = JobSpec(
+            name=name, func=func, trigger=trigger, max_retries=max_retries,
+            backoff_seconds=backoff_seconds, backoff_max_seconds=backoff_max_seconds,
+            next_run=trigger.next_after(self.clock()) if trigger else None
+        )
+
+    def submit(self, name: str) -> Optional[JobRun]:
+        """Ставит задачу в очередь; None, если запуск этого типа уже активен"""
+        if name in self._active:
+            return None
+        now = self.clock()
+        self._sequence += 1
+        run = JobRun(
+            id=f"{name}_{now.strftime('%Y%m%d%H%M%S')}_{self._sequence}",
+            type=name,
+            status="queued",
+            created_at=now.isoformat()
+        )
+        self._active[name] = run
+        self._due_at[name] = now
+        return run
+
+    async def tick(self) -> List[JobRun]:
+        """Ставит в очередь задачи по расписанию и запускает готовые; возвращает запущенные"""
+        now = self.clock()
+        for spec in self.jobs.values():
+            if spec.next_run and now >= spec.next_run:
+                self.submit(spec.name)
+                spec.next_run = spec.trigger.next_after(now)
+
+        started = []
+        for name, run in list(self._active.items()):
+            if run.status in ("queued", "retrying") and now >= self._due_at[name] and name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._execute(self.jobs[name], run))
+                started.append(run)
+        # Дать запущенным задачам начать выполнение
+        await asyncio.sleep(0)
+        return started
+
+    async def _execute(self, spec: JobSpec, run: JobRun):
+        run.status = "running"
+        run.attempts += 1
+        run.started_at = self.clock().isoformat()
+        try:
+            run.results = await spec.func()
+            run.status = "completed"
+        except Exception as e:
+            run.errors.append(str(e))
+            if run.attempts <= spec.max_retries:
+                delay = min(spec.backoff_seconds * 2 ** (run.attempts - 1), spec.backoff_max_seconds)
+                run.status = "retrying"
+                self._due_at[spec.name] = self.clock() + timedelta(seconds=delay)
+            else:
+                run.status = "failed"
+        finally:
+            self._tasks.pop(spec.name, None)
+
+        if run.status in ("completed", "failed"):
+            run.completed_at = self.clock().isoformat()
+            self._active.pop(spec.name, None)
+            self._due_at.pop(spec.name, None)
+            self.history.append(run)
+            self.finished_count += 1
+            if self.store:
+                self.store.append(run, self.history)
+
+    async def wait_running(self):
+        """Дождаться выполняющихся сейчас запусков"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    def counts(self) -> Dict[str, int]:
+        statuses = [run.status for run in self._active.values()]
+        return {
+            "queued": sum(status in ("queued", "retrying") for status in statuses),
+            "running": statuses.count("running"),
+            "finished": self.finished_count
+        }
+
+    def last_run(self, name: str, status: str = "completed") -> Optional[JobRun]:
+        for run in reversed(self.history):
+            if run.type == name and run.status == status:
+                return run
+        return None
+
+    def next_wakeup(self) -> Optional[datetime]:
+        moments = [spec.next_run for spec in self.jobs.values() if spec.next_run]
+        moments += [due for name, due in self._due_at.items() if name not in self._tasks]
+        return min(moments) if moments else None
+
+    async def run_forever(self, poll_interval: float = 60.0):
+        """Основной цикл: просыпается к ближайшему сроку, но не реже poll_interval"""
+        while True:
+            await self.tick()
+            wakeup = self.next_wakeup()
+            delay = poll_interval
+            if wakeup:
+                delay = min(poll_interval, max(0.5, (wakeup - self.clock()).total_seconds()))
+            await asyncio.sleep(delay)
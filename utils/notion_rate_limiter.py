@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий ограничитель запросов к Notion API
+
+Notion допускает в среднем ~3 запроса в секунду на интеграцию.
+Ограничитель совмещает token bucket (темп) и семафор (число
+одновременных запросов) и умеет ставить все запросы на паузу
+после ответа 429 с Retry-After.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class NotionRateLimiter:
+    """Token bucket + лимит параллельных запросов для Notion API"""
+
+    def __init__(self, rate_per_second: float = 3.0, burst: int = 3, max_concurrency: int = 3):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _primitives(self):
+        # Создаются лениво и заново для каждого event loop (asyncio.run в скриптах)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._lock, self._semaphore
+
+    async def _take_token(self, lock: asyncio.Lock):
+        async with lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+    async def acquire(self):
+        lock, semaphore = self._primitives()
+        await semaphore.acquire()
+        try:
+            await self._take_token(lock)
+        except BaseException:
+            semaphore.release()
+            raise
+
+    def release(self):
+        self._semaphore.release()
+
+    def backoff(self, retry_after: float):
+        """Приостанавливает все запросы (ответ 429 с Retry-After)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self._tokens = 0
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# Глобальный ограничитель для всех скриптов процесса
+notion_rate_limiter = NotionRateLimiter()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Профиль времени старта модулей
+
+Импортирует модуль в отдельном процессе с `python -X importtime`,
+печатает самые дорогие импорты и проверяет бюджет времени старта.
+
+    python -m utils.startup_profile notion_mcp_server --budget-ms 800
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """Возвращает (время процесса в мс, [(self мкс, cumulative мкс, модуль)])"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError("\n".join(errors[-5:]))
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+    return wall_ms, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль времени старта модулей")
+    parser.add_argument("modules", nargs="+", help="Модули для проверки")
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых дорогих импортов показать")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Бюджет времени старта на модуль")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.modules:
+        try:
+            wall_ms, entries = profile_import(module)
+        except RuntimeError as e:
+            print(f"❌ {module}: ошибка импорта\n{e}")
+            over_budget = True
+            continue
+
+        status = ""
+        if args.budget_ms is not None:
+            over = wall_ms > args.budget_ms
+            over_budget |= over
+            status = f" {'❌ больше' if over else '✅ в пределах'} бюджета {args.budget_ms:.0f} мс"
+        print(f"\n⏱️ {module}: {wall_ms:.0f} мс{status}")
+
+        for self_us, cumulative_us, name in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+            print(f"   {cumulative_us / 1000:8.1f} мс  (сам {self_us / 1000:6.1f})  {name}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
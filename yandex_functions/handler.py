@@ -2,11 +2,17 @@
 """
 🔗 Webhook обработчик для Notion с обработкой обложек и Files & media
 ФИНАЛЬНАЯ ИСПРАВЛЕННАЯ ВЕРСИЯ - собрана на основе предыдущего опыта.
+
+Теплый старт: event loop (в фоновом потоке) и пул соединений aiohttp
+живут на уровне модуля и переиспользуются между вызовами функции.
+С HANDLER_DEFER_UPDATES=1 вебхук получает 200 сразу после определения
+обложки, а PATCH в Notion доделывается в фоне.
 """
 
 import json
 import os
 import re
+import threading
 from urllib.parse import quote
 import aiohttp
 import asyncio
@@ -17,6 +23,10 @@ NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 FIGMA_TOKEN = os.getenv("FIGMA_TOKEN")
 YANDEX_DISK_TOKEN = os.getenv("YANDEX_DISK_TOKEN")
 
+# Отвечать вебхуку до записи в Notion (PATCH выполняется в фоне)
+DEFER_UPDATES = os.getenv("HANDLER_DEFER_UPDATES", "0") == "1"
+HANDLER_TIMEOUT_SECONDS = float(os.getenv("HANDLER_TIMEOUT_SECONDS", "25"))
+
 # --- CONSTANTS ---
 CLOUDFLARE_WORKER_URL = "https://delicate-hat-c01b.e1vice.workers.dev"
 NOTION_API_VERSION = "2022-06-28"
@@ -35,6 +45,37 @@ def log(message):
     """Централизованная функция логирования."""
     print(f"[HANDLER] {message}")
 
+# --- WARM START STATE ---
+_loop = None
+_loop_thread = None
+_session = None
+_session_loop = None
+_pending_updates = set()
+
+def get_loop():
+    """Event loop модуля в фоновом потоке, общий для теплых вызовов."""
+    global _loop, _loop_thread
+    if _loop is None or _loop.is_closed() or not _loop_thread.is_alive():
+        _loop = asyncio.new_event_loop()
+        _loop_thread = threading.Thread(target=_loop.run_forever, name="handler-loop", daemon=True)
+        _loop_thread.start()
+    return _loop
+
+async def get_session():
+    """
+    Общая сессия aiohttp: keep-alive соединения к прокси, Figma и Яндексу.
+    Сессия привязана к event loop; если get_loop() создал новый, создается и новая сессия.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session_loop = loop
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=600, keepalive_timeout=300),
+            timeout=aiohttp.ClientTimeout(total=HANDLER_TIMEOUT_SECONDS)
+        )
+    return _session
+
 def get_base_headers():
     """Возвращает базовые заголовки для всех запросов к Notion через прокси."""
     return {
@@ -58,9 +99,6 @@ async def get_notion_page(session, page_id):
     headers = get_base_headers()
     
     log(f"🔍 [get_notion_page] Запрос страницы: {page_id}")
-    log(f"🔑 Токен: {NOTION_TOKEN[:10] if NOTION_TOKEN else 'None'}...")
-    log(f"🔑 Полный токен: {NOTION_TOKEN}")
-    log(f"🔑 Длина токена: {len(NOTION_TOKEN) if NOTION_TOKEN else 0}")
     log(f"🎯 URL через прокси: {url}")
     
     async with session.get(url, headers=headers) as response:
@@ -72,39 +110,37 @@ async def get_notion_page(session, page_id):
         log(f"❌ [get_notion_page] Ошибка: {response.status} - {error_text}")
         return None
 
-async def update_notion_cover(session, page_id, cover_url):
-    """Обновляет обложку страницы Notion."""
+async def patch_notion_page(session, page_id, data, label):
+    """Один PATCH страницы Notion через воркер; True при успехе."""
     url = f"{CLOUDFLARE_WORKER_URL}/v1/pages/{page_id}"
-    data = {"cover": {"type": "external", "external": {"url": cover_url}}}
     headers = get_base_headers_with_content_type()
-    
-    log(f"🖼️ [update_notion_cover] Обновление обложки для {page_id}...")
     async with session.patch(url, json=data, headers=headers) as response:
         success = response.status == 200
-        log(f"🖼️ [update_notion_cover] Результат: {'✅' if success else '❌'}")
+        log(f"🖼️ [{label}] Результат: {'✅' if success else '❌'}")
         if not success:
-            log(f"❌ [update_notion_cover] Ошибка: {await response.text()}")
+            log(f"❌ [{label}] Ошибка: {await response.text()}")
         return success
 
-async def update_notion_files_media(session, page_id, file_url):
-    """Обновляет свойство 'Files & media' страницы Notion."""
-    url = f"{CLOUDFLARE_WORKER_URL}/v1/pages/{page_id}"
-    data = {
-        "properties": {
-            "Files & media": {
-                "files": [{"name": "Material File", "type": "external", "external": {"url": file_url}}]
-            }
-        }
-    }
-    headers = get_base_headers_with_content_type()
+async def update_notion_page(session, page_id, cover_url, files_url=None):
+    """
+    Обновляет обложку и, если нужно, 'Files & media' одним PATCH.
+    Если Notion отклонил 'Files & media', обложка обновляется отдельно.
+    """
+    cover = {"cover": {"type": "external", "external": {"url": cover_url}}}
+    if not files_url:
+        log(f"🖼️ [update_notion_page] Обновление обложки {page_id}...")
+        return await patch_notion_page(session, page_id, cover, "update_notion_page")
 
-    log(f"📎 [update_notion_files_media] Обновление Files & media для {page_id}...")
-    async with session.patch(url, json=data, headers=headers) as response:
-        success = response.status == 200
-        log(f"📎 [update_notion_files_media] Результат: {'✅' if success else '❌'}")
-        if not success:
-            log(f"❌ [update_notion_files_media] Ошибка: {await response.text()}")
-        return success
+    data = dict(cover, properties={
+        "Files & media": {
+            "files": [{"name": "Material File", "type": "external", "external": {"url": files_url}}]
+        }
+    })
+    log(f"🖼️ [update_notion_page] Обновление обложки и Files & media {page_id}...")
+    if await patch_notion_page(session, page_id, data, "update_notion_page"):
+        return True
+    log(f"🔁 [update_notion_page] Повтор только с обложкой для {page_id}")
+    return await patch_notion_page(session, page_id, cover, "update_notion_page:cover")
 
 async def get_figma_cover(session, figma_url):
     """Извлекает URL превью из ссылки Figma."""
@@ -220,36 +256,59 @@ async def get_cover_url_from_link(session, link):
     log(f"⚠️ Неизвестный тип ссылки: {link}")
     return None
 
-async def process_page_update(session, page_id, page_data):
-    """Основная логика обработки обновления страницы."""
-    log(f"🔄 [process_page_update] Начинаю обработку страницы {page_id}")
-    properties = page_data.get("properties", {})
-    
-    url_property = None
+def find_page_url(properties):
+    """Ищет ссылку на материал в свойствах страницы."""
     for prop_name in ["URL", "Link", "Ссылка", "url", "link"]:
         if prop_name in properties:
             prop = properties[prop_name]
             if prop.get("type") == "url" and prop.get("url"):
-                url_property = prop["url"]
-                log(f"🔗 [process_page_update] Найден URL: {url_property}")
-                break
-    
-    if not url_property:
-        log("⚠️ [process_page_update] URL не найден в свойствах.")
-        return
+                log(f"🔗 Найден URL: {prop['url']}")
+                return prop["url"]
+    return None
+
+async def apply_cover_updates(session, page_id, page_data, cover_url):
+    """PATCH обложки (и Files & media для материалов)."""
+    parent_db_id = page_data.get("parent", {}).get("database_id", "").replace("-", "")
+    is_material = parent_db_id == DATABASES["materials"].replace("-", "")
+    if is_material:
+        log("📎 Обновляю Files & media для материалов...")
+    return await update_notion_page(session, page_id, cover_url, cover_url if is_material else None)
+
+def defer_updates(coro):
+    """Выполняет запись в Notion в фоне на event loop модуля."""
+    task = asyncio.ensure_future(coro)
+    _pending_updates.add(task)
+
+    def done(t):
+        _pending_updates.discard(t)
+        if not t.cancelled() and t.exception():
+            log(f"❌ Ошибка отложенного обновления: {t.exception()}")
+
+    task.add_done_callback(done)
+    return task
+
+async def process_page_update(session, page_id, page_data, cover_task=None):
+    """Основная логика обработки обновления страницы."""
+    log(f"🔄 [process_page_update] Начинаю обработку страницы {page_id}")
+
+    if cover_task is None:
+        url_property = find_page_url(page_data.get("properties", {}))
+        if not url_property:
+            log("⚠️ [process_page_update] URL не найден в свойствах.")
+            return
+        cover_task = get_cover_url_from_link(session, url_property)
 
-    cover_url = await get_cover_url_from_link(session, url_property)
+    cover_url = await cover_task
     if not cover_url:
         log("⚠️ [process_page_update] Не удалось получить URL обложки.")
         return
 
     log(f"✅ [process_page_update] Обложка получена: {cover_url[:100]}...")
-    await update_notion_cover(session, page_id, cover_url)
-    
-    parent_db_id = page_data.get("parent", {}).get("database_id", "").replace("-", "")
-    if parent_db_id == DATABASES["materials"].replace("-", ""):
-        log("📎 [process_page_update] Обновляю Files & media для материалов...")
-        await update_notion_files_media(session, page_id, cover_url)
+    if DEFER_UPDATES:
+        defer_updates(apply_cover_updates(session, page_id, page_data, cover_url))
+        log("⏩ [process_page_update] Запись в Notion отложена, отвечаем вебхуку")
+    else:
+        await apply_cover_updates(session, page_id, page_data, cover_url)
 
 async def handler_async(event, context):
     """Асинхронный обработчик входящих запросов."""
@@ -280,6 +339,8 @@ async def handler_async(event, context):
         page_id = webhook_data['page']['id']
     elif 'entity' in webhook_data and 'id' in webhook_data['entity']: # Fallback
         page_id = webhook_data['entity']['id']
+    elif isinstance(webhook_data.get('data'), dict) and webhook_data['data'].get('object') == 'page': # Автоматизация Notion
+        page_id = webhook_data['data']['id']
 
     if not page_id:
         log(f"❌ ID страницы не найден в webhook. Структура: {list(webhook_data.keys())}")
@@ -298,22 +359,40 @@ async def handler_async(event, context):
 
     log(f"📄 Обрабатываю страницу: {page_id}")
     
-    async with aiohttp.ClientSession() as session:
-        page_data = await get_notion_page(session, page_id)
-        if not page_data:
-            log("❌ Не удалось получить данные страницы. Завершаю.")
-            return {'statusCode': 200, 'body': 'OK (page data fetch failed)'}
-        
-        await process_page_update(session, page_id, page_data)
+    session = await get_session()
+    page_task = asyncio.ensure_future(get_notion_page(session, page_id))
+
+    # Если вебхук уже содержит свойства страницы (автоматизации Notion),
+    # определение обложки стартует параллельно с загрузкой страницы
+    cover_task = None
+    payload_properties = (webhook_data.get('data') or {}).get('properties') if isinstance(webhook_data.get('data'), dict) else None
+    if payload_properties:
+        url_property = find_page_url(payload_properties)
+        if url_property:
+            cover_task = asyncio.ensure_future(get_cover_url_from_link(session, url_property))
+
+    page_data = await page_task
+    if not page_data:
+        if cover_task:
+            cover_task.cancel()
+        log("❌ Не удалось получить данные страницы. Завершаю.")
+        return {'statusCode': 200, 'body': 'OK (page data fetch failed)'}
+    
+    await process_page_update(session, page_id, page_data, cover_task)
             
     return {'statusCode': 200, 'body': 'OK'}
 
 def handler(event, context):
     """Синхронная точка входа для Yandex Cloud Function."""
+    future = None
     try:
-        return asyncio.run(handler_async(event, context))
+        future = asyncio.run_coroutine_threadsafe(handler_async(event, context), get_loop())
+        return future.result(timeout=HANDLER_TIMEOUT_SECONDS)
     except Exception as e:
-        log(f"💥 КРИТИЧЕСКАЯ ОШИБКА в handler: {e}")
+        if future is not None and not future.done():
+            # Таймаут: без отмены PATCH ушел бы в Notion уже после ответа вебхуку
+            future.cancel()
+        log(f"💥 КРИТИЧЕСКАЯ ОШИБКА в handler: {e!r}")
         log(traceback.format_exc())
         # Возвращаем 200, чтобы Notion не отключил вебхук
         return {'statusCode': 200, 'body': f'Critical error: {e}'}